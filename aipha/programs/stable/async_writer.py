@@ -0,0 +1,125 @@
+"""
+async_writer.py - Escritor de resultados en segundo plano con cola acotada
+
+Los detectores encolan trabajos de escritura (por ejemplo saver.save_results de un archivo)
+y un hilo escritor los ejecuta en orden mientras el hilo principal sigue con el siguiente archivo.
+Si la cola está llena, submit() bloquea (contrapresión) para que la detección no acumule en memoria
+más resultados de los que la base de datos puede absorber. Al cerrar (o al salir del proceso) se
+vacía la cola, y cualquier error del hilo escritor se relanza en el hilo que encola.
+Ubicación: aipha/programs/stable/async_writer.py
+"""
+
+import atexit
+import queue
+import threading
+import logging
+import time
+
+# Marca de fin de la cola
+_STOP = object()
+
+
+class BackgroundWriteError(RuntimeError):
+    """Error producido por un trabajo de escritura en segundo plano."""
+
+
+class BackgroundResultWriter:
+    """
+    Hilo escritor con cola acotada.
+
+        with BackgroundResultWriter(max_pending=2) as writer:
+            for csv_file in csv_files:
+                results = detect(csv_file)
+                writer.submit(save, csv_file, results)
+
+    Los trabajos se ejecutan en el orden de llegada. Un trabajo que devuelve False se considera
+    fallido igual que uno que lanza una excepción.
+    """
+    def __init__(self, max_pending=2, name='aipha-result-writer'):
+        """
+        :param max_pending: Trabajos en cola como máximo antes de bloquear submit()
+        :param name: Nombre del hilo escritor
+        """
+        self._queue = queue.Queue(maxsize=max(1, int(max_pending)))
+        self._error = None
+        self._closed = False
+        self.completed = 0
+        self.busy_seconds = 0.0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        atexit.register(self._close_at_exit)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is _STOP:
+                    return
+                if self._error is not None:
+                    # Tras un error se descartan los trabajos pendientes
+                    continue
+                description, fn, args, kwargs = job
+                start = time.perf_counter()
+                try:
+                    result = fn(*args, **kwargs)
+                    if result is False:
+                        raise BackgroundWriteError(f"Write job failed: {description}")
+                    self.completed += 1
+                except Exception as e:
+                    logging.error(f"Background write error in {description}: {e}")
+                    self._error = e
+                finally:
+                    self.busy_seconds += time.perf_counter() - start
+            finally:
+                self._queue.task_done()
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            error = self._error
+            if isinstance(error, BackgroundWriteError):
+                raise error
+            raise BackgroundWriteError(str(error)) from error
+
+    def submit(self, fn, *args, description=None, **kwargs):
+        """
+        Encola un trabajo de escritura. Bloquea mientras la cola esté llena.
+        Relanza (como BackgroundWriteError) el error de un trabajo anterior.
+        """
+        if self._closed:
+            raise RuntimeError("BackgroundResultWriter is closed")
+        self._raise_if_failed()
+        self._queue.put((description or getattr(fn, '__name__', 'job'), fn, args, kwargs))
+
+    def flush(self):
+        """Espera a que terminen todos los trabajos encolados y relanza su error si lo hubo."""
+        self._queue.join()
+        self._raise_if_failed()
+
+    def close(self):
+        """Vacía la cola, detiene el hilo y relanza el error de escritura si lo hubo."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(_STOP)
+            self._thread.join()
+            atexit.unregister(self._close_at_exit)
+        self._raise_if_failed()
+
+    def _close_at_exit(self):
+        try:
+            self.close()
+        except Exception as e:
+            logging.error(f"Pending background writes failed at exit: {e}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # Con una excepción en curso se vacía la cola pero se conserva la excepción original
+            try:
+                self.close()
+            except BackgroundWriteError as e:
+                logging.error(f"Background write error while handling another exception: {e}")
+        return False
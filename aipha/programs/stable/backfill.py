@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+backfill.py - Procesamiento masivo de símbolos, timeframes y días con reanudación
+
+Recorre los CSV diarios {SYMBOL}-{timeframe}-{YYYY-MM-DD}.csv de un rango de fechas y ejecuta
+pipeline.py sobre cada uno en un pool de procesos. Muestra velas/s y tiempo restante estimado, y
+registra cada unidad (símbolo, timeframe, día, etapa) completada con su destino y el hash del CSV en
+un checkpoint SQLite: si el backfill se interrumpe, al relanzarlo con los mismos argumentos continúa
+donde se quedó; cambiar de destino o el contenido del CSV vuelve a procesar la unidad.
+
+    python backfill.py --symbols BTCUSDT,ETHUSDT --timeframes 5m,15m \
+        --start 2025-04-01 --end 2025-04-30 --data-dir data --workers 8
+
+Por defecto cada etapa se guarda como CSV en --output-dir. Con --sink db se usan los savers de
+MySQL; cada día reemplaza solo sus propias filas (símbolo, timeframe y csv_file), de modo que los
+días de un par se acumulan. Los días de un mismo par se escriben de uno en uno para que dos procesos
+no borren y reescriban a la vez el mismo ámbito; los pares distintos sí van en paralelo.
+Ubicación: aipha/programs/stable/backfill.py
+"""
+
+import os
+import sys
+import glob
+import time
+import sqlite3
+import argparse
+import logging
+import traceback
+from collections import OrderedDict, deque
+from datetime import date, datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+from param_sets import param_hash
+from run_cache import file_sha256
+from log_config import configure_logging
+from pipeline import STAGES, PipelineSink, CsvSink, DatabaseSink, required_stages, run_pipeline, stage_params
+
+# Rutas por defecto
+DEFAULT_CHECKPOINT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../data/backfill_checkpoint.sqlite'))
+DEFAULT_OUTPUT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../data/backfill'))
+
+
+def day_range(start, end):
+    """Días entre start y end (ambos incluidos), como cadenas YYYY-MM-DD."""
+    first = date.fromisoformat(start)
+    last = date.fromisoformat(end)
+    return [(first + timedelta(days=offset)).isoformat() for offset in range((last - first).days + 1)]
+
+
+def find_csv(data_dir, symbol, timeframe, day):
+    """Ruta del CSV diario dentro de data_dir (se busca también en subdirectorios), o None."""
+    name = f"{symbol}-{timeframe}-{day}.csv"
+    direct = os.path.join(data_dir, name)
+    if os.path.exists(direct):
+        return direct
+    matches = sorted(glob.glob(os.path.join(data_dir, '**', name), recursive=True))
+    return matches[0] if matches else None
+
+
+def count_bars(csv_file):
+    """Número de filas del CSV (velas), para estimar el progreso."""
+    with open(csv_file, 'rb') as f:
+        return sum(1 for _ in f)
+
+
+class BackfillCheckpoint:
+    """
+    Unidades (símbolo, timeframe, día, etapa) completadas, con el hash de los parámetros de la etapa:
+    cambiar los parámetros de zonas no invalida las velas clave ya calculadas. La clave incluye el
+    destino (csv, db, none) y el hash del CSV: una ejecución sin destino no cuenta como guardada en
+    la base de datos, y un CSV reescrito se vuelve a procesar.
+    Un archivo SQLite local; solo lo escribe el proceso principal.
+    """
+    def __init__(self, path=None):
+        self.path = path or DEFAULT_CHECKPOINT_PATH
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.connection = sqlite3.connect(self.path, timeout=30)
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(backfill_units)")]
+        if columns and 'sink' not in columns:
+            # Checkpoint anterior sin destino ni hash del CSV: no se sabe dónde quedaron sus unidades
+            logging.warning(f"Checkpoint {self.path} sin destino ni hash del CSV: se descarta")
+            self.connection.execute("DROP TABLE backfill_units")
+        self.connection.execute("""
+        CREATE TABLE IF NOT EXISTS backfill_units (
+            symbol TEXT NOT NULL,
+            timeframe TEXT NOT NULL,
+            day TEXT NOT NULL,
+            stage TEXT NOT NULL,
+            param_hash TEXT NOT NULL,
+            sink TEXT NOT NULL,
+            csv_hash TEXT NOT NULL,
+            bars INTEGER,
+            seconds REAL,
+            finished_at TEXT,
+            PRIMARY KEY (symbol, timeframe, day, stage, param_hash, sink, csv_hash)
+        )
+        """)
+        self.connection.commit()
+
+    def completed(self, symbol, timeframe, day, stage_hashes, sink, csv_hash):
+        """
+        Etapas ya completadas de una unidad con este destino y este contenido del CSV.
+        :param stage_hashes: Diccionario etapa -> hash de sus parámetros (ver stage_param_hashes)
+        :param sink: Destino de los resultados (csv, db, none)
+        :param csv_hash: Hash SHA-256 del CSV
+        """
+        rows = self.connection.execute(
+            "SELECT stage, param_hash FROM backfill_units "
+            "WHERE symbol = ? AND timeframe = ? AND day = ? AND sink = ? AND csv_hash = ?",
+            (symbol, timeframe, day, sink, csv_hash)
+        ).fetchall()
+        return {stage for stage, digest in rows if stage_hashes.get(stage) == digest}
+
+    def mark(self, symbol, timeframe, day, stage, params_hash, sink, csv_hash, bars=None, seconds=None):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO backfill_units (symbol, timeframe, day, stage, param_hash, sink, csv_hash, "
+            "bars, seconds, finished_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (symbol, timeframe, day, stage, params_hash, sink, csv_hash, bars, seconds,
+             datetime.now().isoformat(timespec='seconds'))
+        )
+        self.connection.commit()
+
+    def clear(self):
+        self.connection.execute("DELETE FROM backfill_units")
+        self.connection.commit()
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class _StageFilter(PipelineSink):
+    """Entrega a los sinks solo las etapas pendientes."""
+    def __init__(self, sinks, stages):
+        self.sinks = sinks
+        self.stages = set(stages)
+
+    def write(self, data, stage, output):
+        if stage in self.stages:
+            for sink in self.sinks:
+                sink.write(data, stage, output)
+
+
+def process_unit(csv_file, stages, done, params, sink_kind='csv', output_dir=None):
+    """
+    Ejecuta el pipeline sobre un CSV en el proceso del pool.
+    Las etapas ya completadas (done) no se vuelven a escribir: con la base de datos se leen
+    de ella (solo las filas de este archivo), en otro caso se recalculan en memoria solo como
+    entrada de las pendientes.
+    :return: Diccionario con las etapas completadas, velas y segundos por etapa
+    """
+    start = time.perf_counter()
+    pending = [stage for stage in required_stages(stages) if stage not in done]
+    sinks = []
+    reuse = {}
+    if sink_kind == 'csv':
+        sinks.append(CsvSink(output_dir or DEFAULT_OUTPUT_DIR))
+    elif sink_kind == 'db':
+        database = DatabaseSink()
+        sinks.append(database)
+        loaders = {'candles': database.load_candles, 'zones': database.load_zones,
+                   'mini_trends': database.load_mini_trends}
+        reuse = {stage: loaders[stage] for stage in done if stage in loaders}
+    stage_filter = _StageFilter(sinks, pending)
+    try:
+        data = run_pipeline(csv_file, params=params, stages=stages, sinks=[stage_filter], reuse=reuse)
+    finally:
+        for sink in sinks:
+            sink.close()
+    # Si algo falla se lanza la excepción y la unidad entera queda pendiente
+    return {
+        'stages': pending,
+        'bars': len(data.raw),
+        'timings': dict(data.timings),
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def unit_queues(units, sink_kind):
+    """
+    Colas de unidades que se procesan de una en una. Con la base de datos hay una cola por par
+    (símbolo, timeframe), porque sus días comparten tablas e índices; en otro caso cada unidad es
+    su propia cola y todas se envían a la vez.
+    :param units: Tuplas que empiezan por (symbol, timeframe, ...)
+    :return: OrderedDict clave -> deque de unidades
+    """
+    queues = OrderedDict()
+    for position, unit in enumerate(units):
+        queues.setdefault(tuple(unit[:2]) if sink_kind == 'db' else position, deque()).append(unit)
+    return queues
+
+
+def stage_param_hashes(stages, params):
+    """Hash por etapa de sus parámetros y los de las etapas de las que depende."""
+    return {stage: param_hash({dep: params[dep] for dep in required_stages([stage])}) for stage in stages}
+
+
+def format_eta(seconds):
+    seconds = int(max(0, seconds))
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def run_backfill(symbols, timeframes, start, end, data_dir, stages=STAGES, params=None, workers=None,
+                 checkpoint=None, sink_kind='csv', output_dir=None, progress=print):
+    """
+    Programa las unidades pendientes en un pool de procesos y registra las completadas.
+    :return: Diccionario resumen (unidades, omitidas, fallidas, velas, segundos)
+    """
+    params = stage_params(params)
+    stages = required_stages(stages)
+    stage_hashes = stage_param_hashes(stages, params)
+    checkpoint = checkpoint or BackfillCheckpoint()
+
+    units = []
+    missing = 0
+    skipped = 0
+    for symbol in symbols:
+        for timeframe in timeframes:
+            for day in day_range(start, end):
+                csv_file = find_csv(data_dir, symbol, timeframe, day)
+                if csv_file is None:
+                    missing += 1
+                    continue
+                csv_hash = file_sha256(csv_file)
+                done = checkpoint.completed(symbol, timeframe, day, stage_hashes, sink_kind, csv_hash)
+                if all(stage in done for stage in stages):
+                    skipped += 1
+                    continue
+                units.append((symbol, timeframe, day, csv_file, csv_hash, done, count_bars(csv_file)))
+
+    queues = unit_queues(units, sink_kind)
+    total_bars = sum(unit[6] for unit in units)
+    progress(f"Backfill: {len(units)} unidades pendientes ({total_bars} velas), {skipped} ya completadas, "
+             f"{missing} sin CSV")
+
+    started = time.perf_counter()
+    done_bars = 0
+    failed = []
+    position = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+
+        def submit_next(queue_key):
+            if queues[queue_key]:
+                unit = queues[queue_key].popleft()
+                symbol, timeframe, day, csv_file, csv_hash, done, bars = unit
+                future = pool.submit(process_unit, csv_file, stages, done, params, sink_kind, output_dir)
+                futures[future] = (queue_key, unit)
+
+        for queue_key in queues:
+            submit_next(queue_key)
+        while futures:
+            finished, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+            for future in finished:
+                queue_key, (symbol, timeframe, day, csv_file, csv_hash, done, bars) = futures.pop(future)
+                # El siguiente día del par solo empieza cuando este ha terminado de escribir
+                submit_next(queue_key)
+                position += 1
+                try:
+                    result = future.result()
+                except Exception as e:
+                    failed.append((symbol, timeframe, day))
+                    logging.error(f"Backfill {symbol}-{timeframe}-{day} falló: {e}")
+                    continue
+                for stage in result['stages']:
+                    checkpoint.mark(symbol, timeframe, day, stage, stage_hashes[stage], sink_kind, csv_hash,
+                                    bars=result['bars'], seconds=result['timings'].get(stage))
+                done_bars += bars
+                elapsed = time.perf_counter() - started
+                rate = done_bars / elapsed if elapsed > 0 else 0.0
+                eta = (total_bars - done_bars) / rate if rate > 0 else 0.0
+                progress(f"[{position}/{len(units)}] {symbol} {timeframe} {day}: {bars} velas en "
+                         f"{result['seconds']:.1f}s | {rate:,.0f} velas/s | ETA {format_eta(eta)}")
+
+    return {
+        'units': len(units),
+        'skipped': skipped,
+        'missing': missing,
+        'failed': failed,
+        'bars': done_bars,
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill de detección para varios símbolos, timeframes y días")
+    parser.add_argument('--symbols', type=str, required=True, help='Símbolos separados por comas (BTCUSDT,ETHUSDT)')
+    parser.add_argument('--timeframes', type=str, default='5m', help='Timeframes separados por comas (5m,15m)')
+    parser.add_argument('--start', type=str, required=True, help='Primer día (YYYY-MM-DD)')
+    parser.add_argument('--end', type=str, required=True, help='Último día, incluido (YYYY-MM-DD)')
+    parser.add_argument('--data-dir', type=str, default='data', help='Directorio con los CSV diarios')
+    parser.add_argument('--stages', type=str, default=','.join(STAGES), help='Etapas separadas por comas')
+    parser.add_argument('--workers', type=int, default=None, help='Procesos del pool (por defecto, núcleos de CPU)')
+    parser.add_argument('--sink', choices=['csv', 'db', 'none'], default='csv', help='Destino de los resultados')
+    parser.add_argument('--output-dir', type=str, default=DEFAULT_OUTPUT_DIR, help='Directorio de salida con --sink csv')
+    parser.add_argument('--checkpoint', type=str, default=None, help='Archivo SQLite del checkpoint')
+    parser.add_argument('--restart', action='store_true', help='Olvidar el checkpoint y procesar todo de nuevo')
+    args = parser.parse_args()
+
+    configure_logging(level=logging.WARNING, fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    with BackfillCheckpoint(args.checkpoint) as checkpoint:
+        if args.restart:
+            checkpoint.clear()
+        summary = run_backfill(
+            [s.strip() for s in args.symbols.split(',') if s.strip()],
+            [t.strip() for t in args.timeframes.split(',') if t.strip()],
+            args.start, args.end, args.data_dir,
+            stages=[s.strip() for s in args.stages.split(',') if s.strip()],
+            workers=args.workers, checkpoint=checkpoint, sink_kind=args.sink, output_dir=args.output_dir
+        )
+
+    rate = summary['bars'] / summary['seconds'] if summary['seconds'] > 0 else 0.0
+    print(f"Backfill completado: {summary['units'] - len(summary['failed'])}/{summary['units']} unidades, "
+          f"{summary['bars']} velas en {format_eta(summary['seconds'])} ({rate:,.0f} velas/s)")
+    for symbol, timeframe, day in summary['failed']:
+        print(f"  Falló: {symbol}-{timeframe}-{day} (se reintentará en la próxima ejecución)")
+    return not summary['failed']
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(0 if main() else 1)
+    except KeyboardInterrupt:
+        print("Backfill interrumpido: las unidades completadas quedan en el checkpoint")
+        sys.exit(130)
+    except Exception as e:
+        logging.error(f"Error inesperado: {str(e)}")
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,191 @@
+"""
+batch_scoring.py - Puntuación vectorizada de señales de triple coincidencia
+
+Reproduce con NumPy, para lotes de señales en formato columnar, la misma lógica que
+TripleSignalSaver.calculate_signal_strength y TripleSignalSaver.calculate_combined_score.
+Las funciones por señal siguen siendo la implementación de referencia; este módulo permite
+puntuar y re-puntuar miles de señales (por ejemplo con otros pesos) sin bucles en Python.
+Ubicación: aipha/programs/stable/batch_scoring.py
+"""
+
+import numpy as np
+
+# Pesos de calculate_signal_strength: zona, tendencia, vela
+SIGNAL_STRENGTH_WEIGHTS = (0.35, 0.35, 0.30)
+
+# Pesos de calculate_combined_score: fuerza base, divergencia, contexto+fiabilidad, rentabilidad
+COMBINED_SCORE_WEIGHTS = (0.5, 0.2, 0.15, 0.15)
+
+# Base provisional que usa calculate_combined_score cuando recibe los detalles ya calculados
+PROVISIONAL_BASE_STRENGTH = 0.5
+
+# Columnas de entrada necesarias para puntuar
+SCORING_INPUT_COLUMNS = (
+    'zone_quality_score', 'trend_r_squared', 'trend_direction',
+    'trend_slope', 'volume', 'body_percentage'
+)
+
+# Códigos de dirección de la mini-tendencia
+DIRECTION_CODES = {'alcista': 1, 'bajista': -1}
+
+
+def _float_column(values):
+    """Convierte una secuencia (con posibles None/Decimal) a float64, None -> NaN."""
+    return np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+
+
+def signals_to_columns(signals):
+    """
+    Convierte una lista de señales (diccionarios de find_triple_signals) a columnas.
+    :param signals: Lista de diccionarios con las claves de SCORING_INPUT_COLUMNS
+    :return: Diccionario columna -> array (float64; str para trend_direction e int8 para direction_code)
+    """
+    columns = {}
+    for name in SCORING_INPUT_COLUMNS:
+        values = [signal.get(name) for signal in signals]
+        if name == 'trend_direction':
+            directions = [(v or '').lower() for v in values]
+            columns[name] = np.array(directions, dtype=str)
+            columns['direction_code'] = np.array([DIRECTION_CODES.get(v, 0) for v in directions], dtype=np.int8)
+        else:
+            columns[name] = _float_column(values)
+    return columns
+
+
+def direction_codes(columns):
+    """
+    Dirección de la mini-tendencia como entero (1 alcista, -1 bajista, 0 otra).
+    Usa la columna 'direction_code' si existe; si no, la deriva de 'trend_direction'.
+    """
+    if 'direction_code' in columns:
+        return np.asarray(columns['direction_code'])
+    direction = np.char.lower(np.asarray(columns['trend_direction'], dtype=str))
+    return np.where(direction == 'alcista', 1, np.where(direction == 'bajista', -1, 0)).astype(np.int8)
+
+
+def component_scores(columns):
+    """
+    Calcula las puntuaciones de componentes de calculate_signal_strength para todo el lote.
+    :param columns: Diccionario columnar (ver signals_to_columns)
+    :return: Diccionario con zone_score, trend_score, candle_score, direction_factor y slope_factor
+    """
+    zone_quality_raw = np.minimum(np.asarray(columns['zone_quality_score'], dtype=np.float64), 1.0)
+    zone_quality = np.where(zone_quality_raw > 0.45, (zone_quality_raw - 0.45) / 0.4, 0.1)
+    zone_quality = np.minimum(zone_quality, 1.0)
+
+    r_squared = np.asarray(columns['trend_r_squared'], dtype=np.float64)
+    trend_quality = np.select(
+        [r_squared >= 0.6, r_squared >= 0.45],
+        [r_squared * 1.3, r_squared * 1.0],
+        default=r_squared * 0.9
+    )
+    trend_quality = np.minimum(trend_quality, 1.0)
+
+    direction = direction_codes(columns)
+    direction_factor = np.select([direction == 1, direction == -1], [1.15, 0.9], default=1.0)
+
+    slope_factor = np.minimum(np.abs(np.asarray(columns['trend_slope'], dtype=np.float64)) / 100, 1.2)
+    trend_quality = np.minimum(trend_quality * direction_factor * slope_factor, 1.0)
+
+    volume_norm = np.minimum(np.asarray(columns['volume'], dtype=np.float64) / 150, 1.0)
+    body_pct = np.asarray(columns['body_percentage'], dtype=np.float64)
+    body_norm = np.select(
+        [body_pct < 5, body_pct <= 15, body_pct <= 40, body_pct <= 60],
+        [0.3, 0.6, 1.0, 0.8],
+        default=0.6
+    )
+    candle_quality = 0.6 * volume_norm + 0.4 * body_norm
+
+    return {
+        'zone_score': zone_quality,
+        'trend_score': trend_quality,
+        'candle_score': candle_quality,
+        'direction_factor': direction_factor,
+        'slope_factor': slope_factor,
+    }
+
+
+def context_factors(columns, zone_score, trend_score, candle_score):
+    """
+    Calcula los factores adicionales de calculate_combined_score para todo el lote.
+    :return: Diccionario con divergence_factor, market_factor, reliability_bonus y profit_potential
+    """
+    stacked = np.vstack([zone_score, trend_score, candle_score])
+    divergence_factor = 1 - (stacked.max(axis=0) - stacked.min(axis=0)) * 0.5
+
+    r_squared = np.asarray(columns['trend_r_squared'], dtype=np.float64)
+    reliability_bonus = np.select([r_squared > 0.8, r_squared > 0.7], [0.2, 0.1], default=0.0)
+
+    direction = direction_codes(columns)
+    volume = np.asarray(columns['volume'], dtype=np.float64)
+    body_pct = np.asarray(columns['body_percentage'], dtype=np.float64)
+    bullish = direction == 1
+    profit_potential = np.select(
+        [bullish & (volume > 80), bullish & (volume > 50), (direction == -1) & (body_pct > 20)],
+        [0.85, 0.75, 0.7],
+        default=0.6
+    )
+
+    return {
+        'divergence_factor': divergence_factor,
+        'market_factor': np.ones_like(divergence_factor),
+        'reliability_bonus': reliability_bonus,
+        'profit_potential': profit_potential,
+    }
+
+
+def score_signals_batch(columns, strength_weights=SIGNAL_STRENGTH_WEIGHTS,
+                        combined_weights=COMBINED_SCORE_WEIGHTS, use_signal_strength=False):
+    """
+    Puntúa un lote de señales en formato columnar.
+
+    Con los valores por defecto coincide con save_signals, que llama a calculate_combined_score
+    con los detalles ya calculados y por tanto usa la base provisional 0.5 en lugar de la fuerza.
+
+    :param columns: Diccionario columnar (ver signals_to_columns)
+    :param strength_weights: Pesos (zona, tendencia, vela) de la fuerza de señal
+    :param combined_weights: Pesos (fuerza, divergencia, contexto+fiabilidad, rentabilidad)
+    :param use_signal_strength: Si True, la puntuación combinada usa la fuerza real de la señal
+    :return: Diccionario columna -> array float64 con signal_strength, combined_score y todos
+             los componentes que save_signals guarda en triple_signals
+    """
+    components = component_scores(columns)
+    # Los detalles se redondean antes de combinarlos, igual que en la ruta por señal
+    zone_score = np.round(components['zone_score'], 4)
+    trend_score = np.round(components['trend_score'], 4)
+    candle_score = np.round(components['candle_score'], 4)
+
+    zone_w, trend_w, candle_w = strength_weights
+    signal_strength = np.round(
+        zone_w * components['zone_score'] + trend_w * components['trend_score'] +
+        candle_w * components['candle_score'], 4
+    )
+
+    factors = context_factors(columns, zone_score, trend_score, candle_score)
+    if use_signal_strength:
+        base_strength = signal_strength
+    else:
+        base_strength = np.full_like(signal_strength, PROVISIONAL_BASE_STRENGTH)
+
+    base_w, divergence_w, context_w, profit_w = combined_weights
+    combined_score = np.round(np.minimum(
+        base_w * base_strength +
+        divergence_w * factors['divergence_factor'] +
+        context_w * (factors['market_factor'] + factors['reliability_bonus']) +
+        profit_w * factors['profit_potential'], 1.0), 4)
+
+    return {
+        'signal_strength': signal_strength,
+        'combined_score': combined_score,
+        'zone_score': zone_score,
+        'trend_score': trend_score,
+        'candle_score': candle_score,
+        'direction_factor': np.round(components['direction_factor'], 4),
+        'slope_factor': np.round(components['slope_factor'], 4),
+        'divergence_factor': np.round(factors['divergence_factor'], 4),
+        'reliability_bonus': np.round(factors['reliability_bonus'], 4),
+        'profit_potential': np.round(factors['profit_potential'], 4),
+        'base_strength': np.round(base_strength, 4),
+        'final_score': combined_score,
+    }
+
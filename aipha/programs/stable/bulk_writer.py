@@ -0,0 +1,159 @@
+"""
+bulk_writer.py - Escritura masiva de filas de resultados en MySQL
+
+Agrupa las filas en lotes y las escribe con INSERT multi-fila (cursor.executemany) o con
+LOAD DATA LOCAL INFILE, en lugar de un cursor.execute por fila. Devuelve estadísticas de
+cada escritura, incluidas las filas por segundo.
+LOAD DATA necesita allow_local_infile en la conexión (db_pool.get_db_config lo activa con
+AIPHA_BULK_METHOD=load_data) y local_infile en el servidor; si el primer lote se rechaza,
+la escritura continúa con executemany.
+Ubicación: aipha/programs/stable/bulk_writer.py
+"""
+
+import os
+import time
+import logging
+import tempfile
+from datetime import datetime, date
+
+# Tamaño de lote y método por defecto (configurables por variable de entorno)
+DEFAULT_BATCH_SIZE = int(os.getenv('AIPHA_BULK_BATCH_SIZE', '1000'))
+DEFAULT_METHOD = os.getenv('AIPHA_BULK_METHOD', 'executemany')
+
+BULK_METHODS = ('executemany', 'load_data')
+
+# Errores de MySQL cuando LOAD DATA LOCAL está deshabilitado en el cliente o en el servidor
+LOCAL_INFILE_DISABLED_ERRORS = (1148, 2068, 3948, 3950)
+
+
+class LocalInfileDisabled(Exception):
+    """LOAD DATA LOCAL INFILE no está permitido en esta conexión."""
+
+
+def _tsv_value(value):
+    """Formatea un valor para un archivo de LOAD DATA (\\N = NULL)."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.strftime('%Y-%m-%d')
+    text = str(value)
+    return (text.replace('\\', '\\\\').replace('\t', '\\t')
+                .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+class BulkWriter:
+    """
+    Escritor por lotes sobre una conexión MySQL existente.
+    No hace commit salvo que se indique; el llamador decide el alcance de la transacción.
+    """
+    def __init__(self, connection, batch_size=None, method=None, commit=False):
+        """
+        :param connection: Conexión mysql.connector abierta
+        :param batch_size: Filas por sentencia (por defecto AIPHA_BULK_BATCH_SIZE o 1000)
+        :param method: 'executemany' (INSERT multi-fila) o 'load_data' (LOAD DATA LOCAL INFILE)
+        :param commit: Si True, hace commit al final de cada insert()
+        """
+        self.connection = connection
+        self.batch_size = max(1, int(batch_size or DEFAULT_BATCH_SIZE))
+        # La variable de entorno se lee al crear el escritor (puede venir de config/.env)
+        self.method = method or os.getenv('AIPHA_BULK_METHOD', DEFAULT_METHOD)
+        if self.method not in BULK_METHODS:
+            raise ValueError(f"Unknown bulk method '{self.method}', expected one of {BULK_METHODS}")
+        self.commit = commit
+
+    def insert(self, table_name, columns, rows, on_duplicate_update=None):
+        """
+        Inserta las filas en la tabla.
+
+        :param table_name: Tabla destino
+        :param columns: Lista de columnas, en el orden de cada fila
+        :param rows: Secuencia de tuplas
+        :param on_duplicate_update: Columnas a actualizar si la fila choca con una clave única
+                                    (solo con executemany)
+        :return: Diccionario con rows, batches, seconds y rows_per_second
+        """
+        rows = list(rows)
+        start = time.perf_counter()
+        batches = 0
+        if rows:
+            if self.method == 'load_data' and not on_duplicate_update:
+                try:
+                    batches = self._insert_load_data(table_name, columns, rows)
+                except LocalInfileDisabled as e:
+                    logging.warning(f"LOAD DATA LOCAL INFILE rejected ({e}), falling back to executemany")
+                    self.method = 'executemany'
+                    batches = self._insert_executemany(table_name, columns, rows, on_duplicate_update)
+            else:
+                batches = self._insert_executemany(table_name, columns, rows, on_duplicate_update)
+            if self.commit:
+                self.connection.commit()
+        seconds = time.perf_counter() - start
+        stats = {
+            'rows': len(rows),
+            'batches': batches,
+            'seconds': seconds,
+            'rows_per_second': len(rows) / seconds if seconds > 0 else float('inf'),
+        }
+        logging.info(f"Bulk insert into {table_name}: {stats['rows']} rows in {stats['batches']} batches, "
+                     f"{stats['seconds']:.3f}s ({stats['rows_per_second']:.0f} rows/s)")
+        return stats
+
+    def insert_dicts(self, table_name, columns, records, on_duplicate_update=None):
+        """Como insert(), pero tomando cada fila de un diccionario por nombre de columna."""
+        return self.insert(table_name, columns, (tuple(r.get(c) for c in columns) for r in records),
+                           on_duplicate_update)
+
+    def _insert_executemany(self, table_name, columns, rows, on_duplicate_update):
+        query = (f"INSERT INTO {table_name} ({', '.join(columns)}) "
+                 f"VALUES ({', '.join(['%s'] * len(columns))})")
+        if on_duplicate_update:
+            updates = ', '.join(f"{c} = VALUES({c})" for c in on_duplicate_update)
+            query += f" ON DUPLICATE KEY UPDATE {updates}"
+        cursor = self.connection.cursor()
+        batches = 0
+        try:
+            # mysql.connector reescribe executemany de un INSERT como un único INSERT multi-fila
+            for offset in range(0, len(rows), self.batch_size):
+                cursor.executemany(query, rows[offset:offset + self.batch_size])
+                batches += 1
+        finally:
+            cursor.close()
+        return batches
+
+    def _insert_load_data(self, table_name, columns, rows):
+        # Requiere que la conexión se haya abierto con allow_local_infile=True
+        from db_pool import Error
+        cursor = self.connection.cursor()
+        batches = 0
+        try:
+            for offset in range(0, len(rows), self.batch_size):
+                with tempfile.NamedTemporaryFile('w', suffix='.tsv', delete=False, encoding='utf-8') as tmp:
+                    for row in rows[offset:offset + self.batch_size]:
+                        tmp.write('\t'.join(_tsv_value(v) for v in row) + '\n')
+                    path = tmp.name
+                try:
+                    cursor.execute(
+                        f"LOAD DATA LOCAL INFILE '{path}' INTO TABLE {table_name} "
+                        f"CHARACTER SET utf8mb4 FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' "
+                        f"({', '.join(columns)})"
+                    )
+                except Error as e:
+                    # Solo el primer lote puede pasar a executemany: no se ha escrito nada todavía
+                    if batches == 0 and getattr(e, 'errno', None) in LOCAL_INFILE_DISABLED_ERRORS:
+                        raise LocalInfileDisabled(str(e)) from e
+                    raise
+                finally:
+                    os.remove(path)
+                batches += 1
+        finally:
+            cursor.close()
+        return batches
+
+
+def format_stats(stats):
+    """Texto breve con las estadísticas de una escritura masiva."""
+    return f"{stats['rows']} rows in {stats['seconds']:.3f}s ({stats['rows_per_second']:.0f} rows/s)"
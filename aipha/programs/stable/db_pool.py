@@ -0,0 +1,145 @@
+"""
+db_pool.py - Pool de conexiones MySQL compartido por proceso
+
+Los guardadores (velas clave, zonas de acumulación, mini-tendencias y señales triples) piden
+sus conexiones a un único pool por configuración en lugar de abrir una conexión nueva cada vez.
+UnitOfWork agrupa todas las escrituras de una etapa en una sola transacción: commit una vez al
+salir sin errores, rollback si hay excepción.
+mysql-connector y python-dotenv se importan la primera vez que se necesitan, no al importar el módulo;
+db_pool.Error es mysql.connector.Error (se resuelve al usarlo en un except).
+Ubicación: aipha/programs/stable/db_pool.py
+"""
+
+import os
+import threading
+import logging
+
+# Tamaño del pool (configurable por variable de entorno)
+POOL_SIZE = int(os.getenv('AIPHA_DB_POOL_SIZE', '4'))
+
+# Variables de entorno de la configuración de aipha
+ENV_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../config/.env'))
+
+# Un pool por configuración de conexión
+_pools = {}
+_pools_lock = threading.Lock()
+_env_loaded = False
+
+
+def __getattr__(name):
+    # Importación diferida: db_pool.Error sin cargar mysql-connector al importar db_pool
+    if name == 'Error':
+        from mysql.connector import Error
+        return Error
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def load_env():
+    """Carga aipha/config/.env una sola vez por proceso (la primera vez que se pide la configuración)."""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv(dotenv_path=ENV_PATH, override=True)
+        _env_loaded = True
+
+
+def get_db_config(host=None, user=None, password=None, database=None):
+    """
+    Configuración de conexión a partir de los argumentos o de las variables de entorno.
+    """
+    load_env()
+    config = {
+        'host': host or os.getenv('MYSQL_HOST', 'localhost'),
+        'user': user or os.getenv('MYSQL_USER', 'root'),
+        'password': password or os.getenv('MYSQL_PASSWORD', ''),
+        'database': database or os.getenv('MYSQL_DATABASE', 'binance_lob')
+    }
+    # BulkWriter con AIPHA_BULK_METHOD=load_data usa LOAD DATA LOCAL INFILE, que el cliente
+    # solo permite si la conexión se abre con allow_local_infile
+    if os.getenv('AIPHA_BULK_METHOD') == 'load_data':
+        config['allow_local_infile'] = True
+    return config
+
+
+def _config_key(db_config):
+    return tuple(sorted((k, str(v)) for k, v in db_config.items()))
+
+
+def get_pool(db_config=None):
+    """
+    Devuelve el pool del proceso para esta configuración, creándolo la primera vez.
+    :param db_config: Diccionario de conexión (por defecto get_db_config())
+    """
+    from mysql.connector import pooling
+    db_config = db_config or get_db_config()
+    key = _config_key(db_config)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = pooling.MySQLConnectionPool(
+                pool_name=f"aipha_{len(_pools)}",
+                pool_size=POOL_SIZE,
+                pool_reset_session=True,
+                **db_config
+            )
+            _pools[key] = pool
+            logging.info(f"Created MySQL connection pool for {db_config.get('database')} (size={POOL_SIZE})")
+        return pool
+
+
+def get_connection(db_config=None):
+    """
+    Conexión del pool. close() la devuelve al pool en lugar de cerrarla.
+    Si el pool está agotado, abre una conexión directa para no bloquear al llamador.
+    """
+    import mysql.connector
+    from mysql.connector.errors import PoolError
+    db_config = db_config or get_db_config()
+    try:
+        return get_pool(db_config).get_connection()
+    except PoolError:
+        logging.warning("Connection pool exhausted, opening a direct connection")
+        return mysql.connector.connect(**db_config)
+
+
+def reset_pools():
+    """Olvida los pools creados (las conexiones prestadas siguen siendo válidas)."""
+    with _pools_lock:
+        _pools.clear()
+
+
+class UnitOfWork:
+    """
+    Transacción de una etapa del pipeline sobre una conexión del pool.
+
+        with UnitOfWork(db_config) as uow:
+            uow.cursor.execute(...)
+            BulkWriter(uow.connection).insert(...)
+
+    Hace commit una sola vez al salir sin errores y rollback si se produce una excepción.
+    Si se pasa una conexión existente, la reutiliza y no la devuelve al pool.
+    """
+    def __init__(self, db_config=None, connection=None, dictionary=False):
+        self.db_config = db_config
+        self.connection = connection
+        self.owns_connection = connection is None
+        self.dictionary = dictionary
+        self.cursor = None
+
+    def __enter__(self):
+        if self.connection is None:
+            self.connection = get_connection(self.db_config)
+        self.cursor = self.connection.cursor(dictionary=self.dictionary)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.connection.commit()
+            else:
+                self.connection.rollback()
+        finally:
+            self.cursor.close()
+            if self.owns_connection:
+                self.connection.close()
+        return False
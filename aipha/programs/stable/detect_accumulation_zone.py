@@ -8,33 +8,32 @@ Ubicación: aipha/programs/stable/detect_accumulation_zone.py
 
 import os
 import sys
-import mysql.connector
-from mysql.connector import Error
 import pandas as pd
 import numpy as np
-import json
 from datetime import datetime
 import traceback
 import argparse
 import logging
-# Reemplazamos talib por pandas_ta
-import pandas_ta as ta
-
-# Configuración de logging
-log_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../logs'))
-os.makedirs(log_dir, exist_ok=True)
-logging.basicConfig(
-    filename=os.path.join(log_dir, 'accumulation_zone.log'),
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
-
-# Cargar variables de entorno
-from dotenv import load_dotenv
-load_dotenv(dotenv_path=os.path.abspath(os.path.join(os.path.dirname(__file__), '../../config/.env')), override=True)
 
 # Ajuste de path para importar desde el módulo padre
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+from sql_indexes import scope_index_sql, ensure_scope_index, scope_from_csv, scope_file
+from bulk_writer import BulkWriter, format_stats
+import db_pool
+from db_pool import get_connection, get_db_config
+from log_config import configure_logging
+import schema_registry
+from result_reader import read_columns
+from param_sets import (get_param_set_id, ensure_param_sets_table, ensure_param_set_column, param_set_sql,
+                        drop_legacy_columns, reset_cache)
+
+def load_pandas_ta():
+    """
+    Importación diferida de pandas_ta (reemplaza a talib): registra el accesor DataFrame.ta
+    la primera vez que se crea un detector, no al importar el módulo.
+    """
+    import pandas_ta
+    return pandas_ta
 
 class AccumulationZoneDetector:
     """
@@ -45,7 +44,10 @@ class AccumulationZoneDetector:
         Inicializa el detector con datos OHLCV.
         :param csv_path: Ruta al archivo CSV en formato Binance
         """
+        load_pandas_ta()
         self.data = None
+        # Serie ATR ya calculada para self.data y params['atr_period'] (opcional, ver atr_series)
+        self.atr = None
         self.params = {
             'atr_period': 14,              # Período para ATR
             'atr_multiplier': 1.5,         # Multiplicador para rango estrecho
@@ -81,6 +83,7 @@ class AccumulationZoneDetector:
             for col in ['open', 'high', 'low', 'close', 'volume']:
                 self.data[col] = pd.to_numeric(self.data[col])
             self.data['datetime'] = pd.to_datetime(self.data['timestamp'], unit='us')
+            self.atr = None
             logging.info(f"Loaded CSV with {len(self.data)} rows from {csv_path}")
         except Exception as e:
             logging.error(f"Error loading CSV: {str(e)}")
@@ -104,6 +107,15 @@ class AccumulationZoneDetector:
         })
         logging.info(f"Parameters set: {self.params}")
 
+    def atr_series(self):
+        """
+        ATR de self.data con params['atr_period']: la serie asignada en self.atr si la hay
+        (calculada una vez por quien reutiliza los datos) o calculada ahora con pandas_ta.
+        """
+        if self.atr is not None:
+            return self.atr
+        return self.data.ta.atr(length=self.params['atr_period'])
+
     def calculate_dynamic_lookback(self, index):
         """
         Calcula un lookback dinámico basado en ATR.
@@ -111,7 +123,7 @@ class AccumulationZoneDetector:
         :return: Número de velas para el lookback
         """
         # Calculamos ATR usando pandas_ta
-        atr_series = self.data.ta.atr(length=self.params['atr_period'])
+        atr_series = self.atr_series()
         atr = atr_series.iloc[index] if index < len(atr_series) else atr_series.iloc[-1]
         lookback = max(self.params['min_zone_bars'], int(atr / self.data['close'].iloc[index] * 1000))
         return min(lookback, 50)
@@ -191,7 +203,7 @@ class AccumulationZoneDetector:
         try:
             # Calculamos ATR y SMA usando pandas_ta con manejo de errores
             try:
-                atr_series = self.data.ta.atr(length=self.params['atr_period'])
+                atr_series = self.atr_series()
                 atr = atr_series.iloc[start_idx:end_idx].mean()
                 if pd.isna(atr) or atr == 0:
                     atr = self.data['close'].iloc[end_idx] * 0.01  # 1% como valor por defecto
@@ -273,7 +285,7 @@ class AccumulationZoneDetector:
                 return None
 
             # Calcular ATR y rango de precios 
-            atr_series = self.data.ta.atr(length=self.params['atr_period'])
+            atr_series = self.atr_series()
             atr = atr_series.iloc[start_idx:candle_index].mean()
             if pd.isna(atr) or atr == 0:  # Manejo de casos con ATR nulo o cero
                 atr = self.data['close'].iloc[candle_index] * 0.01  # 1% del precio como ATR por defecto
@@ -402,12 +414,7 @@ class AccumulationZoneResultSaver:
     Maneja la conexión y métodos para almacenar datos de zonas y parámetros de detección.
     """
     def __init__(self, host=None, user=None, password=None, database=None):
-        self.db_config = {
-            'host': host or os.getenv('MYSQL_HOST', 'localhost'),
-            'user': user or os.getenv('MYSQL_USER', 'root'),
-            'password': password or os.getenv('MYSQL_PASSWORD', ''),
-            'database': database or os.getenv('MYSQL_DATABASE', 'binance_lob')
-        }
+        self.db_config = get_db_config(host, user, password, database)
         print(f"Database configuration: host={self.db_config['host']}, user={self.db_config['user']}, database={self.db_config['database']}")
         self.connection = None
         self.cursor = None
@@ -416,12 +423,13 @@ class AccumulationZoneResultSaver:
 
     def connect(self):
         try:
-            self.connection = mysql.connector.connect(**self.db_config)
+            # Conexión del pool compartido del proceso
+            self.connection = get_connection(self.db_config)
             if self.connection.is_connected():
                 self.cursor = self.connection.cursor()
                 print(f"Connected to MySQL database: {self.db_config['database']}")
                 return True
-        except Error as e:
+        except db_pool.Error as e:
             print(f"Error connecting to MySQL database: {e}")
             return False
 
@@ -442,13 +450,12 @@ class AccumulationZoneResultSaver:
             return False
         
         try:
-            # Verifica si la tabla existe
-            self.cursor.execute("SHOW TABLES LIKE 'detect_accumulation_zone_results'")
-            exists = self.cursor.fetchone() is not None
+            # Verifica si la tabla existe (estructura cacheada en schema_registry)
+            exists = schema_registry.table_exists(self.cursor, 'detect_accumulation_zone_results')
             
             if not exists:
                 # Crea la tabla con la estructura adecuada
-                create_table_query = """
+                create_table_query = f"""
                 CREATE TABLE IF NOT EXISTS detect_accumulation_zone_results (
                     id INT AUTO_INCREMENT PRIMARY KEY,
                     start_idx INT,
@@ -463,29 +470,32 @@ class AccumulationZoneResultSaver:
                     quality_score FLOAT,
                     datetime_start DATETIME,
                     datetime_end DATETIME,
-                    detection_params JSON,
                     symbol VARCHAR(20),
                     timeframe VARCHAR(10),
                     csv_file VARCHAR(255),
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    {param_set_sql('detect_accumulation_zone_results')},
+                    {scope_index_sql('detect_accumulation_zone_results')}
                 ) ENGINE=InnoDB;
                 """
+                ensure_param_sets_table(self.cursor)
                 self.cursor.execute(create_table_query)
-                self.connection.commit()
+                schema_registry.invalidate('detect_accumulation_zone_results')
+            else:
+                # Tablas creadas antes del índice compuesto y de param_set_id
+                ensure_scope_index(self.cursor, 'detect_accumulation_zone_results')
+                ensure_param_set_column(self.cursor, 'detect_accumulation_zone_results')
+                drop_legacy_columns(self.cursor, 'detect_accumulation_zone_results')
             
             # Limpia la tabla antes de insertar nuevos datos
             # self.cursor.execute("DELETE FROM detect_accumulation_zone_results")
             
-            # Prepara la consulta de inserción
-            insert_query = """
-            INSERT INTO detect_accumulation_zone_results (
-                start_idx, end_idx, high, low, volume_avg, vol_total, 
-                vwap, poc, mfi, quality_score, datetime_start, datetime_end,
-                detection_params, symbol, timeframe, csv_file
-            ) VALUES (
-                %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-            )
-            """
+            # Columnas de la inserción
+            insert_columns = [
+                'start_idx', 'end_idx', 'high', 'low', 'volume_avg', 'vol_total',
+                'vwap', 'poc', 'mfi', 'quality_score', 'datetime_start', 'datetime_end',
+                'param_set_id', 'symbol', 'timeframe', 'csv_file'
+            ]
             
             # Extrae información de símbolo y timeframe del nombre del archivo CSV
             symbol = None
@@ -496,7 +506,10 @@ class AccumulationZoneResultSaver:
                     symbol = parts[0]
                     timeframe = parts[1]
             
-            # Inserta los datos de cada zona detectada
+            # Inserta los datos de todas las zonas detectadas en lotes
+            # Parámetros normalizados en param_sets: cada zona guarda solo el id
+            param_set_id = get_param_set_id(self.cursor, detection_params, stage='zones')
+            rows = []
             for zone in zones:
                 row = (
                     zone.get('start_idx'),
@@ -511,23 +524,43 @@ class AccumulationZoneResultSaver:
                     zone.get('quality_score'),
                     zone.get('datetime_start'),
                     zone.get('datetime_end'),
-                    json.dumps(detection_params),
+                    param_set_id,
                     symbol,
                     timeframe,
                     os.path.basename(self.csv_file) if self.csv_file else None
                 )
-                self.cursor.execute(insert_query, row)
+                rows.append(row)
             
+            stats = BulkWriter(self.connection).insert('detect_accumulation_zone_results', insert_columns, rows)
             self.connection.commit()
-            print(f"Saved {len(zones)} accumulation zones to database.")
+            print(f"Saved {len(zones)} accumulation zones to database: {format_stats(stats)}")
             return True
         
         except Exception as e:
             print(f"Error saving results: {str(e)}")
             traceback.print_exc()
+            self.connection.rollback()
+            reset_cache()
             return False
 
 
+def spaced_key_candle_indices(total_rows):
+    """
+    Índices espaciados a lo largo del archivo, para cuando no hay velas clave disponibles.
+    :param total_rows: Número de filas del CSV
+    :return: Lista de índices
+    """
+    if total_rows > 100:
+        # Selecciona índices cada 50 filas, saltando las primeras 50
+        indices = list(range(50, total_rows, 50))
+        # Limita a 20 índices como máximo
+        if len(indices) > 20:
+            indices = indices[:20]
+        return indices
+    # Para archivos pequeños, usa algunos índices fijos
+    return [10, 20, 30, 40, 50]
+
+
 def load_key_candles(csv_file_path, key_candles_path=None, db_saver=None):
     """
     Carga los índices de velas clave desde la base de datos, archivo CSV o utiliza un rango si no se proporciona.
@@ -541,14 +574,20 @@ def load_key_candles(csv_file_path, key_candles_path=None, db_saver=None):
     if db_saver and hasattr(db_saver, 'connection') and hasattr(db_saver, 'cursor'):
         try:
             # Extraer symbol y timeframe del csv_file_path
-            parts = os.path.basename(csv_file_path).split('-')
-            symbol = parts[0] if len(parts) > 0 else None
-            timeframe = parts[1] if len(parts) > 1 else None
+            symbol, timeframe = scope_from_csv(csv_file_path)
             
             if symbol and timeframe:
-                query = "SELECT candle_index FROM key_candles WHERE symbol = %s AND timeframe = %s"
-                db_saver.cursor.execute(query, (symbol, timeframe))
-                indices = [row[0] for row in db_saver.cursor.fetchall()]
+                # Solo la columna candle_index del mismo archivo (día), leída en bloque; las filas
+                # guardadas antes de la columna csv_file (NULL) sirven si el día no está
+                indices = []
+                for csv_file in (scope_file(csv_file_path), None):
+                    indices = read_columns(
+                        db_saver.connection, 'key_candles', ['candle_index'],
+                        symbol=symbol, timeframe=timeframe, filters={'csv_file': csv_file},
+                        order_by='candle_index'
+                    )['candle_index'].tolist()
+                    if indices:
+                        break
                 if indices:
                     logging.info(f"Loaded {len(indices)} key candles from database for {symbol}-{timeframe}")
                     return indices
@@ -575,19 +614,7 @@ def load_key_candles(csv_file_path, key_candles_path=None, db_saver=None):
             'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'
         ]
         data = pd.read_csv(csv_file_path, names=binance_columns, header=None)
-        
-        # Genera un conjunto de índices espaciados a lo largo del archivo
-        total_rows = len(data)
-        if total_rows > 100:
-            # Selecciona índices cada 50 filas, saltando las primeras 50
-            indices = list(range(50, total_rows, 50))
-            # Limita a 20 índices como máximo
-            if len(indices) > 20:
-                indices = indices[:20]
-            return indices
-        else:
-            # Para archivos pequeños, usa algunos índices fijos
-            return [10, 20, 30, 40, 50]
+        return spaced_key_candle_indices(len(data))
     except Exception as e:
         logging.error(f"Error generating key candle indices: {str(e)}")
         # Retorna algunos índices por defecto
@@ -605,6 +632,7 @@ def main():
     parser.add_argument('--quality-threshold', type=float, default=0.7, help='Quality threshold for zone validation')
     
     args = parser.parse_args()
+    configure_logging('accumulation_zone.log')
     
     # Inicializa el detector y carga los datos
     try:
@@ -624,6 +652,8 @@ def main():
         
         # Carga o genera índices de velas clave
         key_candle_indices = load_key_candles(args.csv, args.key_candles, db_saver=db_saver)
+        # Devuelve la conexión al pool antes de guardar
+        db_saver.close()
         logging.info(f"Processing {len(key_candle_indices)} key candles")
         
         # Detecta zonas de acumulación
@@ -0,0 +1,142 @@
+"""
+detection_client.py - Cliente ligero del servicio de detección (detection_service.py)
+
+Solo biblioteca estándar: quien envía trabajos no importa pandas ni los detectores, que ya están
+cargados en el servicio. Habla el protocolo de una petición JSON por línea, por socket Unix o por
+stdin/stdout con un servicio hijo.
+
+    with connect_or_start() as client:
+        response = client.run('data/BTCUSDT-5m-2025-04-16.csv', stages=['candles'])
+
+Ubicación: aipha/programs/stable/detection_client.py
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import tempfile
+import threading
+import subprocess
+
+# Socket por defecto (uno por usuario)
+DEFAULT_SOCKET = os.getenv('AIPHA_SERVICE_SOCKET') or os.path.join(
+    tempfile.gettempdir(), f"aipha_detection_{os.getuid() if hasattr(os, 'getuid') else 0}.sock")
+
+SERVICE_SCRIPT = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'detection_service.py')
+
+
+class ServiceError(Exception):
+    """Respuesta con ok=False del servicio."""
+
+
+class DetectionClient:
+    """
+    Cliente del servicio: por socket Unix (DetectionClient(socket_path)) o lanzando un servicio
+    propio que habla por stdin/stdout (DetectionClient.spawn()).
+    """
+    def __init__(self, socket_path=DEFAULT_SOCKET, timeout=None):
+        self.process = None
+        self.sock = None
+        self._lock = threading.Lock()
+        self._next_id = 0
+        if socket_path is not None:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            try:
+                self.sock.connect(socket_path)
+            except OSError:
+                self.sock.close()
+                raise
+            self._reader = self.sock.makefile('r', encoding='utf-8')
+            self._writer = self.sock.makefile('w', encoding='utf-8')
+
+    @classmethod
+    def spawn(cls, *args):
+        """Lanza un servicio hijo por stdin/stdout (args: opciones adicionales de la línea de comandos)."""
+        client = cls(socket_path=None)
+        client.process = subprocess.Popen(
+            [sys.executable, SERVICE_SCRIPT, '--stdio', *args],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1
+        )
+        client._reader = client.process.stdout
+        client._writer = client.process.stdin
+        return client
+
+    def request(self, payload, check=True):
+        """Envía una petición y espera su respuesta."""
+        with self._lock:
+            self._next_id += 1
+            payload = dict(payload, id=self._next_id)
+            self._writer.write(json.dumps(payload) + '\n')
+            self._writer.flush()
+            line = self._reader.readline()
+        if not line:
+            raise ServiceError("El servicio cerró la conexión")
+        response = json.loads(line)
+        if check and not response.get('ok'):
+            raise ServiceError(response.get('error'))
+        return response
+
+    def ping(self):
+        return self.request({'op': 'ping'})
+
+    def stats(self):
+        return self.request({'op': 'stats'})
+
+    def run(self, csv_file, stages=('candles',), params=None, sink='none', **options):
+        """
+        Ejecuta un trabajo de detección.
+        :param options: output_dir, reuse, workers, executor, max_pending_writes, run_id (run_id de las
+                        filas con sink='db'), storage y storage_path (backend de storage.open_store
+                        con sink='db'; por defecto MySQL), return_outputs
+        """
+        return self.request({'op': 'run', 'csv': os.path.abspath(csv_file), 'stages': list(stages),
+                             'params': params or {}, 'sink': sink, **options})
+
+    def shutdown(self):
+        try:
+            return self.request({'op': 'shutdown'})
+        finally:
+            self.close()
+
+    def close(self):
+        for stream in (self._writer, self._reader):
+            try:
+                stream.close()
+            except Exception:
+                pass
+        if self.process is not None:
+            self.process.wait(timeout=10)
+        elif self.sock is not None:
+            self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def connect_or_start(socket_path=DEFAULT_SOCKET, timeout=30.0):
+    """
+    Cliente del servicio en socket_path; si no hay ninguno escuchando, lo arranca en segundo plano
+    y espera a que responda.
+    """
+    try:
+        return DetectionClient(socket_path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        pass
+    subprocess.Popen([sys.executable, SERVICE_SCRIPT, '--socket', socket_path],
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, start_new_session=True)
+    deadline = time.time() + timeout
+    while True:
+        try:
+            client = DetectionClient(socket_path)
+            client.ping()
+            return client
+        except (FileNotFoundError, ConnectionRefusedError):
+            if time.time() > deadline:
+                raise
+            time.sleep(0.1)
@@ -0,0 +1,316 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+detection_service.py - Servicio de detección persistente con dependencias y cachés en caliente
+
+Un proceso de larga duración importa una sola vez pandas, los detectores y pandas_ta, y atiende
+trabajos de detección sin pagar el arranque del intérprete en cada llamada:
+- Caché LRU de archivos cargados (raw, vista bars y huella del CSV), por ruta, tamaño y mtime.
+- Caché de salidas de etapas (stage_dag.StageCache) compartida entre trabajos: repetir un trabajo
+  con los mismos datos y parámetros no vuelve a calcular nada.
+
+Protocolo: una petición JSON por línea y una respuesta JSON por línea, por socket Unix o por
+stdin/stdout (--stdio). Operaciones:
+    {"op": "ping"}
+    {"op": "run", "csv": "...", "stages": ["candles"], "params": {...}, "sink": "none|csv|db",
+     "output_dir": "...", "reuse": ["candles"], "workers": 2, "run_id": "...",
+     "storage": "mysql|sqlite|duckdb", "storage_path": "...", "return_outputs": true}
+    {"op": "stats"}
+    {"op": "shutdown"}
+Con sink 'db' y storage sqlite o duckdb los resultados van a ese archivo (pipeline.StoreSink) en
+lugar de MySQL. El cliente (detection_client.py) solo usa la biblioteca estándar.
+
+    python detection_service.py --socket /tmp/aipha_detection.sock
+    python run_combined_detection.py --csv data/BTCUSDT-5m-2025-04-16.csv --service
+
+Ubicación: aipha/programs/stable/detection_service.py
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import logging
+import argparse
+import threading
+import traceback
+import socketserver
+from collections import OrderedDict
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+from pipeline import (STAGES, PipelineData, CsvSink, DatabaseSink, StoreSink, required_stages, run_pipeline,
+                      stage_params)
+from storage import open_store
+from stage_dag import StageCache
+from log_config import configure_logging
+from detection_client import DEFAULT_SOCKET
+
+def to_jsonable(value):
+    """Convierte las salidas de las etapas (DataFrames, tipos numpy, fechas) a tipos JSON."""
+    if isinstance(value, pd.DataFrame):
+        return [to_jsonable(record) for record in value.to_dict('records')]
+    if isinstance(value, dict):
+        return {str(k): to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return [to_jsonable(v) for v in value.tolist()]
+    if isinstance(value, (pd.Timestamp, datetime, date)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+class DetectionService:
+    """Estado en caliente del servicio: archivos cargados, caché de etapas y contadores."""
+    def __init__(self, max_files=8, cache_entries=256, max_jobs=2):
+        """
+        :param max_files: Archivos cargados que se conservan en memoria
+        :param cache_entries: Salidas de etapas que se conservan en memoria
+        :param max_jobs: Trabajos que se ejecutan a la vez
+        """
+        self.max_files = max_files
+        self.files = OrderedDict()
+        self.files_lock = threading.Lock()
+        self.stage_cache = StageCache(max_entries=cache_entries)
+        self.jobs = threading.Semaphore(max_jobs)
+        self.started = time.time()
+        self.counters = {'jobs': 0, 'errors': 0, 'file_hits': 0, 'file_misses': 0}
+        self.warm_seconds = None
+        self.warm_errors = {}
+        self.shutdown_requested = threading.Event()
+
+    def warm(self):
+        """Importa por adelantado lo que usan los trabajos (pandas_ta y los guardadores, si están)."""
+        started = time.perf_counter()
+        for module in ('detect_accumulation_zone', 'save_detect_candles', 'save_detect_accumulation_zone',
+                       'save_mini_trend', 'save_triple_signals'):
+            try:
+                __import__(module)
+            except Exception as e:
+                self.warm_errors[module] = str(e)
+        try:
+            from detect_accumulation_zone import load_pandas_ta
+            load_pandas_ta()
+        except Exception as e:
+            self.warm_errors['pandas_ta'] = str(e)
+        self.warm_seconds = time.perf_counter() - started
+        for module, error in self.warm_errors.items():
+            logging.warning(f"Servicio: {module} no disponible ({error})")
+        return self
+
+    def load(self, csv_file):
+        """
+        Datos del CSV desde la caché (si el archivo no ha cambiado) o leídos ahora.
+        :return: (PipelineData propio del trabajo, True si venía de la caché)
+        """
+        path = os.path.abspath(csv_file)
+        stat = os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        with self.files_lock:
+            data = self.files.get(key)
+            if data is not None:
+                self.files.move_to_end(key)
+                self.counters['file_hits'] += 1
+                return data.fork(), True
+            self.counters['file_misses'] += 1
+            data = PipelineData(csv_file)
+            # La vista bars y la huella se calculan una vez y las comparten los trabajos
+            data.bars
+            data.fingerprint
+            self.files[key] = data
+            while len(self.files) > self.max_files:
+                self.files.popitem(last=False)
+            return data.fork(), False
+
+    def run(self, request):
+        """Operación 'run': ejecuta el pipeline sobre un CSV con los sinks pedidos."""
+        requested = request.get('stages') or ['candles']
+        requested = list(STAGES) if requested == 'all' else requested
+        stages = required_stages(requested)
+        params = stage_params(request.get('params'))
+        with self.jobs:
+            started = time.perf_counter()
+            data, file_cached = self.load(request['csv'])
+            load_seconds = time.perf_counter() - started
+
+            sink_kind = request.get('sink', 'none')
+            sinks = []
+            reuse = {}
+            run_id = None
+            if sink_kind == 'csv':
+                sinks.append(CsvSink(request.get('output_dir') or os.path.dirname(os.path.abspath(request['csv']))))
+            elif sink_kind == 'db':
+                # run_id del trabajo (el que registra el cliente); sin él, uno nuevo: el del proceso
+                # del servicio sería el mismo para todos los trabajos
+                run_id = request.get('run_id') or uuid.uuid4().hex
+                storage = request.get('storage') or 'mysql'
+                if storage == 'mysql':
+                    sink = DatabaseSink(max_pending=request.get('max_pending_writes', 2), run_id=run_id)
+                else:
+                    sink = StoreSink(open_store(storage, request.get('storage_path')),
+                                     max_pending=request.get('max_pending_writes', 2), run_id=run_id)
+                loaders = {'candles': sink.load_candles, 'zones': sink.load_zones,
+                           'mini_trends': sink.load_mini_trends, 'triples': lambda data: []}
+                reuse = {stage: loaders[stage] for stage in request.get('reuse', []) if stage in loaders}
+                sinks.append(sink)
+
+            try:
+                run_pipeline(request['csv'], params=params, stages=stages, sinks=sinks, reuse=reuse, data=data,
+                             max_workers=request.get('workers', 1), cache=self.stage_cache,
+                             executor=request.get('executor', 'thread'))
+            finally:
+                # Las escrituras terminan antes de responder
+                for sink in sinks:
+                    sink.close()
+
+        response = {
+            'ok': True,
+            'stages': stages,
+            'counts': {stage: len(output) for stage, output in data.outputs.items()},
+            'timings': data.timings,
+            'cached': [stage for stage, timing in data.dag_result.timings.items() if timing.cached],
+            'file_cached': file_cached,
+            'run_id': run_id,
+            'load_seconds': load_seconds,
+            'seconds': time.perf_counter() - started,
+        }
+        if request.get('return_outputs', True):
+            response['outputs'] = {stage: to_jsonable(data.outputs[stage]) for stage in requested}
+        return response
+
+    def stats(self):
+        return {
+            'ok': True,
+            'pid': os.getpid(),
+            'uptime': time.time() - self.started,
+            'warm_seconds': self.warm_seconds,
+            'warm_errors': self.warm_errors,
+            'files': len(self.files),
+            'stage_cache': {'entries': len(self.stage_cache), 'hits': self.stage_cache.hits,
+                            'misses': self.stage_cache.misses},
+            **self.counters,
+        }
+
+    def handle(self, request):
+        """Atiende una petición y devuelve la respuesta (los errores se devuelven, no se lanzan)."""
+        op = request.get('op')
+        try:
+            if op == 'ping':
+                return {'ok': True, 'pid': os.getpid()}
+            if op == 'stats':
+                return self.stats()
+            if op == 'shutdown':
+                self.shutdown_requested.set()
+                return {'ok': True}
+            if op == 'run':
+                self.counters['jobs'] += 1
+                return self.run(request)
+            return {'ok': False, 'error': f"Operación desconocida: {op}"}
+        except Exception as e:
+            self.counters['errors'] += 1
+            logging.error(f"Servicio: error en {op}: {e}")
+            return {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+
+    def handle_line(self, line):
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            return {'ok': False, 'error': f"JSON inválido: {e}"}
+        response = self.handle(request)
+        if 'id' in request:
+            response['id'] = request['id']
+        return response
+
+
+def serve_stdio(service, stdin=None, stdout=None):
+    """Atiende peticiones línea a línea por stdin/stdout hasta EOF o 'shutdown'."""
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    # Los detectores escriben con print: mientras se atiende, su salida va a stderr y no al canal
+    real_stdout, sys.stdout = sys.stdout, sys.stderr
+    try:
+        for line in stdin:
+            if not line.strip():
+                continue
+            stdout.write(json.dumps(service.handle_line(line)) + '\n')
+            stdout.flush()
+            if service.shutdown_requested.is_set():
+                break
+    finally:
+        sys.stdout = real_stdout
+
+
+class _ServiceHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            response = self.server.service.handle_line(line.decode('utf-8'))
+            self.wfile.write((json.dumps(response) + '\n').encode('utf-8'))
+            self.wfile.flush()
+            if self.server.service.shutdown_requested.is_set():
+                # shutdown() espera al bucle de serve_forever: se llama desde otro hilo
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                break
+
+
+class ServiceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Servidor por socket Unix: un hilo por conexión y varias peticiones por conexión."""
+    daemon_threads = True
+
+    def __init__(self, socket_path, service):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        self.service = service
+        super().__init__(socket_path, _ServiceHandler)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicio de detección persistente")
+    parser.add_argument('--socket', type=str, default=DEFAULT_SOCKET, help='Ruta del socket Unix')
+    parser.add_argument('--stdio', action='store_true', help='Atender por stdin/stdout en lugar de un socket')
+    parser.add_argument('--max-files', type=int, default=8, help='Archivos cargados que se conservan en memoria')
+    parser.add_argument('--cache-entries', type=int, default=256, help='Salidas de etapas en la caché')
+    parser.add_argument('--max-jobs', type=int, default=2, help='Trabajos simultáneos')
+    args = parser.parse_args()
+
+    # stdout es el canal de respuestas en --stdio: el log va a stderr
+    configure_logging(level=logging.WARNING, fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    service = DetectionService(args.max_files, args.cache_entries, args.max_jobs).warm()
+    if args.stdio:
+        serve_stdio(service)
+        return True
+    server = ServiceServer(args.socket, service)
+    logging.warning(f"Servicio de detección escuchando en {args.socket} (pid {os.getpid()})")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+    return True
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(0 if main() else 1)
+    except KeyboardInterrupt:
+        sys.exit(0)
+    except Exception as e:
+        logging.error(f"Error inesperado: {str(e)}")
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,394 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+equivalence_harness.py - Equivalencia de los caminos rápidos con las implementaciones de referencia
+
+Ejecuta a la vez las referencias congeladas (reference_detectors.py) y las implementaciones actuales
+y rápidas sobre los CSV de data/ y sobre series sintéticas aleatorias (con velas de rango 0, tramos
+planos y volúmenes repetidos), e informa de cualquier divergencia:
+- key_candles: índices exactos; percentil de volumen y % de cuerpo con tolerancia
+  (Detector.process_csv y tuning_server.fast_key_candles)
+- pivots: pivotes ZigZag exactos (MiniTrendDetector.detect_zigzag_pivots)
+- trend_poc: segmentos exactos; POC y volumen con tolerancia (MiniTrendDetector)
+- zone_poc / zones: POC y límites de zona (AccumulationZoneDetector; se omiten sin pandas_ta)
+- scores: signal_strength y combined_score (batch_scoring) con tolerancia de redondeo
+- triples: tripletas exactas (interval_join.find_triple_coincidences)
+Un modo rápido no debe usarse en producción si este arnés informa divergencias. Una comprobación
+omitida también hace que termine con error, salvo con --allow-skipped.
+
+    python equivalence_harness.py
+    python equivalence_harness.py --synthetic 10 --rows 5000 --checks key_candles pivots --json equivalencia.json
+
+Ubicación: aipha/programs/stable/equivalence_harness.py
+"""
+
+import io
+import os
+import sys
+import json
+import argparse
+import contextlib
+
+import numpy as np
+import pandas as pd
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+from pipeline import BINANCE_COLUMNS, PipelineData, stage_params
+from reference_detectors import (reference_key_candles, reference_zigzag_pivots, reference_trend_volume_profile,
+                                 reference_zone_volume_profile, reference_accumulation_zone,
+                                 reference_signal_scores, reference_triples)
+from stage_benchmark import synthetic_bars
+
+DEFAULT_DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'data'))
+
+# Tolerancias por defecto: los cálculos numéricos pueden cambiar el orden de las operaciones,
+# y las puntuaciones se redondean a 4 decimales (un empate puede redondear distinto)
+DEFAULT_OPTIONS = {
+    'rtol': 1e-9,
+    'atol': 1e-9,
+    'score_atol': 1e-4 + 1e-9,
+    'max_zone_candles': 20,
+    'max_examples': 10,
+}
+
+# Ventana de zona (velas antes de la vela clave) para zone_poc y las zonas sintéticas de triples
+ZONE_WINDOW = 15
+
+
+class Comparison:
+    """Resultado de una comprobación sobre un conjunto de datos."""
+    def __init__(self, check, dataset, max_examples=10):
+        self.check = check
+        self.dataset = dataset
+        self.max_examples = max_examples
+        self.compared = 0
+        self.count = 0
+        self.max_abs_diff = 0.0
+        self.divergences = []
+        self.skipped = None
+
+    def _diverge(self, what, reference, fast):
+        self.count += 1
+        if len(self.divergences) < self.max_examples:
+            self.divergences.append({'what': what, 'reference': reference, 'fast': fast})
+
+    def exact(self, what, reference, fast):
+        """Comparación exacta (índices, límites, pivotes)."""
+        self.compared += 1
+        if reference != fast:
+            self._diverge(what, reference, fast)
+
+    def close(self, what, reference, fast, rtol, atol):
+        """Comparación numérica con tolerancia (None solo coincide con None)."""
+        self.compared += 1
+        if reference is None or fast is None:
+            if reference is not fast:
+                self._diverge(what, reference, fast)
+            return
+        diff = abs(float(reference) - float(fast))
+        self.max_abs_diff = max(self.max_abs_diff, diff)
+        if not np.isclose(float(fast), float(reference), rtol=rtol, atol=atol):
+            self._diverge(what, float(reference), float(fast))
+
+    def as_dict(self):
+        return {'check': self.check, 'dataset': self.dataset, 'compared': self.compared,
+                'divergences': self.count, 'max_abs_diff': self.max_abs_diff,
+                'examples': self.divergences, 'skipped': self.skipped}
+
+
+def _reference_segments(data, params):
+    """Segmentos (inicio, fin) de la referencia con al menos min_trend_bars velas."""
+    pivots = reference_zigzag_pivots(data.bars, params['zigzag_threshold'])
+    return [(start, end) for start, end in zip(pivots[:-1], pivots[1:])
+            if end - start + 1 >= params['min_trend_bars']]
+
+
+def _zone_detector(data, params):
+    """AccumulationZoneDetector sobre la vista bars, o None si falta pandas_ta."""
+    try:
+        from detect_accumulation_zone import AccumulationZoneDetector
+        detector = AccumulationZoneDetector()
+    except ImportError:
+        return None
+    detector.data = data.bars
+    detector.set_params(atr_period=params['atr_period'], atr_multiplier=params['atr_multiplier'],
+                        volume_threshold=params['volume_threshold'], quality_threshold=params['quality_threshold'])
+    return detector
+
+
+def check_key_candles(data, params, options, result):
+    from detect_candles import Detector
+    from tuning_server import fast_key_candles
+    candle_params = params['candles']
+    reference = reference_key_candles(data.candle_frame, candle_params['volume_percentile'],
+                                      candle_params['body_threshold'], candle_params['lookback'])
+    detector = Detector()
+    detector.data = data.candle_frame
+    detector.set_detection_params(candle_params['volume_percentile'], candle_params['body_threshold'],
+                                  candle_params['lookback'])
+    for name, candles in (('detector', detector.process_csv()),
+                          ('vectorized', fast_key_candles(data.candle_frame, candle_params))):
+        result.exact(f"{name}: índices", [c['index'] for c in reference], [c['index'] for c in candles])
+        by_index = {c['index']: c for c in candles}
+        for ref in reference:
+            fast = by_index.get(ref['index'])
+            if fast is None:
+                continue
+            for key in ('volume_percentile', 'body_percentage', 'volume'):
+                result.close(f"{name}: {key} vela {ref['index']}", ref[key], fast[key], options['rtol'], options['atol'])
+
+
+def check_pivots(data, params, options, result):
+    from mini_trend import MiniTrendDetector
+    detector = MiniTrendDetector()
+    detector.data = data.bars
+    detector.set_params(zigzag_threshold=params['segments']['zigzag_threshold'])
+    result.exact('pivotes', reference_zigzag_pivots(data.bars, params['segments']['zigzag_threshold']),
+                 detector.detect_zigzag_pivots())
+
+
+def check_trend_poc(data, params, options, result):
+    from mini_trend import MiniTrendDetector
+    detector = MiniTrendDetector()
+    detector.data = data.bars
+    detector.set_params(zigzag_threshold=params['segments']['zigzag_threshold'],
+                        min_trend_bars=params['segments']['min_trend_bars'])
+    reference = _reference_segments(data, params['segments'])
+    segments = detector.process_csv()
+    current = list(zip(segments['start_idx'], segments['end_idx'])) if not segments.empty else []
+    result.exact('segmentos', reference, [(int(s), int(e)) for s, e in current])
+    for position, (start, end) in enumerate(reference):
+        segment = data.bars.iloc[start:end + 1]
+        ref_poc, ref_volume = reference_trend_volume_profile(segment, detector.params['volume_profile_bins'])
+        poc, volume = detector.calculate_volume_profile(segment)
+        result.close(f"POC segmento {start}-{end}", ref_poc, poc, options['rtol'], options['atol'])
+        result.close(f"volumen segmento {start}-{end}", ref_volume, volume, options['rtol'], options['atol'])
+        if position < len(segments):
+            result.close(f"POC de la etapa segmento {start}-{end}", ref_poc, segments['poc'].iloc[position],
+                         options['rtol'], options['atol'])
+
+
+def check_zone_poc(data, params, options, result):
+    detector = _zone_detector(data, params['zones'])
+    if detector is None:
+        result.skipped = 'pandas_ta no disponible'
+        return
+    candles = params['candles']
+    for candle in reference_key_candles(data.candle_frame, candles['volume_percentile'], candles['body_threshold'],
+                                        candles['lookback']):
+        end = candle['index']
+        start = max(0, end - ZONE_WINDOW)
+        ref_poc, ref_volume = reference_zone_volume_profile(data.bars, start, end, detector.params['volume_profile_bins'])
+        poc, volume = detector.calculate_volume_profile(start, end)
+        result.close(f"POC zona {start}-{end}", ref_poc, poc, options['rtol'], options['atol'])
+        result.close(f"volumen zona {start}-{end}", ref_volume, volume, options['rtol'], options['atol'])
+
+
+def check_zones(data, params, options, result):
+    detector = _zone_detector(data, params['zones'])
+    if detector is None:
+        result.skipped = 'pandas_ta no disponible'
+        return
+    candles = params['candles']
+    reference_candles = reference_key_candles(data.candle_frame, candles['volume_percentile'],
+                                              candles['body_threshold'], candles['lookback'])
+    for candle in reference_candles[:options['max_zone_candles']]:
+        # Los detectores imprimen trazas de depuración por ventana
+        with contextlib.redirect_stdout(io.StringIO()):
+            reference = reference_accumulation_zone(data.bars, candle['index'], detector.params)
+            zone = detector.detect_accumulation_zone(candle['index'])
+        what = f"zona de la vela {candle['index']}"
+        if reference is None or zone is None:
+            result.exact(what, reference is None, zone is None)
+            continue
+        result.exact(what, (reference['start_idx'], reference['end_idx']), (zone['start_idx'], zone['end_idx']))
+        for key in ('high', 'low', 'poc', 'vwap', 'quality_score'):
+            result.close(f"{what}: {key}", reference[key], zone[key], options['rtol'], options['atol'])
+
+
+def _synthetic_signals(data, params, seed=0):
+    """Señales con las velas y segmentos de referencia y calidades de zona aleatorias."""
+    candles = params['candles']
+    key_candles = reference_key_candles(data.candle_frame, candles['volume_percentile'], candles['body_threshold'],
+                                        candles['lookback'])
+    segments = _reference_segments(data, params['segments'])
+    if not segments:
+        return []
+    rng = np.random.default_rng(seed)
+    close = data.bars['close'].to_numpy(dtype=float)
+    signals = []
+    for position, candle in enumerate(key_candles):
+        start, end = segments[position % len(segments)]
+        signals.append({
+            'zone_quality_score': float(rng.uniform(0.3, 1.3)),
+            'trend_r_squared': float(rng.uniform(0.2, 1.0)),
+            'trend_direction': 'alcista' if close[end] > close[start] else 'bajista',
+            'trend_slope': float((close[end] - close[start]) / (end - start + 1) * rng.uniform(0, 400)),
+            'volume': candle['volume'],
+            'body_percentage': candle['body_percentage'],
+        })
+    return signals
+
+
+def check_scores(data, params, options, result):
+    from batch_scoring import signals_to_columns, score_signals_batch
+    signals = _synthetic_signals(data, params)
+    if not signals:
+        result.skipped = 'sin señales'
+        return
+    scores = score_signals_batch(signals_to_columns(signals))
+    for position, signal in enumerate(signals):
+        strength, combined = reference_signal_scores(signal)
+        result.close(f"signal_strength señal {position}", strength, scores['signal_strength'][position],
+                     0, options['score_atol'])
+        result.close(f"combined_score señal {position}", combined, scores['combined_score'][position],
+                     0, options['score_atol'])
+
+
+def check_triples(data, params, options, result):
+    from interval_join import find_triple_coincidences
+    candles = params['candles']
+    triples = params['triples']
+    key_candles = reference_key_candles(data.candle_frame, candles['volume_percentile'], candles['body_threshold'],
+                                        candles['lookback'])
+    rng = np.random.default_rng(1)
+    candle_indices = [c['index'] for c in key_candles]
+    zones = [(max(0, idx - ZONE_WINDOW), max(0, idx - 2), float(rng.uniform(0.3, 1.0))) for idx in candle_indices]
+    trends = [(start, end, float(rng.uniform(0.2, 1.0))) for start, end in _reference_segments(data, params['segments'])]
+    reference = reference_triples(candle_indices, zones, trends, triples['tolerance'], triples['min_zone_quality'],
+                                  triples['min_trend_r_squared'])
+    matches = find_triple_coincidences(
+        candle_indices, [z[0] for z in zones], [z[1] for z in zones], [t[0] for t in trends], [t[1] for t in trends],
+        zone_tolerance=triples['tolerance'], trend_tolerance=triples['tolerance'],
+        zone_quality=[z[2] for z in zones], min_zone_quality=triples['min_zone_quality'],
+        trend_r_squared=[t[2] for t in trends], min_trend_r_squared=triples['min_trend_r_squared'])
+    found = list(zip(matches['candle'].tolist(), matches['zone'].tolist(), matches['trend'].tolist()))
+    result.exact('tripletas', sorted(reference), sorted(found))
+    result.exact('tripletas duplicadas', len(found), len(set(found)))
+
+
+# Comprobación -> función(data, params, options, result)
+CHECKS = {
+    'key_candles': check_key_candles,
+    'pivots': check_pivots,
+    'trend_poc': check_trend_poc,
+    'zone_poc': check_zone_poc,
+    'zones': check_zones,
+    'scores': check_scores,
+    'triples': check_triples,
+}
+
+
+def synthetic_dataset(rows=2000, seed=0):
+    """
+    Serie sintética en formato Binance con casos límite: velas de rango 0, un tramo plano
+    y volúmenes repetidos (empates en el percentil).
+    """
+    bars = synthetic_bars(rows, seed)
+    rng = np.random.default_rng(seed + 1000)
+    flat = rng.integers(0, max(rows - 40, 1))
+    bars.loc[flat:flat + 30, ['open', 'high', 'low', 'close']] = bars.loc[flat, 'close']
+    zero_range = rng.choice(rows, size=max(rows // 100, 1), replace=False)
+    for column in ('open', 'high', 'low'):
+        bars.loc[zero_range, column] = bars.loc[zero_range, 'close']
+    repeated = rng.choice(rows, size=max(rows // 20, 1), replace=False)
+    bars.loc[repeated, 'volume'] = np.round(bars.loc[repeated, 'volume'], 0)
+
+    raw = pd.DataFrame({column: 0 for column in BINANCE_COLUMNS}, index=range(rows))
+    for column in ('timestamp', 'open', 'high', 'low', 'close', 'volume'):
+        raw[column] = bars[column].to_numpy()
+    raw['close_time'] = raw['timestamp'] + 299999999
+    return PipelineData(f"SYNTH-5m-seed{seed}.csv", raw=raw)
+
+
+def find_csv_files(data_dir):
+    """CSV de velas bajo data_dir (recursivo)."""
+    files = []
+    for root, _, names in os.walk(data_dir):
+        files.extend(os.path.join(root, name) for name in names if name.endswith('.csv'))
+    return sorted(files)
+
+
+def run_harness(datasets, checks=None, params=None, options=None):
+    """
+    Ejecuta las comprobaciones sobre cada conjunto de datos.
+    :param datasets: Lista de (nombre, PipelineData)
+    :param params: Parámetros por etapa (se completan con DEFAULT_PARAMS)
+    :return: Lista de resultados (Comparison.as_dict)
+    """
+    params = stage_params(params)
+    options = dict(DEFAULT_OPTIONS, **(options or {}))
+    results = []
+    for name, data in datasets:
+        for check in checks or CHECKS:
+            result = Comparison(check, name, options['max_examples'])
+            try:
+                CHECKS[check](data, params, options, result)
+            except Exception as e:
+                # Un camino que falla donde la referencia no falla también es una divergencia
+                result._diverge('excepción', None, f"{type(e).__name__}: {e}")
+            results.append(result.as_dict())
+    return results
+
+
+def format_report(results):
+    lines = [f"{'comprobación':<13} {'datos':<34} {'comparado':>9} {'divergencias':>12} {'máx. dif.':>10}"]
+    for r in results:
+        if r['skipped']:
+            lines.append(f"{r['check']:<13} {r['dataset']:<34}  omitido: {r['skipped']}")
+            continue
+        lines.append(f"{r['check']:<13} {r['dataset']:<34} {r['compared']:>9} {r['divergences']:>12} "
+                     f"{r['max_abs_diff']:>10.2e}")
+        for example in r['examples']:
+            lines.append(f"    {example['what']}: referencia={example['reference']} rápido={example['fast']}")
+    diverged = sum(1 for r in results if r['divergences'])
+    skipped = sum(1 for r in results if r['skipped'])
+    summary = 'Sin divergencias' if not diverged else f'{diverged} comprobaciones con divergencias'
+    if skipped:
+        summary += f', {skipped} comprobaciones omitidas'
+    lines.append(summary)
+    return '\n'.join(lines)
+
+
+def harness_passed(results, allow_skipped=False):
+    """
+    True si ninguna comprobación diverge y, salvo allow_skipped, ninguna se ha omitido
+    (una comprobación omitida no ha verificado su camino rápido).
+    """
+    if any(r['divergences'] for r in results):
+        return False
+    return allow_skipped or not any(r['skipped'] for r in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Equivalencia de los caminos rápidos con las referencias congeladas")
+    parser.add_argument('--data-dir', type=str, default=DEFAULT_DATA_DIR, help='Directorio con los CSV de muestra')
+    parser.add_argument('--csv', type=str, nargs='*', default=[], help='CSV adicionales')
+    parser.add_argument('--synthetic', type=int, default=3, help='Series sintéticas aleatorias')
+    parser.add_argument('--rows', type=int, default=2000, help='Velas por serie sintética')
+    parser.add_argument('--seed', type=int, default=0, help='Semilla de la primera serie sintética')
+    parser.add_argument('--checks', type=str, nargs='*', help=f"Comprobaciones (por defecto: {', '.join(CHECKS)})")
+    parser.add_argument('--max-zone-candles', type=int, default=DEFAULT_OPTIONS['max_zone_candles'],
+                        help='Velas clave por conjunto en la comprobación de zonas (la referencia es lenta)')
+    parser.add_argument('--json', type=str, help='Guardar los resultados en este archivo JSON')
+    parser.add_argument('--allow-skipped', action='store_true',
+                        help='Terminar con 0 aunque se omitan comprobaciones (p. ej. zonas sin pandas_ta)')
+    args = parser.parse_args()
+
+    csv_files = (find_csv_files(args.data_dir) if os.path.isdir(args.data_dir) else []) + args.csv
+    datasets = [(os.path.basename(path), PipelineData(path)) for path in csv_files]
+    datasets += [(f"sintético seed={seed}", synthetic_dataset(args.rows, seed))
+                 for seed in range(args.seed, args.seed + args.synthetic)]
+    results = run_harness(datasets, args.checks, options={'max_zone_candles': args.max_zone_candles})
+    print(format_report(results))
+    if args.json:
+        from detection_service import to_jsonable
+        with open(args.json, 'w') as f:
+            json.dump(to_jsonable(results), f, indent=2)
+    return harness_passed(results, args.allow_skipped)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
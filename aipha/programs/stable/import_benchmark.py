@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+import_benchmark.py - Tiempo de importación y efectos secundarios de los módulos de stable
+
+Importa cada módulo en un intérprete nuevo (como un CLI corto o un worker recién lanzado) y mide:
+- Tiempo de importación en frío (mejor de varias repeticiones) y tiempo propio del módulo
+  sin numpy/pandas (que comparten todos los programas).
+- Dependencias pesadas cargadas al importar (pandas_ta, mysql.connector, dotenv, matplotlib).
+- Handlers añadidos al logger raíz (logging.basicConfig al importar).
+
+    python import_benchmark.py --json import_times.json
+    python import_benchmark.py --baseline import_times.json --tolerance 0.25
+
+Ubicación: aipha/programs/stable/import_benchmark.py
+"""
+
+import os
+import sys
+import glob
+import json
+import argparse
+import tempfile
+import subprocess
+
+STABLE_DIR = os.path.abspath(os.path.dirname(__file__))
+
+# Dependencias que ningún módulo debe cargar al importarse (se importan al usarlas)
+HEAVY_MODULES = ('pandas_ta', 'mysql.connector', 'dotenv', 'matplotlib')
+
+# Dependencias comunes que se importan antes de medir el tiempo propio del módulo
+SHARED_MODULES = ('numpy', 'pandas')
+
+_PROBE = '''
+import sys, time, json, logging, importlib
+sys.path.insert(0, {stable_dir!r})
+for name in {shared!r}:
+    importlib.import_module(name) if {preload!r} else None
+started = time.perf_counter()
+try:
+    importlib.import_module({module!r})
+    error = None
+except Exception as e:
+    error = f"{{type(e).__name__}}: {{e}}"
+seconds = time.perf_counter() - started
+print(json.dumps({{
+    'seconds': seconds,
+    'error': error,
+    'heavy': [name for name in {heavy!r} if name in sys.modules],
+    'root_handlers': len(logging.getLogger().handlers),
+}}))
+'''
+
+
+def stable_modules():
+    """Módulos de aipha/programs/stable (sin las pruebas ni este benchmark)."""
+    names = [os.path.splitext(os.path.basename(path))[0] for path in glob.glob(os.path.join(STABLE_DIR, '*.py'))]
+    return sorted(name for name in names if name not in ('__init__', 'import_benchmark'))
+
+
+def probe_import(module, preload_shared=False):
+    """
+    Importa un módulo en un intérprete nuevo.
+    :param preload_shared: Importar numpy/pandas antes de medir
+    :return: Diccionario con seconds, error, heavy y root_handlers
+    """
+    code = _PROBE.format(stable_dir=STABLE_DIR, shared=SHARED_MODULES, preload=preload_shared,
+                         module=module, heavy=HEAVY_MODULES)
+    # Directorio de trabajo temporal: lo que se escriba en rutas relativas no cae en el repositorio
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=tempfile.gettempdir())
+    if result.returncode != 0 or not result.stdout.strip():
+        return {'seconds': None, 'error': (result.stderr.strip().splitlines() or ['fallo'])[-1],
+                'heavy': [], 'root_handlers': 0}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def benchmark(modules=None, repeat=3):
+    """
+    Tiempo de importación por módulo (mejor de repeat ejecuciones).
+    :return: Diccionario módulo -> {cold, own, error, heavy, root_handlers}
+    """
+    results = {}
+    for module in modules or stable_modules():
+        cold = [probe_import(module) for _ in range(repeat)]
+        own = [probe_import(module, preload_shared=True) for _ in range(repeat)]
+        first = cold[0]
+        results[module] = {
+            'cold': min((r['seconds'] for r in cold if r['seconds'] is not None), default=None),
+            'own': min((r['seconds'] for r in own if r['seconds'] is not None), default=None),
+            'error': first['error'],
+            'heavy': first['heavy'],
+            'root_handlers': first['root_handlers'],
+        }
+    return results
+
+
+def side_effects(results):
+    """Módulos que cargan dependencias pesadas o configuran el logging al importarse."""
+    return {module: r for module, r in results.items() if r['heavy'] or r['root_handlers']}
+
+
+def compare(results, baseline, tolerance=0.25, min_delta=0.02):
+    """
+    Regresiones respecto a un resultado anterior.
+    :param tolerance: Aumento relativo permitido del tiempo propio
+    :param min_delta: Aumento absoluto (segundos) por debajo del cual no se considera regresión
+    :return: Lista de (módulo, antes, ahora)
+    """
+    regressions = []
+    for module, r in results.items():
+        before = baseline.get(module, {}).get('own')
+        now = r['own']
+        if before is None or now is None:
+            continue
+        if now > before * (1 + tolerance) and now - before > min_delta:
+            regressions.append((module, before, now))
+    return regressions
+
+
+def format_results(results):
+    lines = [f"{'módulo':<32} {'frío (ms)':>10} {'propio (ms)':>12}  efectos"]
+    for module, r in sorted(results.items(), key=lambda item: -(item[1]['cold'] or 0)):
+        cold = f"{r['cold'] * 1000:.1f}" if r['cold'] is not None else '-'
+        own = f"{r['own'] * 1000:.1f}" if r['own'] is not None else '-'
+        effects = ', '.join(r['heavy'] + ([f"logging ({r['root_handlers']} handlers)"] if r['root_handlers'] else []))
+        if r['error']:
+            effects = f"error: {r['error']}"
+        lines.append(f"{module:<32} {cold:>10} {own:>12}  {effects}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de importación y efectos secundarios de los módulos de stable")
+    parser.add_argument('modules', nargs='*', help='Módulos a medir (por defecto todos los de stable)')
+    parser.add_argument('--repeat', type=int, default=3, help='Repeticiones por módulo (se toma la mejor)')
+    parser.add_argument('--json', type=str, help='Guardar los resultados en este archivo JSON')
+    parser.add_argument('--baseline', type=str, help='JSON de una ejecución anterior con el que comparar')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Aumento relativo permitido respecto al baseline')
+    args = parser.parse_args()
+
+    results = benchmark(args.modules or None, repeat=args.repeat)
+    print(format_results(results))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    ok = not side_effects(results)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for module, before, now in compare(results, baseline, args.tolerance):
+            print(f"Regresión: {module} {before * 1000:.1f}ms -> {now * 1000:.1f}ms")
+            ok = False
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
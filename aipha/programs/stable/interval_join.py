@@ -0,0 +1,141 @@
+"""
+interval_join.py - Motor de unión por intervalos (sweep-line) para la triple coincidencia
+
+Este módulo resuelve en memoria la relación "vela clave dentro (o cerca) de una zona de
+acumulación y de una mini-tendencia" sin recurrir a un JOIN SQL con rangos OR-eados.
+Los intervalos se ordenan por su inicio ampliado con la tolerancia y se recorren con una
+línea de barrido sobre los índices de vela ordenados, manteniendo en un heap los intervalos
+activos. El coste total es O((K+Z+T) log n + salida).
+Ubicación: aipha/programs/stable/interval_join.py
+"""
+
+import heapq
+import numpy as np
+
+
+def join_points_to_intervals(points, starts, ends, tolerance=0, mask=None):
+    """
+    Empareja cada punto con todos los intervalos que lo contienen.
+
+    Un punto p pertenece al intervalo i si starts[i] - tolerance <= p <= ends[i] + tolerance.
+
+    :param points: Índices de vela (array-like de enteros)
+    :param starts: Inicio de cada intervalo
+    :param ends: Fin de cada intervalo (inclusivo)
+    :param tolerance: Barras de tolerancia a cada lado del intervalo
+    :param mask: Array booleano opcional; solo participan los intervalos con mask=True
+    :return: Tupla (point_pos, interval_pos) de arrays int64 con las posiciones en los
+             arrays de entrada, ordenados por índice de vela y luego por inicio de intervalo
+    """
+    points = np.asarray(points, dtype=np.int64)
+    starts = np.asarray(starts, dtype=np.int64) - tolerance
+    ends = np.asarray(ends, dtype=np.int64) + tolerance
+
+    candidates = np.arange(len(starts))
+    if mask is not None:
+        candidates = candidates[np.asarray(mask, dtype=bool)]
+    # Intervalos ordenados por inicio (estable para que el orden de salida sea determinista)
+    candidates = candidates[np.argsort(starts[candidates], kind='stable')]
+    point_order = np.argsort(points, kind='stable')
+
+    point_pos = []
+    interval_pos = []
+    heap = []      # (fin, posición) de los intervalos abiertos
+    active = {}    # posición -> None, conserva el orden de inserción (orden por inicio)
+    next_interval = 0
+    n_candidates = len(candidates)
+
+    for p_pos in point_order:
+        p = points[p_pos]
+        # Abrir los intervalos que comienzan antes o en el punto
+        while next_interval < n_candidates and starts[candidates[next_interval]] <= p:
+            i = int(candidates[next_interval])
+            heapq.heappush(heap, (ends[i], i))
+            active[i] = None
+            next_interval += 1
+        # Cerrar los intervalos que terminaron antes del punto
+        while heap and heap[0][0] < p:
+            _, i = heapq.heappop(heap)
+            del active[i]
+        for i in active:
+            point_pos.append(p_pos)
+            interval_pos.append(i)
+
+    return np.asarray(point_pos, dtype=np.int64), np.asarray(interval_pos, dtype=np.int64)
+
+
+def assign_points_to_intervals(points, starts, ends, tolerance=0, mask=None):
+    """
+    Asigna a cada punto un único intervalo que lo contiene (el de inicio más reciente).
+
+    :return: Array int64 con la posición del intervalo asignado a cada punto, -1 si ninguno
+    """
+    point_pos, interval_pos = join_points_to_intervals(points, starts, ends, tolerance, mask)
+    assigned = np.full(len(np.asarray(points)), -1, dtype=np.int64)
+    # Los pares de cada punto salen ordenados por inicio de intervalo: se toma el último par de
+    # cada punto de forma explícita (primera aparición en los arrays invertidos), sin depender
+    # del orden de escritura con índices repetidos
+    unique_points, last_in_reversed = np.unique(point_pos[::-1], return_index=True)
+    assigned[unique_points] = interval_pos[::-1][last_in_reversed]
+    return assigned
+
+def find_triple_coincidences(candle_indices, zone_starts, zone_ends, trend_starts, trend_ends,
+                             zone_tolerance=8, trend_tolerance=8,
+                             zone_quality=None, min_zone_quality=0.5,
+                             trend_r_squared=None, min_trend_r_squared=0.45):
+    """
+    Encuentra todas las tripletas (vela clave, zona, mini-tendencia) que coinciden.
+
+    Equivale al JOIN de TripleSignalSaver.find_triple_signals: una vela coincide con una zona
+    si está dentro de [start_idx - tolerancia, end_idx + tolerancia], y lo mismo con la
+    mini-tendencia. Los filtros de calidad se aplican antes del barrido.
+
+    :param candle_indices: Índices de las velas clave
+    :param zone_starts, zone_ends: Rango de índices de cada zona de acumulación
+    :param trend_starts, trend_ends: Rango de índices de cada mini-tendencia
+    :param zone_tolerance: Tolerancia en barras para las zonas
+    :param trend_tolerance: Tolerancia en barras para las mini-tendencias
+    :param zone_quality: quality_score de cada zona (opcional)
+    :param min_zone_quality: Calidad mínima de zona
+    :param trend_r_squared: r_squared de cada mini-tendencia (opcional)
+    :param min_trend_r_squared: R² mínimo de la mini-tendencia
+    :return: Diccionario con arrays 'candle', 'zone' y 'trend' (posiciones en las entradas)
+    """
+    zone_mask = None
+    if zone_quality is not None:
+        zone_mask = np.asarray(zone_quality, dtype=float) >= min_zone_quality
+    trend_mask = None
+    if trend_r_squared is not None:
+        trend_mask = np.asarray(trend_r_squared, dtype=float) >= min_trend_r_squared
+
+    cz_candle, cz_zone = join_points_to_intervals(candle_indices, zone_starts, zone_ends,
+                                                  zone_tolerance, zone_mask)
+    ct_candle, ct_trend = join_points_to_intervals(candle_indices, trend_starts, trend_ends,
+                                                   trend_tolerance, trend_mask)
+    return compose_triples(cz_candle, cz_zone, ct_candle, ct_trend)
+
+def compose_triples(cz_candle, cz_zone, ct_candle, ct_trend):
+    """
+    Tripletas a partir de las parejas vela-zona y vela-tendencia de join_points_to_intervals
+    (calculadas por separado, por ejemplo para reutilizar una al cambiar solo la otra).
+    :return: Diccionario con arrays 'candle', 'zone' y 'trend'
+    """
+    # Agrupar las parejas por vela (ambas listas vienen en el mismo orden de velas)
+    trends_by_candle = {}
+    for c, t in zip(ct_candle.tolist(), ct_trend.tolist()):
+        trends_by_candle.setdefault(c, []).append(t)
+
+    out_candle = []
+    out_zone = []
+    out_trend = []
+    for c, z in zip(cz_candle.tolist(), cz_zone.tolist()):
+        for t in trends_by_candle.get(c, ()):
+            out_candle.append(c)
+            out_zone.append(z)
+            out_trend.append(t)
+
+    return {
+        'candle': np.asarray(out_candle, dtype=np.int64),
+        'zone': np.asarray(out_zone, dtype=np.int64),
+        'trend': np.asarray(out_trend, dtype=np.int64),
+    }
@@ -0,0 +1,544 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+live_engine.py - Modo en vivo: detectores incrementales por vela cerrada (asyncio)
+
+Consume velas cerradas de una fuente intercambiable (CsvReplaySource reproduce los CSV de Binance
+como si llegaran del websocket) y avanza por cada vela versiones incrementales de los detectores:
+velas clave, ZigZag de mini-tendencias, búsqueda de zonas de acumulación y emparejamiento de
+señales triples. Cada señal se emite en cuanto se completa su tercer componente.
+
+Las versiones incrementales reproducen la ejecución por lotes de pipeline.py sobre el mismo CSV:
+- Las velas clave usan los índices de Detector (todas las filas) y las mini-tendencias/zonas los de
+  AccumulationZoneDetector / MiniTrendDetector (sin la primera fila). Como en el lote, la zona de la
+  vela clave k se busca en la fila k de esa vista, así que se resuelve una vela después de k.
+- Un tramo ZigZag se emite al confirmarse su pivote final; el último tramo, provisional en el lote,
+  solo se emite al cerrar la fuente (flush).
+- No se calcula comparison_results de las mini-tendencias: mira velas clave posteriores y no
+  interviene en las señales.
+- La memoria está acotada: cada símbolo guarda solo las últimas velas que necesita la búsqueda de
+  zonas (zone_history_bars) más el tramo ZigZag en curso, y el emparejador descarta las velas,
+  zonas y tendencias que ya no pueden formar ninguna señal nueva. El ATR de la búsqueda se calcula
+  sobre esa ventana: con ATR_WARMUP_FACTOR periodos de calentamiento, la media de Wilder difiere de
+  la del histórico completo en menos de (1 - 1/periodo)^(factor * periodo), ~1e-9 con 14.
+
+    engine = LiveEngine(on_event=print_signal)
+    asyncio.run(engine.run(CsvReplaySource(['BTCUSDT-5m-2025-04-16.csv'], speed=100)))
+
+Ubicación: aipha/programs/stable/live_engine.py
+"""
+
+import os
+import sys
+import time
+import heapq
+import asyncio
+import argparse
+import logging
+import inspect
+import traceback
+from collections import deque, namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+from mini_trend import MiniTrendDetector
+from sql_indexes import scope_from_csv
+from log_config import configure_logging
+from pipeline import BINANCE_COLUMNS, stage_params, build_triple_signal, score_signals
+
+# Duración de una vela por timeframe, en segundos
+TIMEFRAME_SECONDS = {
+    '1m': 60, '3m': 180, '5m': 300, '15m': 900, '30m': 1800,
+    '1h': 3600, '2h': 7200, '4h': 14400, '6h': 21600, '12h': 43200, '1d': 86400,
+}
+
+# Velas hacia atrás que mira AccumulationZoneDetector.detect_accumulation_zone: lookback máximo (50)
+# y, desde su inicio, el volumen de referencia de calculate_quality_score (150)
+ZONE_LOOKBACK_BARS = 50
+ZONE_VOLUME_LOOKBACK_BARS = 150
+
+# Periodos de calentamiento del ATR (media de Wilder) antes de la primera vela en que se usa
+ATR_WARMUP_FACTOR = 20
+
+# Vela cerrada recibida de una fuente: valores de la fila en el orden de BINANCE_COLUMNS
+Kline = namedtuple('Kline', ['symbol', 'timeframe', 'values'])
+
+# Evento emitido por el motor: kind es 'key_candle', 'zone', 'mini_trend' o 'signal';
+# bar es la fila (vista de Detector) que lo produjo y at el instante (perf_counter) en que se generó
+LiveEvent = namedtuple('LiveEvent', ['kind', 'symbol', 'timeframe', 'bar', 'payload', 'at'])
+
+
+class CsvReplaySource:
+    """
+    Fuente de velas a partir de CSV de Binance, intercaladas por close_time entre archivos.
+    :param speed: Factor de aceleración (1 = tiempo real, 100 = 100x); None o 0 = sin esperas
+    """
+    def __init__(self, csv_files, speed=None):
+        self.csv_files = list(csv_files)
+        self.speed = speed
+
+    def _rows(self, csv_file):
+        symbol, timeframe = scope_from_csv(csv_file)
+        raw = pd.read_csv(csv_file, names=BINANCE_COLUMNS, header=None)
+        for values in raw.itertuples(index=False, name=None):
+            yield Kline(symbol, timeframe, values)
+
+    def _keyed(self, file_pos, csv_file):
+        for row_pos, kline in enumerate(self._rows(csv_file)):
+            yield (self.close_time(kline) or 0.0, file_pos, row_pos), kline
+
+    @staticmethod
+    def close_time(kline):
+        try:
+            return float(kline.values[BINANCE_COLUMNS.index('close_time')])
+        except (TypeError, ValueError):
+            return None
+
+    async def stream(self):
+        # Orden global por close_time (sin close_time numérico, la fila va en su posición del archivo)
+        streams = [self._keyed(file_pos, csv_file) for file_pos, csv_file in enumerate(self.csv_files)]
+        origin = None
+        started = time.perf_counter()
+        for (close_time, _, _), kline in heapq.merge(*streams, key=lambda item: item[0]):
+            if self.speed and close_time:
+                if origin is None:
+                    origin = close_time
+                # close_time en microsegundos
+                due = (close_time - origin) / 1e6 / self.speed
+                delay = due - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            else:
+                # Ceder el control aunque no haya espera
+                await asyncio.sleep(0)
+            yield kline
+
+    def __aiter__(self):
+        return self.stream()
+
+
+class IncrementalKeyCandleDetector:
+    """Detector.process_csv vela a vela: percentil de volumen sobre las lookback velas anteriores."""
+    def __init__(self, params):
+        self.vpt = params['volume_percentile']
+        self.bpt = params['body_threshold']
+        self.lookback = params['lookback']
+        self.volumes = deque(maxlen=self.lookback)
+
+    def update(self, index, row):
+        """
+        :param index: Índice de la vela en la vista de Detector (todas las filas)
+        :param row: Diccionario con open, high, low, close, volume
+        :return: Vela clave con las claves de Detector.process_csv, o None
+        """
+        volume = float(row['volume'])
+        key_candle = None
+        if index >= self.lookback and len(self.volumes) == self.lookback:
+            volume_percentile = float(np.percentile(np.asarray(self.volumes, dtype=float), self.vpt))
+            body = abs(float(row['close']) - float(row['open']))
+            candle_range = float(row['high']) - float(row['low'])
+            if candle_range != 0:
+                body_percentage = 100 * body / candle_range
+                if volume >= volume_percentile and body_percentage <= self.bpt:
+                    key_candle = {
+                        'index': index,
+                        'open': float(row['open']),
+                        'high': float(row['high']),
+                        'low': float(row['low']),
+                        'close': float(row['close']),
+                        'volume': volume,
+                        'volume_percentile': volume_percentile,
+                        'body_percentage': body_percentage,
+                        'is_key_candle': True,
+                        'timestamp': None
+                    }
+        self.volumes.append(volume)
+        return key_candle
+
+
+class IncrementalZigZag:
+    """MiniTrendDetector.detect_zigzag_pivots vela a vela."""
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.pivots = []
+        self.trend = None
+        self.last_pivot_idx = 0
+        self.last_pivot_price = None
+
+    @property
+    def anchor(self):
+        """Primer índice del próximo tramo: el último pivote confirmado o el candidato actual."""
+        return self.pivots[-1] if self.pivots else self.last_pivot_idx
+
+    def update(self, index, close):
+        """:return: Índice del pivote confirmado en esta vela, o None"""
+        if self.last_pivot_price is None:
+            self.last_pivot_price = close
+            return None
+        price_change = (close - self.last_pivot_price) / self.last_pivot_price
+        if self.trend is None and abs(price_change) >= self.threshold:
+            self.trend = price_change > 0
+            return None
+        confirmed = None
+        if (self.trend and price_change <= -self.threshold) or (not self.trend and price_change >= self.threshold):
+            self.pivots.append(self.last_pivot_idx)
+            # Cada tramo solo necesita los dos últimos pivotes
+            del self.pivots[:-2]
+            confirmed = self.last_pivot_idx
+            self.last_pivot_idx = index
+            self.last_pivot_price = close
+            self.trend = not self.trend
+        elif (self.trend and close > self.last_pivot_price) or (not self.trend and close < self.last_pivot_price):
+            self.last_pivot_idx = index
+            self.last_pivot_price = close
+        return confirmed
+
+    def flush(self):
+        """Último pivote provisional, como al final de detect_zigzag_pivots."""
+        if self.pivots and self.pivots[-1] != self.last_pivot_idx:
+            self.pivots.append(self.last_pivot_idx)
+            return self.last_pivot_idx
+        return None
+
+
+class IncrementalTripleMatcher:
+    """
+    Emparejamiento de find_triple_coincidences por llegada: cada tripleta (vela, zona, tendencia)
+    se emite una sola vez, cuando llega el último de sus tres componentes.
+    zone_id y trend_id son el orden de llegada (las posiciones del lote); prune() descarta los
+    componentes que ya no pueden emparejarse sin cambiar esos ids.
+    """
+    def __init__(self, symbol, timeframe, params):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.tolerance = params['tolerance']
+        self.min_zone_quality = params['min_zone_quality']
+        self.min_trend_r_squared = params['min_trend_r_squared']
+        self.candles = []
+        self.zones = {}
+        self.trends = {}
+        self.zone_count = 0
+        self.trend_count = 0
+
+    def _near(self, index, item):
+        return item['start_idx'] - self.tolerance <= index <= item['end_idx'] + self.tolerance
+
+    @staticmethod
+    def _at_least(value, minimum):
+        try:
+            return float(value) >= minimum
+        except (TypeError, ValueError):
+            return False
+
+    def _signals(self, triplets):
+        return score_signals([
+            build_triple_signal(self.symbol, self.timeframe, candle, self.zones[z], z, self.trends[t], t)
+            for candle, z, t in triplets
+        ])
+
+    def add_candle(self, candle):
+        self.candles.append(candle)
+        index = candle['index']
+        zones = [z for z, zone in self.zones.items() if self._near(index, zone)]
+        trends = [t for t, trend in self.trends.items() if self._near(index, trend)]
+        return self._signals([(candle, z, t) for z in zones for t in trends])
+
+    def add_zone(self, zone):
+        z = self.zone_count
+        self.zone_count += 1
+        # Las zonas y tendencias que no pasan el filtro solo consumen su id
+        if not self._at_least(zone.get('quality_score'), self.min_zone_quality):
+            return []
+        self.zones[z] = zone
+        return self._signals([(candle, z, t) for candle in self.candles if self._near(candle['index'], zone)
+                              for t, trend in self.trends.items() if self._near(candle['index'], trend)])
+
+    def add_trend(self, trend):
+        t = self.trend_count
+        self.trend_count += 1
+        if not self._at_least(trend.get('r_squared'), self.min_trend_r_squared):
+            return []
+        self.trends[t] = trend
+        return self._signals([(candle, z, t) for candle in self.candles if self._near(candle['index'], trend)
+                              for z, zone in self.zones.items() if self._near(candle['index'], zone)])
+
+    def prune(self, floor):
+        """
+        Descarta lo que ya no puede formar señales: ninguna zona o tendencia futura empieza antes de
+        floor, así que las velas anteriores a floor - tolerance no se emparejarán, y las zonas y
+        tendencias que terminan antes de esa frontera no alcanzan ninguna vela que quede o llegue.
+        :param floor: Menor start_idx posible de las zonas y tendencias que aún pueden llegar
+        """
+        limit = floor - self.tolerance
+        self.candles = [candle for candle in self.candles if candle['index'] >= limit]
+        for items in (self.zones, self.trends):
+            for key in [key for key, item in items.items() if item['end_idx'] + self.tolerance < limit]:
+                del items[key]
+
+
+def accumulation_zone_search(params):
+    """
+    Búsqueda de zona de AccumulationZoneDetector sobre las velas recibidas hasta el momento.
+    :return: Función(bars, index, atr=None) -> zona o None; atr es la serie ATR de bars con
+             params['atr_period'] si ya está calculada (ver zone_atr)
+    """
+    # Importación diferida: detect_accumulation_zone (y pandas_ta) solo se carga si se buscan zonas
+    from detect_accumulation_zone import AccumulationZoneDetector
+    detector = AccumulationZoneDetector()
+    detector.set_params(
+        atr_period=params['atr_period'],
+        atr_multiplier=params['atr_multiplier'],
+        volume_threshold=params['volume_threshold'],
+        quality_threshold=params['quality_threshold']
+    )
+    detector.params['recency_bonus'] = params['recency_bonus']
+
+    def search(bars, index, atr=None):
+        detector.data = bars
+        detector.atr = atr
+        return detector.detect_accumulation_zone(index)
+    return search
+
+
+def zone_atr(bars, atr_period):
+    """Serie ATR que usa la búsqueda de zonas (pandas_ta), para calcularla una vez y reutilizarla."""
+    from detect_accumulation_zone import load_pandas_ta
+    load_pandas_ta()
+    return bars.ta.atr(length=atr_period)
+
+
+def zone_history_bars(params, sma_period=200, mfi_period=14):
+    """
+    Velas que necesita la búsqueda de zonas antes de la vela clave: lookback, volumen de referencia
+    y el mayor de SMA, MFI y calentamiento del ATR (valores por defecto de AccumulationZoneDetector).
+    :param params: Parámetros de la etapa de zonas
+    """
+    indicators = max(ZONE_VOLUME_LOOKBACK_BARS, sma_period, mfi_period, ATR_WARMUP_FACTOR * params['atr_period'])
+    return ZONE_LOOKBACK_BARS + indicators + 1
+
+
+class LiveSymbolEngine:
+    """
+    Estado incremental de un símbolo/timeframe. Las velas se guardan en una ventana móvil:
+    offset es el índice (vista sin la primera fila) de la primera vela guardada.
+    """
+    def __init__(self, symbol, timeframe, params=None, zone_search=None, history=None,
+                 zone_lookback=ZONE_LOOKBACK_BARS):
+        """
+        :param params: Parámetros por etapa, como en pipeline.run_pipeline
+        :param zone_search: Función(bars, index) -> zona; por defecto accumulation_zone_search.
+                            Recibe la ventana de velas e índices relativos a ella
+        :param history: Velas que se conservan para la búsqueda de zonas (por defecto zone_history_bars)
+        :param zone_lookback: Máximo de velas entre el inicio de una zona y su vela clave
+        """
+        params = stage_params(params)
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.key_candles = IncrementalKeyCandleDetector(params['candles'])
+        self.zigzag = IncrementalZigZag(params['segments']['zigzag_threshold'])
+        self.min_trend_bars = params['segments']['min_trend_bars']
+        self.segment_detector = MiniTrendDetector()
+        self.segment_detector.set_params(zigzag_threshold=params['segments']['zigzag_threshold'],
+                                         min_trend_bars=self.min_trend_bars)
+        self.zone_search = zone_search or accumulation_zone_search(params['zones'])
+        self.matcher = IncrementalTripleMatcher(symbol, timeframe, params['triples'])
+        self.history = history or zone_history_bars(params['zones'])
+        self.zone_lookback = zone_lookback
+        self.rows = 0
+        self.offset = 0
+        self.columns = {name: [] for name in ('timestamp', 'open', 'high', 'low', 'close', 'volume')}
+        self.pending_zones = deque()
+
+    def bars(self, start=None, end=None):
+        """
+        Vista de AccumulationZoneDetector / MiniTrendDetector con las velas guardadas (o un tramo).
+        :param start: Índice absoluto de la primera vela (por defecto, la primera guardada)
+        :param end: Índice absoluto final, excluido (por defecto, la última recibida)
+        """
+        start = 0 if start is None else start - self.offset
+        end = None if end is None else end - self.offset
+        frame = pd.DataFrame({name: values[start:end] for name, values in self.columns.items()})
+        frame['datetime'] = pd.to_datetime(frame['timestamp'], unit='us')
+        return frame
+
+    def _trim(self, bar_index):
+        # Se conservan las últimas history velas y el tramo ZigZag en curso; se recorta por bloques
+        # de al menos history velas para no mover las listas en cada vela
+        keep_from = min(bar_index - self.history + 1, self.zigzag.anchor)
+        drop = keep_from - self.offset
+        if drop >= self.history:
+            for values in self.columns.values():
+                del values[:drop]
+            self.offset += drop
+
+    def _zone(self, index):
+        # La búsqueda trabaja sobre la ventana: índices relativos a offset
+        zone = self.zone_search(self.bars(), index - self.offset)
+        if zone:
+            zone = dict(zone, start_idx=zone['start_idx'] + self.offset, end_idx=zone['end_idx'] + self.offset)
+        return zone
+
+    def _event(self, kind, payload):
+        return LiveEvent(kind, self.symbol, self.timeframe, self.rows - 1, payload, time.perf_counter())
+
+    def _segment(self, start_idx, end_idx):
+        events = []
+        if end_idx - start_idx + 1 >= self.min_trend_bars:
+            trend = self.segment_detector.describe_segment(self.bars(start_idx, end_idx + 1), start_idx, end_idx)
+            events.append(self._event('mini_trend', trend))
+            events.extend(self._event('signal', s) for s in self.matcher.add_trend(trend))
+        return events
+
+    def _confirmed_pivot(self, pivot):
+        pivots = self.zigzag.pivots
+        if pivot is None or len(pivots) < 2:
+            return []
+        return self._segment(pivots[-2], pivots[-1])
+
+    def on_bar(self, values):
+        """
+        Procesa una vela cerrada.
+        :param values: Valores de la fila en el orden de BINANCE_COLUMNS
+        :return: Lista de LiveEvent producidos por esta vela
+        """
+        row = dict(zip(BINANCE_COLUMNS, values))
+        index = self.rows
+        self.rows += 1
+        events = []
+
+        candle = self.key_candles.update(index, row)
+        if candle is not None:
+            events.append(self._event('key_candle', candle))
+            events.extend(self._event('signal', s) for s in self.matcher.add_candle(candle))
+            self.pending_zones.append(candle['index'])
+
+        # La vista de mini-tendencias y zonas no incluye la primera fila
+        if index == 0:
+            return events
+        bar_index = index - 1
+        for name in self.columns:
+            self.columns[name].append(pd.to_numeric(row[name]) if name != 'timestamp' else row[name])
+        events.extend(self._confirmed_pivot(self.zigzag.update(bar_index, float(row['close']))))
+
+        # Zonas de las velas clave cuya fila ya existe en la vista sin la primera fila
+        while self.pending_zones and self.pending_zones[0] <= bar_index:
+            zone = self._zone(self.pending_zones.popleft())
+            if zone:
+                events.append(self._event('zone', zone))
+                events.extend(self._event('signal', s) for s in self.matcher.add_zone(zone))
+
+        # Las zonas futuras empiezan como pronto zone_lookback velas antes de su vela clave y las
+        # tendencias futuras en el ancla del ZigZag (margen de 1 por la fila que falta en la vista)
+        next_candle = self.pending_zones[0] if self.pending_zones else index + 1
+        self.matcher.prune(min(self.zigzag.anchor, next_candle - self.zone_lookback) - 1)
+        self._trim(bar_index)
+        return events
+
+    def flush(self):
+        """Cierra el último tramo ZigZag al terminar la fuente."""
+        return self._confirmed_pivot(self.zigzag.flush())
+
+
+class LiveEngine:
+    """
+    Motor asyncio: reparte cada vela cerrada a su LiveSymbolEngine y emite los eventos.
+    Registra el tiempo de proceso de cada vela para compararlo con la duración de la vela.
+    """
+    def __init__(self, params=None, zone_search=None, on_event=None, kinds=('signal',)):
+        """
+        :param on_event: Función o corrutina llamada con cada LiveEvent
+        :param kinds: Tipos de evento que se entregan a on_event (None = todos)
+        """
+        self.params = params
+        self.zone_search = zone_search
+        self.on_event = on_event
+        self.kinds = kinds
+        self.engines = {}
+        self.bar_seconds = []
+        self.events = 0
+
+    def engine(self, symbol, timeframe):
+        key = (symbol, timeframe)
+        if key not in self.engines:
+            self.engines[key] = LiveSymbolEngine(symbol, timeframe, self.params, self.zone_search)
+        return self.engines[key]
+
+    def process(self, kline):
+        """Procesa una vela de forma síncrona y devuelve sus eventos."""
+        start = time.perf_counter()
+        events = self.engine(kline.symbol, kline.timeframe).on_bar(kline.values)
+        self.bar_seconds.append(time.perf_counter() - start)
+        return events
+
+    async def _emit(self, events):
+        for event in events:
+            self.events += 1
+            if self.on_event is None or (self.kinds is not None and event.kind not in self.kinds):
+                continue
+            result = self.on_event(event)
+            if inspect.isawaitable(result):
+                await result
+
+    async def run(self, source):
+        """Consume la fuente hasta agotarla y cierra los tramos pendientes."""
+        async for kline in source:
+            await self._emit(self.process(kline))
+        for engine in self.engines.values():
+            await self._emit(engine.flush())
+        return self.stats()
+
+    def stats(self):
+        """Tiempo de proceso por vela (segundos) y margen frente a la vela más corta."""
+        seconds = np.asarray(self.bar_seconds, dtype=float)
+        if len(seconds) == 0:
+            return {'bars': 0}
+        intervals = [TIMEFRAME_SECONDS.get(tf) for _, tf in self.engines if tf in TIMEFRAME_SECONDS]
+        return {
+            'bars': int(len(seconds)),
+            'symbols': len(self.engines),
+            'p50': float(np.percentile(seconds, 50)),
+            'p99': float(np.percentile(seconds, 99)),
+            'max': float(seconds.max()),
+            'bar_interval': min(intervals) if intervals else None,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Modo en vivo: detección incremental por vela cerrada")
+    parser.add_argument('--csv', type=str, nargs='+', required=True, help='CSV a reproducir como velas en vivo')
+    parser.add_argument('--speed', type=float, default=0, help='Aceleración de la reproducción (0 = sin esperas)')
+    parser.add_argument('--all-events', action='store_true', help='Mostrar también velas clave, zonas y mini-tendencias')
+    args = parser.parse_args()
+
+    configure_logging(level=logging.WARNING, fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    def show(event):
+        payload = event.payload
+        if event.kind == 'signal':
+            print(f"[{event.symbol} {event.timeframe} vela {event.bar}] Señal triple en {payload['candle_index']}: "
+                  f"zona {payload['zone_id']}, tendencia {payload['trend_id']} ({payload['trend_direction']}), "
+                  f"score={payload['combined_score']:.3f}")
+        else:
+            print(f"[{event.symbol} {event.timeframe} vela {event.bar}] {event.kind}")
+
+    engine = LiveEngine(on_event=show, kinds=None if args.all_events else ('signal',))
+    stats = asyncio.run(engine.run(CsvReplaySource(args.csv, speed=args.speed or None)))
+    if stats['bars']:
+        print(f"Velas: {stats['bars']} en {stats['symbols']} símbolos | proceso por vela p50={stats['p50'] * 1000:.2f}ms "
+              f"p99={stats['p99'] * 1000:.2f}ms max={stats['max'] * 1000:.2f}ms")
+        if stats['bar_interval']:
+            print(f"Margen: la vela más lenta usa el {100 * stats['max'] / stats['bar_interval']:.4f}% de una vela")
+    return True
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(0 if main() else 1)
+    except Exception as e:
+        logging.error(f"Error inesperado: {str(e)}")
+        traceback.print_exc()
+        sys.exit(1)
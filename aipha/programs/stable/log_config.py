@@ -0,0 +1,36 @@
+"""
+log_config.py - Configuración de logging de los puntos de entrada
+
+Los módulos de aipha/programs/stable no configuran el logging al importarse: cada script lo hace
+al arrancar con configure_logging, que crea aipha/logs solo cuando va a escribir en él.
+Importar un detector desde otro programa (pipeline, backfill, worker) ya no fija el archivo de log
+del proceso ni crea directorios.
+Ubicación: aipha/programs/stable/log_config.py
+"""
+
+import os
+import sys
+import logging
+
+# Directorio de logs de aipha
+LOG_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../logs'))
+
+DEFAULT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+def configure_logging(log_file=None, level=logging.INFO, fmt=DEFAULT_FORMAT, stdout=False):
+    """
+    Configura el logger raíz (sin efecto si ya está configurado, como logging.basicConfig).
+    :param log_file: Nombre del archivo en aipha/logs (o ruta absoluta); None = solo consola
+    :param stdout: Escribir también en stdout (sin archivo se escribe en stderr)
+    """
+    handlers = []
+    if log_file:
+        path = log_file if os.path.isabs(log_file) else os.path.join(LOG_DIR, log_file)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handlers.append(logging.FileHandler(path))
+    if stdout:
+        handlers.append(logging.StreamHandler(sys.stdout))
+    elif not handlers:
+        handlers.append(logging.StreamHandler())
+    logging.basicConfig(level=level, format=fmt, handlers=handlers)
@@ -11,15 +11,6 @@ import os
 import logging
 from datetime import datetime
 
-# Configuración de logging
-log_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../logs'))
-os.makedirs(log_dir, exist_ok=True)
-logging.basicConfig(
-    filename=os.path.join(log_dir, 'mini_trend.log'),
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
-
 class MiniTrendDetector:
     """
     Detector de mini-tendencias que implementa varios métodos de segmentación
@@ -145,46 +136,51 @@ class MiniTrendDetector:
             # Solo considerar segmentos con suficientes barras
             if end_idx - start_idx + 1 >= self.params['min_trend_bars']:
                 segment = self.data.iloc[start_idx:end_idx+1]
-                
-                # Calcular propiedades de la mini-tendencia
-                start_price = segment.iloc[0]['close']
-                end_price = segment.iloc[-1]['close']
-                direction = 'alcista' if end_price > start_price else 'bajista'
-                slope = (end_price - start_price) / len(segment)
-                
-                # Calcular R^2 para medir la suavidad de la tendencia
-                x = np.arange(len(segment))
-                y = segment['close'].values
-                coeffs = np.polyfit(x, y, 1)
-                p = np.poly1d(coeffs)
-                y_fit = p(x)
-                ss_total = np.sum((y - np.mean(y))**2)
-                ss_residual = np.sum((y - y_fit)**2)
-                r_squared = 1 - (ss_residual / ss_total) if ss_total > 0 else 0
-                
-                # Calcular volume profile y POC
-                poc, vol_total = self.calculate_volume_profile(segment)
-                
-                mini_trend = {
-                    'start_idx': start_idx,
-                    'end_idx': end_idx,
-                    'start_time': segment.iloc[0]['datetime'],
-                    'end_time': segment.iloc[-1]['datetime'],
-                    'direction': direction,
-                    'slope': slope,
-                    'r_squared': r_squared,
-                    'poc': poc,
-                    'volume_total': vol_total,
-                    'duration_bars': len(segment),
-                    'duration_minutes': len(segment) * 15  # Asumiendo barras de 15 minutos
-                }
-                
-                mini_trends.append(mini_trend)
+                mini_trends.append(self.describe_segment(segment, start_idx, end_idx))
         
         self.mini_trends = mini_trends
         logging.info(f"Segmented {len(mini_trends)} mini-trends")
         return mini_trends
     
+    def describe_segment(self, segment, start_idx, end_idx):
+        """
+        Propiedades de la mini-tendencia entre dos pivotes.
+        :param segment: Filas de la mini-tendencia (start_idx a end_idx, ambos incluidos)
+        :return: Diccionario de la mini-tendencia
+        """
+        # Calcular propiedades de la mini-tendencia
+        start_price = segment.iloc[0]['close']
+        end_price = segment.iloc[-1]['close']
+        direction = 'alcista' if end_price > start_price else 'bajista'
+        slope = (end_price - start_price) / len(segment)
+        
+        # Calcular R^2 para medir la suavidad de la tendencia
+        x = np.arange(len(segment))
+        y = segment['close'].values
+        coeffs = np.polyfit(x, y, 1)
+        p = np.poly1d(coeffs)
+        y_fit = p(x)
+        ss_total = np.sum((y - np.mean(y))**2)
+        ss_residual = np.sum((y - y_fit)**2)
+        r_squared = 1 - (ss_residual / ss_total) if ss_total > 0 else 0
+        
+        # Calcular volume profile y POC
+        poc, vol_total = self.calculate_volume_profile(segment)
+        
+        return {
+            'start_idx': start_idx,
+            'end_idx': end_idx,
+            'start_time': segment.iloc[0]['datetime'],
+            'end_time': segment.iloc[-1]['datetime'],
+            'direction': direction,
+            'slope': slope,
+            'r_squared': r_squared,
+            'poc': poc,
+            'volume_total': vol_total,
+            'duration_bars': len(segment),
+            'duration_minutes': len(segment) * 15  # Asumiendo barras de 15 minutos
+        }
+    
     def calculate_volume_profile(self, segment):
         """
         Calcula el volume profile y POC para un segmento de datos.
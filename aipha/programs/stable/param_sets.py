@@ -0,0 +1,196 @@
+"""
+param_sets.py - Tabla normalizada de conjuntos de parámetros
+
+Cada conjunto de parámetros de detección se guarda una sola vez en param_sets, identificado por el
+hash SHA-256 de su JSON canónico (claves ordenadas, sin espacios). Las tablas de resultados
+guardan solo el entero param_set_id (con clave foránea e índice) en lugar de repetir el JSON en
+cada fila, y "todos los resultados del conjunto X" se resuelve por índice.
+Ubicación: aipha/programs/stable/param_sets.py
+"""
+
+import os
+import sys
+import json
+import hashlib
+import threading
+import logging
+import numpy as np
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+import schema_registry
+
+PARAM_SETS_TABLE = 'param_sets'
+
+# Columna que enlaza cada fila de resultados con su conjunto de parámetros
+PARAM_SET_COLUMN = ('param_set_id', 'INT')
+
+# Columnas JSON por fila que ya no se escriben, con la etapa de sus parámetros: param_set_id
+# sustituye a detection_params y las columnas de puntuación tipadas a scoring_details
+LEGACY_COLUMNS = {
+    'key_candles': ('detection_params', 'candles'),
+    'detect_accumulation_zone_results': ('detection_params', 'zones'),
+    'triple_signals': ('scoring_details', None),
+}
+
+# Filas por UPDATE al rellenar param_set_id en tablas antiguas
+_MIGRATION_BATCH = 1000
+
+# (base de datos, hash) -> id, para no repetir la consulta dentro del proceso
+_ids = {}
+_lock = threading.Lock()
+
+
+def _json_default(value):
+    """Escalares numpy y otros tipos no serializables."""
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def canonical_params(params):
+    """JSON canónico de un diccionario de parámetros: mismo contenido, misma cadena."""
+    return json.dumps(params or {}, sort_keys=True, separators=(',', ':'), default=_json_default)
+
+
+def param_hash(params):
+    """Hash SHA-256 (hexadecimal) del JSON canónico de los parámetros."""
+    return hashlib.sha256(canonical_params(params).encode('utf-8')).hexdigest()
+
+
+def param_set_sql(table_name):
+    """Columna, índice y clave foránea param_set_id para incluir en un CREATE TABLE."""
+    column, column_type = PARAM_SET_COLUMN
+    return (f"{column} {column_type},\n"
+            f"INDEX idx_{table_name}_param_set ({column}),\n"
+            f"CONSTRAINT fk_{table_name}_param_set FOREIGN KEY ({column}) REFERENCES {PARAM_SETS_TABLE} (id)")
+
+
+def ensure_param_sets_table(cursor):
+    """Crea la tabla param_sets si no existe."""
+    if schema_registry.table_exists(cursor, PARAM_SETS_TABLE):
+        return False
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS {PARAM_SETS_TABLE} (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        param_hash CHAR(64) NOT NULL,
+        stage VARCHAR(32),
+        params JSON,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE KEY unique_param_hash (param_hash)
+    ) ENGINE=InnoDB;
+    """)
+    schema_registry.invalidate(PARAM_SETS_TABLE)
+    logging.info(f"Created table {PARAM_SETS_TABLE}")
+    return True
+
+
+def ensure_param_set_column(cursor, table_name):
+    """
+    Añade param_set_id (con índice y clave foránea) a una tabla creada antes de param_sets.
+    :return: True si se añadió
+    """
+    column, column_type = PARAM_SET_COLUMN
+    if schema_registry.has_column(cursor, table_name, column):
+        return False
+    ensure_param_sets_table(cursor)
+    cursor.execute(
+        f"ALTER TABLE {table_name} ADD COLUMN {column} {column_type}, "
+        f"ADD INDEX idx_{table_name}_param_set ({column}), "
+        f"ADD CONSTRAINT fk_{table_name}_param_set FOREIGN KEY ({column}) REFERENCES {PARAM_SETS_TABLE} (id)"
+    )
+    schema_registry.invalidate(table_name)
+    logging.info(f"Added {column} column to {table_name}")
+    return True
+
+
+def drop_legacy_columns(cursor, table_name):
+    """
+    Migración de las columnas JSON por fila de LEGACY_COLUMNS. Antes de eliminar la columna, las
+    filas antiguas reciben su param_set_id (a partir de detection_params) o base_strength y
+    final_score (a partir de scoring_details), de modo que no se pierde información.
+    Incluye DDL: llamarla antes de abrir la transacción de guardado.
+    :return: True si se eliminó la columna
+    """
+    column, stage = LEGACY_COLUMNS.get(table_name, (None, None))
+    if column is None or not schema_registry.has_column(cursor, table_name, column):
+        return False
+
+    if column == 'detection_params':
+        ensure_param_set_column(cursor, table_name)
+        cursor.execute(f"SELECT id, {column} FROM {table_name} WHERE param_set_id IS NULL AND {column} IS NOT NULL")
+        rows = [tuple(row.values()) if isinstance(row, dict) else tuple(row) for row in cursor.fetchall()]
+        row_ids = {}
+        for row_id, value in rows:
+            params = json.loads(value) if isinstance(value, (str, bytes, bytearray)) else value
+            row_ids.setdefault(get_param_set_id(cursor, params, stage=stage), []).append(row_id)
+        for param_set_id, ids in row_ids.items():
+            for offset in range(0, len(ids), _MIGRATION_BATCH):
+                batch = ids[offset:offset + _MIGRATION_BATCH]
+                cursor.execute(
+                    f"UPDATE {table_name} SET param_set_id = %s WHERE id IN ({', '.join(['%s'] * len(batch))})",
+                    (param_set_id, *batch)
+                )
+    else:
+        cursor.execute(
+            f"UPDATE {table_name} SET "
+            f"base_strength = COALESCE(base_strength, JSON_EXTRACT({column}, '$.base_strength')), "
+            f"final_score = COALESCE(final_score, JSON_EXTRACT({column}, '$.final_score')) "
+            f"WHERE {column} IS NOT NULL"
+        )
+
+    cursor.execute(f"ALTER TABLE {table_name} DROP COLUMN {column}")
+    schema_registry.invalidate(table_name)
+    logging.info(f"Migrated and dropped legacy column {column} from {table_name}")
+    return True
+
+
+def get_param_set_id(cursor, params, stage=None, database=None):
+    """
+    Identificador del conjunto de parámetros, insertándolo si es nuevo.
+    Seguro con varios procesos a la vez: el UNIQUE sobre param_hash resuelve la carrera y
+    LAST_INSERT_ID(id) devuelve el id existente cuando el conjunto ya estaba guardado.
+    :param cursor: Cursor abierto sobre la base de datos
+    :param params: Diccionario de parámetros
+    :param stage: Etapa que los usa (candles, zones, triples), solo informativo
+    :param database: Nombre de la base de datos para la caché (por defecto MYSQL_DATABASE)
+    :return: id en param_sets
+    """
+    digest = param_hash(params)
+    key = (database or os.getenv('MYSQL_DATABASE', 'binance_lob'), digest)
+    param_set_id = _ids.get(key)
+    if param_set_id is not None:
+        return param_set_id
+
+    ensure_param_sets_table(cursor)
+    cursor.execute(
+        f"INSERT INTO {PARAM_SETS_TABLE} (param_hash, stage, params) VALUES (%s, %s, %s) "
+        f"ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)",
+        (digest, stage, canonical_params(params))
+    )
+    param_set_id = cursor.lastrowid
+    with _lock:
+        _ids[key] = param_set_id
+    return param_set_id
+
+
+def load_params(cursor, param_set_id):
+    """
+    Parámetros de un conjunto guardado.
+    :return: Diccionario, o None si el id no existe
+    """
+    cursor.execute(f"SELECT params FROM {PARAM_SETS_TABLE} WHERE id = %s", (param_set_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    value = row['params'] if isinstance(row, dict) else row[0]
+    return json.loads(value) if isinstance(value, (str, bytes)) else value
+
+
+def reset_cache():
+    """
+    Olvida los ids cacheados. Llamar tras un rollback: un conjunto insertado en la transacción
+    deshecha ya no existe en param_sets.
+    """
+    with _lock:
+        _ids.clear()
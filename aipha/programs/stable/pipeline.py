@@ -0,0 +1,620 @@
+"""
+pipeline.py - Orquestador de la detección en un solo proceso
+
+Carga el CSV una vez y ejecuta velas clave → zonas de acumulación → mini-tendencias → señales de
+triple coincidencia sobre los mismos datos en memoria, pasando los resultados de cada etapa a la
+siguiente directamente (sin releer el CSV ni consultar la base de datos entre etapas).
+Las etapas forman un grafo (stage_dag.py): con max_workers > 1 las independientes se ejecutan a la vez.
+La persistencia es opcional: cada etapa entrega su salida a los sinks configurados
+(DatabaseSink escribe en MySQL en segundo plano, StoreSink en un storage.ResultStore como SQLite
+o DuckDB sin servidor, CsvSink deja un CSV por etapa).
+
+Las vistas de datos reproducen la carga de cada detector: Detector.load_csv descarta la columna
+timestamp, y AccumulationZoneDetector / MiniTrendDetector descartan la primera fila.
+
+    data = run_pipeline('BTCUSDT-5m-2025-04-16.csv', sinks=[DatabaseSink()])
+    print(stage_dag.format_report(data.dag_result))
+
+Ubicación: aipha/programs/stable/pipeline.py
+"""
+
+import os
+import sys
+import logging
+import functools
+import threading
+import numpy as np
+import pandas as pd
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+from detect_candles import Detector
+from mini_trend import MiniTrendDetector
+from interval_join import find_triple_coincidences, assign_points_to_intervals
+from batch_scoring import score_signals_batch, signals_to_columns
+from sql_indexes import scope_from_csv, scope_file, current_run_id
+from run_cache import file_sha256
+from async_writer import BackgroundResultWriter
+from stage_dag import StageDAG
+from pipeline_stages import STAGES, STAGE_DEPENDENCIES, DEFAULT_PARAMS, required_stages, stage_params
+
+# Columnas del CSV de Binance
+BINANCE_COLUMNS = [
+    'timestamp', 'open', 'high', 'low', 'close', 'volume',
+    'close_time', 'quote_asset_volume', 'number_of_trades',
+    'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'
+]
+
+
+class PipelineData:
+    """
+    Datos de un CSV cargados una sola vez, con las vistas que usa cada detector,
+    y las salidas y tiempos de las etapas ejecutadas.
+    """
+    def __init__(self, csv_file, raw=None):
+        """
+        :param csv_file: Ruta al CSV en formato Binance
+        :param raw: DataFrame ya leído con BINANCE_COLUMNS (opcional)
+        """
+        if raw is None and not os.path.exists(csv_file):
+            raise FileNotFoundError(f"CSV file not found: {csv_file}")
+        self.csv_file = csv_file
+        self.symbol, self.timeframe = scope_from_csv(csv_file)
+        self.raw = raw if raw is not None else pd.read_csv(csv_file, names=BINANCE_COLUMNS, header=None)
+        self._bars = None
+        self._bars_lock = threading.Lock()
+        self._fingerprint = None
+        self.outputs = {}
+        self.stage_params = {}
+        self.timings = {}
+        self.dag_result = None
+
+    def __getstate__(self):
+        # Para executor='process': el candado no se serializa y las salidas viajan como entradas de cada etapa
+        state = dict(self.__dict__, outputs={}, stage_params={}, timings={}, dag_result=None)
+        del state['_bars_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._bars_lock = threading.Lock()
+
+    def fork(self):
+        """Copia que comparte los datos cargados (raw, bars, huella) pero sin salidas ni tiempos."""
+        data = PipelineData(self.csv_file, raw=self.raw)
+        data._bars = self.bars
+        data._fingerprint = self.fingerprint
+        return data
+
+    @property
+    def fingerprint(self):
+        """Huella del contenido de los datos (hash del CSV, o de las filas si no hay archivo)."""
+        if self._fingerprint is None:
+            if os.path.exists(self.csv_file):
+                self._fingerprint = file_sha256(self.csv_file)
+            else:
+                self._fingerprint = str(int(pd.util.hash_pandas_object(self.raw, index=False).sum()))
+        return self._fingerprint
+
+    @property
+    def candle_frame(self):
+        """Vista de Detector.load_csv: todas las filas, sin la columna timestamp."""
+        return self.raw.iloc[:, 1:]
+
+    @property
+    def bars(self):
+        """Vista de AccumulationZoneDetector / MiniTrendDetector: sin la primera fila, OHLCV numérico y datetime."""
+        # Con etapas en paralelo la vista se construye una sola vez
+        with self._bars_lock:
+            if self._bars is None:
+                bars = self.raw.iloc[1:].reset_index(drop=True)
+                for col in ['open', 'high', 'low', 'close', 'volume']:
+                    bars[col] = pd.to_numeric(bars[col])
+                bars['datetime'] = pd.to_datetime(bars['timestamp'], unit='us')
+                self._bars = bars
+        return self._bars
+
+
+def detect_key_candles(data, params):
+    """
+    Etapa 1: velas clave con Detector.
+    :return: (lista de velas clave, parámetros del detector)
+    """
+    detector = Detector()
+    detector.data = data.candle_frame
+    detector.set_detection_params(params['volume_percentile'], params['body_threshold'], params['lookback'])
+    return detector.process_csv(), dict(detector.detection_params)
+
+
+def detect_zones(data, key_candles, params):
+    """
+    Etapa 2: zonas de acumulación alrededor de las velas clave.
+    Sin velas clave se usan índices espaciados, como save_detect_accumulation_zone.py.
+    :return: (lista de zonas, parámetros del detector)
+    """
+    # Importación diferida: detect_accumulation_zone (y pandas_ta) solo se carga si se buscan zonas
+    from detect_accumulation_zone import AccumulationZoneDetector, spaced_key_candle_indices
+    detector = AccumulationZoneDetector()
+    detector.data = data.bars
+    detector.set_params(
+        atr_period=params['atr_period'],
+        atr_multiplier=params['atr_multiplier'],
+        volume_threshold=params['volume_threshold'],
+        quality_threshold=params['quality_threshold']
+    )
+    detector.params['recency_bonus'] = params['recency_bonus']
+    indices = [candle['index'] for candle in key_candles] or spaced_key_candle_indices(len(data.raw))
+    return detector.process_candles(indices), dict(detector.params)
+
+
+def segment_mini_trends(data, params):
+    """
+    Etapa de segmentación: mini-tendencias por ZigZag. No depende de las velas clave,
+    así que puede ejecutarse a la vez que la detección de velas.
+    :return: (DataFrame de mini-tendencias, parámetros del detector)
+    """
+    detector = MiniTrendDetector()
+    detector.data = data.bars
+    detector.set_params(zigzag_threshold=params['zigzag_threshold'], min_trend_bars=params['min_trend_bars'])
+    return detector.process_csv(), dict(detector.params)
+
+
+def detect_mini_trends(data, key_candles, segments, params):
+    """
+    Etapa 3: mini-tendencias de la segmentación comparadas con las velas clave de la etapa 1.
+    :return: (DataFrame de mini-tendencias con comparison_results, parámetros)
+    """
+    from save_mini_trend import compare_mini_trends_with_key_candles
+    # Copia: la segmentación puede estar en caché y la comparación añade columnas
+    mini_trends = segments.copy()
+    if not mini_trends.empty:
+        columns = {name: [candle[key] for candle in key_candles]
+                   for name, key in (('candle_index', 'index'), ('open', 'open'), ('high', 'high'),
+                                     ('low', 'low'), ('close', 'close'))}
+        mini_trends = compare_mini_trends_with_key_candles(
+            mini_trends, columns, poc_tol=params['poc_tol'], check_direction=params['check_direction']
+        )
+    return mini_trends, dict(params)
+
+
+def build_triple_signal(symbol, timeframe, kc, daz, zone_id, mt, trend_id):
+    """Señal de triple coincidencia con las claves de TripleSignalSaver.find_triple_signals."""
+    return {
+        'key_candle_id': None,
+        'symbol': symbol,
+        'timeframe': timeframe,
+        'candle_index': kc['index'],
+        'open': kc['open'],
+        'high': kc['high'],
+        'low': kc['low'],
+        'close': kc['close'],
+        'volume': kc['volume'],
+        'body_percentage': kc['body_percentage'],
+        'zone_id': zone_id,
+        'zone_quality_score': daz['quality_score'],
+        'zone_start_datetime': daz.get('datetime_start'),
+        'zone_end_datetime': daz.get('datetime_end'),
+        'trend_id': trend_id,
+        'trend_direction': mt['direction'],
+        'trend_slope': mt['slope'],
+        'trend_r_squared': mt['r_squared'],
+        'trend_start_datetime': mt.get('start_time'),
+        'trend_end_datetime': mt.get('end_time'),
+    }
+
+
+def score_signals(signals):
+    """Añade signal_strength y combined_score (batch_scoring) a cada señal."""
+    if signals:
+        scores = score_signals_batch(signals_to_columns(signals))
+        for position, signal in enumerate(signals):
+            signal['signal_strength'] = float(scores['signal_strength'][position])
+            signal['combined_score'] = float(scores['combined_score'][position])
+    return signals
+
+
+def find_triple_signals(data, key_candles, zones, mini_trends, params):
+    """
+    Etapa 4: señales de triple coincidencia, con la misma regla y puntuación que
+    TripleSignalSaver pero sobre las salidas en memoria. zone_id y trend_id son las
+    posiciones en las listas de zonas y mini-tendencias (aún no hay ids de base de datos).
+    :return: (lista de señales puntuadas, parámetros)
+    """
+    if not key_candles or not zones or mini_trends is None or mini_trends.empty:
+        logging.info(f"Componentes insuficientes para señales triples: velas={len(key_candles)}, "
+                     f"zonas={len(zones)}, tendencias={0 if mini_trends is None else len(mini_trends)}")
+        return [], dict(params)
+
+    trends = mini_trends.to_dict('records')
+    matches = find_triple_coincidences(
+        [c['index'] for c in key_candles],
+        [z['start_idx'] for z in zones],
+        [z['end_idx'] for z in zones],
+        [t['start_idx'] for t in trends],
+        [t['end_idx'] for t in trends],
+        zone_tolerance=params['tolerance'],
+        trend_tolerance=params['tolerance'],
+        zone_quality=[z['quality_score'] for z in zones],
+        min_zone_quality=params['min_zone_quality'],
+        trend_r_squared=[t['r_squared'] for t in trends],
+        min_trend_r_squared=params['min_trend_r_squared']
+    )
+
+    signals = build_triple_signals(data.symbol, data.timeframe, key_candles, zones, trends, matches)
+    logging.info(f"Encontradas {len(signals)} señales de triple coincidencia en memoria")
+    return signals, dict(params)
+
+
+def build_triple_signals(symbol, timeframe, key_candles, zones, trends, matches):
+    """
+    Señales puntuadas a partir de las tripletas de interval_join (posiciones en las listas).
+    :param trends: Mini-tendencias como lista de diccionarios
+    """
+    signals = [build_triple_signal(symbol, timeframe, key_candles[c_pos], zones[z_pos], z_pos,
+                                   trends[t_pos], t_pos)
+               for c_pos, z_pos, t_pos in zip(matches['candle'].tolist(), matches['zone'].tolist(),
+                                              matches['trend'].tolist())]
+    return score_signals(signals)
+
+
+STAGE_FUNCTIONS = {
+    'candles': detect_key_candles,
+    'segments': segment_mini_trends,
+    'zones': detect_zones,
+    'mini_trends': detect_mini_trends,
+    'triples': find_triple_signals,
+}
+
+
+def _run_stage(data, stage, params, *inputs):
+    # Las salidas del grafo son pares (salida, parámetros nativos); cada etapa recibe solo las salidas
+    return STAGE_FUNCTIONS[stage](data, *[output for output, _ in inputs], params)
+
+
+def _stage_runner(data, stage, params):
+    # partial de una función de módulo (no un cierre) para que executor='process' pueda serializarla
+    return functools.partial(_run_stage, data, stage, params)
+
+
+def build_dag(data, params):
+    """Grafo de etapas de detección (stage_dag.StageDAG) sobre los datos cargados."""
+    dag = StageDAG()
+    for stage in STAGES:
+        dag.add(stage, _stage_runner(data, stage, params[stage]),
+                inputs=STAGE_DEPENDENCIES[stage], params=params[stage])
+    return dag
+
+
+def run_pipeline(csv_file, params=None, stages=STAGES, sinks=(), reuse=None, data=None,
+                 max_workers=1, cache=None, executor='thread'):
+    """
+    Ejecuta las etapas pedidas (y sus dependencias) sobre un CSV cargado una sola vez.
+
+    :param csv_file: Ruta al CSV en formato Binance
+    :param params: Diccionario etapa -> parámetros (se completan con DEFAULT_PARAMS)
+    :param stages: Etapas a ejecutar
+    :param sinks: Destinos de la salida de cada etapa (PipelineSink), en orden de dependencias
+    :param reuse: Diccionario etapa -> función(data) que devuelve una salida ya persistida;
+                  esa etapa no se ejecuta ni se entrega a los sinks
+    :param data: PipelineData ya cargado (opcional)
+    :param max_workers: Hilos para ejecutar a la vez las etapas independientes (1 = en serie)
+    :param cache: stage_dag.StageCache para reutilizar salidas de ejecuciones anteriores (opcional)
+    :param executor: 'thread' o 'process' (ver stage_dag); los sinks siempre se llaman en este proceso
+    :return: PipelineData con outputs, stage_params, timings y dag_result
+    """
+    reuse = reuse or {}
+    params = stage_params(params)
+    data = data or PipelineData(csv_file)
+    preset = {}
+    for stage in reuse:
+        preset[stage] = (reuse[stage](data), None)
+        logging.info(f"Pipeline {stage}: salida reutilizada")
+
+    def on_complete(stage, value, cached):
+        output, native_params = value
+        data.outputs[stage] = output
+        if stage in reuse:
+            return
+        data.stage_params[stage] = native_params
+        for sink in sinks:
+            sink.write(data, stage, output)
+
+    result = build_dag(data, params).run(
+        targets=[stage for stage in STAGES if stage in stages], max_workers=max_workers,
+        cache=cache, fingerprint=data.fingerprint if cache is not None else None,
+        preset=preset, on_complete=on_complete, executor=executor
+    )
+    for stage in result.timings:
+        data.timings[stage] = result.seconds(stage)
+        logging.info(f"Pipeline {stage}: {len(data.outputs[stage])} resultados en {data.timings[stage]:.2f}s")
+    data.dag_result = result
+    return data
+
+
+class PipelineSink:
+    """Destino de las salidas del pipeline. Las subclases implementan on_<etapa>(data, output)."""
+    def write(self, data, stage, output):
+        handler = getattr(self, f'on_{stage}', None)
+        if handler is not None:
+            handler(data, output)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class CsvSink(PipelineSink):
+    """Guarda la salida de cada etapa en <output_dir>/<nombre del CSV>_<etapa>.csv."""
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+
+    def path(self, data, stage):
+        name = os.path.splitext(os.path.basename(data.csv_file))[0]
+        return os.path.join(self.output_dir, f"{name}_{stage}.csv")
+
+    def write(self, data, stage, output):
+        frame = output if isinstance(output, pd.DataFrame) else pd.DataFrame(output)
+        frame.to_csv(self.path(data, stage), index=False)
+        logging.info(f"Saved {len(frame)} {stage} results to {self.path(data, stage)}")
+
+
+class DatabaseSink(PipelineSink):
+    """
+    Escribe cada etapa en MySQL con los savers existentes, en el hilo de BackgroundResultWriter
+    y en el orden de las etapas: la detección de la etapa siguiente se solapa con la escritura.
+    Las señales triples en memoria se guardan con TripleSignalSaver, que resuelve los ids de vela,
+    zona y mini-tendencia ya escritos por las etapas anteriores.
+    """
+    def __init__(self, max_pending=2, db_config=None, run_id=None):
+        """
+        :param run_id: run_id de todas las filas escritas (por defecto el del proceso); un servicio
+                       persistente pasa el de cada trabajo
+        """
+        self.db_config = db_config
+        self.run_id = run_id or current_run_id()
+        self.writer = BackgroundResultWriter(max_pending=max_pending, name='aipha-pipeline-writer')
+
+    def on_candles(self, data, key_candles):
+        from save_detect_candles import save_detection
+        self.writer.submit(save_detection, data.csv_file, key_candles, data.stage_params['candles'],
+                           len(data.raw), run_id=self.run_id, description=f"candles {os.path.basename(data.csv_file)}")
+
+    def on_zones(self, data, zones):
+        if not zones:
+            return
+        from save_detect_accumulation_zone import save_zones
+        self.writer.submit(save_zones, data.csv_file, zones, data.stage_params['zones'], data.bars,
+                           mini_trend_data=data.bars, run_id=self.run_id,
+                           description=f"zones {os.path.basename(data.csv_file)}")
+
+    def on_mini_trends(self, data, mini_trends):
+        if mini_trends.empty:
+            return
+        from save_mini_trend import save_mini_trend, get_db_config
+        self.writer.submit(save_mini_trend, mini_trends, db_config=self.db_config or get_db_config(),
+                           csv_file=os.path.basename(data.csv_file), run_id=self.run_id,
+                           description=f"mini-trends {os.path.basename(data.csv_file)}")
+
+    def on_triples(self, data, signals):
+        if not signals:
+            return
+        if not data.symbol or not data.timeframe:
+            logging.warning(f"Sin símbolo/timeframe en {data.csv_file}: no se guardan señales triples")
+            return
+        # zone_id/trend_id son posiciones: se añaden las claves naturales para resolver los ids guardados
+        zones = data.outputs['zones']
+        trends = data.outputs['mini_trends']
+        records = []
+        for signal in signals:
+            zone = zones[signal['zone_id']]
+            trend = trends.iloc[signal['trend_id']]
+            records.append(dict(signal, zone_start_idx=int(zone['start_idx']), zone_end_idx=int(zone['end_idx']),
+                                trend_start_idx=int(trend['start_idx']), trend_end_idx=int(trend['end_idx'])))
+        self.writer.submit(_save_triple_signals, data.symbol, data.timeframe, data.stage_params['triples'],
+                           data.csv_file, records, run_id=self.run_id, description=f"triples {os.path.basename(data.csv_file)}")
+
+    def load_candles(self, data):
+        """Velas clave ya guardadas del archivo, con las claves de Detector.process_csv."""
+        frame = self._read('key_candles', ['candle_index', 'open', 'high', 'low', 'close', 'volume',
+                                           'volume_percentile', 'body_percentage'], data, 'candle_index')
+        candles = frame.rename(columns={'candle_index': 'index'}).to_dict('records')
+        for candle in candles:
+            candle['index'] = int(candle['index'])
+            candle['is_key_candle'] = True
+        return candles
+
+    def load_zones(self, data):
+        """Zonas ya guardadas del archivo."""
+        return self._read('detect_accumulation_zone_results',
+                          ['start_idx', 'end_idx', 'quality_score', 'datetime_start', 'datetime_end'],
+                          data, 'id').to_dict('records')
+
+    def load_mini_trends(self, data):
+        """Mini-tendencias ya guardadas del archivo."""
+        return self._read('mini_trend_results',
+                          ['start_idx', 'end_idx', 'start_time', 'end_time', 'direction', 'slope',
+                           'r_squared', 'poc', 'comparison_results'], data, 'id')
+
+    def _read(self, table_name, columns, data, order_by):
+        from db_pool import get_connection
+        from result_reader import read_frame
+        connection = get_connection(self.db_config)
+        try:
+            # Solo las filas del mismo archivo (día): otros días del par tienen los mismos índices
+            return read_frame(connection, table_name, columns, symbol=data.symbol, timeframe=data.timeframe,
+                              filters={'csv_file': scope_file(data.csv_file)}, order_by=order_by)
+        finally:
+            connection.close()
+
+    def close(self):
+        """Espera a que terminen las escrituras y relanza su error si lo hubo."""
+        self.writer.close()
+
+
+class StoreSink(PipelineSink):
+    """
+    Escribe cada etapa en un storage.ResultStore (SQLite o DuckDB embebidos, o MySQL), en el hilo de
+    BackgroundResultWriter y reemplazando solo las filas del mismo archivo, como DatabaseSink.
+    Permite ejecutar el pipeline sin servidor (run_combined_detection.py --storage sqlite).
+    Las zonas marcan in_accumulation_zone en las velas clave; mini_trend_id y la tabla mini_trends
+    (la segmentación propia de save_detect_accumulation_zone.py) no se escriben.
+    """
+    def __init__(self, store, max_pending=2, run_id=None):
+        """
+        :param store: ResultStore abierto (ver storage.open_store); el sink lo cierra al terminar
+        :param run_id: run_id de todas las filas escritas (por defecto el del proceso)
+        """
+        self.store = store
+        self.run_id = run_id or current_run_id()
+        self.writer = BackgroundResultWriter(max_pending=max_pending, name='aipha-store-writer')
+
+    def on_candles(self, data, key_candles):
+        self.writer.submit(self._write_candles, data, key_candles, data.stage_params['candles'],
+                           description=f"candles {os.path.basename(data.csv_file)}")
+
+    def on_zones(self, data, zones):
+        if not zones:
+            return
+        self.writer.submit(self._write_zones, data, zones, data.stage_params['zones'],
+                           description=f"zones {os.path.basename(data.csv_file)}")
+
+    def on_mini_trends(self, data, mini_trends):
+        if mini_trends.empty:
+            return
+        self.writer.submit(self._write_mini_trends, data, mini_trends,
+                           description=f"mini-trends {os.path.basename(data.csv_file)}")
+
+    def on_triples(self, data, signals):
+        if not signals:
+            return
+        self.writer.submit(self._write_triples, data, signals, data.outputs['zones'], data.outputs['mini_trends'],
+                           data.stage_params['triples'], description=f"triples {os.path.basename(data.csv_file)}")
+
+    def _scope_rows(self, data, records, params, stage):
+        # Columnas de ámbito y de ejecución comunes a todas las tablas
+        param_set_id = self.store.param_set_id(params, stage=stage) if params is not None else None
+        extra = {'symbol': data.symbol, 'timeframe': data.timeframe, 'csv_file': scope_file(data.csv_file),
+                 'run_id': self.run_id, 'param_set_id': param_set_id}
+        return [dict(record, **extra) for record in records]
+
+    def _write_candles(self, data, key_candles, params):
+        indices = [candle['index'] for candle in key_candles]
+        datetimes = _candle_datetimes(data, indices)
+        records = [dict(candle, candle_index=candle['index'], datetime=moment, in_accumulation_zone=False)
+                   for candle, moment in zip(key_candles, datetimes)]
+        self.store.replace_scope('key_candles', data.symbol, data.timeframe, data.csv_file,
+                                 self._scope_rows(data, records, params, 'candles'))
+
+    def _write_zones(self, data, zones, params):
+        self.store.replace_scope('detect_accumulation_zone_results', data.symbol, data.timeframe, data.csv_file,
+                                 self._scope_rows(data, zones, params, 'zones'))
+        # Marca de las velas clave del mismo archivo que caen dentro de alguna zona
+        candles = self.store.scan('key_candles', ['id', 'candle_index'], data.symbol, data.timeframe,
+                                  csv_file=data.csv_file)
+        if len(candles['id']):
+            zone_pos = assign_points_to_intervals(np.asarray(candles['candle_index'], dtype=np.int64),
+                                                  [zone['start_idx'] for zone in zones],
+                                                  [zone['end_idx'] for zone in zones])
+            self.store.update_column('key_candles', 'in_accumulation_zone', candles['id'].tolist(),
+                                     (zone_pos >= 0).tolist())
+
+    def _write_mini_trends(self, data, mini_trends):
+        # mini_trend_results no tiene param_set_id (append solo escribe las columnas del esquema)
+        self.store.replace_scope('mini_trend_results', data.symbol, data.timeframe, data.csv_file,
+                                 self._scope_rows(data, mini_trends.to_dict('records'), None, None))
+
+    def _write_triples(self, data, signals, zones, trends, params):
+        # Importación diferida, como en _save_triple_signals
+        from save_triple_signals import SCORE_COLUMNS
+        # zone_id/trend_id son posiciones: se resuelven con los ids guardados por clave natural
+        # (start_idx, end_idx) dentro del archivo, usando la última fila si hay varias (como attach_ids)
+        zone_ids = self._interval_ids('detect_accumulation_zone_results', data)
+        trend_ids = self._interval_ids('mini_trend_results', data)
+        scores = score_signals_batch(signals_to_columns(signals))
+        datetimes = _candle_datetimes(data, [signal['candle_index'] for signal in signals])
+        records = []
+        seen_candles = set()
+        for position, signal in enumerate(signals):
+            # Clave única (symbol, timeframe, csv_file, candle_index): se conserva la primera señal de cada vela
+            if signal['candle_index'] in seen_candles:
+                logging.warning(f"Se omitió una señal duplicada en candle_index={signal['candle_index']}")
+                continue
+            seen_candles.add(signal['candle_index'])
+            zone = zones[signal['zone_id']]
+            trend = trends.iloc[signal['trend_id']]
+            record = dict(signal, datetime=datetimes[position],
+                          zone_id=zone_ids.get((int(zone['start_idx']), int(zone['end_idx']))),
+                          mini_trend_id=trend_ids.get((int(trend['start_idx']), int(trend['end_idx']))))
+            record.update((key, float(scores[key][position])) for key in SCORE_COLUMNS)
+            records.append(record)
+        self.store.replace_scope('triple_signals', data.symbol, data.timeframe, data.csv_file,
+                                 self._scope_rows(data, records, params, 'triples'))
+
+    def _interval_ids(self, table_name, data):
+        ids = {}
+        for row in self.store.scan_records(table_name, ['id', 'start_idx', 'end_idx'], data.symbol,
+                                           data.timeframe, order_by='id', csv_file=data.csv_file):
+            ids[(int(row['start_idx']), int(row['end_idx']))] = int(row['id'])
+        return ids
+
+    def load_candles(self, data):
+        """Velas clave ya guardadas del archivo, con las claves de Detector.process_csv."""
+        frame = self._read('key_candles', ['candle_index', 'open', 'high', 'low', 'close', 'volume',
+                                           'volume_percentile', 'body_percentage'], data, 'candle_index')
+        candles = frame.rename(columns={'candle_index': 'index'}).to_dict('records')
+        for candle in candles:
+            candle['index'] = int(candle['index'])
+            candle['is_key_candle'] = True
+        return candles
+
+    def load_zones(self, data):
+        """Zonas ya guardadas del archivo."""
+        return self._read('detect_accumulation_zone_results',
+                          ['start_idx', 'end_idx', 'quality_score', 'datetime_start', 'datetime_end'],
+                          data, 'id').to_dict('records')
+
+    def load_mini_trends(self, data):
+        """Mini-tendencias ya guardadas del archivo."""
+        return self._read('mini_trend_results',
+                          ['start_idx', 'end_idx', 'start_time', 'end_time', 'direction', 'slope',
+                           'r_squared', 'poc', 'comparison_results'], data, 'id')
+
+    def _read(self, table_name, columns, data, order_by):
+        # La conexión es la misma que usa el hilo de escritura: se espera a las escrituras pendientes
+        self.writer.flush()
+        return pd.DataFrame(self.store.scan(table_name, columns, data.symbol, data.timeframe,
+                                            order_by=order_by, csv_file=data.csv_file))
+
+    def close(self):
+        """Espera a que terminen las escrituras (relanzando su error si lo hubo) y cierra el almacenamiento."""
+        try:
+            self.writer.close()
+        finally:
+            self.store.close()
+
+
+def _candle_datetimes(data, indices):
+    """Fecha de apertura de las velas (posiciones del CSV, como candle_index), o None si no se puede leer."""
+    if 'timestamp' not in data.raw:
+        return [None] * len(indices)
+    timestamps = pd.to_numeric(data.raw['timestamp'].iloc[list(indices)], errors='coerce')
+    return [None if pd.isna(moment) else moment.to_pydatetime()
+            for moment in pd.to_datetime(timestamps, unit='us')]
+
+
+def _save_triple_signals(symbol, timeframe, params, csv_file=None, signals=None, run_id=None):
+    # Importación diferida: save_triple_signals solo se carga al guardar señales
+    from save_triple_signals import TripleSignalSaver
+    saver = TripleSignalSaver(
+        tolerance=params['tolerance'],
+        min_zone_quality=params['min_zone_quality'],
+        min_trend_r_squared=params['min_trend_r_squared']
+    )
+    saver.run_id = run_id
+    return saver.save_signals(symbol, timeframe, csv_file, signals)
@@ -0,0 +1,49 @@
+"""
+pipeline_stages.py - Etapas del pipeline de detección, sus dependencias y parámetros por defecto
+
+Solo biblioteca estándar: los clientes ligeros (run_combined_detection.py con --service,
+detection_client.py) resuelven etapas y parámetros sin importar pandas ni los detectores.
+pipeline.py reexporta estos nombres.
+Ubicación: aipha/programs/stable/pipeline_stages.py
+"""
+
+# Etapas en orden de ejecución y las etapas de las que depende cada una.
+# 'segments' (ZigZag) no depende de las velas clave: stage_dag la ejecuta a la vez que 'candles'
+STAGES = ('candles', 'segments', 'zones', 'mini_trends', 'triples')
+STAGE_DEPENDENCIES = {
+    'candles': (),
+    'segments': (),
+    'zones': ('candles',),
+    'mini_trends': ('candles', 'segments'),
+    'triples': ('candles', 'zones', 'mini_trends'),
+}
+
+# Parámetros por defecto de cada etapa (los mismos que los scripts save_*)
+DEFAULT_PARAMS = {
+    'candles': {'volume_percentile': 70, 'body_threshold': 40, 'lookback': 30},
+    'zones': {'atr_period': 14, 'atr_multiplier': 1.0, 'volume_threshold': 1.1,
+              'quality_threshold': 3.0, 'recency_bonus': 0.1},
+    'segments': {'zigzag_threshold': 0.005, 'min_trend_bars': 5},
+    'mini_trends': {'poc_tol': 0.002, 'check_direction': False},
+    'triples': {'tolerance': 8, 'min_zone_quality': 0.5, 'min_trend_r_squared': 0.45},
+}
+
+
+def required_stages(stages):
+    """Etapas pedidas más sus dependencias, en orden de ejecución."""
+    needed = set()
+    pending = list(stages)
+    while pending:
+        stage = pending.pop()
+        if stage not in STAGE_DEPENDENCIES:
+            raise ValueError(f"Unknown pipeline stage: {stage}")
+        if stage not in needed:
+            needed.add(stage)
+            pending.extend(STAGE_DEPENDENCIES[stage])
+    return [stage for stage in STAGES if stage in needed]
+
+
+def stage_params(params=None):
+    """Parámetros por etapa: DEFAULT_PARAMS actualizado con los indicados."""
+    params = params or {}
+    return {stage: dict(DEFAULT_PARAMS[stage], **params.get(stage, {})) for stage in STAGES}
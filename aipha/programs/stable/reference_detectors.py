@@ -0,0 +1,386 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+reference_detectors.py - Implementaciones de referencia congeladas de los detectores
+
+Copias literales (sin logs ni prints de depuración) de los algoritmos tal como estaban antes de las
+optimizaciones, como funciones sobre DataFrames. NO se deben optimizar ni corregir: son el patrón
+con el que equivalence_harness.py compara los caminos rápidos. Si un cambio de comportamiento es
+intencionado, se actualiza aquí en un commit aparte que lo explique.
+- reference_key_candles: Detector.process_csv
+- reference_zigzag_pivots: MiniTrendDetector.detect_zigzag_pivots
+- reference_trend_volume_profile: MiniTrendDetector.calculate_volume_profile
+- reference_zone_volume_profile: AccumulationZoneDetector.calculate_volume_profile
+- reference_accumulation_zone: AccumulationZoneDetector.detect_accumulation_zone (requiere pandas_ta)
+- reference_signal_scores: TripleSignalSaver.calculate_signal_strength + calculate_combined_score
+- reference_triples: regla del JOIN SQL de TripleSignalSaver.find_triple_signals
+Ubicación: aipha/programs/stable/reference_detectors.py
+"""
+
+import numpy as np
+import pandas as pd
+
+# Parámetros por defecto de AccumulationZoneDetector
+ZONE_DEFAULTS = {
+    'atr_period': 14,
+    'atr_multiplier': 1.5,
+    'volume_threshold': 1.2,
+    'min_zone_bars': 5,
+    'volume_profile_bins': 50,
+    'mfi_period': 14,
+    'sma_period': 200,
+    'quality_threshold': 0.7
+}
+
+
+def reference_key_candles(data, volume_percentile_threshold=70, body_percentage_threshold=40, lookback_candles=30):
+    """
+    Detector.process_csv.
+    :param data: Vista candle_frame (open, high, low, close, volume)
+    :return: Lista de velas clave
+    """
+    key_candles = []
+    vpt = volume_percentile_threshold
+    bpt = body_percentage_threshold
+    lookback = lookback_candles
+    for idx in range(len(data)):
+        if idx < lookback:
+            continue
+        volume_percentile = float(np.percentile(data['volume'].iloc[idx - lookback:idx], vpt))
+        current = data.iloc[idx]
+        current_volume = float(current['volume'])
+        current_body_size = abs(float(current['close']) - float(current['open']))
+        current_range = float(current['high']) - float(current['low'])
+        if current_range == 0:
+            continue
+        body_percentage = 100 * current_body_size / current_range
+        if current_volume >= volume_percentile and body_percentage <= bpt:
+            key_candles.append({
+                'index': idx,
+                'open': float(current['open']),
+                'high': float(current['high']),
+                'low': float(current['low']),
+                'close': float(current['close']),
+                'volume': current_volume,
+                'volume_percentile': volume_percentile,
+                'body_percentage': body_percentage,
+            })
+    return key_candles
+
+
+def reference_zigzag_pivots(data, threshold=0.005):
+    """
+    MiniTrendDetector.detect_zigzag_pivots.
+    :param data: Vista bars
+    :return: Lista de índices de pivotes
+    """
+    if data is None or len(data) < 2:
+        return []
+    pivots = []
+    trend = None
+    last_pivot_idx = 0
+    last_pivot_price = data.iloc[0]['close']
+    for i in range(1, len(data)):
+        current_price = data.iloc[i]['close']
+        price_change = (current_price - last_pivot_price) / last_pivot_price
+        if trend is None and abs(price_change) >= threshold:
+            trend = price_change > 0
+            continue
+        if (trend and price_change <= -threshold) or (not trend and price_change >= threshold):
+            pivots.append(last_pivot_idx)
+            last_pivot_idx = i
+            last_pivot_price = current_price
+            trend = not trend
+        elif (trend and current_price > last_pivot_price) or (not trend and current_price < last_pivot_price):
+            last_pivot_idx = i
+            last_pivot_price = current_price
+    if pivots and pivots[-1] != last_pivot_idx:
+        pivots.append(last_pivot_idx)
+    return pivots
+
+
+def reference_trend_volume_profile(segment, num_bins=50):
+    """
+    MiniTrendDetector.calculate_volume_profile.
+    :param segment: Filas del segmento
+    :return: (POC, volumen total)
+    """
+    if len(segment) == 0:
+        return None, 0
+    price_min = segment['low'].min()
+    price_max = segment['high'].max()
+    price_range = price_max - price_min
+    if price_range < 0.001:
+        price_range = 0.001
+    bin_size = price_range / num_bins
+    volume_profile = np.zeros(num_bins)
+    for _, candle in segment.iterrows():
+        low_price = candle['low']
+        high_price = candle['high']
+        candle_volume = candle['volume']
+        low_bin_idx = max(0, min(int((low_price - price_min) / bin_size), num_bins - 1))
+        high_bin_idx = max(0, min(int((high_price - price_min) / bin_size), num_bins - 1))
+        if low_bin_idx == high_bin_idx:
+            volume_profile[low_bin_idx] += candle_volume
+        else:
+            candle_range = high_price - low_price
+            if candle_range <= 0:
+                close_bin_idx = max(0, min(int((candle['close'] - price_min) / bin_size), num_bins - 1))
+                volume_profile[close_bin_idx] += candle_volume
+            else:
+                for bin_idx in range(low_bin_idx, high_bin_idx + 1):
+                    bin_low = price_min + bin_idx * bin_size
+                    bin_high = price_min + (bin_idx + 1) * bin_size
+                    overlap_range = min(bin_high, high_price) - max(bin_low, low_price)
+                    if overlap_range > 0:
+                        volume_profile[bin_idx] += candle_volume * (overlap_range / candle_range)
+    poc_bin_idx = np.argmax(volume_profile)
+    poc_price = price_min + (poc_bin_idx + 0.5) * bin_size
+    return poc_price, segment['volume'].sum()
+
+
+def reference_zone_volume_profile(data, start_idx, end_idx, num_bins=50):
+    """
+    AccumulationZoneDetector.calculate_volume_profile.
+    :param data: Vista bars
+    :return: (POC, volumen total) de las velas start_idx a end_idx - 1
+    """
+    segment = data.iloc[start_idx:end_idx]
+    if len(segment) == 0:
+        return None, 0
+    price_min = segment['low'].min()
+    price_max = segment['high'].max()
+    price_range = price_max - price_min
+    if price_range < 0.001:
+        price_range = 0.001
+    bin_size = price_range / num_bins
+    volume_profile = np.zeros(num_bins)
+    for _, candle in segment.iterrows():
+        low_price = candle['low']
+        high_price = candle['high']
+        candle_volume = candle['volume']
+        low_bin_idx = max(0, min(int((low_price - price_min) / bin_size), num_bins - 1))
+        high_bin_idx = max(0, min(int((high_price - price_min) / bin_size), num_bins - 1))
+        if low_bin_idx == high_bin_idx:
+            volume_profile[low_bin_idx] += candle_volume
+        else:
+            candle_range = high_price - low_price or 0.001
+            for bin_idx in range(low_bin_idx, high_bin_idx + 1):
+                bin_low = price_min + bin_idx * bin_size
+                bin_high = price_min + (bin_idx + 1) * bin_size
+                overlap_range = max(0, min(bin_high, high_price) - max(bin_low, low_price))
+                volume_profile[bin_idx] += candle_volume * (overlap_range / candle_range)
+    poc_bin_idx = np.argmax(volume_profile)
+    poc_price = price_min + (poc_bin_idx + 0.5) * bin_size
+    return poc_price, segment['volume'].sum()
+
+
+def _reference_vwap(data, start_idx, end_idx):
+    prices = (data['high'].iloc[start_idx:end_idx] + data['low'].iloc[start_idx:end_idx] +
+              data['close'].iloc[start_idx:end_idx]) / 3
+    volumes = data['volume'].iloc[start_idx:end_idx]
+    vwap = (prices * volumes).cumsum() / volumes.cumsum()
+    return vwap.iloc[-1]
+
+
+def _reference_quality_score(data, params, start_idx, end_idx, range_width, avg_volume_zone, vwap, poc, mfi):
+    try:
+        try:
+            atr = data.ta.atr(length=params['atr_period']).iloc[start_idx:end_idx].mean()
+            if pd.isna(atr) or atr == 0:
+                atr = data['close'].iloc[end_idx] * 0.01
+        except Exception:
+            atr = data['close'].iloc[end_idx] * 0.01
+        try:
+            volume_percentile = np.percentile(data['volume'].iloc[max(0, start_idx - 150):end_idx], 65)
+        except Exception:
+            volume_percentile = avg_volume_zone * 1.2
+        try:
+            sma = data.ta.sma(length=params['sma_period']).iloc[end_idx]
+            if pd.isna(sma):
+                sma = data['close'].iloc[end_idx]
+        except Exception:
+            sma = data['close'].iloc[end_idx]
+
+        range_threshold = params['atr_multiplier'] * atr * 1.5
+        range_score = 1 - min(range_width / range_threshold, 1)
+        min_volume_score = 0.3
+        volume_score = min(avg_volume_zone / (volume_percentile * 0.8), 1) if volume_percentile > 0 else min_volume_score
+        volume_score = max(volume_score, min_volume_score)
+        vwap_score = 1 if abs(data['close'].iloc[end_idx] - vwap) / vwap <= 0.03 else 0.6
+        mfi_score = 1 if 30 <= mfi <= 70 else 0.6
+        context_score = 0.8
+        if not pd.isna(sma):
+            context_score = 1 if abs(data['close'].iloc[end_idx] - sma) / sma <= 0.02 else 0.8
+        quality = (0.35 * range_score + 0.35 * volume_score + 0.15 * vwap_score +
+                   0.1 * mfi_score + 0.05 * context_score)
+        num_bars = end_idx - start_idx
+        if num_bars >= 3:
+            quality += min(0.15, 0.05 * (num_bars - 2))
+        return min(quality, 1.0)
+    except Exception:
+        return 0.5
+
+
+def reference_accumulation_zone(data, candle_index, params=None):
+    """
+    AccumulationZoneDetector.detect_accumulation_zone (usa el accesor DataFrame.ta de pandas_ta).
+    :param data: Vista bars
+    :param params: Parámetros del detector (se completan con ZONE_DEFAULTS)
+    :return: Diccionario de la zona o None
+    """
+    import pandas_ta  # noqa: F401 (registra el accesor DataFrame.ta)
+    params = dict(ZONE_DEFAULTS, **(params or {}))
+    if data is None or candle_index < params['min_zone_bars'] + params['atr_period']:
+        return None
+    try:
+        atr_series = data.ta.atr(length=params['atr_period'])
+        atr_now = atr_series.iloc[candle_index] if candle_index < len(atr_series) else atr_series.iloc[-1]
+        dynamic_lookback = min(max(params['min_zone_bars'], int(atr_now / data['close'].iloc[candle_index] * 1000)), 50)
+        lookback = min(dynamic_lookback * 2, 50)
+        start_idx = max(0, candle_index - lookback)
+        if candle_index - start_idx < params['min_zone_bars']:
+            return None
+
+        atr = atr_series.iloc[start_idx:candle_index].mean()
+        if pd.isna(atr) or atr == 0:
+            atr = data['close'].iloc[candle_index] * 0.01
+
+        best_zone = None
+        best_quality = 0
+        min_window = max(params['min_zone_bars'], 2)
+        for window_size in range(min_window, min(lookback, 15) + 1):
+            for window_start in range(start_idx, candle_index - window_size + 1):
+                window_end = window_start + window_size
+                high_max = data['high'].iloc[window_start:window_end].max()
+                low_min = data['low'].iloc[window_start:window_end].min()
+                range_width = high_max - low_min
+                if range_width > params['atr_multiplier'] * atr * 1.5:
+                    continue
+                avg_volume_zone = data['volume'].iloc[window_start:window_end].mean()
+                global_avg_volume = data['volume'].iloc[max(0, start_idx - 50):candle_index].mean()
+                volume_threshold = max(0.5, params['volume_threshold']) * global_avg_volume
+                if avg_volume_zone < volume_threshold * 0.7:
+                    continue
+                vwap = _reference_vwap(data, window_start, window_end)
+                candle_high = data['high'].iloc[candle_index]
+                candle_low = data['low'].iloc[candle_index]
+                price_2pct = data['close'].iloc[candle_index] * 0.02
+                zone_touches_candle = (
+                    (low_min <= candle_high + price_2pct and high_max >= candle_low - price_2pct) or
+                    (abs(high_max - candle_low) <= price_2pct) or
+                    (abs(low_min - candle_high) <= price_2pct)
+                )
+                if not zone_touches_candle:
+                    continue
+                poc, vol_total = reference_zone_volume_profile(data, window_start, window_end,
+                                                               params['volume_profile_bins'])
+                try:
+                    mfi_series = data.ta.mfi(high=data['high'], low=data['low'], close=data['close'],
+                                             volume=data['volume'], length=params['mfi_period'])
+                    mfi = mfi_series.iloc[candle_index] if not pd.isna(mfi_series.iloc[candle_index]) else 50
+                except Exception:
+                    mfi = 50
+                quality = _reference_quality_score(data, params, window_start, window_end, range_width,
+                                                   avg_volume_zone, vwap, poc, mfi)
+                quality += 0.2 * (1 - (candle_index - window_end) / lookback)
+                if quality > best_quality and quality >= params['quality_threshold'] * 0.8:
+                    best_quality = quality
+                    best_zone = {
+                        'start_idx': window_start,
+                        'end_idx': window_end,
+                        'high': high_max,
+                        'low': low_min,
+                        'volume_avg': avg_volume_zone,
+                        'vol_total': vol_total,
+                        'vwap': vwap,
+                        'poc': poc,
+                        'mfi': mfi,
+                        'quality_score': quality,
+                        'datetime_start': data['datetime'].iloc[window_start],
+                        'datetime_end': data['datetime'].iloc[window_end]
+                    }
+        return best_zone
+    except Exception:
+        return None
+
+
+def reference_signal_scores(signal):
+    """
+    calculate_signal_strength y calculate_combined_score con los detalles ya calculados
+    (base provisional 0.5, como save_signals).
+    :return: (signal_strength, combined_score)
+    """
+    zone_quality_raw = min(signal['zone_quality_score'], 1.0)
+    zone_quality = (zone_quality_raw - 0.45) / 0.4 if zone_quality_raw > 0.45 else 0.1
+    zone_quality = min(zone_quality, 1.0)
+
+    trend_quality_raw = signal['trend_r_squared']
+    if trend_quality_raw >= 0.6:
+        trend_quality = trend_quality_raw * 1.3
+    elif trend_quality_raw >= 0.45:
+        trend_quality = trend_quality_raw * 1.0
+    else:
+        trend_quality = trend_quality_raw * 0.9
+    trend_quality = min(trend_quality, 1.0)
+    trend_direction = signal.get('trend_direction', '').lower()
+    direction_factor = 1.0
+    if trend_direction == 'alcista':
+        direction_factor = 1.15
+    elif trend_direction == 'bajista':
+        direction_factor = 0.9
+    slope_factor = min(abs(float(signal['trend_slope'])) / 100, 1.2)
+    trend_quality = min(trend_quality * direction_factor * slope_factor, 1.0)
+
+    volume_norm = min(float(signal['volume']) / 150, 1.0)
+    body_pct = float(signal['body_percentage'])
+    if body_pct < 5:
+        body_norm = 0.3
+    elif body_pct <= 15:
+        body_norm = 0.6
+    elif body_pct <= 40:
+        body_norm = 1.0
+    elif body_pct <= 60:
+        body_norm = 0.8
+    else:
+        body_norm = 0.6
+    candle_quality = 0.6 * volume_norm + 0.4 * body_norm
+    base_strength = 0.35 * zone_quality + 0.35 * trend_quality + 0.30 * candle_quality
+
+    component_scores = [round(zone_quality, 4), round(trend_quality, 4), round(candle_quality, 4)]
+    divergence_factor = 1 - ((max(component_scores) - min(component_scores)) * 0.5)
+    r_squared = float(signal.get('trend_r_squared', 0.5))
+    reliability_bonus = 0.0
+    if r_squared > 0.8:
+        reliability_bonus = 0.2
+    elif r_squared > 0.7:
+        reliability_bonus = 0.1
+    profit_potential = 0.6
+    if trend_direction == 'alcista' and float(signal.get('volume', 0)) > 80:
+        profit_potential = 0.85
+    elif trend_direction == 'alcista' and float(signal.get('volume', 0)) > 50:
+        profit_potential = 0.75
+    elif trend_direction == 'bajista' and signal.get('body_percentage', 0) > 20:
+        profit_potential = 0.7
+    combined_score = 0.5 * 0.5 + 0.2 * divergence_factor + 0.15 * (1.0 + reliability_bonus) + 0.15 * profit_potential
+    return round(base_strength, 4), round(min(combined_score, 1.0), 4)
+
+
+def reference_triples(candle_indices, zones, trends, tolerance=8, min_zone_quality=0.5, min_trend_r_squared=0.45):
+    """
+    Regla del JOIN SQL: la vela está dentro de la zona y de la tendencia con tolerancia,
+    con calidad y R² mínimos.
+    :param zones: Lista de (start_idx, end_idx, quality_score)
+    :param trends: Lista de (start_idx, end_idx, r_squared)
+    :return: Conjunto de (posición de vela, posición de zona, posición de tendencia)
+    """
+    triples = set()
+    for c_pos, idx in enumerate(candle_indices):
+        for z_pos, (zs, ze, quality) in enumerate(zones):
+            if quality < min_zone_quality or not (zs - tolerance <= idx <= ze + tolerance):
+                continue
+            for t_pos, (ts, te, r_squared) in enumerate(trends):
+                if r_squared >= min_trend_r_squared and ts - tolerance <= idx <= te + tolerance:
+                    triples.add((c_pos, z_pos, t_pos))
+    return triples
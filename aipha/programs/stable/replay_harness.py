@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+replay_harness.py - Reproducción acelerada del mercado con medición de latencia de extremo a extremo
+
+Reproduce los CSV de data/ (o archivos mayores, incluidos .zip de Binance) por live_engine.py en
+orden temporal, a la velocidad indicada (1x, 100x o sin esperas). Registra el instante en que se
+libera cada vela y el instante en que se genera cada evento (vela clave, mini-tendencia, zona, señal),
+e informa de:
+- Latencia cierre de vela -> evento por etapa (p50/p95/p99/máx, en ms).
+- Retraso de detección de las señales en velas (desde la vela clave hasta la vela que la completa).
+- Rendimiento: velas/s observadas y máximas sostenibles (solo tiempo de proceso).
+- Equivalencia: las señales de la reproducción deben coincidir exactamente con las del lote
+  (pipeline.py sobre los mismos datos concatenados por símbolo/timeframe).
+
+    python replay_harness.py data --speed 100
+
+Ubicación: aipha/programs/stable/replay_harness.py
+"""
+
+import os
+import sys
+import glob
+import time
+import asyncio
+import argparse
+import logging
+import traceback
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+from sql_indexes import scope_from_csv
+from log_config import configure_logging
+from live_engine import LiveEngine, CsvReplaySource
+from pipeline import (BINANCE_COLUMNS, PipelineData, stage_params, detect_key_candles, detect_zones,
+                      segment_mini_trends, find_triple_signals)
+
+# Percentiles de latencia que se informan
+LATENCY_PERCENTILES = (50, 95, 99)
+
+
+def find_replay_files(paths):
+    """CSV y ZIP de Binance de las rutas indicadas (archivos o directorios, recursivo)."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for pattern in ('*.csv', '*.zip'):
+                files.extend(glob.glob(os.path.join(path, '**', pattern), recursive=True))
+        elif os.path.exists(path):
+            files.append(path)
+    # Solo archivos con formato SYMBOL-timeframe-fecha
+    return sorted(f for f in set(files) if scope_from_csv(f)[1] is not None)
+
+
+def group_by_scope(files):
+    """Archivos por (símbolo, timeframe), en orden de fecha (el del nombre)."""
+    groups = defaultdict(list)
+    for csv_file in files:
+        groups[scope_from_csv(csv_file)].append(csv_file)
+    return {scope: sorted(group, key=os.path.basename) for scope, group in groups.items()}
+
+
+def signal_key(signal):
+    """Identidad de una señal para comparar reproducción y lote."""
+    return (signal['symbol'], signal['timeframe'], int(signal['candle_index']), int(signal['zone_id']),
+            int(signal['trend_id']), round(float(signal['combined_score']), 9))
+
+
+def batch_signals(files, params=None, zone_search=None):
+    """
+    Señales del lote para un símbolo/timeframe: pipeline.py sobre los archivos concatenados,
+    como los recibe el motor en vivo.
+    :param zone_search: Búsqueda de zona alternativa (la misma que se pase al motor en vivo)
+    """
+    params = stage_params(params)
+    raw = pd.concat([pd.read_csv(f, names=BINANCE_COLUMNS, header=None) for f in files], ignore_index=True)
+    data = PipelineData(files[0], raw=raw)
+    candles, _ = detect_key_candles(data, params['candles'])
+    segments, _ = segment_mini_trends(data, params['segments'])
+    if zone_search is None:
+        zones, _ = detect_zones(data, candles, params['zones'])
+    else:
+        zones = [zone for zone in (zone_search(data.bars, c['index']) for c in candles) if zone]
+    signals, _ = find_triple_signals(data, candles, zones, segments, params['triples'])
+    return signals
+
+
+def percentiles(values, scale=1.0):
+    values = np.asarray(values, dtype=float) * scale
+    if len(values) == 0:
+        return None
+    summary = {f"p{p}": float(np.percentile(values, p)) for p in LATENCY_PERCENTILES}
+    summary['max'] = float(values.max())
+    summary['count'] = int(len(values))
+    return summary
+
+
+class ReplayRecorder:
+    """Marca el instante de liberación de cada vela y recoge los eventos del motor."""
+    def __init__(self):
+        self.released = {}
+        self.rows = defaultdict(int)
+        self.events = []
+
+    async def wrap(self, source):
+        async for kline in source:
+            scope = (kline.symbol, kline.timeframe)
+            self.released[scope + (self.rows[scope],)] = time.perf_counter()
+            self.rows[scope] += 1
+            yield kline
+
+    def on_event(self, event):
+        self.events.append(event)
+
+    def latency(self, event):
+        """Segundos desde que se liberó la vela que produjo el evento hasta que se generó."""
+        return event.at - self.released[(event.symbol, event.timeframe, event.bar)]
+
+
+def run_replay(files, speed=None, params=None, zone_search=None, check=True):
+    """
+    Reproduce los archivos por el motor en vivo y mide latencias, rendimiento y equivalencia.
+    :param speed: Aceleración (1 = tiempo real); None o 0 = tan rápido como sea posible
+    :param check: Comparar las señales con las del lote
+    :return: Diccionario con el informe
+    """
+    recorder = ReplayRecorder()
+    engine = LiveEngine(params=params, zone_search=zone_search, on_event=recorder.on_event, kinds=None)
+    source = CsvReplaySource(files, speed=speed or None)
+
+    started = time.perf_counter()
+    stats = asyncio.run(engine.run(recorder.wrap(source)))
+    seconds = time.perf_counter() - started
+    busy = float(np.sum(engine.bar_seconds)) if engine.bar_seconds else 0.0
+
+    by_kind = defaultdict(list)
+    for event in recorder.events:
+        by_kind[event.kind].append(recorder.latency(event))
+    signals = [event for event in recorder.events if event.kind == 'signal']
+
+    report = {
+        'files': len(files),
+        'bars': stats.get('bars', 0),
+        'speed': speed or None,
+        'seconds': seconds,
+        'throughput': stats.get('bars', 0) / seconds if seconds > 0 else 0.0,
+        'max_throughput': stats.get('bars', 0) / busy if busy > 0 else 0.0,
+        'bar_processing': stats,
+        'latency_ms': {kind: percentiles(values, 1000.0) for kind, values in by_kind.items()},
+        'signal_delay_bars': percentiles([event.bar - event.payload['candle_index'] for event in signals]),
+        'signals': len(signals),
+    }
+
+    if check:
+        live_keys = sorted(signal_key(event.payload) for event in signals)
+        batch_keys = []
+        for scope, group in group_by_scope(files).items():
+            batch_keys.extend(signal_key(signal) for signal in batch_signals(group, params, zone_search))
+        batch_keys.sort()
+        live_set, batch_set = set(live_keys), set(batch_keys)
+        report['equivalence'] = {
+            'match': live_keys == batch_keys,
+            'batch_signals': len(batch_keys),
+            'missing': sorted(batch_set - live_set)[:10],
+            'extra': sorted(live_set - batch_set)[:10],
+        }
+    return report
+
+
+def format_report(report):
+    speed = f"{report['speed']:g}x" if report['speed'] else 'sin esperas'
+    lines = [f"Reproducción de {report['files']} archivos, {report['bars']} velas ({speed}) en {report['seconds']:.2f}s"]
+    lines.append(f"Rendimiento: {report['throughput']:,.0f} velas/s observadas, "
+                 f"{report['max_throughput']:,.0f} velas/s máximas sostenibles")
+    lines.append("Latencia cierre de vela -> evento (ms):")
+    for kind in ('key_candle', 'mini_trend', 'zone', 'signal'):
+        summary = report['latency_ms'].get(kind)
+        if summary:
+            values = ' '.join(f"{name}={summary[name]:.3f}" for name in [f"p{p}" for p in LATENCY_PERCENTILES] + ['max'])
+            lines.append(f"  {kind:<11} n={summary['count']:<6} {values}")
+    delay = report['signal_delay_bars']
+    if delay:
+        lines.append(f"Retraso de las señales desde la vela clave: p50={delay['p50']:.0f} velas, máx={delay['max']:.0f} velas")
+    equivalence = report.get('equivalence')
+    if equivalence:
+        status = 'coinciden' if equivalence['match'] else 'NO coinciden'
+        lines.append(f"Equivalencia con el lote: {status} ({report['signals']} en vivo, "
+                     f"{equivalence['batch_signals']} en lote)")
+        for name in ('missing', 'extra'):
+            for key in equivalence[name]:
+                lines.append(f"  {name}: {key}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproducción acelerada del mercado con medición de latencia")
+    parser.add_argument('paths', nargs='*', default=['data'], help='CSV/ZIP o directorios a reproducir (por defecto data/)')
+    parser.add_argument('--speed', type=float, default=0, help='Aceleración (1 = tiempo real, 100 = 100x, 0 = sin esperas)')
+    parser.add_argument('--no-check', action='store_true', help='No comparar las señales con el lote')
+    args = parser.parse_args()
+
+    configure_logging(level=logging.WARNING, fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    files = find_replay_files(args.paths)
+    if not files:
+        logging.error(f"No hay archivos SYMBOL-timeframe-fecha en {args.paths}")
+        return False
+    report = run_replay(files, speed=args.speed, check=not args.no_check)
+    print(format_report(report))
+    return report.get('equivalence', {}).get('match', True)
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(0 if main() else 1)
+    except Exception as e:
+        logging.error(f"Error inesperado: {str(e)}")
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,146 @@
+"""
+result_reader.py - Lectura columnar y filtrada de las tablas de resultados
+
+Lee de MySQL solo las columnas pedidas, con los filtros de símbolo, timeframe y rango de tiempo
+dentro de la consulta (resueltos por los índices de ámbito), y materializa el resultado
+directamente en arrays NumPy o en un DataFrame. Usa un cursor raw, de modo que el conector no
+convierte cada valor a un objeto Python: las columnas numéricas y de fecha se convierten en
+bloque con NumPy.
+Ubicación: aipha/programs/stable/result_reader.py
+"""
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+from storage import TABLE_SCHEMAS
+
+# Tipos genéricos numéricos (ver storage.TABLE_SCHEMAS)
+_NUMERIC_KINDS = ('INT', 'FLOAT', 'BOOL')
+# Columnas comunes a todas las tablas que no están en TABLE_SCHEMAS
+_COMMON_KINDS = {'id': 'INT', 'run_id': 'TEXT', 'created_at': 'DATETIME'}
+
+
+def column_kind(table_name, column):
+    """Tipo genérico (INT, FLOAT, BOOL, TEXT o DATETIME) de una columna, TEXT si no se conoce."""
+    kinds = dict(TABLE_SCHEMAS.get(table_name, ()))
+    return kinds.get(column) or _COMMON_KINDS.get(column, 'TEXT')
+
+
+def build_query(table_name, columns, symbol=None, timeframe=None, start=None, end=None,
+                time_column='datetime', filters=None, order_by=None, limit=None):
+    """
+    Construye la consulta SELECT con los filtros en el WHERE.
+    :param filters: Diccionario columna -> valor (igualdad) o lista/tupla de valores (IN)
+    :param start: Inicio del rango sobre time_column (incluido)
+    :param end: Fin del rango sobre time_column (excluido)
+    :return: (consulta, parámetros)
+    """
+    conditions = []
+    params = []
+    if symbol is not None:
+        conditions.append("symbol = %s")
+        params.append(symbol)
+    if timeframe is not None:
+        conditions.append("timeframe = %s")
+        params.append(timeframe)
+    if start is not None:
+        conditions.append(f"{time_column} >= %s")
+        params.append(start)
+    if end is not None:
+        conditions.append(f"{time_column} < %s")
+        params.append(end)
+    for column, value in (filters or {}).items():
+        if isinstance(value, (list, tuple, np.ndarray)):
+            if len(value) == 0:
+                conditions.append("1 = 0")
+                continue
+            conditions.append(f"{column} IN ({', '.join(['%s'] * len(value))})")
+            params.extend(value)
+        elif value is None:
+            conditions.append(f"{column} IS NULL")
+        else:
+            conditions.append(f"{column} = %s")
+            params.append(value)
+
+    query = f"SELECT {', '.join(columns)} FROM {table_name}"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    if order_by:
+        query += f" ORDER BY {order_by}"
+    if limit is not None:
+        query += f" LIMIT {int(limit)}"
+    return query, tuple(params)
+
+
+def _text(value):
+    return bytes(value).decode('utf-8') if isinstance(value, (bytes, bytearray)) else value
+
+
+def _column_array(values, kind):
+    """
+    Convierte los valores de una columna (bytes del cursor raw o valores ya convertidos) en un array.
+    INT/BOOL sin nulos -> int64; numéricos con nulos -> float64 con NaN; DATETIME -> datetime64[s]
+    con NaT; el resto -> array de objetos con cadenas.
+    """
+    if kind in _NUMERIC_KINDS:
+        if values and isinstance(values[0], (bytes, bytearray)):
+            parsed = np.array([b'nan' if v is None else bytes(v) for v in values], dtype='S').astype(np.float64)
+        else:
+            parsed = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+        if kind != 'FLOAT' and not np.isnan(parsed).any():
+            return parsed.astype(np.int64)
+        return parsed
+    if kind == 'DATETIME':
+        return np.array([_text(v) for v in values], dtype='datetime64[s]')
+    array = np.empty(len(values), dtype=object)
+    array[:] = [_text(v) for v in values]
+    return array
+
+
+def _raw_cursor(connection):
+    """Cursor raw de mysql-connector; otros conectores DB-API usan su cursor normal."""
+    try:
+        return connection.cursor(raw=True)
+    except TypeError:
+        return connection.cursor()
+
+
+def read_columns(connection, table_name, columns, symbol=None, timeframe=None, start=None, end=None,
+                 time_column='datetime', filters=None, order_by=None, limit=None, kinds=None):
+    """
+    Lee las columnas pedidas de una tabla de resultados con los filtros en la consulta.
+
+        candles = read_columns(conn, 'key_candles', ['candle_index', 'close'],
+                               symbol='BTCUSDT', timeframe='5m', order_by='candle_index')
+        candles['candle_index']  # array int64
+
+    :param connection: Conexión abierta (del pool de db_pool)
+    :param table_name: Tabla a leer
+    :param columns: Columnas a leer
+    :param kinds: Diccionario opcional columna -> tipo genérico, si no se deduce de storage.TABLE_SCHEMAS
+    :return: Diccionario columna -> array NumPy (vacío con todas las columnas si no hay filas)
+    """
+    query, params = build_query(table_name, columns, symbol, timeframe, start, end,
+                                time_column, filters, order_by, limit)
+    cursor = _raw_cursor(connection)
+    try:
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    kinds = kinds or {}
+    values = list(zip(*rows)) if rows else [()] * len(columns)
+    return {
+        column: _column_array(list(column_values), kinds.get(column) or column_kind(table_name, column))
+        for column, column_values in zip(columns, values)
+    }
+
+
+def read_frame(connection, table_name, columns, **kwargs):
+    """Igual que read_columns, pero devuelve un DataFrame con las columnas en el orden pedido."""
+    return pd.DataFrame(read_columns(connection, table_name, columns, **kwargs), columns=list(columns))
@@ -0,0 +1,243 @@
+"""
+run_cache.py - Registro de ejecuciones direccionado por contenido
+
+Guarda, para cada etapa de detección ejecutada, la clave (hash SHA-256 del CSV, etapa, hash de
+parámetros, versión de código) y dónde quedó su salida (tabla, símbolo/timeframe y run_id).
+Si una etapa se vuelve a pedir con la misma clave y su salida sigue siendo la última escrita en ese
+ámbito, se puede omitir y reutilizar la salida existente aguas abajo. El registro es un archivo
+SQLite local (AIPHA_RUN_LEDGER), sin servidor.
+
+Las tablas de resultados se reemplazan por archivo dentro de su (symbol, timeframe) (ver
+sql_indexes.scope_filter), así que el ámbito es ese mismo (ledger_scope): una salida solo es
+reutilizable mientras ninguna otra ejecución haya escrito después en el mismo archivo; lookup()
+lo comprueba, y ejecutar otro día del mismo par no invalida los anteriores. Las escrituras hechas fuera del registro (lanzando los scripts a mano) no se ven:
+usar --force en ese caso.
+Ubicación: aipha/programs/stable/run_cache.py
+"""
+
+import os
+import sys
+import ast
+import json
+import sqlite3
+import hashlib
+import threading
+import logging
+from collections import namedtuple
+from datetime import datetime
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+from param_sets import param_hash
+from sql_indexes import scope_from_csv, scope_file
+
+# Ruta por defecto del registro
+DEFAULT_LEDGER_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../data/run_ledger.sqlite'))
+
+# Tamaño de bloque al calcular el hash de un archivo
+HASH_CHUNK_SIZE = 1 << 20
+
+# Clave de una ejecución de etapa
+RunKey = namedtuple('RunKey', ['csv_hash', 'stage', 'param_hash', 'code_version'])
+
+
+def ledger_scope(csv_file):
+    """
+    Ámbito que reemplaza una ejecución sobre el CSV: sus filas (symbol, timeframe, csv_file),
+    como scope_filter en los savers ('BTCUSDT-5m/BTCUSDT-5m-2025-04-16.csv').
+    Si el nombre no sigue el formato, la ruta absoluta del CSV.
+    """
+    symbol, timeframe = scope_from_csv(csv_file)
+    if symbol and timeframe:
+        return f"{symbol}-{timeframe}/{scope_file(csv_file)}"
+    return os.path.abspath(csv_file)
+
+# (ruta, tamaño, mtime) -> hash, para no releer el mismo CSV dentro del proceso
+_file_hashes = {}
+# (ruta, tamaño, mtime) -> módulos locales importados por ese archivo fuente
+_file_imports = {}
+_lock = threading.Lock()
+
+
+def file_sha256(path):
+    """Hash SHA-256 del contenido de un archivo, leído por bloques y cacheado por (ruta, tamaño, mtime)."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    digest = _file_hashes.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        with _lock:
+            _file_hashes[key] = digest
+    return digest
+
+
+def local_imports(path):
+    """
+    Módulos de este directorio que importa un archivo fuente (incluidas las importaciones dentro
+    de funciones), como nombres de archivo. Cacheado por (ruta, tamaño, mtime).
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    names = _file_imports.get(key)
+    if names is None:
+        with open(path, 'rb') as f:
+            tree = ast.parse(f.read(), filename=path)
+        modules = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                modules.update(alias.name.split('.')[0] for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                modules.add(node.module.split('.')[0])
+        base_dir = os.path.dirname(path)
+        names = frozenset(f"{m}.py" for m in modules if os.path.isfile(os.path.join(base_dir, f"{m}.py")))
+        with _lock:
+            _file_imports[key] = names
+    return names
+
+
+def source_closure(*source_files):
+    """Archivos fuente de una etapa más todos los módulos locales que importan, transitivamente."""
+    base_dir = os.path.abspath(os.path.dirname(__file__))
+    seen = set()
+    pending = list(source_files)
+    while pending:
+        name = pending.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        pending.extend(local_imports(os.path.join(base_dir, name)) - seen)
+    return sorted(seen)
+
+
+def code_version(*source_files):
+    """
+    Versión del código de una etapa: hash de sus archivos fuente (relativos a este directorio) y de
+    los módulos locales que importan, de modo que un cambio en un módulo auxiliar también invalida la etapa.
+    AIPHA_CODE_VERSION, si está definido, tiene prioridad.
+    """
+    override = os.getenv('AIPHA_CODE_VERSION')
+    if override:
+        return override
+    sha = hashlib.sha256()
+    base_dir = os.path.abspath(os.path.dirname(__file__))
+    for name in source_closure(*source_files):
+        sha.update(name.encode('utf-8'))
+        sha.update(file_sha256(os.path.join(base_dir, name)).encode('ascii'))
+    return sha.hexdigest()[:16]
+
+
+class RunLedger:
+    """
+    Registro de ejecuciones por etapa.
+
+        ledger = RunLedger()
+        key = ledger.key(csv_file, 'candles', params, code_version('detect_candles.py'))
+        output = ledger.lookup(key, scope=ledger_scope(csv_file))
+        if output is None:
+            output = run_stage()
+            ledger.record(key, ledger_scope(csv_file), output, csv_file)
+    """
+    def __init__(self, path=None):
+        """
+        :param path: Archivo SQLite del registro (por defecto AIPHA_RUN_LEDGER o aipha/data/run_ledger.sqlite)
+        """
+        self.path = path or os.getenv('AIPHA_RUN_LEDGER') or DEFAULT_LEDGER_PATH
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+        CREATE TABLE IF NOT EXISTS stage_runs (
+            csv_hash TEXT NOT NULL,
+            stage TEXT NOT NULL,
+            param_hash TEXT NOT NULL,
+            code_version TEXT NOT NULL,
+            scope TEXT,
+            output TEXT,
+            csv_file TEXT,
+            seconds REAL,
+            recorded_at TEXT,
+            seq INTEGER,
+            PRIMARY KEY (csv_hash, stage, param_hash, code_version)
+        )
+        """)
+        self.connection.execute("CREATE INDEX IF NOT EXISTS idx_stage_runs_scope ON stage_runs (stage, scope, seq)")
+        self.connection.commit()
+
+    def key(self, csv_file, stage, params, version):
+        """
+        Clave de una etapa.
+        :param csv_file: CSV de entrada (se usa el hash de su contenido, no la ruta)
+        :param stage: Nombre de la etapa (candles, zones, ...)
+        :param params: Diccionario de parámetros; incluir el run_id de la etapa anterior si depende de ella
+        :param version: Versión del código (ver code_version)
+        """
+        return RunKey(file_sha256(csv_file), stage, param_hash(params), version)
+
+    def lookup(self, key, scope):
+        """
+        Salida registrada para la clave, si sigue siendo la última escrita en el ámbito.
+        :return: Diccionario con la salida, o None si la etapa debe ejecutarse
+        """
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT output, seq FROM stage_runs WHERE csv_hash = ? AND stage = ? AND param_hash = ? "
+                "AND code_version = ?", tuple(key)
+            ).fetchone()
+            if row is None:
+                return None
+            latest = self.connection.execute(
+                "SELECT MAX(seq) FROM stage_runs WHERE stage = ? AND scope IS ?", (key.stage, scope)
+            ).fetchone()[0]
+        if latest != row[1]:
+            # Otra ejecución reemplazó después el mismo ámbito
+            return None
+        return json.loads(row[0]) if row[0] else {}
+
+    def record(self, key, scope, output, csv_file=None, seconds=None):
+        """
+        Registra la salida de una etapa ejecutada, como la más reciente de su ámbito.
+        :param scope: Ámbito que la etapa reemplaza (ver ledger_scope)
+        :param output: Diccionario serializable con la ubicación de la salida
+        """
+        with self._lock:
+            seq = self.connection.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM stage_runs").fetchone()[0]
+            self.connection.execute(
+                "INSERT OR REPLACE INTO stage_runs (csv_hash, stage, param_hash, code_version, scope, output, "
+                "csv_file, seconds, recorded_at, seq) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                tuple(key) + (scope, json.dumps(output, default=str), csv_file, seconds,
+                              datetime.now().isoformat(timespec='seconds'), seq)
+            )
+            self.connection.commit()
+        logging.info(f"Run ledger: recorded {key.stage} for {scope}")
+
+    def forget(self, stage=None, scope=None):
+        """Borra entradas del registro (todas, o las de una etapa y/o ámbito)."""
+        conditions = []
+        params = []
+        if stage is not None:
+            conditions.append("stage = ?")
+            params.append(stage)
+        if scope is not None:
+            conditions.append("scope = ?")
+            params.append(scope)
+        query = "DELETE FROM stage_runs" + (" WHERE " + " AND ".join(conditions) if conditions else "")
+        with self._lock:
+            self.connection.execute(query, params)
+            self.connection.commit()
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -4,46 +4,118 @@
 """
 run_combined_detection.py - Script para ejecutar la detección de velas clave y zonas de acumulación en secuencia
 
-Este script coordina la ejecución de save_detect_candles.py y save_detect_accumulation_zone.py
-para asegurar que usen los mismos parámetros y datos, permitiendo una integración efectiva
-de la detección de velas clave con zonas de acumulación.
+Ejecuta las etapas de pipeline.py (velas clave, zonas de acumulación y, con --stages o --use-mini-trends, mini-tendencias
+y señales triples) en un solo proceso: el CSV se carga una vez, cada etapa recibe en memoria la salida
+de la anterior y DatabaseSink guarda los resultados en segundo plano con los mismos savers que los
+scripts save_*.py. Los parámetros de velas clave (VPT, BPT, lookback) se aplican a la detección.
+Cada etapa se registra en run_cache.RunLedger: si el CSV, los parámetros y el código no cambiaron
+desde la última ejecución sobre ese archivo, la etapa se omite y su salida se lee de la base de datos.
+Con --storage sqlite o duckdb los resultados se guardan en un archivo embebido (pipeline.StoreSink sobre
+storage.py) en lugar de MySQL, sin servidor de base de datos; por defecto AIPHA_STORAGE_BACKEND o mysql.
+Con --service el trabajo se envía al servicio de detección persistente (detection_service.py), que ya
+tiene pandas, pandas_ta y los datos en caliente; este proceso solo importa la biblioteca estándar y numpy.
 """
 
 import os
 import sys
 import argparse
 import logging
-import subprocess
 import traceback
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+from run_cache import RunLedger, code_version, ledger_scope
+from sql_indexes import current_run_id
+from stage_dag import format_report
+from log_config import configure_logging
+from pipeline_stages import STAGES, STAGE_DEPENDENCIES, required_stages, stage_params
 
-def run_command(command, description):
+# Archivos fuente de cada etapa (su hash forma parte de la clave de caché)
+STAGE_SOURCES = {
+    'candles': ('detect_candles.py', 'save_detect_candles.py', 'pipeline.py'),
+    'zones': ('detect_accumulation_zone.py', 'save_detect_accumulation_zone.py', 'mini_trend.py', 'pipeline.py'),
+    'segments': ('mini_trend.py', 'pipeline.py'),
+    'mini_trends': ('mini_trend.py', 'save_mini_trend.py', 'pipeline.py'),
+    'triples': ('save_triple_signals.py', 'interval_join.py', 'batch_scoring.py', 'pipeline.py'),
+}
+
+# Tablas que escribe cada etapa ('segments' no se persiste: forma parte de la clave de 'mini_trends')
+STAGE_TABLES = {
+    'candles': ('key_candles', 'detection_sessions', 'detection_params'),
+    'zones': ('detect_accumulation_zone_results', 'mini_trends', 'key_candles'),
+    'mini_trends': ('mini_trend_results',),
+    'triples': ('triple_signals',),
+}
+
+def plan_stages(ledger, csv_file, scope, stages, params, force=False):
     """
-    Ejecuta un comando y registra su salida en el log
+    Decide qué etapas pueden reutilizarse según el registro de ejecuciones.
+    Cada etapa incluye en su clave el run_id de las etapas de las que depende: si una etapa
+    anterior se vuelve a ejecutar (run_id nuevo), las siguientes también.
+    :return: (claves por etapa, salidas reutilizables por etapa)
     """
-    logging.info(f"Ejecutando: {description}")
-    logging.info(f"Comando: {command}")
-    
-    try:
-        result = subprocess.run(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            check=True
-        )
-        logging.info(f"Resultado exitoso: {description}")
-        logging.info(f"Salida: {result.stdout}")
-        return True
-    except subprocess.CalledProcessError as e:
-        logging.error(f"Error en {description}: {e}")
-        logging.error(f"Salida de error: {e.stderr}")
-        return False
+    keys = {}
+    reused = {}
+    run_ids = {}
+    for stage in stages:
+        if stage not in STAGE_TABLES:
+            continue
+        stage_key_params = dict(params[stage])
+        upstream = []
+        for dep in STAGE_DEPENDENCIES[stage]:
+            if dep in STAGE_TABLES:
+                upstream.append(run_ids[dep])
+            else:
+                stage_key_params[dep] = params[dep]
+        if upstream:
+            stage_key_params['upstream'] = upstream
+        keys[stage] = ledger.key(csv_file, stage, stage_key_params, code_version(*STAGE_SOURCES[stage]))
+        output = None if force else ledger.lookup(keys[stage], scope)
+        if output is not None:
+            logging.info(f"{stage}: sin cambios desde la ejecución {output.get('run_id')}, se omite")
+            reused[stage] = output
+            run_ids[stage] = output.get('run_id')
+        else:
+            run_ids[stage] = current_run_id()
+    return keys, reused
+
+def run_in_process(args, stages, params, reused):
+    """
+    Un solo proceso: el CSV se carga una vez y las etapas reutilizadas se leen de la base de datos
+    (o del almacenamiento de --storage).
+    :return: (segundos por etapa, informe de tiempos)
+    """
+    # Importación diferida: con --service este proceso no carga pandas ni los detectores
+    from pipeline import DatabaseSink, StoreSink, run_pipeline
+    if args.storage == 'mysql':
+        sink = DatabaseSink(max_pending=args.max_pending_writes)
+    else:
+        from storage import open_store
+        sink = StoreSink(open_store(args.storage, args.storage_path), max_pending=args.max_pending_writes)
+    # Las escrituras deben terminar (también si la detección falla) antes de registrar las etapas
+    with sink:
+        loaders = {'candles': sink.load_candles, 'zones': sink.load_zones, 'mini_trends': sink.load_mini_trends,
+                   'triples': lambda data: []}
+        data = run_pipeline(args.csv, params=params, stages=stages, sinks=[sink],
+                            reuse={stage: loaders[stage] for stage in reused}, max_workers=args.workers,
+                            executor=args.executor)
+    return data.timings, format_report(data.dag_result)
+
+def run_in_service(args, stages, params, reused):
+    """
+    El trabajo se ejecuta en el servicio de detección persistente (ya en caliente), que guarda
+    en la base de datos y responde cuando las escrituras han terminado.
+    :return: (segundos por etapa, informe de tiempos)
+    """
+    from detection_client import DEFAULT_SOCKET, connect_or_start
+    with connect_or_start(args.service or DEFAULT_SOCKET) as client:
+        response = client.run(args.csv, stages=stages, params=params, sink='db', reuse=reused,
+                              workers=args.workers, executor=args.executor, max_pending_writes=args.max_pending_writes,
+                              run_id=current_run_id(), storage=args.storage, storage_path=args.storage_path,
+                              return_outputs=False)
+    report = '\n'.join(f"{stage:<12} {seconds:7.2f}s{' (caché del servicio)' if stage in response['cached'] else ''}"
+                       for stage, seconds in response['timings'].items())
+    return response['timings'], report
 
 def main():
     parser = argparse.ArgumentParser(description="Ejecutar detección combinada de velas clave y zonas de acumulación")
@@ -56,55 +128,91 @@ def main():
     parser.add_argument('--volume-threshold', type=float, default=1.1, help='Umbral de volumen (menor = más zonas)')
     parser.add_argument('--quality-threshold', type=float, default=3.0, help='Umbral de calidad para validación')
     parser.add_argument('--recency-bonus', type=float, default=0.1, help='Bonificación por proximidad temporal')
-    parser.add_argument('--use-mini-trends', action='store_true', help='Activar análisis de mini-tendencias')
-    parser.add_argument('--verbose', action='store_true', help='Mostrar información detallada')
+    parser.add_argument('--use-mini-trends', action='store_true', help='Añadir la etapa de mini-tendencias a --stages')
+    parser.add_argument('--verbose', action='store_true', help='Mostrar información detallada (nivel DEBUG)')
+    parser.add_argument('--force', action='store_true', help='Ejecutar todas las etapas aunque no hayan cambiado')
+    parser.add_argument('--no-cache', action='store_true', help='No consultar ni actualizar el registro de ejecuciones')
+    parser.add_argument('--stages', type=str, default='candles,zones',
+                        help=f"Etapas separadas por comas ({','.join(STAGES)}) o 'all'")
+    parser.add_argument('--workers', type=int, default=2, help='Hilos o procesos para ejecutar a la vez las etapas independientes')
+    parser.add_argument('--executor', choices=['thread', 'process'], default='thread',
+                        help='Pool de las etapas: hilos (solapan E/S y pandas) o procesos (etapas de CPU en Python puro)')
+    parser.add_argument('--max-pending-writes', type=int, default=2, help='Etapas pendientes de guardar antes de pausar la detección')
+    parser.add_argument('--service', type=str, nargs='?', const='', default=None,
+                        help='Enviar el trabajo al servicio de detección persistente (socket opcional; se arranca si no está)')
+    parser.add_argument('--storage', choices=['mysql', 'sqlite', 'duckdb'],
+                        default=os.getenv('AIPHA_STORAGE_BACKEND', 'mysql').lower(),
+                        help='Dónde guardar los resultados: MySQL o un archivo embebido sin servidor (sqlite, duckdb)')
+    parser.add_argument('--storage-path', type=str, default=None,
+                        help='Archivo de --storage sqlite/duckdb (por defecto AIPHA_STORAGE_PATH o aipha/data/aipha_results.*)')
     
     args = parser.parse_args()
+    # Ruta absoluta: el servicio de detección puede tener otro directorio de trabajo
+    args.storage_path = args.storage_path or os.getenv('AIPHA_STORAGE_PATH')
+    if args.storage_path:
+        args.storage_path = os.path.abspath(args.storage_path)
+    configure_logging(level=logging.DEBUG if args.verbose else logging.INFO,
+                      fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     
     # Verifica si el archivo CSV existe
     if not os.path.exists(args.csv):
         logging.error(f"El archivo CSV no existe: {args.csv}")
         return False
     
-    # 1. Primero ejecutar detección de velas clave
-    candles_cmd = [
-        sys.executable,
-        os.path.join(os.path.dirname(__file__), "save_detect_candles.py"),
-        "--csv", args.csv
-    ]
+    requested = list(STAGES) if args.stages == 'all' else [s.strip() for s in args.stages.split(',') if s.strip()]
+    if args.use_mini_trends and 'mini_trends' not in requested:
+        requested.append('mini_trends')
+    stages = required_stages(requested)
+    params = stage_params({
+        'candles': {
+            'volume_percentile': args.volume_percentile,
+            'body_threshold': args.body_threshold,
+            'lookback': args.lookback,
+        },
+        'zones': {
+            'atr_period': args.atr_period,
+            'atr_multiplier': args.atr_multiplier,
+            'volume_threshold': args.volume_threshold,
+            'quality_threshold': args.quality_threshold,
+            'recency_bonus': args.recency_bonus,
+        },
+    })
+    logging.info(f"Parámetros de velas clave: VPT={args.volume_percentile}, BPT={args.body_threshold}, lookback={args.lookback}")
     
-    # Añade la lógica para modificar los parámetros de detección de velas clave por código
-    cmd_str = " ".join(candles_cmd)
-    logging.info(f"NOTA: Los parámetros de detección de velas clave se modificarán en el código (VPT={args.volume_percentile}, BPT={args.body_threshold}, lookback={args.lookback})")
+    # Registro de ejecuciones: clave = (hash del CSV, etapa, hash de parámetros, versión de código)
+    ledger = None if args.no_cache else RunLedger()
+    # Las tablas se reemplazan por archivo: otro día del mismo par no invalida este. Cada almacenamiento
+    # tiene sus propias tablas: una ejecución guardada en MySQL no sirve para reutilizar en SQLite
+    scope = ledger_scope(args.csv)
+    if args.storage != 'mysql':
+        scope = f"{args.storage}:{args.storage_path or 'default'}/{scope}"
+    keys, reused = plan_stages(ledger, args.csv, scope, stages, params, args.force) if ledger else ({}, {})
     
-    success = run_command(candles_cmd, "Detección de velas clave")
-    if not success:
-        logging.error("Falló la detección de velas clave, abortando.")
-        return False
-    
-    # 2. Luego ejecutar detección de zonas de acumulación con los mismos parámetros
-    accum_cmd = [
-        sys.executable,
-        os.path.join(os.path.dirname(__file__), "save_detect_accumulation_zone.py"),
-        "--csv", args.csv,
-        "--atr-period", str(args.atr_period),
-        "--atr-multiplier", str(args.atr_multiplier),
-        "--volume-threshold", str(args.volume_threshold),
-        "--quality-threshold", str(args.quality_threshold),
-        "--recency-bonus", str(args.recency_bonus)
-    ]
+    if len(reused) == len(keys) and keys:
+        logging.info("Todas las etapas están al día, no hay nada que ejecutar.")
+        ledger.close()
+        return True
     
-    # Añadir el parámetro de uso de mini-tendencias si está activado
-    if args.use_mini_trends:
-        accum_cmd.extend(["--use-mini-trends", "True"])
+    try:
+        if args.service is not None:
+            timings, report = run_in_service(args, stages, params, list(reused))
+        else:
+            timings, report = run_in_process(args, stages, params, list(reused))
+    except Exception as e:
+        logging.error(f"Falló la detección combinada: {e}")
+        if ledger is not None:
+            ledger.close()
+        return False
     
-    if args.verbose:
-        accum_cmd.append("--verbose")
+    if ledger is not None:
+        for stage in keys:
+            if stage in reused:
+                continue
+            output = {'tables': list(STAGE_TABLES[stage]), 'scope': scope, 'run_id': current_run_id()}
+            ledger.record(keys[stage], scope, output, csv_file=args.csv, seconds=timings.get(stage))
+        ledger.close()
     
-    success = run_command(accum_cmd, "Detección de zonas de acumulación")
-    if not success:
-        logging.error("Falló la detección de zonas de acumulación.")
-        return False
+    logging.info("Tiempos por etapa:\n" + report)
     
     logging.info("Proceso combinado completado con éxito.")
     logging.info(f"Las velas clave que coinciden con zonas de acumulación pueden consultarse con:")
@@ -8,28 +8,24 @@ Ubicación: aipha/programs/stable/save_detect_accumulation_zone.py
 import os
 import sys
 import pandas as pd
-import mysql.connector
+import numpy as np
 import argparse
-import json
 import logging
 import traceback
-from dotenv import load_dotenv
 from datetime import datetime
-from detect_accumulation_zone import AccumulationZoneDetector
+from detect_accumulation_zone import AccumulationZoneDetector, load_key_candles
 from mini_trend import MiniTrendDetector
-
-# Configuración de logging
-log_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../logs'))
-os.makedirs(log_dir, exist_ok=True)
-logging.basicConfig(
-    filename=os.path.join(log_dir, 'save_accumulation_zone.log'),
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
-
-# Cargar variables de entorno
-from dotenv import load_dotenv
-load_dotenv(dotenv_path=os.path.abspath(os.path.join(os.path.dirname(__file__), '../../config/.env')), override=True)
+from sql_indexes import (scope_index_sql, ensure_scope_index, ensure_run_column, ensure_file_column, current_run_id,
+                         scope_from_csv, scope_file, scope_filter)
+from interval_join import assign_points_to_intervals
+from bulk_writer import BulkWriter, format_stats
+import db_pool
+from db_pool import get_connection, get_db_config
+from async_writer import BackgroundResultWriter
+from log_config import configure_logging
+import schema_registry
+from param_sets import (get_param_set_id, ensure_param_sets_table, ensure_param_set_column, param_set_sql,
+                        drop_legacy_columns, reset_cache)
 
 # Ajuste de path para importar desde el módulo padre
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
@@ -40,27 +36,28 @@ class AccumulationZoneResultSaver:
     Maneja la conexión y métodos para almacenar datos de zonas y parámetros de detección.
     """
     def __init__(self, host=None, user=None, password=None, database=None):
-        self.db_config = {
-            'host': host or os.getenv('MYSQL_HOST', 'localhost'),
-            'user': user or os.getenv('MYSQL_USER', 'root'),
-            'password': password or os.getenv('MYSQL_PASSWORD', ''),
-            'database': database or os.getenv('MYSQL_DATABASE', 'binance_lob')
-        }
+        self.db_config = get_db_config(host, user, password, database)
         print(f"Database configuration: host={self.db_config['host']}, user={self.db_config['user']}, database={self.db_config['database']}")
         self.connection = None
         self.cursor = None
         self.csv_file = None
         self.num_candles = None
         self.mini_trend_detector = None
+        self.mini_trend_data = None
+        self.saved_mini_trends = None  # ids e intervalos de las mini-tendencias guardadas
+        self.run_id = None  # run_id de las filas (por defecto sql_indexes.current_run_id())
 
     def connect(self):
+        # Reutiliza la conexión abierta: una ejecución usa una sola conexión del pool
+        if self.connection is not None and self.connection.is_connected():
+            return True
         try:
-            self.connection = mysql.connector.connect(**self.db_config)
+            self.connection = get_connection(self.db_config)
             if self.connection.is_connected():
                 self.cursor = self.connection.cursor()
                 print(f"Connected to MySQL database: {self.db_config['database']}")
                 return True
-        except mysql.connector.Error as e:
+        except db_pool.Error as e:
             print(f"Error connecting to MySQL database: {e}")
             return False
 
@@ -68,63 +65,165 @@ class AccumulationZoneResultSaver:
         if self.cursor:
             self.cursor.close()
         if self.connection:
+            # Con el pool, close() devuelve la conexión al pool
             self.connection.close()
             print("Database connection closed.")
+        self.cursor = None
+        self.connection = None
 
-    def update_key_candles_in_zones(self, zones):
+    def ensure_tables(self):
         """
-        Actualiza la tabla key_candles para marcar las velas que están dentro de las zonas de acumulación.
+        Crea mini_trends y detect_accumulation_zone_results si no existen y añade a las tablas
+        existentes (incluidas las columnas de marcas de key_candles) lo que les falte.
+        Se ejecuta antes de la transacción de guardado: en MySQL cada DDL hace commit implícito.
         """
-        if not self.connection or not zones:
-            return
+        ensure_param_sets_table(self.cursor)
+        create_mini_trends_table = f"""
+        CREATE TABLE IF NOT EXISTS mini_trends (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            start_idx INT,
+            end_idx INT,
+            start_time DATETIME,
+            end_time DATETIME,
+            direction VARCHAR(20),
+            slope FLOAT,
+            r_squared FLOAT,
+            poc FLOAT,
+            volume_total FLOAT,
+            duration_bars INT,
+            symbol VARCHAR(20),
+            timeframe VARCHAR(10),
+            csv_file VARCHAR(255),
+            related_accumulation_zone_id INT NULL,
+            run_id VARCHAR(32),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            {scope_index_sql('mini_trends')}
+        )
+        """
+        if not schema_registry.table_exists(self.cursor, 'mini_trends'):
+            self.cursor.execute(create_mini_trends_table)
+            schema_registry.invalidate('mini_trends')
+        else:
+            ensure_run_column(self.cursor, 'mini_trends')
+            ensure_scope_index(self.cursor, 'mini_trends')
         
-        print("Updating key_candles with in_accumulation_zone information...")
+        create_table_query = f"""
+        CREATE TABLE IF NOT EXISTS detect_accumulation_zone_results (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            start_idx INT,
+            end_idx INT,
+            high FLOAT,
+            low FLOAT,
+            volume_avg FLOAT,
+            vol_total FLOAT,
+            vwap FLOAT,
+            poc FLOAT,
+            mfi FLOAT,
+            quality_score FLOAT,
+            datetime_start DATETIME,
+            datetime_end DATETIME,
+            symbol VARCHAR(20),
+            timeframe VARCHAR(10),
+            csv_file VARCHAR(255),
+            run_id VARCHAR(32),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            {param_set_sql('detect_accumulation_zone_results')},
+            {scope_index_sql('detect_accumulation_zone_results')}
+        )
+        """
+        if not schema_registry.table_exists(self.cursor, 'detect_accumulation_zone_results'):
+            self.cursor.execute(create_table_query)
+            schema_registry.invalidate('detect_accumulation_zone_results')
+        else:
+            ensure_run_column(self.cursor, 'detect_accumulation_zone_results')
+            ensure_param_set_column(self.cursor, 'detect_accumulation_zone_results')
+            ensure_scope_index(self.cursor, 'detect_accumulation_zone_results')
+            drop_legacy_columns(self.cursor, 'detect_accumulation_zone_results')
         
-        # Asegurarse que la columna existe en la tabla
-        try:
-            # Primero verificamos si la columna existe
-            check_column_query = """SHOW COLUMNS FROM key_candles LIKE 'in_accumulation_zone';"""
-            self.cursor.execute(check_column_query)
-            column_exists = self.cursor.fetchone()
-            
-            if not column_exists:
-                # Si no existe, la añadimos
-                add_column_query = """ALTER TABLE key_candles ADD COLUMN in_accumulation_zone BOOLEAN DEFAULT FALSE;"""
-                self.cursor.execute(add_column_query)
-                self.connection.commit()
+        # Columnas de marcas en key_candles (estructura cacheada en schema_registry)
+        if schema_registry.table_exists(self.cursor, 'key_candles'):
+            if not schema_registry.has_column(self.cursor, 'key_candles', 'in_accumulation_zone'):
+                self.cursor.execute("ALTER TABLE key_candles ADD COLUMN in_accumulation_zone BOOLEAN DEFAULT FALSE")
+                schema_registry.invalidate('key_candles')
                 print("Added in_accumulation_zone column to key_candles table")
-                
-            # Verificamos si la columna mini_trend_id existe
-            check_column_query = """SHOW COLUMNS FROM key_candles LIKE 'mini_trend_id';"""
-            self.cursor.execute(check_column_query)
-            column_exists = self.cursor.fetchone()
-            
-            if not column_exists:
-                # Si no existe, la añadimos
-                add_column_query = """ALTER TABLE key_candles ADD COLUMN mini_trend_id INT NULL;"""
-                self.cursor.execute(add_column_query)
-                self.connection.commit()
+            if not schema_registry.has_column(self.cursor, 'key_candles', 'mini_trend_id'):
+                self.cursor.execute("ALTER TABLE key_candles ADD COLUMN mini_trend_id INT NULL")
+                schema_registry.invalidate('key_candles')
                 print("Added mini_trend_id column to key_candles table")
-        except Exception as e:
-            print(f"Error checking/adding column: {e}")
+            ensure_file_column(self.cursor, 'key_candles')
+        self.connection.commit()
+
+    def update_key_candles_in_zones(self, zones):
+        """
+        Actualiza la tabla key_candles para marcar las velas que están dentro de las zonas de acumulación
+        (in_accumulation_zone) y la mini-tendencia que las contiene (mini_trend_id).
+        Las asignaciones se calculan en memoria y se aplican con un único UPDATE ... JOIN
+        sobre una tabla temporal, filtrando por el archivo (día) del símbolo/timeframe en lugar de
+        una sentencia por zona. Las columnas las añade ensure_tables antes de la transacción.
+        """
+        if not self.connection or not zones:
             return
+        if not schema_registry.table_exists(self.cursor, 'key_candles'):
+            print("No existe la tabla key_candles: no hay velas clave que marcar")
+            return False
         
-        # Actualizar la columna in_accumulation_zone para cada zona de acumulación
-        for zone in zones:
-            start_idx = zone.get('start_idx')
-            end_idx = zone.get('end_idx')
-            
-            if start_idx is not None and end_idx is not None:
-                update_query = """
-                UPDATE key_candles
-                SET in_accumulation_zone = TRUE
-                WHERE index_in_csv >= %s AND index_in_csv <= %s
-                AND csv_file = %s;
-                """
-                self.cursor.execute(update_query, (start_idx, end_idx, self.csv_file))
-                self.connection.commit()
-            print(f"Actualizadas velas clave en zonas de acumulación")
+        print("Updating key_candles with in_accumulation_zone information...")
+        
+        # Velas clave del mismo archivo: los índices de las zonas son posiciones dentro de ese día
+        symbol, timeframe = scope_from_csv(self.csv_file)
+        condition, params = scope_filter(symbol, timeframe, self.csv_file)
+        if not (symbol and timeframe and condition):
+            print("No se pudo determinar símbolo y timeframe para marcar velas clave")
+            return False
+        self.cursor.execute(f"SELECT id, candle_index FROM key_candles WHERE {condition}", params)
+        key_candles = self.cursor.fetchall()
+        if not key_candles:
             return True
+        candle_ids = np.array([row[0] for row in key_candles], dtype=np.int64)
+        candle_indices = np.array([row[1] for row in key_candles], dtype=np.int64)
+        
+        # Asignaciones vela -> zona y vela -> mini-tendencia con una unión por intervalos en memoria
+        valid_zones = [z for z in zones if z.get('start_idx') is not None and z.get('end_idx') is not None]
+        zone_pos = assign_points_to_intervals(
+            candle_indices,
+            [z['start_idx'] for z in valid_zones],
+            [z['end_idx'] for z in valid_zones]
+        )
+        in_zone = zone_pos >= 0
+        trend_ids = np.full(len(candle_ids), -1, dtype=np.int64)
+        if self.saved_mini_trends is not None and len(self.saved_mini_trends['id']):
+            trend_pos = assign_points_to_intervals(
+                candle_indices, self.saved_mini_trends['start_idx'], self.saved_mini_trends['end_idx']
+            )
+            # Solo las velas dentro de una zona reciben mini_trend_id
+            tagged = in_zone & (trend_pos >= 0)
+            trend_ids[tagged] = self.saved_mini_trends['id'][trend_pos[tagged]]
+        
+        # Aplicar todas las marcas con un único UPDATE desde una tabla temporal
+        self.cursor.execute("""
+        CREATE TEMPORARY TABLE IF NOT EXISTS tmp_key_candle_tags (
+            id INT PRIMARY KEY,
+            in_accumulation_zone BOOLEAN,
+            mini_trend_id INT NULL
+        )
+        """)
+        self.cursor.execute("DELETE FROM tmp_key_candle_tags")
+        rows = [(int(cid), bool(z), int(t) if t >= 0 else None)
+                for cid, z, t in zip(candle_ids, in_zone, trend_ids)]
+        BulkWriter(self.connection).insert(
+            'tmp_key_candle_tags', ['id', 'in_accumulation_zone', 'mini_trend_id'], rows
+        )
+        # El commit lo hace save_results al final de la etapa
+        self.cursor.execute("""
+        UPDATE key_candles kc
+        JOIN tmp_key_candle_tags t ON t.id = kc.id
+        SET kc.in_accumulation_zone = t.in_accumulation_zone,
+            kc.mini_trend_id = t.mini_trend_id
+        """)
+        self.cursor.execute("DROP TEMPORARY TABLE IF EXISTS tmp_key_candle_tags")
+        print(f"Actualizadas velas clave en zonas de acumulación: {int(in_zone.sum())} de {len(candle_ids)} "
+              f"en zona, {int((trend_ids >= 0).sum())} con mini-tendencia")
+        return True
 
     def analyze_mini_trends(self, data_df, zones):
         """
@@ -133,7 +232,10 @@ class AccumulationZoneResultSaver:
         """
         if self.mini_trend_detector is None:
             self.mini_trend_detector = MiniTrendDetector()
-            if self.csv_file:
+            if self.mini_trend_data is not None:
+                # Datos ya cargados por el llamador en el formato de MiniTrendDetector.load_csv
+                self.mini_trend_detector.data = self.mini_trend_data
+            elif self.csv_file:
                 self.mini_trend_detector.load_csv(self.csv_file)
             else:
                 # Si no tenemos archivo CSV, usamos el DataFrame proporcionado
@@ -147,6 +249,9 @@ class AccumulationZoneResultSaver:
                 volume_profile_bins=100  # Mayor resolución en el volume profile
             )
         
+        # Las marcas de key_candles solo usan las mini-tendencias guardadas en esta llamada
+        self.saved_mini_trends = None
+        
         # Detectar mini-tendencias
         self.mini_trend_detector.segment_mini_trends()
         mini_trends = self.mini_trend_detector.mini_trends
@@ -157,75 +262,33 @@ class AccumulationZoneResultSaver:
         
         print(f"Se detectaron {len(mini_trends)} mini-tendencias")
         
-        # Crear tabla para mini-tendencias si no existe
-        self.connect()
-        if not self.connection:
+        # Si save_results ya abrió la conexión (y creó las tablas) se reutiliza y el commit queda a su cargo
+        owns_connection = self.connection is None
+        if not self.connect():
             return zones
         
         try:
-            create_mini_trends_table = """
-            CREATE TABLE IF NOT EXISTS mini_trends (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                start_idx INT,
-                end_idx INT,
-                start_time DATETIME,
-                end_time DATETIME,
-                direction VARCHAR(20),
-                slope FLOAT,
-                r_squared FLOAT,
-                poc FLOAT,
-                volume_total FLOAT,
-                duration_bars INT,
-                symbol VARCHAR(20),
-                timeframe VARCHAR(10),
-                csv_file VARCHAR(255),
-                related_accumulation_zone_id INT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """
-            self.cursor.execute(create_mini_trends_table)
-            self.connection.commit()
+            if owns_connection:
+                self.ensure_tables()
             
             # Extraer símbolo y timeframe del archivo CSV
-            symbol = None
-            timeframe = None
-            if self.csv_file:
-                parts = os.path.basename(self.csv_file).split('-')
-                if len(parts) >= 2:
-                    symbol = parts[0]
-                    timeframe = parts[1]
-                    
-            # Eliminar mini-tendencias anteriores para este símbolo y timeframe
-            if symbol and timeframe:
-                delete_query = "DELETE FROM mini_trends WHERE symbol = %s AND timeframe = %s"
-                self.cursor.execute(delete_query, (symbol, timeframe))
-                self.connection.commit()
+            symbol, timeframe = scope_from_csv(self.csv_file)
+            csv_file = scope_file(self.csv_file)
             
-            # Guardar mini-tendencias y relacionarlas con zonas de acumulación
-            insert_mini_trend_query = """
-            INSERT INTO mini_trends (
-                start_idx, end_idx, start_time, end_time, direction, slope, r_squared,
-                poc, volume_total, duration_bars, symbol, timeframe, csv_file
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
+            # Eliminar mini-tendencias anteriores del mismo archivo (los demás días del par se conservan)
+            condition, params = scope_filter(symbol, timeframe, csv_file)
+            if condition:
+                self.cursor.execute(f"DELETE FROM mini_trends WHERE {condition}", params)
             
-            # Relaciones entre mini-tendencias y zonas de acumulación
-            mini_trend_zone_relations = []
+            # Guardar mini-tendencias
+            mini_trend_columns = [
+                'start_idx', 'end_idx', 'start_time', 'end_time', 'direction', 'slope', 'r_squared',
+                'poc', 'volume_total', 'duration_bars', 'symbol', 'timeframe', 'csv_file', 'run_id'
+            ]
+            mini_trend_rows = []
+            run_id = self.run_id or current_run_id()
             
             for trend in mini_trends:
-                # Verificar si la mini-tendencia tiene relación con alguna zona de acumulación
-                trend_start = trend['start_idx']
-                trend_end = trend['end_idx']
-                
-                related_zones = []
-                for i, zone in enumerate(zones):
-                    zone_start = zone.get('start_idx')
-                    zone_end = zone.get('end_idx')
-                    
-                    # Verificar si hay solapamiento entre la mini-tendencia y la zona
-                    if not (trend_end < zone_start or trend_start > zone_end):
-                        related_zones.append(i)
-                
                 # Guardar la mini-tendencia
                 row = (
                     trend['start_idx'],
@@ -240,119 +303,100 @@ class AccumulationZoneResultSaver:
                     trend['duration_bars'],
                     symbol,
                     timeframe,
-                    self.csv_file
+                    csv_file,
+                    run_id
                 )
-                self.cursor.execute(insert_mini_trend_query, row)
-                mini_trend_id = self.cursor.lastrowid
-                
-                # Guardar relaciones para actualización posterior
-                for zone_idx in related_zones:
-                    mini_trend_zone_relations.append((mini_trend_id, zone_idx))
+                mini_trend_rows.append(row)
             
-            self.connection.commit()
+            stats = BulkWriter(self.connection).insert('mini_trends', mini_trend_columns, mini_trend_rows)
+            # Un INSERT multi-fila no devuelve el id de cada fila: se vuelven a leer por clave natural
+            # (ejecución, archivo e intervalo), sin depender de que nadie más inserte a la vez
+            self.cursor.execute(
+                "SELECT id, start_idx, end_idx FROM mini_trends "
+                "WHERE run_id = %s AND symbol <=> %s AND timeframe <=> %s AND csv_file <=> %s",
+                (run_id, symbol, timeframe, csv_file)
+            )
+            ids_by_interval = {}
+            for trend_id, start_idx, end_idx in self.cursor.fetchall():
+                key = (int(start_idx), int(end_idx))
+                ids_by_interval[key] = max(trend_id, ids_by_interval.get(key, trend_id))
+            mini_trend_ids = [ids_by_interval[(int(t['start_idx']), int(t['end_idx']))] for t in mini_trends]
+            print(f"Saved to mini_trends: {format_stats(stats)}")
             
-            # Ahora actualizar las velas clave con su mini_trend_id si corresponde
-            for mini_trend_id, zone_idx in mini_trend_zone_relations:
-                zone = zones[zone_idx]
-                zone_start = zone.get('start_idx')
-                zone_end = zone.get('end_idx')
-                
-                # Actualizar mini_trend_id para key_candles dentro de la zona
-                update_candles_query = """
-                UPDATE key_candles
-                SET mini_trend_id = %s
-                WHERE index_in_csv >= %s AND index_in_csv <= %s
-                AND csv_file = %s AND in_accumulation_zone = TRUE;
-                """
-                self.cursor.execute(update_candles_query, (mini_trend_id, zone_start, zone_end, self.csv_file))
+            # Intervalos de las mini-tendencias guardadas para marcar las velas clave
+            self.saved_mini_trends = {
+                'id': np.array(mini_trend_ids, dtype=np.int64),
+                'start_idx': np.array([t['start_idx'] for t in mini_trends], dtype=np.int64),
+                'end_idx': np.array([t['end_idx'] for t in mini_trends], dtype=np.int64),
+            }
             
-            self.connection.commit()
-            print(f"Saved {len(mini_trends)} mini-trends and updated key candles with mini-trend relationships")
+            if owns_connection:
+                # Fuera de save_results las marcas se aplican y confirman aquí
+                self.update_key_candles_in_zones(zones)
+                self.connection.commit()
+            print(f"Saved {len(mini_trends)} mini-trends")
             
         except Exception as e:
+            if not owns_connection:
+                # La transacción es de save_results: su manejador deshace toda la etapa
+                raise
             print(f"Error analyzing mini-trends: {e}")
+            self.connection.rollback()
         finally:
-            self.close()
+            if owns_connection:
+                self.close()
         
         return zones
         
     def save_results(self, zones, detection_params, data_df=None):
         """
         Guarda los resultados de las zonas de acumulación en la tabla detect_accumulation_zone_results.
-        Si la tabla no existe, la crea con la estructura adecuada.
-        Borra solo los datos anteriores del mismo símbolo y timeframe antes de insertar los nuevos.
+        Si la tabla no existe, la crea con la estructura adecuada antes de abrir la transacción.
+        Borra solo los datos anteriores del mismo archivo (un día de un símbolo/timeframe) antes de
+        insertar los nuevos.
         También actualiza la tabla key_candles para marcar qué velas están dentro de zonas de acumulación.
         """
         if not zones:
             print("No accumulation zones to save.")
             return False
         
-        # Analizar mini-tendencias en relación con las zonas detectadas
-        zones = self.analyze_mini_trends(data_df, zones)
-        
-        self.connect()
-        if not self.connection:
+        # Una sola conexión y una sola transacción para toda la etapa
+        if not self.connect():
             return False
         
         try:
-            # Crea la tabla si no existe
-            create_table_query = """
-            CREATE TABLE IF NOT EXISTS detect_accumulation_zone_results (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                start_idx INT,
-                end_idx INT,
-                high FLOAT,
-                low FLOAT,
-                volume_avg FLOAT,
-                vol_total FLOAT,
-                vwap FLOAT,
-                poc FLOAT,
-                mfi FLOAT,
-                quality_score FLOAT,
-                datetime_start DATETIME,
-                datetime_end DATETIME,
-                detection_params TEXT,
-                symbol VARCHAR(20),
-                timeframe VARCHAR(10),
-                csv_file VARCHAR(255),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """
-            self.cursor.execute(create_table_query)
-            self.connection.commit()
+            # Todo el DDL antes de la transacción de borrado e inserción
+            self.ensure_tables()
+            
+            # Analizar mini-tendencias en relación con las zonas detectadas
+            zones = self.analyze_mini_trends(data_df, zones)
             
             # Extraer símbolo y timeframe del nombre del archivo CSV
-            symbol = None
-            timeframe = None
-            if self.csv_file:
-                parts = os.path.basename(self.csv_file).split('-')
-                if len(parts) >= 2:
-                    symbol = parts[0]
-                    timeframe = parts[1]
+            symbol, timeframe = scope_from_csv(self.csv_file)
+            csv_file = scope_file(self.csv_file)
             
-            # Borra solo los datos anteriores del mismo símbolo y timeframe
-            if symbol and timeframe:
-                print(f"Borrando datos anteriores para {symbol}-{timeframe}...")
-                delete_query = "DELETE FROM detect_accumulation_zone_results WHERE symbol = %s AND timeframe = %s"
-                self.cursor.execute(delete_query, (symbol, timeframe))
-                self.connection.commit()
+            # Borra solo los datos anteriores del mismo archivo (los demás días del par se conservan)
+            condition, params = scope_filter(symbol, timeframe, csv_file)
+            if condition:
+                print(f"Borrando datos anteriores para {symbol}-{timeframe} ({csv_file})...")
+                self.cursor.execute(f"DELETE FROM detect_accumulation_zone_results WHERE {condition}", params)
             else:
-                print("No se pudo determinar símbolo y timeframe para borrar datos antiguos")
+                print("No se pudo determinar el ámbito para borrar datos antiguos")
             
-            # Prepara la consulta de inserción
-            insert_query = """
-            INSERT INTO detect_accumulation_zone_results (
-                start_idx, end_idx, high, low, volume_avg, vol_total, 
-                vwap, poc, mfi, quality_score, datetime_start, datetime_end,
-                detection_params, symbol, timeframe, csv_file
-            ) VALUES (
-                %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-            )
-            """
+            # Columnas de la inserción
+            insert_columns = [
+                'start_idx', 'end_idx', 'high', 'low', 'volume_avg', 'vol_total',
+                'vwap', 'poc', 'mfi', 'quality_score', 'datetime_start', 'datetime_end',
+                'param_set_id', 'symbol', 'timeframe', 'csv_file', 'run_id'
+            ]
             
             # Usamos el symbol y timeframe que ya extrajimos anteriormente
+            # Parámetros normalizados en param_sets: cada zona guarda solo el id
+            param_set_id = get_param_set_id(self.cursor, detection_params, stage='zones')
+            run_id = self.run_id or current_run_id()
             
-            # Inserta los datos de cada zona detectada
+            # Inserta los datos de todas las zonas detectadas en lotes
+            rows = []
             for zone in zones:
                 row = (
                     zone.get('start_idx'),
@@ -367,32 +411,87 @@ class AccumulationZoneResultSaver:
                     zone.get('quality_score'),
                     zone.get('datetime_start'),
                     zone.get('datetime_end'),
-                    json.dumps(detection_params),
+                    param_set_id,
                     symbol,
                     timeframe,
-                    os.path.basename(self.csv_file) if self.csv_file else None
+                    csv_file,
+                    run_id
                 )
-                self.cursor.execute(insert_query, row)
+                rows.append(row)
             
-            self.connection.commit()
-            print(f"Saved {len(zones)} accumulation zones")
+            stats = BulkWriter(self.connection).insert('detect_accumulation_zone_results', insert_columns, rows)
+            print(f"Saved {len(zones)} accumulation zones: {format_stats(stats)}")
             
             # Actualiza la tabla key_candles para marcar las velas dentro de zonas de acumulación
             self.update_key_candles_in_zones(zones)
             
+            # Commit único de mini-tendencias, zonas y marcas en key_candles
+            self.connection.commit()
             return True
         
         except Exception as e:
             print(f"Error saving results: {e}")
+            self.connection.rollback()
+            reset_cache()
             return False
         
         finally:
             self.close()
 
 
+def load_ohlcv_dataframe(csv_file, detect_header=False):
+    """
+    Carga el CSV en formato Binance para el análisis de mini-tendencias.
+    :param detect_header: Si es False (comportamiento de siempre) se descarta la primera fila,
+                          como el resto del pipeline; si es True solo se descarta cuando es un
+                          encabezado ('timestamp' u 'open_time')
+    :return: DataFrame o None si no se pudo cargar
+    """
+    try:
+        # Intentamos cargar los datos usando las mismas columnas que usa MiniTrendDetector
+        binance_columns = [
+            'timestamp', 'open', 'high', 'low', 'close', 'volume',
+            'close_time', 'quote_asset_volume', 'number_of_trades',
+            'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'
+        ]
+        data_df = pd.read_csv(csv_file, names=binance_columns, header=None)
+        
+        # Verificar si ya tiene encabezados
+        if not detect_header or data_df.iloc[0]['timestamp'] in ['timestamp', 'open_time']:
+            data_df = data_df.iloc[1:].reset_index(drop=True)
+            
+        # Convertir a tipos numéricos
+        for col in ['open', 'high', 'low', 'close', 'volume']:
+            data_df[col] = pd.to_numeric(data_df[col])
+            
+        # Convertir timestamp a datetime para referencia
+        data_df['datetime'] = pd.to_datetime(pd.to_numeric(data_df['timestamp']), unit='us')
+        
+        print(f"Loaded CSV with {len(data_df)} rows for mini-trend analysis")
+        return data_df
+    except Exception as e:
+        print(f"Error loading data for mini-trend analysis: {e}")
+        return None
+
+
+def save_zones(csv_file, zones, detection_params, data_df, mini_trend_data=None, run_id=None):
+    """
+    Guarda las zonas de un archivo CSV con su propia conexión del pool.
+    Pensada para ejecutarse en el hilo de BackgroundResultWriter.
+    :param mini_trend_data: Datos ya cargados con el formato de MiniTrendDetector.load_csv (evita releer el CSV)
+    :param run_id: run_id de las filas (por defecto el del proceso)
+    """
+    saver = AccumulationZoneResultSaver()
+    saver.csv_file = csv_file
+    saver.run_id = run_id
+    saver.mini_trend_data = mini_trend_data
+    # Pasar también el DataFrame para el análisis de mini-tendencias
+    return saver.save_results(zones, detection_params, data_df)
+
+
 def main():
     parser = argparse.ArgumentParser(description="Save detected accumulation zones to DB")
-    parser.add_argument('--csv', type=str, required=True, help='Path to CSV file with OHLCV data')
+    parser.add_argument('--csv', type=str, nargs='+', required=True, help='Path to CSV file(s) with OHLCV data')
     parser.add_argument('--key-candles', type=str, help='Path to CSV file with key candles (optional)')
     parser.add_argument('--atr-period', type=int, default=14, help='Periodo ATR para la detección (default: 14)')
     parser.add_argument('--atr-multiplier', type=float, default=1.0, help='Multiplicador ATR para la tolerancia de rango (default: 1.0)')
@@ -400,64 +499,55 @@ def main():
     parser.add_argument('--quality-threshold', type=float, default=3.0, help='Umbral de puntuación de calidad mínima (default: 3.0)')
     parser.add_argument('--recency-bonus', type=float, default=0.1, help='Bonificación por proximidad temporal')
     parser.add_argument('--use-mini-trends', type=bool, default=True, help='Usar detector de mini-tendencias para enriquecer resultados')
+    parser.add_argument('--max-pending-writes', type=int, default=2, help='Archivos pendientes de guardar antes de pausar la detección')
+    parser.add_argument('--detect-header', action='store_true',
+                        help='Descartar la primera fila del CSV solo si es un encabezado (por defecto se descarta siempre)')
     parser.add_argument('--verbose', action='store_true', help='Mostrar información detallada durante la ejecución')
     
     args = parser.parse_args()
+    configure_logging('save_accumulation_zone.log')
     
-    # Inicializa el detector y carga los datos
     try:
-        detector = AccumulationZoneDetector()
-        detector.set_params(
-            atr_period=args.atr_period,
-            atr_multiplier=args.atr_multiplier,
-            volume_threshold=args.volume_threshold,
-            quality_threshold=args.quality_threshold,
-            recency_bonus=args.recency_bonus  # Pasar recency_bonus al detector
-        )
-        
-        # Cargar los datos para tenerlos disponibles
-        data_df = None
-        try:
-            # Intentamos cargar los datos usando las mismas columnas que usa MiniTrendDetector
-            binance_columns = [
-                'timestamp', 'open', 'high', 'low', 'close', 'volume',
-                'close_time', 'quote_asset_volume', 'number_of_trades',
-                'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'
-            ]
-            data_df = pd.read_csv(args.csv, names=binance_columns, header=None)
-            
-            # Verificar si ya tiene encabezados
-            if data_df.columns[0] in ['timestamp', 'open_time']:
-                data_df = data_df.iloc[1:].reset_index(drop=True)
+        # La detección del siguiente archivo se solapa con la escritura del anterior
+        with BackgroundResultWriter(max_pending=args.max_pending_writes) as writer:
+            for csv_file in args.csv:
+                # Inicializa el detector y carga los datos
+                detector = AccumulationZoneDetector(csv_file)
+                detector.set_params(
+                    atr_period=args.atr_period,
+                    atr_multiplier=args.atr_multiplier,
+                    volume_threshold=args.volume_threshold,
+                    quality_threshold=args.quality_threshold
+                )
+                # set_params no acepta recency_bonus: se guarda con el resto de parámetros
+                detector.params['recency_bonus'] = args.recency_bonus
                 
-            # Convertir a tipos numéricos
-            for col in ['open', 'high', 'low', 'close', 'volume']:
-                data_df[col] = pd.to_numeric(data_df[col])
+                # Cargar los datos para tenerlos disponibles
+                data_df = load_ohlcv_dataframe(csv_file, detect_header=args.detect_header)
                 
-            # Convertir timestamp a datetime para referencia
-            data_df['datetime'] = pd.to_datetime(data_df['timestamp'], unit='us')
-            
-            print(f"Loaded CSV with {len(data_df)} rows for mini-trend analysis")
-        except Exception as e:
-            print(f"Error loading data for mini-trend analysis: {e}")
-            data_df = None
-        
-        # Ejecutar la detección
-        results = detector.process_csv(args.csv)
-        
-        if results:
-            # Guardar resultados en la base de datos
-            saver = AccumulationZoneResultSaver()
-            saver.csv_file = args.csv
-            # Pasar también el DataFrame para el análisis de mini-tendencias
-            saver.save_results(results, detector.params, data_df)
-        else:
-            print("No accumulation zones detected")
+                # Índices de velas clave (base de datos, CSV opcional o índices espaciados)
+                lookup = AccumulationZoneResultSaver()
+                if lookup.connect():
+                    key_candle_indices = load_key_candles(csv_file, args.key_candles, db_saver=lookup)
+                    lookup.close()
+                else:
+                    key_candle_indices = load_key_candles(csv_file, args.key_candles)
+                
+                # Ejecutar la detección
+                zones = detector.process_candles(key_candle_indices)
+                
+                if zones:
+                    writer.submit(save_zones, csv_file, zones, dict(detector.params), data_df,
+                                  description=os.path.basename(csv_file))
+                else:
+                    print(f"No accumulation zones detected in {os.path.basename(csv_file)}")
             
     except Exception as e:
         logging.error(f"Error in main execution: {str(e)}")
         traceback.print_exc()
+        return 1
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
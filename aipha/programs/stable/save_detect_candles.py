@@ -7,18 +7,6 @@ Ubicación: aipha/programs/stable/save_detect_candles.py
 
 import os
 import sys
-import mysql.connector
-from mysql.connector import Error
-import pandas as pd
-import numpy as np
-import json
-import os
-from dotenv import load_dotenv
-load_dotenv(dotenv_path=os.path.abspath(os.path.join(os.path.dirname(__file__), '../../config/.env')), override=True)
-
-import sys
-import mysql.connector
-from mysql.connector import Error
 import pandas as pd
 import numpy as np
 import json
@@ -28,6 +16,15 @@ import traceback
 # Ajuste de path para importar desde el módulo padre
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 from detect_candles import Detector
+from sql_indexes import (scope_index_sql, ensure_scope_index, ensure_run_column, ensure_file_column, current_run_id,
+                         scope_from_csv, scope_file, scope_filter)
+from bulk_writer import BulkWriter, format_stats
+import db_pool
+from db_pool import get_connection, get_db_config
+from async_writer import BackgroundResultWriter
+from param_sets import (get_param_set_id, ensure_param_sets_table, ensure_param_set_column, param_set_sql,
+                        drop_legacy_columns, reset_cache)
+import schema_registry
 
 class DetectionResultSaver:
     """
@@ -35,24 +32,21 @@ class DetectionResultSaver:
     Maneja la conexión y métodos para almacenar datos de velas clave y parámetros de detección.
     """
     def __init__(self, host=None, user=None, password=None, database=None):
-        self.db_config = {
-            'host': host or os.getenv('MYSQL_HOST', 'localhost'),
-            'user': user or os.getenv('MYSQL_USER', 'root'),
-            'password': password or os.getenv('MYSQL_PASSWORD', ''),
-            'database': database or os.getenv('MYSQL_DATABASE', 'binance_lob')
-        }
+        self.db_config = get_db_config(host, user, password, database)
         print(f"Database configuration: host={self.db_config['host']}, user={self.db_config['user']}, database={self.db_config['database']}")
         self.connection = None
         self.cursor = None
+        self.run_id = None  # run_id de las filas (por defecto sql_indexes.current_run_id())
 
     def connect(self):
         try:
-            self.connection = mysql.connector.connect(**self.db_config)
+            # Conexión del pool compartido del proceso
+            self.connection = get_connection(self.db_config)
             if self.connection.is_connected():
                 self.cursor = self.connection.cursor()
                 print(f"Connected to MySQL database: {self.db_config['database']}")
                 return True
-        except Error as e:
+        except db_pool.Error as e:
             print(f"Error connecting to MySQL database: {e}")
             return False
 
@@ -63,24 +57,80 @@ class DetectionResultSaver:
             self.connection.close()
             print("Database connection closed.")
 
+    def ensure_tables(self, tables):
+        """
+        Crea las tablas que falten y añade a las existentes las columnas e índices posteriores.
+        Se ejecuta antes de abrir la transacción de guardado: en MySQL cada DDL hace commit implícito.
+        """
+        ensure_param_sets_table(self.cursor)
+        for table_name in tables:
+            # Verifica si la tabla existe (estructura cacheada en schema_registry)
+            if not schema_registry.table_exists(self.cursor, table_name):
+                # Crea la tabla con la estructura estándar o de sesión
+                if table_name in ['detection_sessions', 'detection_params']:
+                    create_table_query = f"""
+                    CREATE TABLE IF NOT EXISTS {table_name} (
+                        id INT AUTO_INCREMENT PRIMARY KEY,
+                        detection_params JSON,
+                        csv_file VARCHAR(255),
+                        run_id VARCHAR(32),
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        {param_set_sql(table_name)}
+                    ) ENGINE=InnoDB;
+                    """
+                else:
+                    create_table_query = f"""
+                    CREATE TABLE IF NOT EXISTS {table_name} (
+                        id INT AUTO_INCREMENT PRIMARY KEY,
+                        candle_index INT,
+                        open FLOAT,
+                        high FLOAT,
+                        low FLOAT,
+                        close FLOAT,
+                        volume FLOAT,
+                        volume_percentile FLOAT,
+                        body_percentage FLOAT,
+                        is_key_candle BOOLEAN,
+                        symbol VARCHAR(20),
+                        timeframe VARCHAR(10),
+                        csv_file VARCHAR(255),
+                        in_accumulation_zone BOOLEAN DEFAULT FALSE,
+                        datetime DATETIME,
+                        run_id VARCHAR(32),
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        {param_set_sql(table_name)},
+                        {scope_index_sql('key_candles')}
+                    ) ENGINE=InnoDB;
+                    """
+                self.cursor.execute(create_table_query)
+                schema_registry.invalidate(table_name)
+            else:
+                # Tablas creadas antes de run_id, param_set_id, csv_file y del índice compuesto
+                ensure_run_column(self.cursor, table_name)
+                ensure_param_set_column(self.cursor, table_name)
+                if table_name == 'key_candles':
+                    ensure_file_column(self.cursor, table_name)
+                    ensure_scope_index(self.cursor, table_name)
+                    drop_legacy_columns(self.cursor, table_name)
+
     def save_results(self, results, detection_params, tables):
         """
-        Guarda los resultados en cada tabla de la lista 'tables'.
+        Guarda los resultados en las tablas indicadas.
+        Solo se reemplazan los datos del mismo ámbito: las velas clave del mismo archivo CSV (un día
+        de un símbolo/timeframe; los demás días del par se conservan) y las sesiones/parámetros del
+        mismo archivo. Cada fila lleva el run_id de la ejecución.
+        Los parámetros se guardan una vez en param_sets; las velas clave solo llevan param_set_id.
         - Si la tabla es 'detection_sessions', guarda solo una fila con los parámetros de la sesión y la fecha/hora.
         - Las otras tablas reciben los resultados completos de velas.
         Si la tabla existe, detecta sus columnas y solo inserta los campos que existan.
-        Si no existe, la crea con la estructura estándar.
+        Si no existe, la crea con la estructura estándar (antes de la transacción de borrado e inserción).
         
         Extrae el símbolo y timeframe del nombre del archivo CSV para guardarlos en las tablas.
         """
         # Extraer símbolo y timeframe del nombre del archivo CSV
-        self.symbol = None
-        self.timeframe = None
-        if hasattr(self, 'csv_file') and self.csv_file:
-            parts = os.path.basename(self.csv_file).split('-')
-            if len(parts) >= 2:
-                self.symbol = parts[0]
-                self.timeframe = parts[1]
+        self.symbol, self.timeframe = scope_from_csv(getattr(self, 'csv_file', None))
+        csv_file = scope_file(getattr(self, 'csv_file', None))
+        run_id = self.run_id or current_run_id()
         from datetime import datetime
         if not self.connection or not self.connection.is_connected():
             print("Not connected to database.")
@@ -94,58 +144,25 @@ class DetectionResultSaver:
                 tablas_borrado.append('detection_params')
             if 'detection_sessions' in tables:
                 tablas_borrado.append('detection_sessions')
+            # Todo el DDL primero; a partir de aquí solo hay borrados e inserciones en una transacción
+            self.ensure_tables(tablas_borrado)
+            self.connection.commit()
+            # Conjunto de parámetros normalizado (una fila por contenido distinto)
+            param_set_id = get_param_set_id(self.cursor, detection_params, stage='candles')
             # Borrado en orden seguro
             for table_name in tablas_borrado:
-                # Verifica si la tabla existe
-                self.cursor.execute(f"SHOW TABLES LIKE '{table_name}'")
-                exists = self.cursor.fetchone() is not None
-                if not exists:
-                    # Crea la tabla con la estructura estándar o de sesión
-                    if table_name in ['detection_sessions', 'detection_params']:
-                        create_table_query = f"""
-                        CREATE TABLE IF NOT EXISTS {table_name} (
-                            id INT AUTO_INCREMENT PRIMARY KEY,
-                            detection_params JSON,
-                            csv_file VARCHAR(255),
-                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                        ) ENGINE=InnoDB;
-                        """
-                    else:
-                        create_table_query = f"""
-                        CREATE TABLE IF NOT EXISTS {table_name} (
-                            id INT AUTO_INCREMENT PRIMARY KEY,
-                            candle_index INT,
-                            open FLOAT,
-                            high FLOAT,
-                            low FLOAT,
-                            close FLOAT,
-                            volume FLOAT,
-                            volume_percentile FLOAT,
-                            body_percentage FLOAT,
-                            is_key_candle BOOLEAN,
-                            symbol VARCHAR(20),
-                            timeframe VARCHAR(10),
-                            in_accumulation_zone BOOLEAN DEFAULT FALSE,
-                            datetime DATETIME,
-                            detection_params JSON,
-                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                        ) ENGINE=InnoDB;
-                        """
-                    self.cursor.execute(create_table_query)
-                    self.connection.commit()
-                # Limpia la tabla antes de insertar nuevos datos
-                self.cursor.execute(f"DELETE FROM {table_name}")
-                # Obtiene las columnas existentes en la tabla
-                self.cursor.execute(f"SHOW COLUMNS FROM {table_name}")
-                columns_info = self.cursor.fetchall()
-                table_columns = [col[0] for col in columns_info if col[0] != 'id' and col[0] != 'created_at']
-                insert_cols = []
-                for col in table_columns:
-                    if col == 'detection_params':
-                        insert_cols.append('detection_params')
+                # Reemplaza solo el ámbito de este archivo: otros días, símbolos o timeframes no se
+                # tocan y varias ejecuciones en paralelo escriben cada una su parte
+                if table_name == 'key_candles':
+                    condition, params = scope_filter(self.symbol, self.timeframe, csv_file)
+                    if condition:
+                        self.cursor.execute(f"DELETE FROM key_candles WHERE {condition}", params)
                     else:
-                        insert_cols.append(col)
-                insert_query = f"INSERT INTO {table_name} ({', '.join(insert_cols)}) VALUES ({', '.join(['%s']*len(insert_cols))})"
+                        print("No se pudo determinar el ámbito para borrar datos antiguos")
+                elif csv_file:
+                    self.cursor.execute(f"DELETE FROM {table_name} WHERE csv_file = %s", (csv_file,))
+                # Columnas existentes en la tabla e INSERT generado a partir de la estructura cacheada
+                insert_cols, insert_query = schema_registry.insert_statement(self.cursor, table_name)
                 if table_name in ['detection_sessions', 'detection_params']:
                     # Solo una fila por sesión
                     row = []
@@ -158,7 +175,11 @@ class DetectionResultSaver:
                         if col == 'detection_params':
                             row.append(json.dumps(detection_params))
                         elif col == 'csv_file':
-                            row.append(self.csv_file if hasattr(self, 'csv_file') else None)
+                            row.append(csv_file)
+                        elif col == 'run_id':
+                            row.append(run_id)
+                        elif col == 'param_set_id':
+                            row.append(param_set_id)
                         elif col == 'created_at':
                             row.append(datetime.now())
                         elif col == 'volume_threshold':
@@ -173,66 +194,99 @@ class DetectionResultSaver:
                             row.append(None)
                     self.cursor.execute(insert_query, tuple(row))
                 else:
+                    # Los parámetros son los mismos para todas las velas: solo se guarda su id
+                    rows = []
                     for res in results:
                         row = []
                         for col in insert_cols:
-                            if col == 'detection_params':
-                                row.append(json.dumps(detection_params))
+                            if col == 'param_set_id':
+                                row.append(param_set_id)
                             elif col == 'candle_index' and 'index' in res:
                                 row.append(res['index'])
                             elif col == 'symbol':
                                 row.append(self.symbol)
                             elif col == 'timeframe':
                                 row.append(self.timeframe)
+                            elif col == 'csv_file':
+                                row.append(csv_file)
+                            elif col == 'run_id':
+                                row.append(run_id)
                             elif col == 'datetime' and 'timestamp' in res:
                                 row.append(res['timestamp'])
                             else:
                                 row.append(res.get(col, None))
-                        self.cursor.execute(insert_query, tuple(row))
-                self.connection.commit()
+                        rows.append(tuple(row))
+                    stats = BulkWriter(self.connection).insert(table_name, insert_cols, rows)
+                    print(f"Saved to {table_name}: {format_stats(stats)}")
+            # Un único commit para todas las tablas de la sesión
+            self.connection.commit()
             return True
         except Exception as e:
             import traceback
             traceback.print_exc()
+            self.connection.rollback()
+            reset_cache()
             return False
 
+def save_detection(csv_file, results, detection_params, num_candles, verbose=False, run_id=None):
+    """
+    Guarda las velas clave de un archivo CSV con su propia conexión del pool.
+    Pensada para ejecutarse en el hilo de BackgroundResultWriter.
+    :param run_id: run_id de las filas (por defecto el del proceso)
+    """
+    saver = DetectionResultSaver()
+    saver.run_id = run_id
+    if not saver.connect():
+        return False
+    try:
+        tablas_destino = ["detection_params", "detection_sessions", "key_candles"]
+        # Guarda el nombre del archivo CSV en el saver para usarlo en detection_sessions
+        saver.csv_file = os.path.basename(csv_file)
+        # Guarda el número de velas analizadas
+        saver.num_candles = num_candles
+        success = saver.save_results(results, detection_params, tablas_destino)
+    finally:
+        saver.close()
+
+    if success and verbose:
+        print(f"Velas clave guardadas exitosamente en la base de datos")
+        # Extraer símbolo y timeframe del nombre del archivo
+        parts = os.path.basename(csv_file).split('-')
+        if len(parts) >= 2:
+            symbol = parts[0]
+            timeframe = parts[1]
+            print(f"Para consultar resultados: SELECT * FROM key_candles WHERE symbol = '{symbol}' AND timeframe = '{timeframe}';")
+    elif not success:
+        print("Error al guardar las velas clave en la base de datos")
+    return success
+
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="Save Shakeout detection results to DB (AIPHA version)")
-    parser.add_argument('--csv', type=str, required=True, help='Path to CSV file')
+    parser.add_argument('--csv', type=str, nargs='+', required=True, help='Path to CSV file(s)')
     parser.add_argument('--volume-percentile', type=int, default=70, help='Percentil para considerar volumen alto (70 = top 30%)')
     parser.add_argument('--body-threshold', type=int, default=40, help='Porcentaje máximo del cuerpo de la vela respecto al rango')
     parser.add_argument('--lookback', type=int, default=30, help='Número de velas para calcular percentiles')
+    parser.add_argument('--max-pending-writes', type=int, default=2, help='Archivos pendientes de guardar antes de pausar la detección')
     parser.add_argument('--verbose', action='store_true', help='Mostrar información detallada')
     args = parser.parse_args()
 
     if args.verbose:
         print(f"Parámetros de detección: VPT={args.volume_percentile}, BPT={args.body_threshold}, lookback={args.lookback}")
-    
-    detector = Detector(args.csv)
-    detector.set_detection_params(args.volume_percentile, args.body_threshold, args.lookback)
-    results = detector.process_csv()
 
-    if args.verbose:
-        print(f"Detectadas {len(results)} velas clave en {os.path.basename(args.csv)}")
+    # La detección del siguiente archivo se solapa con la escritura del anterior
+    with BackgroundResultWriter(max_pending=args.max_pending_writes) as writer:
+        for csv_file in args.csv:
+            detector = Detector(csv_file)
+            detector.set_detection_params(args.volume_percentile, args.body_threshold, args.lookback)
+            results = detector.process_csv()
 
-    saver = DetectionResultSaver()
-    if saver.connect():
-        tablas_destino = ["detection_params", "detection_sessions", "key_candles"]
-        # Guarda el nombre del archivo CSV en el saver para usarlo en detection_sessions
-        saver.csv_file = os.path.basename(args.csv)
-        # Guarda el número de velas analizadas
-        saver.num_candles = len(detector.data) if detector.data is not None else None
-        success = saver.save_results(results, detector.detection_params, tablas_destino)
-        saver.close()
-        
-        if success and args.verbose:
-            print(f"Velas clave guardadas exitosamente en la base de datos")
-            # Extraer símbolo y timeframe del nombre del archivo
-            parts = os.path.basename(args.csv).split('-')
-            if len(parts) >= 2:
-                symbol = parts[0]
-                timeframe = parts[1]
-                print(f"Para consultar resultados: SELECT * FROM key_candles WHERE symbol = '{symbol}' AND timeframe = '{timeframe}';")
-        elif not success:
-            print("Error al guardar las velas clave en la base de datos")
+            if args.verbose:
+                print(f"Detectadas {len(results)} velas clave en {os.path.basename(csv_file)}")
+
+            writer.submit(
+                save_detection, csv_file, results, detector.detection_params,
+                len(detector.data) if detector.data is not None else None,
+                verbose=args.verbose,
+                description=os.path.basename(csv_file)
+            )
@@ -7,8 +7,6 @@ incluida la comparación con las velas clave detectadas por detect_candles.py.
 
 import os
 import sys
-import mysql.connector
-from mysql.connector import Error
 import pandas as pd
 import numpy as np
 import json
@@ -20,42 +18,32 @@ import traceback
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 from mini_trend import MiniTrendDetector
 from detect_candles import Detector
-from dotenv import load_dotenv
-
-# Cargar variables de entorno
-load_dotenv(dotenv_path=os.path.abspath(os.path.join(os.path.dirname(__file__), '../../config/.env')), override=True)
-
-# Configuración de logging
-log_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../logs'))
-os.makedirs(log_dir, exist_ok=True)
-logging.basicConfig(
-    filename=os.path.join(log_dir, 'mini_trend.log'),
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+from sql_indexes import (scope_index_sql, ensure_scope_columns, ensure_scope_index, ensure_run_column,
+                         current_run_id, scope_from_csv, scope_file, scope_filter)
+from bulk_writer import BulkWriter, format_stats
+import db_pool
+import schema_registry
+from result_reader import read_columns
+from log_config import configure_logging
 
 def get_db_config():
     """
     Obtiene la configuración de la base de datos desde variables de entorno.
     """
-    return {
-        'host': os.getenv('MYSQL_HOST', 'localhost'),
-        'user': os.getenv('MYSQL_USER', 'root'),
-        'password': os.getenv('MYSQL_PASSWORD', ''),
-        'database': os.getenv('MYSQL_DATABASE', 'binance_lob')
-    }
+    return db_pool.get_db_config()
 
 def connect_to_db(db_config):
     """
     Establece conexión con la base de datos MySQL.
     """
     try:
-        connection = mysql.connector.connect(**db_config)
+        # Conexión del pool compartido del proceso; close() la devuelve al pool
+        connection = db_pool.get_connection(db_config)
         if connection.is_connected():
             cursor = connection.cursor()
             logging.info(f"Connected to MySQL database: {db_config['database']}")
             return connection, cursor
-    except Error as e:
+    except db_pool.Error as e:
         logging.error(f"Error connecting to MySQL database: {e}")
     return None, None
 
@@ -69,26 +57,25 @@ def close_db_connection(connection, cursor):
         connection.close()
         logging.info("Database connection closed.")
 
-def get_key_candles_from_db(cursor, table_name='key_candles'):
+# Columnas de key_candles que usa compare_mini_trends_with_key_candles
+KEY_CANDLE_COLUMNS = ['id', 'candle_index', 'open', 'high', 'low', 'close']
+
+def get_key_candles_from_db(connection, table_name='key_candles', symbol=None, timeframe=None):
     """
-    Obtiene las velas clave guardadas en la base de datos.
+    Obtiene las velas clave guardadas en la base de datos, en formato columnar.
+    Solo lee las columnas que usa la comparación y, si se indican, solo el símbolo/timeframe pedido.
+    :return: Diccionario columna -> array NumPy (id, candle_index, open, high, low, close)
     """
     try:
-        cursor.execute(f"SELECT * FROM {table_name}")
-        columns = [desc[0] for desc in cursor.description]
-        key_candles = []
-        
-        for row in cursor.fetchall():
-            key_candle = {}
-            for i, column in enumerate(columns):
-                key_candle[column] = row[i]
-            key_candles.append(key_candle)
-            
-        logging.info(f"Retrieved {len(key_candles)} key candles from database")
+        key_candles = read_columns(
+            connection, table_name, KEY_CANDLE_COLUMNS,
+            symbol=symbol, timeframe=timeframe, order_by='id'
+        )
+        logging.info(f"Retrieved {len(key_candles['id'])} key candles from database")
         return key_candles
-    except Error as e:
+    except db_pool.Error as e:
         logging.error(f"Error retrieving key candles: {e}")
-        return []
+        return {column: np.array([]) for column in KEY_CANDLE_COLUMNS}
 
 def compare_mini_trends_with_key_candles(mini_trends_df, key_candles, poc_tol=0.002, check_direction=True):
     """
@@ -97,15 +84,24 @@ def compare_mini_trends_with_key_candles(mini_trends_df, key_candles, poc_tol=0.
     
     Args:
         mini_trends_df: DataFrame con las mini-tendencias detectadas
-        key_candles: Lista de velas clave de la base de datos
+        key_candles: Velas clave en formato columnar (ver get_key_candles_from_db)
         poc_tol: Tolerancia para considerar el POC cercano al precio (% relativo)
         check_direction: Si True, verifica si la dirección de la mini-tendencia es coherente con
                          la probable dirección de reversión o continuación tras la vela clave
     """
-    if mini_trends_df.empty or not key_candles:
+    if mini_trends_df.empty or len(key_candles['candle_index']) == 0:
         logging.warning("No hay datos para comparar")
         return mini_trends_df
     
+    # Columnas de las velas clave como arrays
+    # Sin 'id' (velas aún no guardadas, por ejemplo en pipeline.py) candle_id queda en None
+    candle_ids = key_candles.get('id')
+    candle_indices = np.asarray(key_candles['candle_index'], dtype=np.float64)
+    candle_close = np.asarray(key_candles['close'], dtype=np.float64)
+    candle_open = np.asarray(key_candles['open'], dtype=np.float64)
+    candle_range = (np.asarray(key_candles['high'], dtype=np.float64)
+                    - np.asarray(key_candles['low'], dtype=np.float64))
+    
     # Añadir columna para resultados de comparación
     mini_trends_df['comparison_results'] = None
     
@@ -115,61 +111,55 @@ def compare_mini_trends_with_key_candles(mini_trends_df, key_candles, poc_tol=0.
         end_idx = mini_trend['end_idx']
         trend_direction = mini_trend['direction']
         relevant_candles = []
+        if not poc:
+            continue
         
-        for candle in key_candles:
-            candle_idx = candle.get('candle_index')
-            candle_price = candle.get('close', 0)
-            candle_open = candle.get('open', 0)
+        # Velas clave después de la mini-tendencia con el precio cerca del POC, en bloque
+        with np.errstate(divide='ignore', invalid='ignore'):
+            price_diff = np.abs(poc - candle_close) / candle_close
+        matches = np.flatnonzero((candle_indices > end_idx) & (price_diff <= poc_tol))
+        
+        for position in matches:
+            candle_idx = int(candle_indices[position])
+            candle_price = candle_close[position]
+            price_diff_pct = float(price_diff[position])
+            
+            # Evaluar coherencia de dirección si se solicita
+            direction_match = True
+            direction_pattern = "neutral"
             
-            # Comprobar si la vela clave está después de la mini-tendencia
-            if candle_idx > end_idx:
-                # Verificar proximidad entre POC y precio de la vela
-                if poc:
-                    price_diff_pct = abs(poc - candle_price) / candle_price
+            if check_direction:
+                # Para velas clave (shakeout), calculamos si podría haber una reversión
+                candle_body = abs(candle_price - candle_open[position])
+                body_percentage = candle_body / candle_range[position] if candle_range[position] > 0 else 0
+                
+                # Analizamos patrones de reversión basados en el tipo de vela clave
+                is_small_body = body_percentage <= 0.3  # 30% es el umbral típico para shakeout
+                
+                if is_small_body:
+                    # Para shakeouts (cuerpo pequeño), esperamos una potencial reversión de dirección
+                    expected_reversal = 'bajista' if trend_direction == 'alcista' else 'alcista'
                     
-                    if price_diff_pct <= poc_tol:
-                        # Evaluar coherencia de dirección si se solicita
-                        direction_match = True
-                        direction_pattern = "neutral"
-                        
-                        if check_direction:
-                            # Para velas clave (shakeout), calculamos si podría haber una reversión
-                            candle_body = abs(candle_price - candle_open)
-                            candle_range = candle.get('high', 0) - candle.get('low', 0)
-                            body_percentage = candle_body / candle_range if candle_range > 0 else 0
-                            
-                            # Analizamos patrones de reversión basados en el tipo de vela clave
-                            is_small_body = body_percentage <= 0.3  # 30% es el umbral típico para shakeout
-                            
-                            if is_small_body:
-                                # Para shakeouts (cuerpo pequeño), esperamos una potencial reversión de dirección
-                                expected_reversal = 'bajista' if trend_direction == 'alcista' else 'alcista'
-                                
-                                # Verificar si hay más velas después de la vela clave para confirmar dirección
-                                next_candle_idx = candle_idx + 1
-                                possible_reversal = True  # Asumimos posible reversión por defecto
-                                
-                                direction_match = possible_reversal  # En ausencia de datos, aceptamos posible reversión
-                                direction_pattern = f"trend:{trend_direction},expected_reversal:{expected_reversal}"
-                            else:
-                                # Para velas con cuerpo grande, es más probable continuación de tendencia
-                                # La mini-tendencia debe ser coherente con la vela clave
-                                candle_direction = 'alcista' if candle_price > candle_open else 'bajista'
-                                direction_match = trend_direction == candle_direction
-                                direction_pattern = f"trend:{trend_direction},candle:{candle_direction}"
-                        
-                        # Solo añadir a relevantes si supera todas las verificaciones
-                        if direction_match or not check_direction:
-                            # Calcular distancia temporal
-                            bars_distance = candle_idx - end_idx
-                            relevant_candles.append({
-                                'candle_id': candle.get('id'),
-                                'candle_idx': candle_idx,
-                                'price_diff_pct': price_diff_pct * 100,  # Convertir a porcentaje
-                                'bars_distance': bars_distance,
-                                'direction_pattern': direction_pattern,
-                                'direction_match': direction_match
-                            })
+                    # En ausencia de datos posteriores, aceptamos posible reversión
+                    direction_match = True
+                    direction_pattern = f"trend:{trend_direction},expected_reversal:{expected_reversal}"
+                else:
+                    # Para velas con cuerpo grande, es más probable continuación de tendencia
+                    # La mini-tendencia debe ser coherente con la vela clave
+                    candle_direction = 'alcista' if candle_price > candle_open[position] else 'bajista'
+                    direction_match = trend_direction == candle_direction
+                    direction_pattern = f"trend:{trend_direction},candle:{candle_direction}"
+            
+            # Solo añadir a relevantes si supera todas las verificaciones
+            if direction_match or not check_direction:
+                relevant_candles.append({
+                    'candle_id': int(candle_ids[position]) if candle_ids is not None else None,
+                    'candle_idx': candle_idx,
+                    'price_diff_pct': price_diff_pct * 100,  # Convertir a porcentaje
+                    'bars_distance': candle_idx - int(end_idx),
+                    'direction_pattern': direction_pattern,
+                    'direction_match': bool(direction_match)
+                })
         
         # Guardar resultados de la comparación
         if relevant_candles:
@@ -184,11 +174,14 @@ def compare_mini_trends_with_key_candles(mini_trends_df, key_candles, poc_tol=0.
 def create_mini_trend_table(cursor, table_name='mini_trend_results'):
     """
     Crea la tabla para almacenar resultados de mini-tendencias si no existe.
+    Ya no vacía la tabla: save_mini_trend reemplaza solo el símbolo/timeframe que guarda.
     """
-    try:
-        cursor.execute(f"DELETE FROM {table_name}")
-        logging.info(f"Cleaned existing table: {table_name}")
-    except Error as e:
+    if schema_registry.table_exists(cursor, table_name):
+        # Tablas creadas antes de las columnas de ámbito, run_id y del índice compuesto
+        ensure_scope_columns(cursor, table_name)
+        ensure_run_column(cursor, table_name)
+        ensure_scope_index(cursor, table_name)
+    else:
         # Si la tabla no existe, crearla
         create_table_query = f"""
         CREATE TABLE IF NOT EXISTS {table_name} (
@@ -206,13 +199,18 @@ def create_mini_trend_table(cursor, table_name='mini_trend_results'):
             duration_minutes INT,
             comparison_results JSON,
             csv_file VARCHAR(255),
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            symbol VARCHAR(20),
+            timeframe VARCHAR(10),
+            run_id VARCHAR(32),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            {scope_index_sql('mini_trend_results')}
         ) ENGINE=InnoDB;
         """
         cursor.execute(create_table_query)
+        schema_registry.invalidate(table_name)
         logging.info(f"Created new table: {table_name}")
 
-def save_mini_trend(df, path=None, db_config=None, table_name='mini_trend_results', csv_file=None):
+def save_mini_trend(df, path=None, db_config=None, table_name='mini_trend_results', csv_file=None, run_id=None):
     """
     Guarda los resultados de mini-tendencias en CSV y/o base de datos MySQL.
     
@@ -222,6 +220,7 @@ def save_mini_trend(df, path=None, db_config=None, table_name='mini_trend_result
         db_config: Configuración para conexión a base de datos (opcional)
         table_name: Nombre de la tabla MySQL
         csv_file: Nombre del archivo CSV procesado
+        run_id: run_id de las filas (por defecto sql_indexes.current_run_id())
     """
     # Guardar en CSV si se proporciona ruta
     if path:
@@ -235,10 +234,28 @@ def save_mini_trend(df, path=None, db_config=None, table_name='mini_trend_result
         connection, cursor = connect_to_db(db_config)
         if connection and cursor:
             try:
-                # Crear/limpiar tabla
+                # Crear la tabla si no existe
                 create_mini_trend_table(cursor, table_name)
                 
+                # Extraer símbolo y timeframe del nombre del archivo CSV
+                symbol, timeframe = scope_from_csv(csv_file)
+                run_id = run_id or current_run_id()
+                
+                csv_file = scope_file(csv_file)
+                
+                # Reemplazar solo los resultados del mismo archivo (los demás días del par se conservan);
+                # la tabla ya existe, así que el borrado y la inserción van en la misma transacción
+                condition, params = scope_filter(symbol, timeframe, csv_file)
+                if condition:
+                    cursor.execute(f"DELETE FROM {table_name} WHERE {condition}", params)
+                
                 # Preparar datos para la inserción
+                insert_columns = [
+                    'start_idx', 'end_idx', 'start_time', 'end_time', 'direction',
+                    'slope', 'r_squared', 'poc', 'volume_total', 'duration_bars',
+                    'duration_minutes', 'comparison_results', 'csv_file', 'symbol', 'timeframe', 'run_id'
+                ]
+                rows = []
                 for _, row in df.iterrows():
                     # Convertir datetime a formato compatible con MySQL
                     start_time = row.get('start_time')
@@ -249,15 +266,7 @@ def save_mini_trend(df, path=None, db_config=None, table_name='mini_trend_result
                     if isinstance(end_time, pd.Timestamp):
                         end_time = end_time.strftime('%Y-%m-%d %H:%M:%S')
                     
-                    # Insertar fila
-                    insert_query = f"""
-                    INSERT INTO {table_name} (
-                        start_idx, end_idx, start_time, end_time, direction, 
-                        slope, r_squared, poc, volume_total, duration_bars, 
-                        duration_minutes, comparison_results, csv_file
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """
-                    cursor.execute(insert_query, (
+                    rows.append((
                         int(row.get('start_idx', 0)),
                         int(row.get('end_idx', 0)),
                         start_time,
@@ -270,15 +279,21 @@ def save_mini_trend(df, path=None, db_config=None, table_name='mini_trend_result
                         int(row.get('duration_bars', 0)),
                         int(row.get('duration_minutes', 0)),
                         row.get('comparison_results'),
-                        csv_file
+                        csv_file,
+                        symbol,
+                        timeframe,
+                        run_id
                     ))
                 
+                # Inserción por lotes en lugar de una sentencia por fila
+                stats = BulkWriter(connection).insert(table_name, insert_columns, rows)
                 connection.commit()
-                logging.info(f"Saved {len(df)} mini-trend results to database table: {table_name}")
+                logging.info(f"Saved {len(df)} mini-trend results to database table: {table_name} ({format_stats(stats)})")
             
-            except Error as e:
+            except db_pool.Error as e:
                 logging.error(f"Error saving to database: {e}")
                 traceback.print_exc()
+                connection.rollback()
             
             finally:
                 close_db_connection(connection, cursor)
@@ -295,6 +310,7 @@ if __name__ == "__main__":
     parser.add_argument('--zigzag-threshold', type=float, default=0.005, help='Threshold for ZigZag segmentation (default: 0.005)')
     parser.add_argument('--min-trend-bars', type=int, default=5, help='Minimum bars for a valid mini-trend (default: 5)')
     args = parser.parse_args()
+    configure_logging('mini_trend.log')
     
     # Obtener configuración de DB
     db_config = get_db_config()
@@ -320,9 +336,10 @@ if __name__ == "__main__":
         # Conectar a la DB para obtener velas clave
         connection, cursor = connect_to_db(db_config)
         if connection and cursor:
-            # Obtener velas clave
-            key_candles = get_key_candles_from_db(cursor)
-            print(f"Retrieved {len(key_candles)} key candles from database")
+            # Obtener solo las velas clave del mismo símbolo y timeframe que el CSV
+            symbol, timeframe = scope_from_csv(args.csv)
+            key_candles = get_key_candles_from_db(connection, symbol=symbol, timeframe=timeframe)
+            print(f"Retrieved {len(key_candles['id'])} key candles from database")
             close_db_connection(connection, cursor)
             
             # Comparar mini-tendencias con velas clave
@@ -16,30 +16,92 @@ import os
 import sys
 import argparse
 import logging
-import mysql.connector
-from mysql.connector import errors
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("aipha/logs/triple_signals.log"),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+from interval_join import find_triple_coincidences
+from sql_indexes import max_interval_span, current_run_id, scope_file, scope_filter
+from batch_scoring import score_signals_batch, signals_to_columns
+from weight_sweep import build_component_cache, save_component_cache
+from bulk_writer import BulkWriter, format_stats
+from db_pool import get_connection, get_db_config
+import schema_registry
+from param_sets import (get_param_set_id, ensure_param_sets_table, ensure_param_set_column, param_set_sql,
+                        drop_legacy_columns, reset_cache)
+from log_config import configure_logging
+
 logger = logging.getLogger(__name__)
 
-# Cargar variables de entorno
-load_dotenv()
+# Columnas de triple_signals (sin id ni created_at), en el orden de inserción
+TRIPLE_SIGNAL_COLUMNS = [
+    ('symbol', 'VARCHAR(20) NOT NULL'),
+    ('timeframe', 'VARCHAR(10) NOT NULL'),
+    ('candle_index', 'INT NOT NULL'),
+    ('datetime', 'DATETIME'),
+    ('open', 'FLOAT'),
+    ('high', 'FLOAT'),
+    ('low', 'FLOAT'),
+    ('close', 'FLOAT'),
+    ('volume', 'FLOAT'),
+    ('body_percentage', 'FLOAT'),
+    ('zone_id', 'INT'),
+    ('zone_quality_score', 'FLOAT'),
+    ('zone_start_datetime', 'DATETIME'),
+    ('zone_end_datetime', 'DATETIME'),
+    ('mini_trend_id', 'INT'),
+    ('trend_direction', 'VARCHAR(10)'),
+    ('trend_slope', 'FLOAT'),
+    ('trend_r_squared', 'FLOAT'),
+    ('trend_start_datetime', 'DATETIME'),
+    ('trend_end_datetime', 'DATETIME'),
+    ('signal_strength', 'FLOAT'),
+    ('combined_score', 'FLOAT'),
+    # Puntuaciones detalladas de componentes
+    ('zone_score', 'FLOAT'),
+    ('trend_score', 'FLOAT'),
+    ('candle_score', 'FLOAT'),
+    ('direction_factor', 'FLOAT'),
+    ('slope_factor', 'FLOAT'),
+    # Factores avanzados de evaluación
+    ('divergence_factor', 'FLOAT'),
+    ('reliability_bonus', 'FLOAT'),
+    ('profit_potential', 'FLOAT'),
+    # Puntuación base y final (antes dentro del JSON scoring_details)
+    ('base_strength', 'FLOAT'),
+    ('final_score', 'FLOAT'),
+    # Archivo (día) del que salen la vela, la zona y la mini-tendencia
+    ('csv_file', 'VARCHAR(255)'),
+    ('run_id', 'VARCHAR(32)'),
+]
+
+# Clave única de una señal: los índices de vela son posiciones dentro de cada archivo (día)
+UNIQUE_SIGNAL_INDEX = ('unique_signal_file', ('symbol', 'timeframe', 'csv_file', 'candle_index'))
+
+# Columnas de puntuación que score_signals_batch devuelve por señal, en el orden de la tabla
+SCORE_COLUMNS = ('zone_score', 'trend_score', 'candle_score', 'direction_factor', 'slope_factor',
+                 'divergence_factor', 'reliability_bonus', 'profit_potential', 'base_strength', 'final_score')
 
 class TripleSignalSaver:
     """Clase para identificar y guardar señales de triple coincidencia."""
     
-    def __init__(self):
-        """Inicializa la conexión a la base de datos y configuraciones."""
+    def __init__(self, join_engine='memory', tolerance=8, min_zone_quality=0.5, min_trend_r_squared=0.45):
+        """
+        Inicializa la conexión a la base de datos y configuraciones.
+
+        :param join_engine: 'memory' (unión por intervalos en proceso) o 'sql' (JOIN en MySQL)
+        :param tolerance: Tolerancia en barras alrededor de zonas y mini-tendencias
+        :param min_zone_quality: Calidad mínima de la zona de acumulación
+        :param min_trend_r_squared: R² mínimo de la mini-tendencia
+        """
+        self.join_engine = join_engine
+        self.tolerance = tolerance
+        self.min_zone_quality = min_zone_quality
+        self.min_trend_r_squared = min_trend_r_squared
+        self.component_cache_path = None  # Archivo .npz opcional con componentes para weight_sweep.py
+        self.run_id = None  # run_id de las filas (por defecto sql_indexes.current_run_id())
+        # Variables de entorno del .env más cercano, al crear el guardador (no al importar el módulo)
+        from dotenv import load_dotenv
+        load_dotenv()
         self.host = os.getenv('MYSQL_HOST', 'localhost')
         self.user = os.getenv('MYSQL_USER', 'root')
         self.password = os.getenv('MYSQL_PASSWORD', '21blackjack')
@@ -47,15 +109,20 @@ class TripleSignalSaver:
         self.conn = None
         self.cursor = None
         
+    @property
+    def signal_params(self):
+        """Parámetros que determinan las señales guardadas (join_engine no cambia el resultado)."""
+        return {
+            'tolerance': self.tolerance,
+            'min_zone_quality': self.min_zone_quality,
+            'min_trend_r_squared': self.min_trend_r_squared,
+        }
+    
     def connect(self):
         """Establece conexión con la base de datos MySQL."""
         try:
-            self.conn = mysql.connector.connect(
-                host=self.host,
-                user=self.user,
-                password=self.password,
-                database=self.database
-            )
+            # Conexión del pool compartido del proceso
+            self.conn = get_connection(get_db_config(self.host, self.user, self.password, self.database))
             self.cursor = self.conn.cursor(dictionary=True)
             logger.info(f"Conectado a base de datos MySQL: {self.database}")
             return True
@@ -70,79 +137,70 @@ class TripleSignalSaver:
         if self.conn:
             self.conn.close()
             logger.info("Conexión a la base de datos cerrada")
+        self.cursor = None
+        self.conn = None
     
     def create_triple_signals_table(self):
-        """Elimina y vuelve a crear la tabla triple_signals con todas las columnas necesarias."""
+        """
+        Crea la tabla triple_signals si no existe. Si ya existe, añade las columnas que le falten
+        en lugar de eliminarla, para no borrar las señales de otros símbolos/timeframes, y cambia la
+        clave única (symbol, timeframe, candle_index) por una que incluye el archivo, para que
+        varios días del mismo par convivan.
+        Todo el DDL se hace aquí, antes de la transacción de borrado e inserción.
+        """
+        index_name, index_columns = UNIQUE_SIGNAL_INDEX
         try:
-            # Primero verificamos si la tabla existe
-            self.cursor.execute("SHOW TABLES LIKE 'triple_signals'")
-            table_exists = self.cursor.fetchone() is not None
-            
-            # Si existe, la eliminamos para poder recrearla con todas las columnas
-            if table_exists:
-                logger.info("Tabla triple_signals existente, eliminándola para recrear")
-                self.cursor.execute("DROP TABLE triple_signals")
-                self.conn.commit()
+            # param_sets antes que nada, por la clave foránea y para que get_param_set_id no haga DDL
+            ensure_param_sets_table(self.cursor)
+            # Estructura cacheada en schema_registry
+            if schema_registry.table_exists(self.cursor, 'triple_signals'):
+                missing = [(name, definition) for name, definition in TRIPLE_SIGNAL_COLUMNS
+                           if not schema_registry.has_column(self.cursor, 'triple_signals', name)]
+                for name, definition in missing:
+                    self.cursor.execute(f"ALTER TABLE triple_signals ADD COLUMN {name} {definition}")
+                if missing:
+                    schema_registry.invalidate('triple_signals')
+                    logger.info(f"Añadidas columnas a triple_signals: {[name for name, _ in missing]}")
+                ensure_param_set_column(self.cursor, 'triple_signals')
+                drop_legacy_columns(self.cursor, 'triple_signals')
+                if not schema_registry.has_index(self.cursor, 'triple_signals', index_name):
+                    drop_old = ("DROP INDEX unique_signal, "
+                                if schema_registry.has_index(self.cursor, 'triple_signals', 'unique_signal') else "")
+                    self.cursor.execute(f"ALTER TABLE triple_signals {drop_old}"
+                                        f"ADD UNIQUE KEY {index_name} ({', '.join(index_columns)})")
+                    schema_registry.invalidate('triple_signals')
+                    logger.info(f"Clave única de triple_signals cambiada a {index_name}")
+                return True
             
             # Creamos la tabla con la estructura completa
-            create_table_query = """
+            column_sql = ',\n                '.join(f"{name} {definition}" for name, definition in TRIPLE_SIGNAL_COLUMNS)
+            create_table_query = f"""
             CREATE TABLE triple_signals (
                 id INT AUTO_INCREMENT PRIMARY KEY,
-                symbol VARCHAR(20) NOT NULL,
-                timeframe VARCHAR(10) NOT NULL,
-                candle_index INT NOT NULL,
-                datetime DATETIME,
-                open FLOAT,
-                high FLOAT,
-                low FLOAT,
-                close FLOAT,
-                volume FLOAT,
-                body_percentage FLOAT,
-                zone_id INT,
-                zone_quality_score FLOAT,
-                zone_start_datetime DATETIME,
-                zone_end_datetime DATETIME,
-                mini_trend_id INT,
-                trend_direction VARCHAR(10),
-                trend_slope FLOAT,
-                trend_r_squared FLOAT,
-                trend_start_datetime DATETIME,
-                trend_end_datetime DATETIME,
-                signal_strength FLOAT,
-                combined_score FLOAT,
-                
-                /* Puntuaciones detalladas de componentes */
-                zone_score FLOAT,
-                trend_score FLOAT,
-                candle_score FLOAT,
-                direction_factor FLOAT,
-                slope_factor FLOAT,
-                
-                /* Factores avanzados de evaluación */
-                divergence_factor FLOAT,
-                reliability_bonus FLOAT,
-                profit_potential FLOAT,
-                
-                /* Información adicional */
-                scoring_details JSON,
+                {column_sql},
                 created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE KEY unique_signal (symbol, timeframe, candle_index)
+                {param_set_sql('triple_signals')},
+                UNIQUE KEY {index_name} ({', '.join(index_columns)})
             )
             """
             self.cursor.execute(create_table_query)
             self.conn.commit()
+            schema_registry.invalidate('triple_signals')
             logger.info("Tabla triple_signals creada correctamente con todas las columnas")
             return True
         except Exception as e:
             logger.error(f"Error creando tabla triple_signals: {e}")
             return False
     
-    def find_triple_signals(self, symbol, timeframe):
+    def find_triple_signals(self, symbol, timeframe, csv_file=None):
         """
         Encuentra señales que coinciden en los tres criterios:
         1. Velas clave
         2. Dentro de zonas de acumulación
         3. Parte de mini-tendencias
+        Vela, zona y mini-tendencia deben venir del mismo archivo (día): los índices son posiciones
+        dentro de cada archivo.
+        :param csv_file: Archivo al que limitar la búsqueda (por defecto todos los del par)
         """
         try:
             # Verificar tabla de mini-tendencias
@@ -150,9 +208,7 @@ class TripleSignalSaver:
             logger.info(f"Usando tabla de mini-tendencias: {mini_trend_table}")
             
             # Verificar si la tabla key_candles tiene mini_trend_id
-            self.cursor.execute("DESCRIBE key_candles")
-            columns = self.cursor.fetchall()
-            column_names = [col['Field'] for col in columns]
+            column_names = schema_registry.table_columns(self.cursor, 'key_candles')
             
             has_mini_trend_id = 'mini_trend_id' in column_names
             has_in_accumulation_zone = 'in_accumulation_zone' in column_names
@@ -172,16 +228,39 @@ class TripleSignalSaver:
                     logger.info("Intentando determinar relación entre velas clave y mini-tendencias por índices")
                     # Podemos relacionar velas y mini-tendencias por rango de índices
             
+            # Verificar si mini_trend_results ya tiene columnas de ámbito (symbol/timeframe)
+            trend_columns = schema_registry.table_columns(self.cursor, mini_trend_table)
+            trend_scoped = 'symbol' in trend_columns and 'timeframe' in trend_columns
+            if not trend_scoped:
+                logger.warning(f"{mini_trend_table} no tiene symbol/timeframe; se usarán mini-tendencias de todos los símbolos")
+            
+            # Unión por intervalos en memoria (sin JOIN con rangos OR-eados en MySQL)
+            if self.join_engine == 'memory':
+                return self._find_triple_signals_in_memory(symbol, timeframe, mini_trend_table, trend_scoped,
+                                                           csv_file)
+            
             # Construyamos una consulta adaptada a la estructura real
             # Modificación: Incluir velas cercanas a zonas y tendencias, no solo dentro
-            tolerance = 8  # Tolerancia de índices para ampliar la detección (ajustado de 5 a 8)
+            tolerance = self.tolerance  # Tolerancia de índices para ampliar la detección (ajustado de 5 a 8)
+            
+            # Acotar start_idx por ambos lados con la longitud máxima de los intervalos:
+            # así cada vela recorre solo una ventana del índice (symbol, timeframe, start_idx, end_idx)
+            zone_span = max_interval_span(self.cursor, 'detect_accumulation_zone_results', symbol, timeframe)
+            trend_filter = ("mt.symbol = kc.symbol AND mt.timeframe = kc.timeframe AND mt.csv_file <=> kc.csv_file AND"
+                            if trend_scoped else "")
+            if trend_scoped:
+                trend_span = max_interval_span(self.cursor, mini_trend_table, symbol, timeframe)
+            else:
+                self.cursor.execute(f"SELECT MAX(end_idx - start_idx) AS span FROM {mini_trend_table}")
+                trend_span = int(self.cursor.fetchone()['span'] or 0)
             
             query = f"""
             SELECT 
                 kc.id as key_candle_id,
-                '{symbol}' as symbol,
-                '{timeframe}' as timeframe,
+                kc.symbol,
+                kc.timeframe,
                 kc.candle_index,
+                kc.csv_file,
                 kc.open,
                 kc.high,
                 kc.low,
@@ -200,33 +279,37 @@ class TripleSignalSaver:
                 mt.end_time as trend_end_datetime
             FROM key_candles kc
             JOIN detect_accumulation_zone_results daz ON 
-                daz.symbol = '{symbol}' AND
-                daz.timeframe = '{timeframe}' AND
-                /* Ampliar el rango de detección para ser más flexibles */
-                (
-                    (kc.candle_index >= daz.start_idx - {tolerance} AND kc.candle_index <= daz.end_idx + {tolerance})
-                    OR
-                    (kc.candle_index >= daz.start_idx AND kc.candle_index <= daz.end_idx)
-                )
+                daz.symbol = kc.symbol AND
+                daz.timeframe = kc.timeframe AND
+                daz.csv_file <=> kc.csv_file AND
+                /* Rangos sargables: start_idx acotado, end_idx como filtro residual */
+                daz.start_idx BETWEEN kc.candle_index - %s AND kc.candle_index + %s AND
+                daz.end_idx >= kc.candle_index - %s
             JOIN {mini_trend_table} mt ON 
-                /* Ampliar el rango de detección para tendencias también */
-                (
-                    (kc.candle_index >= mt.start_idx - {tolerance} AND kc.candle_index <= mt.end_idx + {tolerance})
-                    OR
-                    (kc.candle_index >= mt.start_idx AND kc.candle_index <= mt.end_idx)
-                )
+                {trend_filter}
+                mt.start_idx BETWEEN kc.candle_index - %s AND kc.candle_index + %s AND
+                mt.end_idx >= kc.candle_index - %s
             WHERE 
-                kc.is_key_candle = TRUE
+                kc.symbol = %s
+                AND kc.timeframe = %s
+                AND kc.is_key_candle = TRUE
+                {"AND kc.csv_file = %s" if csv_file else ""}
                 /* Filtros menos restrictivos para la calidad */
-                AND daz.quality_score >= 0.5 
-                AND mt.r_squared >= 0.45
-            ORDER BY kc.candle_index
+                AND daz.quality_score >= %s 
+                AND mt.r_squared >= %s
+            ORDER BY kc.csv_file, kc.candle_index
             """
+            params = (
+                tolerance + zone_span, tolerance, tolerance,
+                tolerance + trend_span, tolerance, tolerance,
+                symbol, timeframe,
+                *((scope_file(csv_file),) if csv_file else ()),
+                self.min_zone_quality, self.min_trend_r_squared
+            )
             
             logger.info("Ejecutando consulta para encontrar señales de triple coincidencia")
             
-            # Ejecutar la consulta sin parámetros ya que los incluimos directamente
-            self.cursor.execute(query)
+            self.cursor.execute(query, params)
             signals = self.cursor.fetchall()
             logger.info(f"Encontradas {len(signals)} señales de triple coincidencia para {symbol}-{timeframe}")
             return signals
@@ -234,6 +317,160 @@ class TripleSignalSaver:
             logger.error(f"Error buscando señales de triple coincidencia: {e}")
             return []
     
+    def _find_triple_signals_in_memory(self, symbol, timeframe, mini_trend_table, trend_scoped=True, csv_file=None):
+        """
+        Variante de find_triple_signals que lee cada componente una sola vez y resuelve
+        la coincidencia con interval_join.find_triple_coincidences, archivo por archivo.
+        Devuelve filas con las mismas claves que la consulta SQL.
+        """
+        file_filter = " AND csv_file = %s" if csv_file else ""
+        file_params = (scope_file(csv_file),) if csv_file else ()
+        self.cursor.execute(
+            f"""
+            SELECT id, candle_index, csv_file, open, high, low, close, volume, body_percentage
+            FROM key_candles
+            WHERE symbol = %s AND timeframe = %s AND is_key_candle = TRUE{file_filter}
+            """,
+            (symbol, timeframe, *file_params)
+        )
+        candles = self.cursor.fetchall()
+        
+        self.cursor.execute(
+            f"""
+            SELECT id, start_idx, end_idx, quality_score, datetime_start, datetime_end, csv_file
+            FROM detect_accumulation_zone_results
+            WHERE symbol = %s AND timeframe = %s{file_filter}
+            """,
+            (symbol, timeframe, *file_params)
+        )
+        zones = self.cursor.fetchall()
+        
+        if trend_scoped:
+            self.cursor.execute(
+                f"""
+                SELECT id, start_idx, end_idx, direction, slope, r_squared, start_time, end_time, csv_file
+                FROM {mini_trend_table}
+                WHERE symbol = %s AND timeframe = %s{file_filter}
+                """,
+                (symbol, timeframe, *file_params)
+            )
+        else:
+            # Tabla antigua sin symbol/timeframe: se usan todas las filas, para todos los archivos
+            self.cursor.execute(f"""
+                SELECT id, start_idx, end_idx, direction, slope, r_squared, start_time, end_time
+                FROM {mini_trend_table}
+                """)
+        trends = self.cursor.fetchall()
+        
+        if not candles or not zones or not trends:
+            logger.info(f"Componentes insuficientes para {symbol}-{timeframe}: "
+                        f"velas={len(candles)}, zonas={len(zones)}, tendencias={len(trends)}")
+            return []
+        
+        # Los índices son posiciones dentro de cada archivo: la coincidencia se resuelve por archivo
+        def by_file(rows):
+            groups = {}
+            for row in rows:
+                groups.setdefault(row.get('csv_file'), []).append(row)
+            return groups
+        zones_by_file = by_file(zones)
+        trends_by_file = by_file(trends) if trend_scoped else None
+        
+        signals = []
+        candles_by_file = by_file(candles)
+        for file_name in sorted(candles_by_file, key=lambda name: (name is None, name or '')):
+            file_candles = candles_by_file[file_name]
+            file_zones = zones_by_file.get(file_name, [])
+            file_trends = trends_by_file.get(file_name, []) if trend_scoped else trends
+            if not file_zones or not file_trends:
+                continue
+            matches = find_triple_coincidences(
+                [c['candle_index'] for c in file_candles],
+                [z['start_idx'] for z in file_zones],
+                [z['end_idx'] for z in file_zones],
+                [t['start_idx'] for t in file_trends],
+                [t['end_idx'] for t in file_trends],
+                zone_tolerance=self.tolerance,
+                trend_tolerance=self.tolerance,
+                zone_quality=[z['quality_score'] for z in file_zones],
+                min_zone_quality=self.min_zone_quality,
+                trend_r_squared=[t['r_squared'] for t in file_trends],
+                min_trend_r_squared=self.min_trend_r_squared
+            )
+            
+            for c_pos, z_pos, t_pos in zip(matches['candle'], matches['zone'], matches['trend']):
+                kc = file_candles[c_pos]
+                daz = file_zones[z_pos]
+                mt = file_trends[t_pos]
+                signals.append({
+                    'key_candle_id': kc['id'],
+                    'symbol': symbol,
+                    'timeframe': timeframe,
+                    'candle_index': kc['candle_index'],
+                    'csv_file': file_name,
+                    'open': kc['open'],
+                    'high': kc['high'],
+                    'low': kc['low'],
+                    'close': kc['close'],
+                    'volume': kc['volume'],
+                    'body_percentage': kc['body_percentage'],
+                    'zone_id': daz['id'],
+                    'zone_quality_score': daz['quality_score'],
+                    'zone_start_datetime': daz['datetime_start'],
+                    'zone_end_datetime': daz['datetime_end'],
+                    'trend_id': mt['id'],
+                    'trend_direction': mt['direction'],
+                    'trend_slope': mt['slope'],
+                    'trend_r_squared': mt['r_squared'],
+                    'trend_start_datetime': mt['start_time'],
+                    'trend_end_datetime': mt['end_time'],
+                })
+        
+        logger.info(f"Encontradas {len(signals)} señales de triple coincidencia para {symbol}-{timeframe} (en memoria)")
+        return signals
+    
+    def attach_ids(self, signals, symbol, timeframe, csv_file=None):
+        """
+        Completa key_candle_id, zone_id y trend_id de señales calculadas en memoria (pipeline.py),
+        cuyos ids son posiciones en las listas, con los ids ya guardados del mismo ámbito.
+        Cada componente se identifica por su clave natural dentro del archivo: candle_index para
+        la vela y (start_idx, end_idx) para la zona y la mini-tendencia (zone_start_idx/zone_end_idx
+        y trend_start_idx/trend_end_idx en la señal). Si se guardó más de una fila, se usa la última.
+        :return: Nuevas señales (las originales no se modifican)
+        """
+        condition, params = scope_filter(symbol, timeframe, csv_file)
+        where = f" WHERE {condition}" if condition else ""
+        
+        self.cursor.execute(f"SELECT id, candle_index FROM key_candles{where}", params)
+        candle_ids = {}
+        for row in self.cursor.fetchall():
+            candle_ids[row['candle_index']] = max(row['id'], candle_ids.get(row['candle_index'], row['id']))
+        
+        def interval_ids(table_name):
+            self.cursor.execute(f"SELECT id, start_idx, end_idx FROM {table_name}{where}", params)
+            ids = {}
+            for row in self.cursor.fetchall():
+                key = (row['start_idx'], row['end_idx'])
+                ids[key] = max(row['id'], ids.get(key, row['id']))
+            return ids
+        zone_ids = interval_ids('detect_accumulation_zone_results')
+        trend_ids = interval_ids('mini_trend_results')
+        
+        file_name = scope_file(csv_file)
+        resolved = []
+        for signal in signals:
+            resolved.append(dict(
+                signal,
+                csv_file=signal.get('csv_file') or file_name,
+                key_candle_id=candle_ids.get(signal['candle_index']),
+                zone_id=zone_ids.get((signal.get('zone_start_idx'), signal.get('zone_end_idx'))),
+                trend_id=trend_ids.get((signal.get('trend_start_idx'), signal.get('trend_end_idx'))),
+            ))
+        missing = sum(1 for signal in resolved if signal['zone_id'] is None or signal['trend_id'] is None)
+        if missing:
+            logger.warning(f"{missing} señales sin zona o mini-tendencia guardada para {symbol}-{timeframe}")
+        return resolved
+    
     def calculate_signal_strength(self, signal):
         """
         Calcula una puntuación de fuerza para cada señal basada en:
@@ -413,65 +650,78 @@ class TripleSignalSaver:
             traceback.print_exc()
             return 0.5, {"error": str(e)}
     
-    def save_signals(self, symbol, timeframe):
-        """Guarda las señales de triple coincidencia en la tabla."""
+    def save_signals(self, symbol, timeframe, csv_file=None, signals=None):
+        """
+        Guarda las señales de triple coincidencia en la tabla.
+        :param csv_file: Archivo (día) a recalcular; por defecto se recalculan todos los días del par
+        :param signals: Señales ya calculadas en memoria (pipeline.find_triple_signals) a guardar en
+                        lugar de buscarlas en la base de datos; sus ids se resuelven con attach_ids
+        """
         if not self.connect():
             return False
         
         try:
-            # Crear tabla si no existe
+            # Crear tabla si no existe (DDL, antes de la transacción de borrado e inserción)
             if not self.create_triple_signals_table():
                 return False
+            self.conn.commit()
             
-            # Encontrar señales
-            signals = self.find_triple_signals(symbol, timeframe)
+            # Encontrar señales, o usar las recibidas con los ids ya guardados
+            if signals is None:
+                signals = self.find_triple_signals(symbol, timeframe, csv_file)
+            else:
+                signals = self.attach_ids(signals, symbol, timeframe, csv_file)
             if not signals:
                 logger.info(f"No se encontraron señales de triple coincidencia para {symbol}-{timeframe}")
                 return True
             
-            # Asegurarnos que no hay registros previos que puedan causar duplicados
-            # Primero, eliminamos cualquier registro con el mismo symbol/timeframe
-            delete_query = "DELETE FROM triple_signals WHERE symbol = %s AND timeframe = %s"
-            self.cursor.execute(delete_query, (symbol, timeframe))
-            self.conn.commit()
-            
-            # Para mayor seguridad, también podemos eliminar registros específicos por índice
-            if signals:
-                candle_indices = [signal['candle_index'] for signal in signals]
-                placeholder = ', '.join(['%s'] * len(candle_indices))
-                delete_specific_query = f"DELETE FROM triple_signals WHERE symbol = %s AND timeframe = %s AND candle_index IN ({placeholder})"
-                params = [symbol, timeframe] + candle_indices
-                self.cursor.execute(delete_specific_query, params)
-                self.conn.commit()
-                logger.info(f"Eliminados registros específicos para candle_index: {candle_indices}")
+            # Reemplazar solo el ámbito recalculado: el archivo indicado o, sin archivo, todos los días
+            # del par (se acaban de recalcular todos). Las señales de otros símbolos no se tocan
+            if csv_file:
+                condition, params = scope_filter(symbol, timeframe, csv_file)
+            else:
+                condition, params = "symbol = %s AND timeframe = %s", (symbol, timeframe)
+            self.cursor.execute(f"DELETE FROM triple_signals WHERE {condition}", params)
             
             # Insertar nuevas señales
-            insert_count = 0
-            insert_query = """
-            INSERT INTO triple_signals (
-                symbol, timeframe, candle_index, datetime, open, high, low, close, 
-                volume, body_percentage, zone_id, zone_quality_score, 
-                zone_start_datetime, zone_end_datetime, mini_trend_id, 
-                trend_direction, trend_slope, trend_r_squared, 
-                trend_start_datetime, trend_end_datetime, 
-                signal_strength, combined_score,
-                zone_score, trend_score, candle_score, direction_factor, slope_factor,
-                divergence_factor, reliability_bonus, profit_potential,
-                scoring_details
-            ) VALUES (
-                %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-                %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-            )
-            """
-            
-            for signal in signals:
-                # Calcular puntuaciones detalladas
-                signal_strength, strength_details = self.calculate_signal_strength(signal)
-                combined_score, extended_details = self.calculate_combined_score(signal, strength_details)
+            insert_columns = [name for name, _ in TRIPLE_SIGNAL_COLUMNS] + ['param_set_id']
+            run_id = self.run_id or current_run_id()
+            param_set_id = get_param_set_id(self.cursor, self.signal_params, stage='triples')
+            
+            # Puntuar todas las señales de una vez (calculate_signal_strength y
+            # calculate_combined_score quedan como implementación de referencia por señal)
+            scores = score_signals_batch(signals_to_columns(signals))
+            
+            # Cachear componentes por señal para re-ordenar con otros pesos sin tocar la base de datos
+            if self.component_cache_path:
+                save_component_cache(build_component_cache(signals), self.component_cache_path)
+                logger.info(f"Componentes de puntuación cacheados en {self.component_cache_path}")
+            
+            # Índices de inicio/fin de todas las zonas implicadas en una sola consulta
+            zone_bounds = {}
+            zone_ids = sorted({signal['zone_id'] for signal in signals if signal.get('zone_id') is not None})
+            if zone_ids:
+                placeholder = ', '.join(['%s'] * len(zone_ids))
+                self.cursor.execute(
+                    f"SELECT id, start_idx, end_idx FROM detect_accumulation_zone_results WHERE id IN ({placeholder})",
+                    zone_ids
+                )
+                zone_bounds = {row['id']: (row['start_idx'], row['end_idx']) for row in self.cursor.fetchall()}
+            
+            rows = []
+            seen_candles = set()
+            for position, signal in enumerate(signals):
+                # Clave única (symbol, timeframe, csv_file, candle_index): se conserva la primera señal de cada vela
+                signal_file = scope_file(signal.get('csv_file'))
+                if (signal_file, signal['candle_index']) in seen_candles:
+                    logger.warning(f"Se omitió una señal duplicada en candle_index={signal['candle_index']}")
+                    continue
+                seen_candles.add((signal_file, signal['candle_index']))
                 
-                # Convertir detalles extendidos a JSON para almacenamiento
-                import json
-                scoring_details_json = json.dumps(extended_details)
+                # Puntuaciones detalladas del lote, en columnas tipadas (sin JSON por señal)
+                signal_strength = float(scores['signal_strength'][position])
+                combined_score = float(scores['combined_score'][position])
+                score_values = tuple(float(scores[key][position]) for key in SCORE_COLUMNS)
                 
                 # Preparar datos para inserción
                 # Calcular datetime para la vela a partir de la zona y su índice
@@ -481,12 +731,10 @@ class TripleSignalSaver:
                 zone_start_idx = None
                 zone_end_idx = None
                 
-                # Buscar los índices de inicio/fin de la zona
-                self.cursor.execute(f"SELECT start_idx, end_idx FROM detect_accumulation_zone_results WHERE id = {signal['zone_id']}")
-                zone_info = self.cursor.fetchone()
+                # Índices de inicio/fin de la zona
+                zone_info = zone_bounds.get(signal['zone_id'])
                 if zone_info:
-                    zone_start_idx = zone_info['start_idx']
-                    zone_end_idx = zone_info['end_idx']
+                    zone_start_idx, zone_end_idx = zone_info
                 
                 # Calcular datetime aproximado para la vela
                 candle_datetime = None
@@ -540,39 +788,31 @@ class TripleSignalSaver:
                     signal['trend_end_datetime'],
                     signal_strength,
                     combined_score,
-                    # Puntuaciones detalladas de componentes
-                    extended_details.get('zone_score', 0.0),
-                    extended_details.get('trend_score', 0.0),
-                    extended_details.get('candle_score', 0.0),
-                    extended_details.get('direction_factor', 0.0),
-                    extended_details.get('slope_factor', 0.0),
-                    # Factores avanzados
-                    extended_details.get('divergence_factor', 0.0),
-                    extended_details.get('reliability_bonus', 0.0),
-                    extended_details.get('profit_potential', 0.0),
-                    # JSON completo con todos los detalles
-                    scoring_details_json
+                    # Puntuaciones detalladas de componentes, factores avanzados, base y final
+                    *score_values,
+                    signal_file,
+                    run_id,
+                    param_set_id
                 )
                 
-                try:
-                    self.cursor.execute(insert_query, params)
-                    insert_count += 1
-                except mysql.connector.errors.IntegrityError as e:
-                    # Manejo específico para error de duplicado
-                    if "Duplicate entry" in str(e):
-                        logger.warning(f"Se omitió una señal duplicada en candle_index={signal['candle_index']}")
-                    else:
-                        # Re-lanzar otros errores de integridad
-                        raise
-            
+                rows.append(params)
+            
+            # Upsert sobre la clave única: si otra ejecución del mismo ámbito insertó la vela entre
+            # el borrado y la inserción, se actualiza su fila en lugar de fallar por clave duplicada
+            update_columns = [c for c in insert_columns if c not in UNIQUE_SIGNAL_INDEX[1]]
+            stats = BulkWriter(self.conn).insert('triple_signals', insert_columns, rows,
+                                                 on_duplicate_update=update_columns)
+            # Borrado e inserción en una sola transacción
             self.conn.commit()
-            logger.info(f"Guardadas {insert_count} señales de triple coincidencia en la tabla")
+            logger.info(f"Guardadas {len(rows)} señales de triple coincidencia en la tabla ({format_stats(stats)})")
             return True
             
         except Exception as e:
             logger.error(f"Error guardando señales de triple coincidencia: {e}")
             import traceback
             traceback.print_exc()
+            self.conn.rollback()
+            reset_cache()
             return False
             
         finally:
@@ -584,12 +824,19 @@ def main():
     parser = argparse.ArgumentParser(description='Guardar señales de triple coincidencia en una tabla')
     parser.add_argument('--symbol', type=str, default='BTCUSDT', help='Símbolo (por defecto: BTCUSDT)')
     parser.add_argument('--timeframe', type=str, default='5m', help='Timeframe (por defecto: 5m)')
+    parser.add_argument('--join-engine', type=str, choices=['memory', 'sql'], default='memory',
+                        help='Motor de coincidencia: unión por intervalos en memoria o JOIN SQL (por defecto: memory)')
+    parser.add_argument('--tolerance', type=int, default=8, help='Tolerancia en velas alrededor de zonas y tendencias (por defecto: 8)')
+    parser.add_argument('--csv-file', type=str, help='Recalcular solo las señales de este archivo/día (por defecto: todos los del par)')
+    parser.add_argument('--component-cache', type=str, help='Archivo .npz donde cachear los componentes de puntuación (para weight_sweep.py)')
     args = parser.parse_args()
+    configure_logging('triple_signals.log', fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s', stdout=True)
     
     logger.info(f"Iniciando guardado de señales de triple coincidencia para {args.symbol}-{args.timeframe}")
     
-    saver = TripleSignalSaver()
-    if saver.save_signals(args.symbol, args.timeframe):
+    saver = TripleSignalSaver(join_engine=args.join_engine, tolerance=args.tolerance)
+    saver.component_cache_path = args.component_cache
+    if saver.save_signals(args.symbol, args.timeframe, args.csv_file):
         logger.info("Proceso completado exitosamente")
         return 0
     else:
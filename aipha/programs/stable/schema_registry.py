@@ -0,0 +1,120 @@
+"""
+schema_registry.py - Caché de la estructura de tablas por proceso
+
+Resuelve en una sola consulta a information_schema las columnas de todas las tablas de la base de
+datos (y en otra sus índices) y las guarda en memoria, de modo que los guardadores y los
+diagnósticos no repitan SHOW TABLES / SHOW COLUMNS / DESCRIBE en cada ejecución.
+Cualquier DDL (CREATE, ALTER, DROP) debe ir seguido de invalidate() para la tabla afectada.
+Ubicación: aipha/programs/stable/schema_registry.py
+"""
+
+import os
+import threading
+import logging
+
+# Base de datos -> {tabla: (columnas en orden)} y {tabla: {índices}}
+_columns = {}
+_indexes = {}
+# Sentencias INSERT generadas: (base de datos, tabla, columnas excluidas) -> (columnas, consulta)
+_insert_cache = {}
+_lock = threading.Lock()
+
+
+def _database(database):
+    return database or os.getenv('MYSQL_DATABASE', 'binance_lob')
+
+
+def _values(row):
+    """Valores de una fila, sea el cursor de tuplas o de diccionarios."""
+    return tuple(row.values()) if isinstance(row, dict) else tuple(row)
+
+
+def load_schema(cursor, database=None):
+    """
+    Lee columnas e índices de todas las tablas de la base de datos actual y los cachea.
+    :param cursor: Cursor abierto (de tuplas o de diccionarios) sobre la base de datos
+    :param database: Nombre con el que se cachea (por defecto MYSQL_DATABASE)
+    """
+    database = _database(database)
+    cursor.execute(
+        "SELECT table_name AS tbl, column_name AS col FROM information_schema.columns "
+        "WHERE table_schema = DATABASE() ORDER BY table_name, ordinal_position"
+    )
+    columns = {}
+    for row in cursor.fetchall():
+        table, column = _values(row)
+        columns.setdefault(table, []).append(column)
+
+    cursor.execute(
+        "SELECT DISTINCT table_name AS tbl, index_name AS idx FROM information_schema.statistics "
+        "WHERE table_schema = DATABASE()"
+    )
+    indexes = {}
+    for row in cursor.fetchall():
+        table, index = _values(row)
+        indexes.setdefault(table, set()).add(index)
+
+    with _lock:
+        _columns[database] = {table: tuple(cols) for table, cols in columns.items()}
+        _indexes[database] = indexes
+        for key in [k for k in _insert_cache if k[0] == database]:
+            del _insert_cache[key]
+    logging.info(f"Schema registry loaded {len(columns)} tables from {database}")
+
+
+def _tables(cursor, database):
+    database = _database(database)
+    if database not in _columns:
+        load_schema(cursor, database)
+    return _columns[database]
+
+
+def invalidate(table_name=None, database=None):
+    """
+    Descarta la estructura cacheada. Llamar después de cualquier DDL sobre table_name.
+    El esquema se relee entero (una consulta) la próxima vez que se necesite.
+    """
+    database = _database(database)
+    with _lock:
+        _columns.pop(database, None)
+        _indexes.pop(database, None)
+        for key in [k for k in _insert_cache if k[0] == database and (table_name is None or k[1] == table_name)]:
+            del _insert_cache[key]
+
+
+def table_exists(cursor, table_name, database=None):
+    """True si la tabla existe."""
+    return table_name in _tables(cursor, database)
+
+
+def table_columns(cursor, table_name, database=None):
+    """Columnas de la tabla en orden, o tupla vacía si no existe."""
+    return _tables(cursor, database).get(table_name, ())
+
+
+def has_column(cursor, table_name, column, database=None):
+    """True si la tabla tiene la columna."""
+    return column in table_columns(cursor, table_name, database)
+
+
+def has_index(cursor, table_name, index_name, database=None):
+    """True si la tabla tiene un índice con ese nombre."""
+    _tables(cursor, database)
+    return index_name in _indexes.get(_database(database), {}).get(table_name, set())
+
+
+def insert_statement(cursor, table_name, exclude=('id', 'created_at'), database=None):
+    """
+    Sentencia INSERT parametrizada con todas las columnas de la tabla salvo las excluidas.
+    :return: (lista de columnas, consulta)
+    """
+    key = (_database(database), table_name, tuple(exclude))
+    statement = _insert_cache.get(key)
+    if statement is None:
+        columns = [c for c in table_columns(cursor, table_name, database) if c not in exclude]
+        query = (f"INSERT INTO {table_name} ({', '.join(columns)}) "
+                 f"VALUES ({', '.join(['%s'] * len(columns))})")
+        statement = (columns, query)
+        with _lock:
+            _insert_cache[key] = statement
+    return statement
@@ -0,0 +1,224 @@
+"""
+signal_bitmap.py - Álgebra de señales con bitmaps sobre índices de barra
+
+Cada detector (velas clave, zonas de acumulación, mini-tendencias, o cualquier condición futura)
+puede expresarse como un bitmap comprimido con un bit por barra. La tolerancia en barras se aplica
+como dilatación del bitmap y la coincidencia de N condiciones es un único AND bit a bit, sin JOINs.
+Ubicación: aipha/programs/stable/signal_bitmap.py
+"""
+
+import itertools
+import numpy as np
+
+
+class SignalBitmap:
+    """
+    Bitmap de longitud fija sobre índices de barra, almacenado con los bits empaquetados
+    (8 barras por byte) para que AND/OR/NOT operen sobre bloques.
+    """
+    def __init__(self, length, packed=None):
+        """
+        :param length: Número de barras cubiertas por el bitmap
+        :param packed: Array uint8 con los bits empaquetados (opcional, vacío por defecto)
+        """
+        self.length = int(length)
+        n_bytes = (self.length + 7) // 8
+        if packed is None:
+            packed = np.zeros(n_bytes, dtype=np.uint8)
+        self.packed = np.asarray(packed, dtype=np.uint8)
+        if len(self.packed) != n_bytes:
+            raise ValueError(f"Packed bitmap has {len(self.packed)} bytes, expected {n_bytes}")
+
+    @classmethod
+    def from_mask(cls, mask):
+        """Construye el bitmap a partir de un array booleano por barra."""
+        mask = np.asarray(mask, dtype=bool)
+        return cls(len(mask), np.packbits(mask))
+
+    @classmethod
+    def from_indices(cls, indices, length):
+        """Marca las barras indicadas; los índices fuera de [0, length) se ignoran."""
+        indices = np.asarray(indices, dtype=np.int64)
+        indices = indices[(indices >= 0) & (indices < length)]
+        mask = np.zeros(length, dtype=bool)
+        mask[indices] = True
+        return cls.from_mask(mask)
+
+    @classmethod
+    def from_intervals(cls, starts, ends, length):
+        """
+        Marca todas las barras cubiertas por los intervalos [start, end] (fin inclusivo).
+        Usa un array de diferencias, así que el coste es O(intervalos + barras).
+        """
+        starts = np.clip(np.asarray(starts, dtype=np.int64), 0, length)
+        ends = np.clip(np.asarray(ends, dtype=np.int64) + 1, 0, length)
+        valid = starts < ends
+        diff = np.zeros(length + 1, dtype=np.int64)
+        np.add.at(diff, starts[valid], 1)
+        np.add.at(diff, ends[valid], -1)
+        return cls.from_mask(np.cumsum(diff[:-1]) > 0)
+
+    def to_mask(self):
+        """Devuelve el bitmap como array booleano de longitud `length`."""
+        return np.unpackbits(self.packed, count=self.length).astype(bool)
+
+    def indices(self):
+        """Índices de las barras activas, en orden ascendente."""
+        return np.flatnonzero(self.to_mask())
+
+    def count(self):
+        """Número de barras activas."""
+        return int(np.unpackbits(self.packed, count=self.length).sum())
+
+    def runs(self):
+        """
+        Vista por tramos (run-length) del bitmap.
+        :return: Tupla (starts, ends) con los tramos de barras activas, fin inclusivo
+        """
+        mask = np.concatenate(([False], self.to_mask(), [False]))
+        edges = np.flatnonzero(mask[1:] != mask[:-1])
+        return edges[0::2], edges[1::2] - 1
+
+    def dilate(self, tolerance):
+        """
+        Dilata el bitmap: una barra queda activa si hay alguna activa a `tolerance` barras o menos.
+        Para bitmaps construidos desde intervalos equivale a ampliar cada intervalo por ambos lados.
+        """
+        if tolerance <= 0:
+            return SignalBitmap(self.length, self.packed.copy())
+        mask = self.to_mask()
+        counts = np.concatenate(([0], np.cumsum(mask, dtype=np.int64)))
+        positions = np.arange(self.length)
+        upper = np.minimum(positions + tolerance + 1, self.length)
+        lower = np.maximum(positions - tolerance, 0)
+        return SignalBitmap.from_mask(counts[upper] - counts[lower] > 0)
+
+    def _check_compatible(self, other):
+        if not isinstance(other, SignalBitmap):
+            return NotImplemented
+        if other.length != self.length:
+            raise ValueError(f"Bitmap lengths differ: {self.length} != {other.length}")
+        return True
+
+    def __and__(self, other):
+        if self._check_compatible(other) is NotImplemented:
+            return NotImplemented
+        return SignalBitmap(self.length, np.bitwise_and(self.packed, other.packed))
+
+    def __or__(self, other):
+        if self._check_compatible(other) is NotImplemented:
+            return NotImplemented
+        return SignalBitmap(self.length, np.bitwise_or(self.packed, other.packed))
+
+    def __invert__(self):
+        inverted = np.bitwise_not(self.packed)
+        # Limpiar los bits de relleno del último byte
+        padding = len(inverted) * 8 - self.length
+        if padding:
+            inverted[-1] &= np.uint8((0xFF << padding) & 0xFF)
+        return SignalBitmap(self.length, inverted)
+
+    def __len__(self):
+        return self.length
+
+    def __eq__(self, other):
+        if not isinstance(other, SignalBitmap):
+            return NotImplemented
+        return self.length == other.length and np.array_equal(self.packed, other.packed)
+
+    def __repr__(self):
+        return f"SignalBitmap(length={self.length}, active={self.count()})"
+
+
+def key_candle_bitmap(key_candles, length, tolerance=0):
+    """
+    Bitmap de velas clave a partir de la salida de Detector.process_csv o de filas de key_candles.
+    :param key_candles: Lista de diccionarios con 'index' o 'candle_index', o lista de índices
+    :param length: Número de barras de la serie
+    :param tolerance: Dilatación opcional en barras
+    """
+    indices = [c.get('index', c.get('candle_index')) if isinstance(c, dict) else c for c in key_candles]
+    return SignalBitmap.from_indices(indices, length).dilate(tolerance)
+
+
+def zone_bitmap(zones, length, tolerance=0, min_quality=None):
+    """
+    Bitmap de barras cubiertas por zonas de acumulación, dilatado con la tolerancia.
+    :param zones: Lista de diccionarios con 'start_idx', 'end_idx' y opcionalmente 'quality_score'
+    :param min_quality: Calidad mínima para incluir la zona (None = todas)
+    """
+    if min_quality is not None:
+        zones = [z for z in zones if z.get('quality_score', 0) >= min_quality]
+    bitmap = SignalBitmap.from_intervals([z['start_idx'] for z in zones],
+                                         [z['end_idx'] for z in zones], length)
+    return bitmap.dilate(tolerance)
+
+
+def trend_bitmap(trends, length, tolerance=0, min_r_squared=None, direction=None):
+    """
+    Bitmap de barras cubiertas por mini-tendencias, dilatado con la tolerancia.
+    :param trends: Lista de diccionarios con 'start_idx', 'end_idx', 'r_squared' y 'direction'
+    :param min_r_squared: R² mínimo para incluir la mini-tendencia (None = todas)
+    :param direction: 'alcista' o 'bajista' para filtrar por dirección (None = ambas)
+    """
+    if min_r_squared is not None:
+        trends = [t for t in trends if t.get('r_squared', 0) >= min_r_squared]
+    if direction is not None:
+        trends = [t for t in trends if t.get('direction') == direction]
+    bitmap = SignalBitmap.from_intervals([t['start_idx'] for t in trends],
+                                         [t['end_idx'] for t in trends], length)
+    return bitmap.dilate(tolerance)
+
+
+class SignalAlgebra:
+    """
+    Registro de condiciones con nombre sobre la misma serie de barras.
+    Permite evaluar la coincidencia de cualquier subconjunto y recorrer combinaciones.
+    """
+    def __init__(self, length):
+        self.length = int(length)
+        self.conditions = {}
+
+    def add(self, name, bitmap):
+        """Registra una condición; todas deben tener la misma longitud."""
+        if bitmap.length != self.length:
+            raise ValueError(f"Condition '{name}' has length {bitmap.length}, expected {self.length}")
+        self.conditions[name] = bitmap
+        return self
+
+    def coincidence(self, names):
+        """AND de las condiciones indicadas."""
+        names = list(names)
+        if not names:
+            raise ValueError("At least one condition is required")
+        result = self.conditions[names[0]]
+        for name in names[1:]:
+            result = result & self.conditions[name]
+        return result
+
+    def evaluate_combinations(self, names=None, min_size=2, max_size=None, required=None):
+        """
+        Evalúa todas las combinaciones de condiciones y cuenta las barras en coincidencia.
+
+        :param names: Condiciones a combinar (por defecto todas las registradas)
+        :param min_size: Tamaño mínimo de la combinación
+        :param max_size: Tamaño máximo (por defecto todas)
+        :param required: Condiciones que deben estar en todas las combinaciones (p.ej. 'key_candle')
+        :return: Lista de (tupla de nombres, número de barras) ordenada por número de barras descendente
+        """
+        required = list(required or [])
+        optional = [n for n in (names or self.conditions) if n not in required]
+        max_size = max_size or len(required) + len(optional)
+        base = self.coincidence(required) if required else None
+
+        results = []
+        for size in range(max(min_size - len(required), 0), max_size - len(required) + 1):
+            for combo in itertools.combinations(optional, size):
+                if not required and not combo:
+                    continue
+                bitmap = base
+                for name in combo:
+                    bitmap = self.conditions[name] if bitmap is None else bitmap & self.conditions[name]
+                results.append((tuple(required) + combo, bitmap.count()))
+        results.sort(key=lambda item: item[1], reverse=True)
+        return results
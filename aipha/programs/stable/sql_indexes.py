@@ -0,0 +1,171 @@
+"""
+sql_indexes.py - Índices compuestos y columnas de ámbito para las tablas de resultados
+
+Define los índices (symbol, timeframe, ...) que permiten a MySQL resolver por rango las consultas
+de find_triple_signals, y funciones para añadirlos (junto con las columnas symbol/timeframe)
+a tablas creadas antes de que existieran.
+Ubicación: aipha/programs/stable/sql_indexes.py
+"""
+
+import os
+import sys
+import uuid
+import logging
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+import schema_registry
+
+# Índice compuesto por tabla: (nombre, columnas)
+SCOPE_INDEXES = {
+    'key_candles': ('idx_key_candles_scope', ('symbol', 'timeframe', 'candle_index')),
+    'detect_accumulation_zone_results': ('idx_zone_scope', ('symbol', 'timeframe', 'start_idx', 'end_idx')),
+    'mini_trend_results': ('idx_mini_trend_results_scope', ('symbol', 'timeframe', 'start_idx', 'end_idx')),
+    'mini_trends': ('idx_mini_trends_scope', ('symbol', 'timeframe', 'start_idx', 'end_idx')),
+}
+
+# Definición de las columnas de ámbito
+SCOPE_COLUMNS = (
+    ('symbol', 'VARCHAR(20)'),
+    ('timeframe', 'VARCHAR(10)'),
+)
+
+# Columna con el identificador de la ejecución que escribió cada fila
+RUN_COLUMN = ('run_id', 'VARCHAR(32)')
+
+# Columna con el archivo CSV (un día de un símbolo/timeframe) del que sale cada fila
+FILE_COLUMN = ('csv_file', 'VARCHAR(255)')
+
+# Identificador de la ejecución actual (AIPHA_RUN_ID o uno nuevo por proceso)
+_run_id = None
+
+
+def current_run_id():
+    """Identificador de la ejecución: AIPHA_RUN_ID si está definido, si no uno aleatorio por proceso."""
+    global _run_id
+    if _run_id is None:
+        _run_id = os.getenv('AIPHA_RUN_ID') or uuid.uuid4().hex
+    return _run_id
+
+
+def scope_from_csv(csv_file):
+    """
+    Símbolo y timeframe a partir del nombre del CSV (BTCUSDT-5m-2025-04-16.csv -> BTCUSDT, 5m).
+    :return: Tupla (symbol, timeframe), con None si el nombre no sigue el formato
+    """
+    if csv_file:
+        parts = os.path.basename(csv_file).split('-')
+        if len(parts) >= 2:
+            return parts[0], parts[1]
+    return None, None
+
+
+def scope_file(csv_file):
+    """Archivo de origen tal como se guarda en la columna csv_file: solo el nombre, sin directorio."""
+    return os.path.basename(csv_file) if csv_file else None
+
+
+def scope_filter(symbol, timeframe, csv_file):
+    """
+    Condición WHERE del ámbito que sustituye un guardado: las filas del mismo archivo dentro de su
+    símbolo/timeframe, de modo que guardar otro día del mismo par no borra los anteriores.
+    Las filas sin csv_file (escritas antes de que se guardara) no se pueden atribuir a un día y
+    también se sustituyen.
+    :return: Tupla (condición, parámetros); (None, ()) si no se puede determinar el ámbito
+    """
+    csv_file = scope_file(csv_file)
+    if symbol and timeframe and csv_file:
+        return ("symbol = %s AND timeframe = %s AND (csv_file = %s OR csv_file IS NULL)",
+                (symbol, timeframe, csv_file))
+    if csv_file:
+        return "csv_file = %s", (csv_file,)
+    if symbol and timeframe:
+        return "symbol = %s AND timeframe = %s", (symbol, timeframe)
+    return None, ()
+
+
+def scope_index_sql(table_name):
+    """Cláusula INDEX para incluir en un CREATE TABLE."""
+    index_name, columns = SCOPE_INDEXES[table_name]
+    return f"INDEX {index_name} ({', '.join(columns)})"
+
+
+def _scalar(row):
+    """Primer valor de una fila, sea el cursor de tuplas o de diccionarios."""
+    if row is None:
+        return None
+    if isinstance(row, dict):
+        return next(iter(row.values()))
+    return row[0]
+
+
+def ensure_scope_columns(cursor, table_name):
+    """
+    Añade las columnas symbol/timeframe si la tabla no las tiene.
+    :return: Lista de columnas añadidas
+    """
+    added = []
+    for column, column_type in SCOPE_COLUMNS:
+        if not schema_registry.has_column(cursor, table_name, column):
+            cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {column} {column_type}")
+            added.append(column)
+    if added:
+        schema_registry.invalidate(table_name)
+        logging.info(f"Added scope columns {added} to {table_name}")
+    return added
+
+
+def ensure_run_column(cursor, table_name):
+    """
+    Añade la columna run_id si la tabla no la tiene.
+    :return: True si se añadió
+    """
+    column, column_type = RUN_COLUMN
+    if schema_registry.has_column(cursor, table_name, column):
+        return False
+    cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {column} {column_type}")
+    schema_registry.invalidate(table_name)
+    logging.info(f"Added {column} column to {table_name}")
+    return True
+
+
+def ensure_file_column(cursor, table_name):
+    """
+    Añade la columna csv_file si la tabla no la tiene.
+    :return: True si se añadió
+    """
+    column, column_type = FILE_COLUMN
+    if schema_registry.has_column(cursor, table_name, column):
+        return False
+    cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {column} {column_type}")
+    schema_registry.invalidate(table_name)
+    logging.info(f"Added {column} column to {table_name}")
+    return True
+
+
+def ensure_scope_index(cursor, table_name):
+    """
+    Crea el índice compuesto de la tabla si todavía no existe.
+    :return: True si se creó el índice
+    """
+    index_name, columns = SCOPE_INDEXES[table_name]
+    if schema_registry.has_index(cursor, table_name, index_name):
+        return False
+    cursor.execute(f"CREATE INDEX {index_name} ON {table_name} ({', '.join(columns)})")
+    schema_registry.invalidate(table_name)
+    logging.info(f"Created index {index_name} on {table_name}")
+    return True
+
+
+def max_interval_span(cursor, table_name, symbol, timeframe):
+    """
+    Longitud máxima (end_idx - start_idx) de los intervalos de un símbolo/timeframe.
+    Permite acotar por ambos lados el rango sobre start_idx y que el índice se recorra
+    solo en una ventana pequeña alrededor de cada vela.
+    """
+    cursor.execute(
+        f"SELECT MAX(end_idx - start_idx) FROM {table_name} WHERE symbol = %s AND timeframe = %s",
+        (symbol, timeframe)
+    )
+    span = _scalar(cursor.fetchone())
+    return int(span) if span is not None else 0
@@ -0,0 +1,347 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+stage_benchmark.py - Tiempo y memoria de cada etapa de detección con datos sintéticos
+
+Genera series OHLCV sintéticas (1k, 100k, 1M y 10M velas por defecto) y mide, cada caso en un
+intérprete nuevo, el tiempo (mejor de varias repeticiones) y la memoria: pico de memoria reservada
+durante la llamada (tracemalloc, en una ejecución aparte que no cuenta para el tiempo) y aumento
+del pico de memoria residente del proceso:
+- key_candles: Detector.process_csv
+- segments: MiniTrendDetector.segment_mini_trends
+- mini_trend_volume_profile: MiniTrendDetector.calculate_volume_profile (una llamada por segmento)
+- zone_volume_profile: AccumulationZoneDetector.calculate_volume_profile (una llamada por vela clave)
+- zones: AccumulationZoneDetector.process_candles
+- triple_matching: interval_join.find_triple_coincidences
+- scoring: batch_scoring.signals_to_columns + score_signals_batch
+Con --budget, si el tiempo estimado de un tamaño (lineal respecto al anterior) lo supera, se omite;
+por defecto se miden todos los tamaños. Frente a un baseline, un caso medido en el baseline que
+ahora falta, se omite o falla cuenta como fallo, igual que una regresión.
+
+    python stage_benchmark.py --json bench_antes.json
+    python stage_benchmark.py --sizes 1000 100000 --stages key_candles segments --json bench_despues.json
+    python stage_benchmark.py --compare bench_despues.json --baseline bench_antes.json
+
+Ubicación: aipha/programs/stable/stage_benchmark.py
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import tracemalloc
+import argparse
+import tempfile
+import subprocess
+
+STABLE_DIR = os.path.abspath(os.path.dirname(__file__))
+
+DEFAULT_SIZES = (1000, 100000, 1000000, 10000000)
+
+# Separación entre velas clave sintéticas y longitud de los segmentos / ventanas de zona
+KEY_CANDLE_SPACING = 50
+SEGMENT_BARS = 20
+ZONE_BARS = 30
+
+
+def synthetic_bars(rows, seed=7):
+    """
+    Velas OHLCV sintéticas (paseo aleatorio) con la vista bars del pipeline:
+    timestamp en microsegundos, OHLCV numérico y datetime.
+    """
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.1, rows))
+    open_ = close + rng.normal(0, 0.05, rows)
+    high = np.maximum(open_, close) + rng.uniform(0.01, 0.1, rows)
+    low = np.minimum(open_, close) - rng.uniform(0.01, 0.1, rows)
+    timestamps = 1744761600000000 + np.arange(rows, dtype=np.int64) * 300000000
+    return pd.DataFrame({
+        'timestamp': timestamps, 'open': open_, 'high': high, 'low': low, 'close': close,
+        'volume': rng.lognormal(3, 0.5, rows), 'datetime': pd.to_datetime(timestamps, unit='us'),
+    })
+
+
+def _key_candles(bars):
+    from detect_candles import Detector
+    detector = Detector()
+    detector.data = bars[['open', 'high', 'low', 'close', 'volume']]
+    detector.set_detection_params()
+    return detector.process_csv
+
+
+def _segments(bars):
+    from mini_trend import MiniTrendDetector
+    detector = MiniTrendDetector()
+    detector.data = bars
+    return detector.segment_mini_trends
+
+
+def _mini_trend_volume_profile(bars):
+    from mini_trend import MiniTrendDetector
+    detector = MiniTrendDetector()
+    detector.data = bars
+    segments = [bars.iloc[start:start + SEGMENT_BARS] for start in range(0, len(bars) - SEGMENT_BARS, SEGMENT_BARS)]
+    return lambda: [detector.calculate_volume_profile(segment) for segment in segments]
+
+
+def _zone_detector(bars):
+    from detect_accumulation_zone import AccumulationZoneDetector
+    detector = AccumulationZoneDetector()
+    detector.data = bars
+    return detector
+
+
+def _zone_volume_profile(bars):
+    detector = _zone_detector(bars)
+    ends = range(KEY_CANDLE_SPACING, len(bars), KEY_CANDLE_SPACING)
+    return lambda: [detector.calculate_volume_profile(end - ZONE_BARS, end) for end in ends]
+
+
+def _zones(bars):
+    detector = _zone_detector(bars)
+    indices = list(range(KEY_CANDLE_SPACING, len(bars), KEY_CANDLE_SPACING))
+    return lambda: detector.process_candles(indices)
+
+
+def _triple_matching(bars):
+    import numpy as np
+    from interval_join import find_triple_coincidences
+    rows = len(bars)
+    rng = np.random.default_rng(1)
+    candles = np.arange(KEY_CANDLE_SPACING, rows, KEY_CANDLE_SPACING // 2)
+    zone_ends = candles - 2
+    trend_starts = np.arange(0, max(rows - SEGMENT_BARS, 1), SEGMENT_BARS)
+    return lambda: find_triple_coincidences(
+        candles, zone_ends - ZONE_BARS, zone_ends, trend_starts, trend_starts + SEGMENT_BARS - 1,
+        zone_quality=rng.uniform(0, 1, len(candles)), trend_r_squared=rng.uniform(0, 1, len(trend_starts)))
+
+
+def _scoring(bars):
+    from batch_scoring import signals_to_columns, score_signals_batch
+    sample = bars.iloc[KEY_CANDLE_SPACING::KEY_CANDLE_SPACING // 2]
+    signals = [{
+        'zone_quality_score': 0.5 + (position % 50) / 100,
+        'trend_r_squared': (position % 97) / 97,
+        'trend_direction': 'alcista' if position % 2 else 'bajista',
+        'trend_slope': close - open_,
+        'volume': volume,
+        'body_percentage': (position % 40) + 1.0,
+    } for position, (open_, close, volume) in enumerate(zip(sample['open'], sample['close'], sample['volume']))]
+    return lambda: score_signals_batch(signals_to_columns(signals))
+
+
+# Etapa -> función(bars) que prepara el caso y devuelve la llamada que se mide
+STAGE_CASES = {
+    'key_candles': _key_candles,
+    'segments': _segments,
+    'mini_trend_volume_profile': _mini_trend_volume_profile,
+    'zone_volume_profile': _zone_volume_profile,
+    'zones': _zones,
+    'triple_matching': _triple_matching,
+    'scoring': _scoring,
+}
+
+
+def _peak_rss_mb():
+    """Pico de memoria residente del proceso en MB (None si no se puede medir)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa en KB; macOS en bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_case(stage, rows, repeat=1, seed=7):
+    """
+    Mide un caso en este proceso.
+    :return: Diccionario con seconds (mejor repetición), setup_seconds, peak_mb (pico reservado por la
+             llamada según tracemalloc) y rss_mb (aumento del pico de memoria residente)
+    """
+    started = time.perf_counter()
+    call = STAGE_CASES[stage](synthetic_bars(rows, seed))
+    setup_seconds = time.perf_counter() - started
+    rss_before = _peak_rss_mb()
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - started)
+    rss_after = _peak_rss_mb()
+    # tracemalloc ralentiza el código Python: la memoria se mide en una ejecución aparte
+    tracemalloc.start()
+    try:
+        call()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'seconds': min(times),
+        'setup_seconds': setup_seconds,
+        'peak_mb': peak / (1024 * 1024),
+        'rss_mb': None if rss_before is None else rss_after - rss_before,
+    }
+
+
+def probe_case(stage, rows, repeat=1, seed=7):
+    """Mide un caso en un intérprete nuevo (memoria aislada de los demás casos)."""
+    command = [sys.executable, os.path.join(STABLE_DIR, 'stage_benchmark.py'), '--case', stage, str(rows),
+               '--repeat', str(repeat), '--seed', str(seed)]
+    # Directorio de trabajo temporal: los logs en rutas relativas no caen en el repositorio
+    result = subprocess.run(command, capture_output=True, text=True, cwd=tempfile.gettempdir())
+    lines = result.stdout.strip().splitlines()
+    if result.returncode != 0 or not lines:
+        return {'seconds': None, 'error': (result.stderr.strip().splitlines() or ['fallo'])[-1]}
+    return json.loads(lines[-1])
+
+
+def benchmark(stages=None, sizes=DEFAULT_SIZES, repeat=1, budget=0, seed=7, isolate=True):
+    """
+    Tiempo y memoria por etapa y tamaño.
+    :param budget: Segundos máximos estimados por caso (0 = sin límite)
+    :param isolate: Medir cada caso en un intérprete nuevo
+    :return: Diccionario etapa -> {filas: {seconds, setup_seconds, peak_mb, rss_mb, error, skipped}}
+    """
+    results = {}
+    for stage in stages or STAGE_CASES:
+        if stage not in STAGE_CASES:
+            raise ValueError(f"Etapa de benchmark desconocida: {stage}")
+        results[stage] = {}
+        previous = None
+        for rows in sorted(sizes):
+            if previous and previous.get('seconds') is None:
+                # Si falla con un tamaño (dependencia ausente), falla con todos
+                results[stage][str(rows)] = {'seconds': None, 'error': previous.get('error'), 'skipped': True}
+                continue
+            if previous and budget:
+                # Repeticiones medidas más la ejecución con tracemalloc
+                estimate = previous['seconds'] * rows / previous['rows'] * (repeat + 1)
+                if estimate > budget:
+                    results[stage][str(rows)] = {'seconds': None, 'error': None, 'skipped': True,
+                                                 'estimate': estimate}
+                    continue
+            if isolate:
+                result = probe_case(stage, rows, repeat, seed)
+            else:
+                try:
+                    result = run_case(stage, rows, repeat, seed)
+                except Exception as e:
+                    result = {'seconds': None, 'error': f"{type(e).__name__}: {e}"}
+            result = dict({'error': None, 'skipped': False}, **result)
+            results[stage][str(rows)] = result
+            previous = dict(result, rows=rows)
+    return results
+
+
+def compare(results, baseline, tolerance=0.25, min_delta=None):
+    """
+    Regresiones de tiempo y memoria respecto a un resultado anterior.
+    Un caso medido en el baseline que ahora no tiene tiempo (omitido, con error o ausente en una
+    etapa medida) se devuelve como regresión de 'seconds' con ahora = None.
+    :param tolerance: Aumento relativo permitido
+    :param min_delta: Aumento absoluto por métrica por debajo del cual no se considera regresión
+                      (por defecto 10ms y 1MB)
+    :return: Lista de (etapa, filas, métrica, antes, ahora)
+    """
+    min_delta = dict({'seconds': 0.01, 'peak_mb': 1.0}, **(min_delta or {}))
+    regressions = []
+    for stage, by_size in results.items():
+        for rows, before in baseline.get(stage, {}).items():
+            if before.get('seconds') is not None and by_size.get(rows, {}).get('seconds') is None:
+                regressions.append((stage, rows, 'seconds', before['seconds'], None))
+        for rows, r in by_size.items():
+            for metric, delta in min_delta.items():
+                before = baseline.get(stage, {}).get(rows, {}).get(metric)
+                now = r.get(metric)
+                if before is None or now is None:
+                    continue
+                if now > before * (1 + tolerance) and now - before > delta:
+                    regressions.append((stage, rows, metric, before, now))
+    return regressions
+
+
+def format_results(results, baseline=None):
+    lines = [f"{'etapa':<28} {'velas':>10} {'tiempo (s)':>11} {'memoria (MB)':>13} {'vs baseline':>12}"]
+    for stage, by_size in results.items():
+        for rows, r in by_size.items():
+            if r.get('error'):
+                lines.append(f"{stage:<28} {int(rows):>10}  error: {r['error']}")
+                continue
+            if r.get('skipped'):
+                lines.append(f"{stage:<28} {int(rows):>10}  omitido (estimado {r['estimate']:.0f}s)")
+                continue
+            memory = f"{r['peak_mb']:.1f}" if r.get('peak_mb') is not None else '-'
+            before = (baseline or {}).get(stage, {}).get(rows, {}).get('seconds')
+            change = f"{r['seconds'] / before:.2f}x" if before else '-'
+            lines.append(f"{stage:<28} {int(rows):>10} {r['seconds']:>11.4f} {memory:>13} {change:>12}")
+    unmeasured = sum(1 for by_size in results.values() for r in by_size.values() if r.get('seconds') is None)
+    if unmeasured:
+        lines.append(f"{unmeasured} casos sin medir (omitidos o con error)")
+    return '\n'.join(lines)
+
+
+def environment():
+    """Versiones con las que se midió (los resultados solo son comparables en el mismo entorno)."""
+    import numpy as np
+    import pandas as pd
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+            'machine': platform.machine(), 'platform': platform.platform(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo y memoria de cada etapa de detección con datos sintéticos")
+    parser.add_argument('--stages', type=str, nargs='*', help=f"Etapas a medir (por defecto: {', '.join(STAGE_CASES)})")
+    parser.add_argument('--sizes', type=int, nargs='*', default=list(DEFAULT_SIZES), help='Número de velas')
+    parser.add_argument('--repeat', type=int, default=1, help='Repeticiones por caso (se toma la mejor)')
+    parser.add_argument('--budget', type=float, default=0, help='Segundos estimados máximos por caso (0 = sin límite)')
+    parser.add_argument('--seed', type=int, default=7, help='Semilla de los datos sintéticos')
+    parser.add_argument('--json', type=str, help='Guardar los resultados en este archivo JSON')
+    parser.add_argument('--baseline', type=str, help='JSON de una ejecución anterior con el que comparar')
+    parser.add_argument('--compare', type=str, help='Comparar este JSON con --baseline sin volver a medir')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Aumento relativo permitido respecto al baseline')
+    parser.add_argument('--case', nargs=2, metavar=('ETAPA', 'VELAS'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        # Modo interno de probe_case: la última línea de stdout es el resultado
+        from log_config import configure_logging
+        import logging
+        configure_logging(level=logging.CRITICAL)
+        result = run_case(args.case[0], int(args.case[1]), args.repeat, args.seed)
+        print(json.dumps(result))
+        return True
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    if args.compare:
+        with open(args.compare) as f:
+            report = json.load(f)
+    else:
+        report = {'environment': environment(),
+                  'results': benchmark(args.stages, args.sizes, args.repeat, args.budget, args.seed)}
+    print(format_results(report['results'], baseline))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    ok = True
+    if baseline is not None:
+        for stage, rows, metric, before, now in compare(report['results'], baseline, args.tolerance):
+            if now is None:
+                print(f"Sin medir: {stage} ({rows} velas), {metric} en el baseline {before:.4f}")
+            else:
+                print(f"Regresión: {stage} ({rows} velas) {metric} {before:.4f} -> {now:.4f}")
+            ok = False
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,264 @@
+"""
+stage_dag.py - Planificador de etapas como grafo de dependencias
+
+Cada etapa declara sus entradas (las etapas cuya salida recibe) y una clave de parámetros.
+Las etapas sin dependencias pendientes se ejecutan a la vez en un pool, de modo que la latencia
+total es la del camino crítico y no la suma de las etapas. Con hilos (por defecto) solo se solapan
+las etapas que liberan el GIL (E/S, numpy/pandas vectorizado); las etapas de Python puro y CPU se
+serializan en el GIL, y para ellas existe executor='process' (las funciones, entradas y salidas
+deben poder serializarse con pickle). Cada salida se guarda en un
+StageCache con una clave de contenido (huella de los datos, etapa, parámetros y claves de sus
+entradas), y se reutiliza si la misma etapa se vuelve a pedir con las mismas entradas.
+
+    dag = StageDAG()
+    dag.add('candles', detect, params={'lookback': 30})
+    dag.add('zones', zones, inputs=('candles',), params={'atr_period': 14})
+    result = dag.run(max_workers=2, cache=StageCache(), fingerprint=csv_hash)
+    print(format_report(result))
+
+Ubicación: aipha/programs/stable/stage_dag.py
+"""
+
+import os
+import sys
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+from param_sets import param_hash
+
+# Etapa del grafo: función, etapas de entrada y parámetros (parte de la clave de caché)
+Stage = namedtuple('Stage', ['name', 'fn', 'inputs', 'params'])
+
+# Tiempo de una etapa: inicio y fin relativos al comienzo de la ejecución, y si salió de la caché
+StageTiming = namedtuple('StageTiming', ['start', 'end', 'cached'])
+
+# Pools disponibles para StageDAG.run
+EXECUTORS = {'thread': ThreadPoolExecutor, 'process': ProcessPoolExecutor}
+
+
+def _timed(fn, args):
+    # Función de módulo para que el pool de procesos pueda serializarla; devuelve la duración
+    # medida en el proceso que ejecuta la etapa
+    start = time.perf_counter()
+    output = fn(*args)
+    return time.perf_counter() - start, output
+
+
+class StageCache:
+    """
+    Caché en memoria de salidas de etapas por clave de contenido, con desalojo LRU.
+    Es segura entre hilos y puede compartirse entre ejecuciones del mismo proceso.
+    """
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DagResult:
+    """Salidas, claves y tiempos de una ejecución del grafo."""
+    def __init__(self, outputs, keys, timings, wall_seconds, critical_path):
+        self.outputs = outputs
+        self.keys = keys
+        self.timings = timings
+        self.wall_seconds = wall_seconds
+        self.critical_path = critical_path
+
+    def seconds(self, stage):
+        timing = self.timings[stage]
+        return timing.end - timing.start
+
+    @property
+    def critical_seconds(self):
+        return sum(self.seconds(stage) for stage in self.critical_path)
+
+
+class StageDAG:
+    """Grafo de etapas con dependencias declaradas."""
+    def __init__(self):
+        self.stages = OrderedDict()
+
+    def add(self, name, fn, inputs=(), params=None):
+        """
+        Añade una etapa.
+        :param name: Nombre único de la etapa
+        :param fn: Función que recibe las salidas de las entradas, en el orden declarado
+        :param inputs: Nombres de las etapas de las que depende
+        :param params: Diccionario serializable de parámetros (forma parte de la clave de caché)
+        """
+        if name in self.stages:
+            raise ValueError(f"Stage already defined: {name}")
+        self.stages[name] = Stage(name, fn, tuple(inputs), dict(params or {}))
+        return self
+
+    def topological_order(self, targets=None, preset=()):
+        """
+        Etapas necesarias para obtener targets, en un orden compatible con las dependencias.
+        Las etapas de preset ya tienen salida: sus entradas no se piden.
+        """
+        targets = list(self.stages) if targets is None else list(targets)
+        order = []
+        state = {}
+
+        def visit(name, path):
+            if name not in self.stages:
+                raise ValueError(f"Unknown stage: {name}")
+            if state.get(name) == 'done':
+                return
+            if state.get(name) == 'visiting':
+                raise ValueError(f"Dependency cycle: {' -> '.join(path + [name])}")
+            state[name] = 'visiting'
+            if name not in preset:
+                for dependency in self.stages[name].inputs:
+                    visit(dependency, path + [name])
+            state[name] = 'done'
+            order.append(name)
+
+        for target in targets:
+            visit(target, [])
+        return order
+
+    def stage_key(self, name, input_keys, fingerprint=None):
+        """Clave de contenido de una etapa: huella de los datos, parámetros y claves de sus entradas."""
+        stage = self.stages[name]
+        sha = hashlib.sha256()
+        sha.update(f"{fingerprint}|{name}|{param_hash(stage.params)}".encode('utf-8'))
+        for key in input_keys:
+            sha.update(b'|')
+            sha.update(str(key).encode('utf-8'))
+        return sha.hexdigest()
+
+    def run(self, targets=None, max_workers=None, cache=None, fingerprint=None, preset=None, on_complete=None,
+            executor='thread'):
+        """
+        Ejecuta las etapas necesarias para targets.
+
+        :param targets: Etapas pedidas (por defecto todas)
+        :param max_workers: Tamaño del pool (por defecto tantas como etapas independientes posibles)
+        :param cache: StageCache para reutilizar salidas (opcional)
+        :param fingerprint: Huella de los datos de entrada (por ejemplo el hash del CSV)
+        :param preset: Diccionario etapa -> salida ya disponible; la etapa no se ejecuta
+        :param on_complete: Función(nombre, salida, cached) llamada en el hilo que planifica,
+                            en un orden compatible con las dependencias
+        :param executor: 'thread' (etapas que liberan el GIL) o 'process' (etapas de CPU en Python puro)
+        :return: DagResult
+        """
+        if executor not in EXECUTORS:
+            raise ValueError(f"Unknown executor '{executor}', expected one of {tuple(EXECUTORS)}")
+        preset = preset or {}
+        order = self.topological_order(targets, preset)
+        outputs = {}
+        keys = {}
+        timings = {}
+        pending = {name: set() if name in preset else set(self.stages[name].inputs) for name in order}
+        dependents = {name: [other for other in order if name in pending[other]] for name in order}
+        origin = time.perf_counter()
+
+        def finish(name, output, cached, start):
+            outputs[name] = output
+            timings[name] = StageTiming(start, time.perf_counter() - origin, cached)
+            if on_complete is not None:
+                on_complete(name, output, cached)
+            for dependent in dependents[name]:
+                pending[dependent].discard(name)
+
+        running = {}
+        with EXECUTORS[executor](max_workers=max_workers or max(1, len(order))) as pool:
+            while len(outputs) < len(order):
+                for name in order:
+                    if name in outputs or name in running.values() or pending[name]:
+                        continue
+                    start = time.perf_counter() - origin
+                    if name in preset:
+                        keys[name] = f"preset:{name}"
+                        finish(name, preset[name], True, start)
+                        continue
+                    stage = self.stages[name]
+                    keys[name] = self.stage_key(name, [keys[i] for i in stage.inputs], fingerprint)
+                    if cache is not None:
+                        hit, value = cache.get(keys[name])
+                        if hit:
+                            logging.info(f"Stage {name}: cache hit")
+                            finish(name, value, True, start)
+                            continue
+                    future = pool.submit(_timed, stage.fn, [outputs[i] for i in stage.inputs])
+                    running[future] = name
+                if len(outputs) == len(order):
+                    break
+                if not running:
+                    # Solo puede ocurrir si una etapa en caché liberó dependientes: volver a planificar
+                    continue
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        seconds, output = future.result()
+                    except Exception:
+                        for other in running:
+                            other.cancel()
+                        raise
+                    if cache is not None:
+                        cache.put(keys[name], output)
+                    # El inicio se deduce de la duración: los relojes de otro proceso no son comparables
+                    finish(name, output, False, max(0.0, time.perf_counter() - origin - seconds))
+
+        wall = time.perf_counter() - origin
+        return DagResult(outputs, keys, timings, wall, critical_path(self, timings, preset))
+
+
+def critical_path(dag, timings, preset=()):
+    """
+    Camino de dependencias con mayor tiempo acumulado: la latencia mínima con hilos ilimitados.
+    :return: Lista de etapas desde la primera hasta la última del camino
+    """
+    best = {}
+    for name in timings:
+        # timings se rellena en orden compatible con las dependencias
+        duration = timings[name].end - timings[name].start
+        inputs = [] if name in preset else [i for i in dag.stages[name].inputs if i in best]
+        previous = max(inputs, key=lambda i: best[i][0], default=None)
+        total = duration + (best[previous][0] if previous else 0.0)
+        best[name] = (total, (best[previous][1] if previous else []) + [name])
+    if not best:
+        return []
+    return max(best.values(), key=lambda item: item[0])[1]
+
+
+def format_report(result):
+    """Tabla de tiempos por etapa con el camino crítico marcado."""
+    lines = [f"{'Etapa':<14}{'Inicio':>9}{'Fin':>9}{'Segundos':>10}  Origen"]
+    for name, timing in sorted(result.timings.items(), key=lambda item: item[1].start):
+        marker = '*' if name in result.critical_path else ' '
+        origin = 'caché' if timing.cached else 'ejecutada'
+        lines.append(f"{marker}{name:<13}{timing.start:>9.3f}{timing.end:>9.3f}{timing.end - timing.start:>10.3f}  {origin}")
+    total = sum(result.seconds(name) for name in result.timings)
+    lines.append(f"Camino crítico: {' -> '.join(result.critical_path)} ({result.critical_seconds:.3f}s); "
+                 f"total real {result.wall_seconds:.3f}s; suma de etapas {total:.3f}s")
+    return '\n'.join(lines)
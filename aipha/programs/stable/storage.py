@@ -0,0 +1,526 @@
+"""
+storage.py - Almacenamiento de resultados detrás de una interfaz de repositorio
+
+Define una interfaz común (ResultStore) para las tablas de resultados del pipeline
+(key_candles, detect_accumulation_zone_results, mini_trend_results, mini_trends y triple_signals,
+más param_sets)
+con tres implementaciones:
+  - SQLiteStore: archivo local embebido, sin servidor (biblioteca estándar)
+  - DuckDBStore: archivo local embebido orientado a consultas analíticas (requiere duckdb)
+  - MySQLStore: la base de datos MySQL de siempre, a través del pool compartido
+Todas admiten inserciones masivas, reemplazo por archivo (symbol, timeframe, csv_file, como
+sql_indexes.scope_filter en los savers) y lecturas columnares.
+El backend se elige con AIPHA_STORAGE_BACKEND (mysql, sqlite o duckdb) y AIPHA_STORAGE_PATH, o con
+--storage en run_combined_detection.py; pipeline.StoreSink escribe las etapas del pipeline en él.
+Ubicación: aipha/programs/stable/storage.py
+"""
+
+import os
+import sys
+import logging
+from datetime import datetime, date
+import numpy as np
+import pandas as pd
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+from sql_indexes import SCOPE_INDEXES, scope_filter, scope_file
+from param_sets import param_hash, canonical_params
+
+# Ruta por defecto del archivo embebido
+DEFAULT_STORAGE_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../data/aipha_results'))
+
+# Columnas de cada tabla (sin id), con un tipo genérico: INT, FLOAT, BOOL, TEXT o DATETIME
+TABLE_SCHEMAS = {
+    'key_candles': (
+        ('candle_index', 'INT'), ('open', 'FLOAT'), ('high', 'FLOAT'), ('low', 'FLOAT'),
+        ('close', 'FLOAT'), ('volume', 'FLOAT'), ('volume_percentile', 'FLOAT'),
+        ('body_percentage', 'FLOAT'), ('is_key_candle', 'BOOL'), ('symbol', 'TEXT'),
+        ('timeframe', 'TEXT'), ('csv_file', 'TEXT'), ('in_accumulation_zone', 'BOOL'), ('mini_trend_id', 'INT'),
+        ('datetime', 'DATETIME'), ('param_set_id', 'INT'), ('run_id', 'TEXT'),
+    ),
+    'detect_accumulation_zone_results': (
+        ('start_idx', 'INT'), ('end_idx', 'INT'), ('high', 'FLOAT'), ('low', 'FLOAT'),
+        ('volume_avg', 'FLOAT'), ('vol_total', 'FLOAT'), ('vwap', 'FLOAT'), ('poc', 'FLOAT'),
+        ('mfi', 'FLOAT'), ('quality_score', 'FLOAT'), ('datetime_start', 'DATETIME'),
+        ('datetime_end', 'DATETIME'), ('param_set_id', 'INT'), ('symbol', 'TEXT'),
+        ('timeframe', 'TEXT'), ('csv_file', 'TEXT'), ('run_id', 'TEXT'),
+    ),
+    'mini_trend_results': (
+        ('start_idx', 'INT'), ('end_idx', 'INT'), ('start_time', 'DATETIME'), ('end_time', 'DATETIME'),
+        ('direction', 'TEXT'), ('slope', 'FLOAT'), ('r_squared', 'FLOAT'), ('poc', 'FLOAT'),
+        ('volume_total', 'FLOAT'), ('duration_bars', 'INT'), ('duration_minutes', 'INT'),
+        ('comparison_results', 'TEXT'), ('csv_file', 'TEXT'), ('symbol', 'TEXT'), ('timeframe', 'TEXT'),
+        ('run_id', 'TEXT'),
+    ),
+    'mini_trends': (
+        ('start_idx', 'INT'), ('end_idx', 'INT'), ('start_time', 'DATETIME'), ('end_time', 'DATETIME'),
+        ('direction', 'TEXT'), ('slope', 'FLOAT'), ('r_squared', 'FLOAT'), ('poc', 'FLOAT'),
+        ('volume_total', 'FLOAT'), ('duration_bars', 'INT'), ('symbol', 'TEXT'), ('timeframe', 'TEXT'),
+        ('csv_file', 'TEXT'), ('related_accumulation_zone_id', 'INT'), ('run_id', 'TEXT'),
+    ),
+    'triple_signals': (
+        ('symbol', 'TEXT'), ('timeframe', 'TEXT'), ('candle_index', 'INT'), ('datetime', 'DATETIME'),
+        ('open', 'FLOAT'), ('high', 'FLOAT'), ('low', 'FLOAT'), ('close', 'FLOAT'), ('volume', 'FLOAT'),
+        ('body_percentage', 'FLOAT'), ('zone_id', 'INT'), ('zone_quality_score', 'FLOAT'),
+        ('zone_start_datetime', 'DATETIME'), ('zone_end_datetime', 'DATETIME'), ('mini_trend_id', 'INT'),
+        ('trend_direction', 'TEXT'), ('trend_slope', 'FLOAT'), ('trend_r_squared', 'FLOAT'),
+        ('trend_start_datetime', 'DATETIME'), ('trend_end_datetime', 'DATETIME'),
+        ('signal_strength', 'FLOAT'), ('combined_score', 'FLOAT'), ('zone_score', 'FLOAT'),
+        ('trend_score', 'FLOAT'), ('candle_score', 'FLOAT'), ('direction_factor', 'FLOAT'),
+        ('slope_factor', 'FLOAT'), ('divergence_factor', 'FLOAT'), ('reliability_bonus', 'FLOAT'),
+        ('profit_potential', 'FLOAT'), ('base_strength', 'FLOAT'), ('final_score', 'FLOAT'),
+        ('csv_file', 'TEXT'), ('run_id', 'TEXT'), ('param_set_id', 'INT'),
+    ),
+    # Conjuntos de parámetros referenciados por param_set_id (ver param_sets.py)
+    'param_sets': (
+        ('param_hash', 'TEXT'), ('stage', 'TEXT'), ('params', 'TEXT'),
+    ),
+}
+
+# Índices adicionales además de los de ámbito de sql_indexes
+EXTRA_INDEXES = {
+    'triple_signals': ('idx_triple_signals_scope', ('symbol', 'timeframe', 'candle_index')),
+}
+
+# Claves únicas, con los mismos nombres que en MySQL (save_triple_signals.py y param_sets.py)
+UNIQUE_INDEXES = {
+    'triple_signals': ('unique_signal_file', ('symbol', 'timeframe', 'csv_file', 'candle_index')),
+    'param_sets': ('unique_param_hash', ('param_hash',)),
+}
+
+# Tipos de las columnas al leer en formato columnar: los enteros son Int64 con nulos de pandas
+# para que los índices y los ids vuelvan como enteros aunque haya NULL
+_NUMPY_TYPES = {'FLOAT': np.float64, 'BOOL': np.float64}
+_NULLABLE_INT = 'Int64'
+
+
+def _plain(value):
+    """Convierte escalares numpy y Timestamps a tipos que aceptan todos los drivers."""
+    if isinstance(value, np.generic):
+        return value.item()
+    if hasattr(value, 'to_pydatetime'):
+        return value.to_pydatetime()
+    return value
+
+
+class ResultStore:
+    """
+    Interfaz de repositorio para las tablas de resultados.
+    Las subclases definen la conexión, el marcador de parámetros y los tipos SQL.
+    """
+    placeholder = '?'
+    type_names = {'INT': 'INTEGER', 'FLOAT': 'DOUBLE', 'BOOL': 'BOOLEAN', 'TEXT': 'VARCHAR', 'DATETIME': 'TIMESTAMP'}
+
+    def __init__(self):
+        self.connection = None
+        self._ready_tables = set()
+
+    # --- Conexión ---------------------------------------------------------------------------
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def _cursor(self):
+        return self.connection.cursor()
+
+    def begin(self):
+        """Inicio explícito de transacción (los drivers DB-API la abren implícitamente)."""
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    # --- Esquema ----------------------------------------------------------------------------
+    def columns(self, table_name):
+        """Columnas de la tabla (sin id)."""
+        return [name for name, _ in TABLE_SCHEMAS[table_name]]
+
+    def _id_column_sql(self, table_name):
+        return "id INTEGER PRIMARY KEY"
+
+    def _create_sequence(self, cursor, table_name):
+        pass
+
+    def _table_exists(self, cursor, table_name):
+        # information_schema estándar; los backends sin él (SQLite) lo sustituyen
+        cursor.execute(f"SELECT 1 FROM information_schema.tables WHERE table_name = {self.placeholder}",
+                       (table_name,))
+        return cursor.fetchone() is not None
+
+    def _table_columns(self, cursor, table_name):
+        cursor.execute(f"SELECT column_name FROM information_schema.columns WHERE table_name = {self.placeholder}",
+                       (table_name,))
+        return {row[0] for row in cursor.fetchall()}
+
+    def _ensure_unique_index(self, cursor, table_name):
+        index_name, index_columns = UNIQUE_INDEXES[table_name]
+        cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {index_name} ON {table_name} ({', '.join(index_columns)})")
+
+    def ensure_table(self, table_name):
+        """
+        Crea la tabla y sus índices si no existen. En una tabla creada con un esquema anterior
+        añade las columnas y la clave única que le falten.
+        """
+        if table_name in self._ready_tables:
+            return
+        cursor = self._cursor()
+        try:
+            if not self._table_exists(cursor, table_name):
+                self._create_sequence(cursor, table_name)
+                column_sql = ', '.join(f"{name} {self.type_names[kind]}" for name, kind in TABLE_SCHEMAS[table_name])
+                cursor.execute(f"CREATE TABLE {table_name} ({self._id_column_sql(table_name)}, {column_sql})")
+                for index in (SCOPE_INDEXES.get(table_name), EXTRA_INDEXES.get(table_name)):
+                    if index:
+                        index_name, index_columns = index
+                        cursor.execute(f"CREATE INDEX {index_name} ON {table_name} ({', '.join(index_columns)})")
+                logging.info(f"Created table {table_name} in {self.__class__.__name__}")
+            else:
+                existing = self._table_columns(cursor, table_name)
+                for name, kind in TABLE_SCHEMAS[table_name]:
+                    if name not in existing:
+                        cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {name} {self.type_names[kind]}")
+                        logging.info(f"Added column {name} to {table_name} in {self.__class__.__name__}")
+            if table_name in UNIQUE_INDEXES:
+                self._ensure_unique_index(cursor, table_name)
+        finally:
+            cursor.close()
+        self._ready_tables.add(table_name)
+
+    # --- Escritura --------------------------------------------------------------------------
+    def _prepare_value(self, value):
+        return _plain(value)
+
+    def _insert_rows(self, table_name, columns, rows):
+        query = (f"INSERT INTO {table_name} ({', '.join(columns)}) "
+                 f"VALUES ({', '.join([self.placeholder] * len(columns))})")
+        cursor = self._cursor()
+        try:
+            cursor.executemany(query, rows)
+        finally:
+            cursor.close()
+
+    def append(self, table_name, records, columns=None, commit=True):
+        """
+        Inserción masiva.
+        :param records: Lista de diccionarios (o de tuplas si se indican columns)
+        :param columns: Columnas de las tuplas; si es None se usan todas las del esquema
+        :return: Número de filas insertadas
+        """
+        self.ensure_table(table_name)
+        records = list(records)
+        if not records:
+            return 0
+        if columns is None:
+            columns = self.columns(table_name)
+            rows = [tuple(self._prepare_value(r.get(c)) for c in columns) for r in records]
+        else:
+            rows = [tuple(self._prepare_value(v) for v in r) for r in records]
+        self._insert_rows(table_name, list(columns), rows)
+        if commit:
+            self.commit()
+        return len(rows)
+
+    def update_column(self, table_name, column, ids, values, commit=True):
+        """
+        Actualiza una columna de las filas indicadas por id (una sentencia con executemany).
+        :return: Número de filas actualizadas
+        """
+        self.ensure_table(table_name)
+        rows = [(self._prepare_value(value), self._prepare_value(row_id)) for row_id, value in zip(ids, values)]
+        if rows:
+            cursor = self._cursor()
+            try:
+                cursor.executemany(f"UPDATE {table_name} SET {column} = {self.placeholder} "
+                                   f"WHERE id = {self.placeholder}", rows)
+            finally:
+                cursor.close()
+        if commit:
+            self.commit()
+        return len(rows)
+
+    def delete_scope(self, table_name, symbol, timeframe, csv_file, commit=True):
+        """
+        Borra las filas de un archivo (día) de un símbolo y timeframe, como scope_filter en los
+        savers: los demás días del par se conservan.
+        """
+        condition, params = scope_filter(symbol, timeframe, csv_file)
+        if condition is None:
+            raise ValueError(f"Cannot determine the scope to replace: symbol={symbol}, timeframe={timeframe}, "
+                             f"csv_file={csv_file}")
+        self.ensure_table(table_name)
+        cursor = self._cursor()
+        try:
+            cursor.execute(f"DELETE FROM {table_name} WHERE {condition.replace('%s', self.placeholder)}", params)
+        finally:
+            cursor.close()
+        if commit:
+            self.commit()
+
+    def replace_scope(self, table_name, symbol, timeframe, csv_file, records, columns=None):
+        """
+        Sustituye en una sola transacción las filas de un archivo de (symbol, timeframe) por las nuevas.
+        :return: Número de filas insertadas
+        """
+        self.ensure_table(table_name)
+        self.begin()
+        try:
+            self.delete_scope(table_name, symbol, timeframe, csv_file, commit=False)
+            count = self.append(table_name, records, columns, commit=False)
+            self.commit()
+            return count
+        except Exception:
+            self.rollback()
+            raise
+
+    # --- Lectura ----------------------------------------------------------------------------
+    def _select(self, table_name, columns, symbol, timeframe, order_by, csv_file=None):
+        self.ensure_table(table_name)
+        columns = list(columns or ['id'] + self.columns(table_name))
+        query = f"SELECT {', '.join(columns)} FROM {table_name}"
+        conditions = []
+        params = []
+        if symbol is not None and timeframe is not None:
+            conditions.append(f"symbol = {self.placeholder} AND timeframe = {self.placeholder}")
+            params = [symbol, timeframe]
+        if csv_file is not None:
+            conditions.append(f"csv_file = {self.placeholder}")
+            params.append(scope_file(csv_file))
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        if order_by:
+            query += f" ORDER BY {order_by}"
+        cursor = self._cursor()
+        try:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+        return columns, rows
+
+    def scan(self, table_name, columns=None, symbol=None, timeframe=None, order_by=None, csv_file=None):
+        """
+        Lectura columnar: diccionario columna -> array.
+        Las columnas INT (e id) son arrays Int64 de pandas (NULL -> <NA>), las FLOAT y BOOL
+        float64 (NULL -> NaN) y el resto arrays numpy de objetos.
+        :param csv_file: Solo las filas de ese archivo (día)
+        """
+        columns, rows = self._select(table_name, columns, symbol, timeframe, order_by, csv_file)
+        kinds = dict(TABLE_SCHEMAS[table_name])
+        kinds['id'] = 'INT'
+        result = {}
+        for position, column in enumerate(columns):
+            values = [row[position] for row in rows]
+            dtype = _NUMPY_TYPES.get(kinds.get(column))
+            if kinds.get(column) == 'INT':
+                result[column] = pd.array([None if v is None else int(v) for v in values], dtype=_NULLABLE_INT)
+            elif dtype is not None:
+                result[column] = np.array([np.nan if v is None else float(v) for v in values], dtype=dtype)
+            else:
+                result[column] = np.array(values, dtype=object)
+        return result
+
+    def scan_records(self, table_name, columns=None, symbol=None, timeframe=None, order_by=None, csv_file=None):
+        """Lectura por filas: lista de diccionarios."""
+        columns, rows = self._select(table_name, columns, symbol, timeframe, order_by, csv_file)
+        return [dict(zip(columns, row)) for row in rows]
+
+    def count(self, table_name, symbol=None, timeframe=None, csv_file=None):
+        """Número de filas (de un símbolo/timeframe y archivo si se indican)."""
+        columns, rows = self._select(table_name, ['COUNT(*)'], symbol, timeframe, None, csv_file)
+        return int(rows[0][0])
+
+    # --- Conjuntos de parámetros ------------------------------------------------------------
+    def param_set_id(self, params, stage=None):
+        """
+        Id del conjunto de parámetros en param_sets, insertándolo si es nuevo (mismo hash que
+        param_sets.get_param_set_id). No hace commit: queda en la transacción del llamador.
+        """
+        digest = param_hash(params)
+        self.ensure_table('param_sets')
+        query = f"SELECT id FROM param_sets WHERE param_hash = {self.placeholder}"
+        cursor = self._cursor()
+        try:
+            cursor.execute(query, (digest,))
+            row = cursor.fetchone()
+            if row is None:
+                cursor.execute(f"INSERT INTO param_sets (param_hash, stage, params) "
+                               f"VALUES ({', '.join([self.placeholder] * 3)})",
+                               (digest, stage, canonical_params(params)))
+                cursor.execute(query, (digest,))
+                row = cursor.fetchone()
+        finally:
+            cursor.close()
+        return int(row[0])
+
+
+class SQLiteStore(ResultStore):
+    """Backend embebido en un archivo SQLite (sin servidor)."""
+    placeholder = '?'
+    type_names = {'INT': 'INTEGER', 'FLOAT': 'REAL', 'BOOL': 'INTEGER', 'TEXT': 'TEXT', 'DATETIME': 'TEXT'}
+
+    def __init__(self, path=None):
+        super().__init__()
+        import sqlite3
+        self.path = path or DEFAULT_STORAGE_PATH + '.sqlite'
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # Sin comprobación de hilo: pipeline.StoreSink escribe desde su hilo de escritura (uno a la vez)
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        # WAL permite lectores concurrentes mientras se escribe; NORMAL evita un fsync por commit
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+
+    def _id_column_sql(self, table_name):
+        return "id INTEGER PRIMARY KEY AUTOINCREMENT"
+
+    def _table_exists(self, cursor, table_name):
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,))
+        return cursor.fetchone() is not None
+
+    def _table_columns(self, cursor, table_name):
+        cursor.execute(f"PRAGMA table_info({table_name})")
+        return {row[1] for row in cursor.fetchall()}
+
+    def _prepare_value(self, value):
+        value = _plain(value)
+        if isinstance(value, datetime):
+            return value.strftime('%Y-%m-%d %H:%M:%S')
+        if isinstance(value, date):
+            return value.strftime('%Y-%m-%d')
+        return value
+
+
+class _DuckDBCursor:
+    """Cursor sobre la conexión DuckDB principal (sus cursores son conexiones independientes)."""
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, query, params=None):
+        self.connection.execute(query, params or [])
+
+    def executemany(self, query, rows):
+        self.connection.executemany(query, rows)
+
+    def fetchone(self):
+        return self.connection.fetchone()
+
+    def fetchall(self):
+        return self.connection.fetchall()
+
+    def close(self):
+        pass
+
+
+class DuckDBStore(ResultStore):
+    """Backend embebido en un archivo DuckDB (columnar, para escaneos analíticos)."""
+    placeholder = '?'
+
+    def __init__(self, path=None):
+        super().__init__()
+        try:
+            import duckdb
+        except ImportError as e:
+            raise ImportError("DuckDBStore requires the 'duckdb' package (pip install duckdb)") from e
+        self.path = path or DEFAULT_STORAGE_PATH + '.duckdb'
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.connection = duckdb.connect(self.path)
+        self._in_transaction = False
+
+    def _cursor(self):
+        return _DuckDBCursor(self.connection)
+
+    # DuckDB trabaja en autocommit salvo que se abra una transacción explícita
+    def begin(self):
+        if not self._in_transaction:
+            self.connection.execute("BEGIN TRANSACTION")
+            self._in_transaction = True
+
+    def commit(self):
+        if self._in_transaction:
+            self.connection.execute("COMMIT")
+            self._in_transaction = False
+
+    def rollback(self):
+        if self._in_transaction:
+            self.connection.execute("ROLLBACK")
+            self._in_transaction = False
+
+    def _id_column_sql(self, table_name):
+        return f"id BIGINT PRIMARY KEY DEFAULT nextval('seq_{table_name}')"
+
+    def _create_sequence(self, cursor, table_name):
+        cursor.execute(f"CREATE SEQUENCE IF NOT EXISTS seq_{table_name}")
+
+
+class MySQLStore(ResultStore):
+    """Backend MySQL sobre el pool compartido; las inserciones van por BulkWriter."""
+    placeholder = '%s'
+    type_names = {'INT': 'INT', 'FLOAT': 'FLOAT', 'BOOL': 'BOOLEAN', 'TEXT': 'VARCHAR(255)', 'DATETIME': 'DATETIME'}
+
+    def __init__(self, db_config=None):
+        super().__init__()
+        from db_pool import get_connection
+        self.connection = get_connection(db_config)
+
+    def _id_column_sql(self, table_name):
+        return "id INT AUTO_INCREMENT PRIMARY KEY"
+
+    def _table_exists(self, cursor, table_name):
+        import schema_registry
+        return schema_registry.table_exists(cursor, table_name)
+
+    def _table_columns(self, cursor, table_name):
+        import schema_registry
+        return set(schema_registry.table_columns(cursor, table_name))
+
+    def _ensure_unique_index(self, cursor, table_name):
+        # MySQL no admite CREATE INDEX IF NOT EXISTS
+        import schema_registry
+        index_name, index_columns = UNIQUE_INDEXES[table_name]
+        if not schema_registry.has_index(cursor, table_name, index_name):
+            cursor.execute(f"ALTER TABLE {table_name} ADD UNIQUE KEY {index_name} ({', '.join(index_columns)})")
+
+    def ensure_table(self, table_name):
+        created = table_name not in self._ready_tables
+        super().ensure_table(table_name)
+        if created:
+            import schema_registry
+            schema_registry.invalidate(table_name)
+
+    def _insert_rows(self, table_name, columns, rows):
+        from bulk_writer import BulkWriter
+        BulkWriter(self.connection).insert(table_name, columns, rows)
+
+
+# Backends disponibles por nombre
+BACKENDS = {
+    'sqlite': SQLiteStore,
+    'duckdb': DuckDBStore,
+    'mysql': MySQLStore,
+}
+
+
+def open_store(backend=None, path=None):
+    """
+    Abre el almacenamiento configurado.
+    :param backend: 'mysql', 'sqlite' o 'duckdb' (por defecto AIPHA_STORAGE_BACKEND o 'mysql')
+    :param path: Archivo de los backends embebidos (por defecto AIPHA_STORAGE_PATH)
+    """
+    backend = (backend or os.getenv('AIPHA_STORAGE_BACKEND', 'mysql')).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown storage backend '{backend}', expected one of {sorted(BACKENDS)}")
+    if backend == 'mysql':
+        return MySQLStore()
+    return BACKENDS[backend](path or os.getenv('AIPHA_STORAGE_PATH'))
@@ -0,0 +1,82 @@
+"""
+Prueba el orden, la contrapresión y la propagación de errores de BackgroundResultWriter,
+y la carga del CSV de la CLI de zonas de acumulación.
+Ubicación: aipha/programs/stable/tests/test_async_writer.py
+"""
+
+import threading
+import time
+import tempfile
+import sys
+import os
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from async_writer import BackgroundResultWriter, BackgroundWriteError
+from save_detect_accumulation_zone import load_ohlcv_dataframe
+from test_pipeline import write_sample_csv
+
+def test_jobs_run_in_order_and_flush_on_close():
+    written = []
+    with BackgroundResultWriter(max_pending=2) as writer:
+        for i in range(10):
+            writer.submit(written.append, i)
+    print(f"Written: {written}")
+    assert written == list(range(10))
+    assert writer.completed == 10
+
+def test_backpressure():
+    release = threading.Event()
+    writer = BackgroundResultWriter(max_pending=1)
+    writer.submit(release.wait)       # ocupa el hilo escritor
+    writer.submit(lambda: None)       # llena la cola
+    blocked = threading.Thread(target=writer.submit, args=(lambda: None,))
+    blocked.start()
+    time.sleep(0.1)
+    # El tercer trabajo espera a que haya hueco en la cola
+    assert blocked.is_alive()
+    release.set()
+    blocked.join(timeout=2)
+    assert not blocked.is_alive()
+    writer.close()
+    assert writer.completed == 3
+
+def test_errors_propagate():
+    writer = BackgroundResultWriter()
+    writer.submit(lambda: False, description='failing save')
+    try:
+        writer.flush()
+    except BackgroundWriteError as e:
+        print(f"Error esperado: {e}")
+    else:
+        assert False, "flush should raise the background error"
+    try:
+        writer.submit(lambda: None)
+    except BackgroundWriteError:
+        pass
+    else:
+        assert False, "submit should raise after a failed job"
+    try:
+        writer.close()
+    except BackgroundWriteError:
+        pass
+
+def test_load_ohlcv_dataframe_first_row():
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = os.path.join(tmp, 'BTCUSDT-5m-2025-04-16.csv')
+        write_sample_csv(csv_file, rows=20)
+        # Por defecto se descarta siempre la primera fila, como el resto del pipeline
+        assert len(load_ohlcv_dataframe(csv_file)) == 19
+        # Con detect_header solo se descarta si es un encabezado
+        assert len(load_ohlcv_dataframe(csv_file, detect_header=True)) == 20
+        with open(csv_file) as f:
+            lines = f.read()
+        with open(csv_file, 'w') as f:
+            f.write('open_time,open,high,low,close,volume,a,b,c,d,e,f\n' + lines)
+        assert len(load_ohlcv_dataframe(csv_file, detect_header=True)) == 20
+
+if __name__ == "__main__":
+    test_jobs_run_in_order_and_flush_on_close()
+    test_backpressure()
+    test_errors_propagate()
+    test_load_ohlcv_dataframe_first_row()
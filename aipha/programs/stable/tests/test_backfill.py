@@ -0,0 +1,90 @@
+"""
+Prueba que backfill procesa las unidades pendientes y que una segunda ejecución las omite por el checkpoint.
+Ubicación: aipha/programs/stable/tests/test_backfill.py
+"""
+
+import sys
+import os
+import sqlite3
+import tempfile
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backfill import BackfillCheckpoint, run_backfill, day_range, unit_queues
+from test_pipeline import write_sample_csv
+
+def test_backfill_resumes_from_checkpoint():
+    assert day_range('2025-04-30', '2025-05-02') == ['2025-04-30', '2025-05-01', '2025-05-02']
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = os.path.join(tmp, 'data', 'data_detect')
+        os.makedirs(data_dir)
+        for day in ('2025-04-10', '2025-04-11'):
+            write_sample_csv(os.path.join(data_dir, f'BTCUSDT-5m-{day}.csv'), rows=200)
+        output_dir = os.path.join(tmp, 'out')
+        messages = []
+
+        with BackfillCheckpoint(os.path.join(tmp, 'checkpoint.sqlite')) as checkpoint:
+            summary = run_backfill(['BTCUSDT'], ['5m'], '2025-04-10', '2025-04-12', os.path.join(tmp, 'data'),
+                                   stages=['candles'], workers=2, checkpoint=checkpoint,
+                                   output_dir=output_dir, progress=messages.append)
+            print('\n'.join(messages))
+            assert summary['units'] == 2 and summary['missing'] == 1 and not summary['failed']
+            assert summary['bars'] == 400
+            assert os.path.exists(os.path.join(output_dir, 'BTCUSDT-5m-2025-04-11_candles.csv'))
+            assert 'velas/s' in messages[-1] and 'ETA' in messages[-1]
+
+            # Reanudación: las unidades completadas no se repiten
+            again = run_backfill(['BTCUSDT'], ['5m'], '2025-04-10', '2025-04-12', os.path.join(tmp, 'data'),
+                                 stages=['candles'], workers=2, checkpoint=checkpoint,
+                                 output_dir=output_dir, progress=messages.append)
+            assert again['units'] == 0 and again['skipped'] == 2
+
+            # Otros parámetros son otras unidades
+            changed = run_backfill(['BTCUSDT'], ['5m'], '2025-04-10', '2025-04-10', os.path.join(tmp, 'data'),
+                                   stages=['candles'], params={'candles': {'lookback': 20}}, workers=1,
+                                   checkpoint=checkpoint, output_dir=output_dir, progress=messages.append)
+            assert changed['units'] == 1
+
+            # Una ejecución sin destino no cuenta como guardada en CSV
+            none = run_backfill(['BTCUSDT'], ['5m'], '2025-04-10', '2025-04-10', os.path.join(tmp, 'data'),
+                                stages=['candles'], params={'candles': {'lookback': 25}}, workers=1,
+                                checkpoint=checkpoint, sink_kind='none', progress=messages.append)
+            assert none['units'] == 1
+            after_none = run_backfill(['BTCUSDT'], ['5m'], '2025-04-10', '2025-04-10', os.path.join(tmp, 'data'),
+                                      stages=['candles'], params={'candles': {'lookback': 25}}, workers=1,
+                                      checkpoint=checkpoint, output_dir=output_dir, progress=messages.append)
+            assert after_none['units'] == 1
+
+            # Un CSV reescrito con otro contenido se vuelve a procesar
+            write_sample_csv(os.path.join(data_dir, 'BTCUSDT-5m-2025-04-11.csv'), rows=200, seed=8)
+            rewritten = run_backfill(['BTCUSDT'], ['5m'], '2025-04-10', '2025-04-12', os.path.join(tmp, 'data'),
+                                     stages=['candles'], workers=2, checkpoint=checkpoint,
+                                     output_dir=output_dir, progress=messages.append)
+            assert rewritten['units'] == 1 and rewritten['skipped'] == 1
+
+def test_db_units_are_serialised_per_pair():
+    units = [('BTCUSDT', '5m', '2025-04-10'), ('BTCUSDT', '5m', '2025-04-11'), ('ETHUSDT', '5m', '2025-04-10')]
+    queues = unit_queues(units, 'db')
+    assert [list(queue) for queue in queues.values()] == [units[:2], units[2:]]
+    assert len(unit_queues(units, 'csv')) == 3
+
+def test_legacy_checkpoint_is_replaced():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'checkpoint.sqlite')
+        connection = sqlite3.connect(path)
+        connection.execute("CREATE TABLE backfill_units (symbol TEXT, timeframe TEXT, day TEXT, stage TEXT, "
+                           "param_hash TEXT, bars INTEGER, seconds REAL, finished_at TEXT, "
+                           "PRIMARY KEY (symbol, timeframe, day, stage, param_hash))")
+        connection.execute("INSERT INTO backfill_units VALUES ('BTCUSDT', '5m', '2025-04-10', 'candles', 'x', 1, 1.0, '')")
+        connection.commit()
+        connection.close()
+        with BackfillCheckpoint(path) as checkpoint:
+            assert checkpoint.completed('BTCUSDT', '5m', '2025-04-10', {'candles': 'x'}, 'csv', 'h') == set()
+            checkpoint.mark('BTCUSDT', '5m', '2025-04-10', 'candles', 'x', 'csv', 'h')
+            assert checkpoint.completed('BTCUSDT', '5m', '2025-04-10', {'candles': 'x'}, 'csv', 'h') == {'candles'}
+            assert checkpoint.completed('BTCUSDT', '5m', '2025-04-10', {'candles': 'x'}, 'db', 'h') == set()
+
+if __name__ == "__main__":
+    test_backfill_resumes_from_checkpoint()
+    test_db_units_are_serialised_per_pair()
+    test_legacy_checkpoint_is_replaced()
@@ -0,0 +1,46 @@
+"""
+Prueba la puntuación vectorizada frente a la implementación por señal de TripleSignalSaver.
+Ubicación: aipha/programs/stable/tests/test_batch_scoring.py
+"""
+
+import numpy as np
+import sys
+import os
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from batch_scoring import score_signals_batch, signals_to_columns
+from save_triple_signals import TripleSignalSaver, SCORE_COLUMNS
+
+def create_sample_signals(num_signals=500):
+    rng = np.random.default_rng(3)
+    directions = ['alcista', 'bajista', 'Alcista', 'lateral']
+    return [{
+        'zone_quality_score': float(rng.uniform(0.3, 1.3)),
+        'trend_r_squared': float(rng.uniform(0.2, 1.0)),
+        'trend_direction': directions[int(rng.integers(0, len(directions)))],
+        'trend_slope': float(rng.normal(0, 120)),
+        'volume': float(rng.uniform(0, 250)),
+        'body_percentage': float(rng.uniform(0, 100)),
+    } for _ in range(num_signals)]
+
+def test_batch_matches_reference():
+    signals = create_sample_signals()
+    saver = TripleSignalSaver()
+    scores = score_signals_batch(signals_to_columns(signals))
+    max_diff = 0.0
+    for position, signal in enumerate(signals):
+        strength, details = saver.calculate_signal_strength(signal)
+        combined, extended = saver.calculate_combined_score(signal, details)
+        # Columnas tipadas que save_signals guarda, en el orden de extended_details
+        batch_details = {key: float(scores[key][position]) for key in SCORE_COLUMNS}
+        assert list(batch_details) == list(extended)
+        max_diff = max(max_diff, abs(strength - scores['signal_strength'][position]),
+                       abs(combined - scores['combined_score'][position]),
+                       *(abs(extended[key] - batch_details[key]) for key in extended))
+    print(f"Max difference vs reference: {max_diff}")
+    # Solo puede diferir el redondeo a 4 decimales en casos de empate
+    assert max_diff <= 1e-4 + 1e-9
+
+if __name__ == "__main__":
+    test_batch_matches_reference()
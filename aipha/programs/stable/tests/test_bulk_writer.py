@@ -0,0 +1,88 @@
+"""
+Prueba el troceado en lotes de BulkWriter y el formato de LOAD DATA.
+Ubicación: aipha/programs/stable/tests/test_bulk_writer.py
+"""
+
+import sys
+import os
+from datetime import datetime
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from bulk_writer import BulkWriter, _tsv_value
+from mysql.connector import Error
+import db_pool
+
+class RecordingCursor:
+    def __init__(self, log):
+        self.log = log
+    def executemany(self, query, rows):
+        self.log.append((query, list(rows)))
+    def execute(self, query, params=None):
+        # El servidor rechaza LOAD DATA LOCAL (local_infile deshabilitado)
+        raise Error(msg="Loading local data is disabled", errno=3948)
+    def close(self):
+        pass
+
+class RecordingConnection:
+    def __init__(self):
+        self.log = []
+        self.commits = 0
+    def cursor(self):
+        return RecordingCursor(self.log)
+    def commit(self):
+        self.commits += 1
+
+def test_executemany_batches():
+    conn = RecordingConnection()
+    rows = [(i, f"s{i}") for i in range(25)]
+    stats = BulkWriter(conn, batch_size=10).insert('t', ['a', 'b'], rows)
+    print(f"Stats: {stats}")
+    assert stats['rows'] == 25 and stats['batches'] == 3
+    assert [len(batch) for _, batch in conn.log] == [10, 10, 5]
+    assert conn.log[0][0] == "INSERT INTO t (a, b) VALUES (%s, %s)"
+    assert sum((batch for _, batch in conn.log), []) == rows
+    assert conn.commits == 0
+
+def test_on_duplicate_update():
+    conn = RecordingConnection()
+    BulkWriter(conn, commit=True).insert('t', ['a', 'b'], [(1, 2)], on_duplicate_update=['b'])
+    assert conn.log[0][0].endswith("ON DUPLICATE KEY UPDATE b = VALUES(b)")
+    assert conn.commits == 1
+
+def test_load_data_falls_back_to_executemany():
+    conn = RecordingConnection()
+    writer = BulkWriter(conn, batch_size=10, method='load_data')
+    rows = [(i, f"s{i}") for i in range(15)]
+    stats = writer.insert('t', ['a', 'b'], rows)
+    assert stats['rows'] == 15 and stats['batches'] == 2
+    assert sum((batch for _, batch in conn.log), []) == rows
+    assert writer.method == 'executemany'
+
+def test_load_data_enables_local_infile():
+    previous = os.environ.get('AIPHA_BULK_METHOD')
+    db_pool.load_env()
+    try:
+        os.environ['AIPHA_BULK_METHOD'] = 'load_data'
+        assert db_pool.get_db_config()['allow_local_infile'] is True
+        assert BulkWriter(RecordingConnection()).method == 'load_data'
+        os.environ['AIPHA_BULK_METHOD'] = 'executemany'
+        assert 'allow_local_infile' not in db_pool.get_db_config()
+    finally:
+        if previous is None:
+            os.environ.pop('AIPHA_BULK_METHOD', None)
+        else:
+            os.environ['AIPHA_BULK_METHOD'] = previous
+
+def test_tsv_values():
+    assert _tsv_value(None) == '\\N'
+    assert _tsv_value(True) == '1'
+    assert _tsv_value(datetime(2024, 1, 2, 3, 4, 5)) == '2024-01-02 03:04:05'
+    assert _tsv_value('a\tb\\c\n') == 'a\\tb\\\\c\\n'
+
+if __name__ == "__main__":
+    test_executemany_batches()
+    test_on_duplicate_update()
+    test_load_data_falls_back_to_executemany()
+    test_load_data_enables_local_infile()
+    test_tsv_values()
@@ -0,0 +1,55 @@
+"""
+Prueba el commit único y el rollback de UnitOfWork sobre una conexión existente.
+Ubicación: aipha/programs/stable/tests/test_db_pool.py
+"""
+
+import sys
+import os
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from db_pool import UnitOfWork
+
+class RecordingCursor:
+    def __init__(self, log):
+        self.log = log
+    def execute(self, query, params=None):
+        self.log.append(query)
+    def close(self):
+        self.log.append('cursor.close')
+
+class RecordingConnection:
+    def __init__(self):
+        self.log = []
+    def cursor(self, dictionary=False):
+        return RecordingCursor(self.log)
+    def commit(self):
+        self.log.append('commit')
+    def rollback(self):
+        self.log.append('rollback')
+    def close(self):
+        self.log.append('close')
+
+def test_commits_once():
+    conn = RecordingConnection()
+    with UnitOfWork(connection=conn) as uow:
+        uow.cursor.execute("DELETE FROM t")
+        uow.cursor.execute("INSERT INTO t VALUES (1)")
+    print(f"Log: {conn.log}")
+    assert conn.log.count('commit') == 1
+    # La conexión prestada no se devuelve al pool
+    assert 'close' not in conn.log
+
+def test_rollback_on_error():
+    conn = RecordingConnection()
+    try:
+        with UnitOfWork(connection=conn) as uow:
+            uow.cursor.execute("DELETE FROM t")
+            raise ValueError("boom")
+    except ValueError:
+        pass
+    assert 'rollback' in conn.log and 'commit' not in conn.log
+
+if __name__ == "__main__":
+    test_commits_once()
+    test_rollback_on_error()
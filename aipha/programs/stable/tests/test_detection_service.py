@@ -0,0 +1,133 @@
+"""
+Prueba el servicio de detección persistente por stdin/stdout y por socket Unix.
+Ubicación: aipha/programs/stable/tests/test_detection_service.py
+"""
+
+import sys
+import os
+import tempfile
+import threading
+import pytest
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from detection_client import DetectionClient, ServiceError
+from detection_service import DetectionService, ServiceServer
+from pipeline import run_pipeline
+from test_pipeline import write_sample_csv
+
+PARAMS = {'candles': {'volume_percentile': 60}}
+
+def test_stdio_service_reuses_loaded_data_and_stage_outputs():
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = os.path.join(tmp, 'BTCUSDT-5m-2025-04-16.csv')
+        write_sample_csv(csv_file)
+        expected = run_pipeline(csv_file, params=PARAMS, stages=['mini_trends'])
+
+        client = DetectionClient.spawn()
+        try:
+            assert client.ping()['ok']
+            first = client.run(csv_file, stages=['candles', 'mini_trends'], params=PARAMS)
+            assert first['stages'] == ['candles', 'segments', 'mini_trends']
+            assert not first['file_cached'] and first['cached'] == []
+            assert [c['index'] for c in first['outputs']['candles']] == [c['index'] for c in expected.outputs['candles']]
+            trends = expected.outputs['mini_trends']
+            assert [(t['start_idx'], t['end_idx']) for t in first['outputs']['mini_trends']] == \
+                list(zip(trends['start_idx'], trends['end_idx']))
+            assert 'segments' not in first['outputs']
+
+            # Mismo archivo y parámetros: datos y etapas desde la caché del servicio
+            second = client.run(csv_file, stages=['candles', 'mini_trends'], params=PARAMS, return_outputs=False)
+            assert second['file_cached']
+            assert sorted(second['cached']) == ['candles', 'mini_trends', 'segments']
+            assert second['counts'] == first['counts'] and 'outputs' not in second
+            print(f"Primer trabajo {first['seconds']:.3f}s, repetido {second['seconds']:.3f}s")
+
+            # Otros parámetros de velas: la segmentación sigue en caché
+            third = client.run(csv_file, stages=['mini_trends'], params={'candles': {'volume_percentile': 80}})
+            assert 'segments' in third['cached'] and 'candles' not in third['cached']
+
+            stats = client.stats()
+            assert stats['jobs'] == 3 and stats['file_hits'] == 2 and stats['file_misses'] == 1
+            assert stats['stage_cache']['hits'] >= 4
+
+            with pytest.raises(ServiceError):
+                client.run(os.path.join(tmp, 'missing.csv'))
+            with pytest.raises(ServiceError):
+                client.request({'op': 'unknown'})
+            assert client.ping()['ok']
+        finally:
+            client.shutdown()
+        assert client.process.returncode == 0
+
+def test_socket_service_writes_csv_sink():
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = os.path.join(tmp, 'ETHUSDT-5m-2025-04-16.csv')
+        write_sample_csv(csv_file, seed=11)
+        socket_path = os.path.join(tmp, 'service.sock')
+        server = ServiceServer(socket_path, DetectionService())
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            with DetectionClient(socket_path) as client:
+                response = client.run(csv_file, stages=['segments'], sink='csv', output_dir=tmp)
+                assert response['counts']['segments'] == len(response['outputs']['segments']) > 0
+                assert os.path.exists(os.path.join(tmp, 'ETHUSDT-5m-2025-04-16_segments.csv'))
+            # Conexión nueva: el servicio sigue en caliente
+            with DetectionClient(socket_path) as client:
+                assert client.run(csv_file, stages=['segments'])['file_cached']
+                client.shutdown()
+            thread.join(timeout=10)
+            assert not thread.is_alive()
+        finally:
+            server.server_close()
+        assert not os.path.exists(socket_path)
+
+def test_db_jobs_write_with_the_requested_run_id():
+    import detection_service
+
+    class RecordingSink:
+        run_ids = []
+        def __init__(self, max_pending=2, run_id=None):
+            self.run_ids.append(run_id)
+        def write(self, data, stage, output):
+            pass
+        def close(self):
+            pass
+        load_candles = load_zones = load_mini_trends = None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = os.path.join(tmp, 'BTCUSDT-5m-2025-04-16.csv')
+        write_sample_csv(csv_file)
+        original = detection_service.DatabaseSink
+        detection_service.DatabaseSink = RecordingSink
+        try:
+            service = DetectionService()
+            first = service.run({'csv': csv_file, 'sink': 'db', 'run_id': 'client-run', 'return_outputs': False})
+            second = service.run({'csv': csv_file, 'sink': 'db', 'return_outputs': False})
+        finally:
+            detection_service.DatabaseSink = original
+        # El run_id del cliente llega a los savers; sin él, cada trabajo tiene el suyo
+        assert first['run_id'] == 'client-run' and RecordingSink.run_ids[0] == 'client-run'
+        assert second['run_id'] == RecordingSink.run_ids[1] and second['run_id'] not in ('client-run', None)
+
+def test_db_jobs_write_to_an_embedded_store():
+    from storage import SQLiteStore
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = os.path.join(tmp, 'BTCUSDT-5m-2025-04-16.csv')
+        write_sample_csv(csv_file)
+        path = os.path.join(tmp, 'results.sqlite')
+        service = DetectionService()
+        response = service.run({'csv': csv_file, 'sink': 'db', 'storage': 'sqlite', 'storage_path': path,
+                                'run_id': 'client-run', 'return_outputs': False})
+        # Sin MySQL: las velas clave quedan en el archivo SQLite con el run_id del cliente
+        with SQLiteStore(path) as store:
+            records = store.scan_records('key_candles', ['run_id'], csv_file=csv_file)
+        assert len(records) == response['counts']['candles'] > 0
+        assert {record['run_id'] for record in records} == {'client-run'}
+
+if __name__ == "__main__":
+    test_stdio_service_reuses_loaded_data_and_stage_outputs()
+    test_socket_service_writes_csv_sink()
+    test_db_jobs_write_with_the_requested_run_id()
+    test_db_jobs_write_to_an_embedded_store()
@@ -0,0 +1,72 @@
+"""
+Prueba que los caminos rápidos coinciden con las referencias congeladas y que el arnés detecta divergencias.
+Ubicación: aipha/programs/stable/tests/test_equivalence_harness.py
+"""
+
+import sys
+import os
+import tempfile
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from equivalence_harness import Comparison, run_harness, synthetic_dataset, format_report, harness_passed
+from pipeline import PipelineData
+from mini_trend import MiniTrendDetector
+from test_pipeline import write_sample_csv
+
+FAST_CHECKS = ['key_candles', 'pivots', 'trend_poc', 'zone_poc', 'scores', 'triples']
+
+def test_fast_paths_match_references():
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = os.path.join(tmp, 'BTCUSDT-5m-2025-04-16.csv')
+        write_sample_csv(csv_file, rows=400, seed=7)
+        datasets = [('muestra', PipelineData(csv_file)), ('sintético', synthetic_dataset(1500, seed=4))]
+        results = run_harness(datasets, FAST_CHECKS, params={'candles': {'volume_percentile': 60}})
+        print(format_report(results))
+        assert len(results) == len(datasets) * len(FAST_CHECKS)
+        for r in results:
+            assert r['divergences'] == 0, r
+            assert r['skipped'] or r['compared'] > 0
+
+def test_synthetic_dataset_has_edge_cases():
+    data = synthetic_dataset(1000, seed=2)
+    frame = data.candle_frame
+    assert len(frame) == 1000
+    assert ((frame['high'] - frame['low']) == 0).sum() >= 10
+    assert frame['volume'].duplicated().any()
+
+def test_divergence_is_reported():
+    comparison = Comparison('demo', 'datos', max_examples=1)
+    comparison.exact('índices', [1, 2], [1, 2])
+    comparison.exact('índices', [1, 2], [1, 3])
+    comparison.close('poc', 10.0, 10.0 + 1e-12, rtol=0, atol=1e-9)
+    comparison.close('poc', 10.0, 10.1, rtol=0, atol=1e-9)
+    comparison.close('zona', None, 1.0, rtol=0, atol=1e-9)
+    result = comparison.as_dict()
+    assert result['compared'] == 5 and result['divergences'] == 3
+    assert result['examples'] == [{'what': 'índices', 'reference': [1, 2], 'fast': [1, 3]}]
+
+    # Un "camino rápido" que pierde el último pivote se detecta
+    original = MiniTrendDetector.detect_zigzag_pivots
+    MiniTrendDetector.detect_zigzag_pivots = lambda self: original(self)[:-1]
+    try:
+        results = run_harness([('sintético', synthetic_dataset(800, seed=1))], ['pivots', 'trend_poc'])
+    finally:
+        MiniTrendDetector.detect_zigzag_pivots = original
+    assert all(r['divergences'] > 0 for r in results)
+
+def test_skipped_checks_fail_unless_allowed():
+    passed = {'check': 'pivots', 'dataset': 'datos', 'compared': 3, 'divergences': 0, 'max_abs_diff': 0.0,
+              'examples': [], 'skipped': None}
+    skipped = dict(passed, check='zones', compared=0, skipped='pandas_ta no disponible')
+    assert harness_passed([passed])
+    assert not harness_passed([passed, skipped])
+    assert harness_passed([passed, skipped], allow_skipped=True)
+    assert not harness_passed([dict(passed, divergences=1), skipped], allow_skipped=True)
+    assert format_report([passed, skipped]).splitlines()[-1] == 'Sin divergencias, 1 comprobaciones omitidas'
+
+if __name__ == "__main__":
+    test_fast_paths_match_references()
+    test_synthetic_dataset_has_edge_cases()
+    test_divergence_is_reported()
+    test_skipped_checks_fail_unless_allowed()
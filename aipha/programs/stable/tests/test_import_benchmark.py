@@ -0,0 +1,31 @@
+"""
+Prueba que importar los módulos de stable no configura el logging ni carga dependencias pesadas.
+Ubicación: aipha/programs/stable/tests/test_import_benchmark.py
+"""
+
+import sys
+import os
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from import_benchmark import stable_modules, benchmark, side_effects, compare
+
+def test_imports_are_side_effect_free():
+    modules = ['detect_accumulation_zone', 'mini_trend', 'save_detect_accumulation_zone', 'save_detect_candles',
+               'save_mini_trend', 'save_triple_signals', 'run_combined_detection', 'db_pool', 'pipeline']
+    assert set(modules) <= set(stable_modules())
+    results = benchmark(modules, repeat=1)
+    for module, r in results.items():
+        print(f"{module}: {r['cold'] * 1000:.1f}ms (propio {r['own'] * 1000:.1f}ms)")
+        assert r['error'] is None, (module, r['error'])
+    assert side_effects(results) == {}
+
+def test_compare_flags_regressions():
+    baseline = {'a': {'own': 0.010}, 'b': {'own': 0.100}}
+    results = {'a': {'own': 0.020}, 'b': {'own': 0.200}, 'c': {'own': 1.0}}
+    # a crece un 100% pero solo 10ms (por debajo de min_delta); c no está en el baseline
+    assert compare(results, baseline, tolerance=0.25) == [('b', 0.100, 0.200)]
+
+if __name__ == "__main__":
+    test_imports_are_side_effect_free()
+    test_compare_flags_regressions()
@@ -0,0 +1,78 @@
+"""
+Prueba el motor de unión por intervalos contra una búsqueda por fuerza bruta.
+Ubicación: aipha/programs/stable/tests/test_interval_join.py
+"""
+
+import numpy as np
+import sys
+import os
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from interval_join import join_points_to_intervals, find_triple_coincidences, assign_points_to_intervals
+
+def brute_force_triples(candles, zones, trends, tolerance, zone_quality, trend_r2):
+    triples = set()
+    for c_pos, idx in enumerate(candles):
+        for z_pos, (zs, ze) in enumerate(zones):
+            if zone_quality[z_pos] < 0.5 or not (zs - tolerance <= idx <= ze + tolerance):
+                continue
+            for t_pos, (ts, te) in enumerate(trends):
+                if trend_r2[t_pos] >= 0.45 and ts - tolerance <= idx <= te + tolerance:
+                    triples.add((c_pos, z_pos, t_pos))
+    return triples
+
+def random_intervals(rng, n, max_idx):
+    starts = rng.integers(0, max_idx, n)
+    return [(int(s), int(s + rng.integers(0, 40))) for s in starts]
+
+def test_points_to_intervals():
+    point_pos, interval_pos = join_points_to_intervals([5, 20, 12], [0, 10, 30], [6, 15, 40], tolerance=2)
+    pairs = set(zip(point_pos.tolist(), interval_pos.tolist()))
+    print(f"Pairs: {sorted(pairs)}")
+    assert pairs == {(0, 0), (2, 1)}
+
+def test_triple_coincidences():
+    rng = np.random.default_rng(42)
+    candles = rng.integers(0, 1000, 120).tolist()
+    zones = random_intervals(rng, 60, 1000)
+    trends = random_intervals(rng, 80, 1000)
+    zone_quality = rng.uniform(0.3, 1.0, len(zones))
+    trend_r2 = rng.uniform(0.2, 1.0, len(trends))
+
+    result = find_triple_coincidences(
+        candles,
+        [z[0] for z in zones], [z[1] for z in zones],
+        [t[0] for t in trends], [t[1] for t in trends],
+        zone_tolerance=8, trend_tolerance=8,
+        zone_quality=zone_quality, trend_r_squared=trend_r2
+    )
+    found = list(zip(result['candle'].tolist(), result['zone'].tolist(), result['trend'].tolist()))
+    expected = brute_force_triples(candles, zones, trends, 8, zone_quality, trend_r2)
+    print(f"Triples found: {len(found)}, expected: {len(expected)}")
+    assert len(found) == len(set(found))
+    assert set(found) == expected
+    # Salida ordenada por índice de vela, como el ORDER BY del JOIN SQL
+    found_indices = [candles[c] for c in result['candle']]
+    assert found_indices == sorted(found_indices)
+
+def test_assign_points():
+    # Cada punto recibe el intervalo de inicio más reciente que lo contiene
+    assigned = assign_points_to_intervals([5, 12, 30], [0, 10, 20], [15, 14, 25])
+    print(f"Assigned: {assigned.tolist()}")
+    assert assigned.tolist() == [0, 1, -1]
+
+    # Muchos intervalos solapados por punto: gana el de mayor inicio (a igual inicio, el último)
+    rng = np.random.default_rng(3)
+    starts = rng.integers(0, 200, 300)
+    ends = starts + rng.integers(0, 40, 300)
+    points = rng.integers(0, 250, 500)
+    assigned = assign_points_to_intervals(points, starts, ends, tolerance=2)
+    for p_pos, p in enumerate(points):
+        containing = [(starts[i], i) for i in range(len(starts)) if starts[i] - 2 <= p <= ends[i] + 2]
+        assert assigned[p_pos] == (max(containing)[1] if containing else -1)
+
+if __name__ == "__main__":
+    test_points_to_intervals()
+    test_triple_coincidences()
+    test_assign_points()
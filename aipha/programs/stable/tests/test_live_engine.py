@@ -0,0 +1,107 @@
+"""
+Prueba que el modo en vivo, vela a vela, produce las mismas velas clave, mini-tendencias y señales que el lote.
+Ubicación: aipha/programs/stable/tests/test_live_engine.py
+"""
+
+import sys
+import os
+import asyncio
+import tempfile
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from live_engine import LiveEngine, CsvReplaySource
+from pipeline import PipelineData, detect_key_candles, segment_mini_trends, find_triple_signals, stage_params
+from test_pipeline import write_sample_csv
+
+def causal_zone_search(bars, index):
+    """Zona de prueba que, como AccumulationZoneDetector, solo mira filas hasta index."""
+    if index < 12:
+        return None
+    start = index - 10
+    end = index - 2
+    window = bars.iloc[start:index + 1]
+    return {
+        'start_idx': start,
+        'end_idx': end,
+        'quality_score': float(window['volume'].mean() / window['volume'].max()),
+        'datetime_start': bars['datetime'].iloc[start],
+        'datetime_end': bars['datetime'].iloc[end],
+    }
+
+def signal_key(signal):
+    return (signal['candle_index'], signal['zone_id'], signal['trend_id'], round(signal['combined_score'], 9))
+
+def test_live_matches_batch():
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = os.path.join(tmp, 'BTCUSDT-5m-2025-04-16.csv')
+        write_sample_csv(csv_file, rows=500, seed=3)
+        params = stage_params({'candles': {'volume_percentile': 60},
+                               'triples': {'min_zone_quality': 0.3, 'min_trend_r_squared': 0.2}})
+
+        # Lote: mismas funciones que pipeline.py, con la zona de prueba
+        data = PipelineData(csv_file)
+        candles, _ = detect_key_candles(data, params['candles'])
+        segments, _ = segment_mini_trends(data, params['segments'])
+        zones = [zone for zone in (causal_zone_search(data.bars, c['index']) for c in candles) if zone]
+        signals, _ = find_triple_signals(data, candles, zones, segments, params['triples'])
+
+        events = []
+        engine = LiveEngine(params=params, zone_search=causal_zone_search, on_event=events.append, kinds=None)
+        stats = asyncio.run(engine.run(CsvReplaySource([csv_file])))
+        print(f"Velas clave={len(candles)}, zonas={len(zones)}, tendencias={len(segments)}, señales={len(signals)}")
+        print(f"Proceso por vela: p99={stats['p99'] * 1000:.2f}ms")
+
+        live = {kind: [e.payload for e in events if e.kind == kind]
+                for kind in ('key_candle', 'zone', 'mini_trend', 'signal')}
+        assert [c['index'] for c in live['key_candle']] == [c['index'] for c in candles]
+        assert [(z['start_idx'], z['end_idx']) for z in live['zone']] == [(z['start_idx'], z['end_idx']) for z in zones]
+        assert [(t['start_idx'], t['end_idx'], t['poc']) for t in live['mini_trend']] == \
+            list(zip(segments['start_idx'], segments['end_idx'], segments['poc']))
+        assert signals
+        assert sorted(map(signal_key, live['signal'])) == sorted(map(signal_key, signals))
+
+        # Ninguna zona se resuelve antes de que exista su fila en la vista sin la primera fila
+        for event in events:
+            if event.kind == 'zone':
+                assert event.bar >= event.payload['end_idx'] + 3
+        assert stats['bars'] == 500 and stats['bar_interval'] == 300
+
+def test_window_and_matcher_stay_bounded():
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = os.path.join(tmp, 'BTCUSDT-5m-2025-04-16.csv')
+        write_sample_csv(csv_file, rows=3000, seed=5)
+        params = stage_params({'candles': {'volume_percentile': 60},
+                               'triples': {'min_zone_quality': 0.3, 'min_trend_r_squared': 0.2}})
+        data = PipelineData(csv_file)
+        candles, _ = detect_key_candles(data, params['candles'])
+        segments, _ = segment_mini_trends(data, params['segments'])
+        zones = [zone for zone in (causal_zone_search(data.bars, c['index']) for c in candles) if zone]
+        signals, _ = find_triple_signals(data, candles, zones, segments, params['triples'])
+
+        engine = LiveEngine(params=params, zone_search=causal_zone_search, kinds=None)
+        engine.engine('BTCUSDT', '5m').history = 40
+        events = []
+        largest = {'window': 0, 'matcher': 0}
+        for kline in CsvReplaySource([csv_file])._rows(csv_file):
+            events.extend(engine.process(kline))
+            symbol_engine = engine.engine('BTCUSDT', '5m')
+            matcher = symbol_engine.matcher
+            largest['window'] = max(largest['window'], len(symbol_engine.columns['close']))
+            largest['matcher'] = max(largest['matcher'], len(matcher.candles) + len(matcher.zones) + len(matcher.trends))
+        events.extend(engine.engine('BTCUSDT', '5m').flush())
+        print(f"Máximos sobre 3000 velas: {largest}, tramo más largo={int((segments['end_idx'] - segments['start_idx']).max())}")
+
+        # Ventana: history más el tramo ZigZag en curso, por bloques; emparejador: solo lo reciente
+        longest = int((segments['end_idx'] - segments['start_idx']).max())
+        assert largest['window'] <= 2 * 40 + longest + 1
+        assert largest['matcher'] < 100
+        # Con la ventana y la poda, las mismas zonas y señales que el lote
+        assert [(e.payload['start_idx'], e.payload['end_idx']) for e in events if e.kind == 'zone'] == \
+            [(z['start_idx'], z['end_idx']) for z in zones]
+        assert signals
+        assert sorted(signal_key(e.payload) for e in events if e.kind == 'signal') == sorted(map(signal_key, signals))
+
+if __name__ == "__main__":
+    test_live_matches_batch()
+    test_window_and_matcher_stay_bounded()
@@ -0,0 +1,81 @@
+"""
+Prueba que param_sets identifica cada conjunto de parámetros por contenido y lo inserta una sola vez.
+Ubicación: aipha/programs/stable/tests/test_param_sets.py
+"""
+
+import sys
+import os
+import numpy as np
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import schema_registry
+import param_sets
+
+class RecordingCursor:
+    """Cursor que responde a information_schema y guarda las demás sentencias."""
+    def __init__(self, tables):
+        self.tables = tables
+        self.statements = []
+        self.rows = []
+        self.lastrowid = None
+    def execute(self, query, params=None):
+        if 'information_schema.columns' in query:
+            self.rows = [(t, c) for t, cols in self.tables.items() for c in cols]
+        elif 'information_schema.statistics' in query:
+            self.rows = []
+        else:
+            self.statements.append(query.split()[0])
+            if query.startswith('INSERT'):
+                self.lastrowid = 7
+    def fetchall(self):
+        return self.rows
+
+def test_hash_ignores_key_order_and_numpy_types():
+    a = {'volume_percentile_threshold': 80, 'body_percentage_threshold': 30.0, 'lookback_candles': 50}
+    b = {'lookback_candles': np.int64(50), 'body_percentage_threshold': np.float64(30.0),
+         'volume_percentile_threshold': 80}
+    assert param_sets.param_hash(a) == param_sets.param_hash(b)
+    assert param_sets.param_hash(a) != param_sets.param_hash(dict(a, lookback_candles=51))
+    assert len(param_sets.param_hash(a)) == 64
+
+def test_param_set_inserted_once_per_process():
+    schema_registry.invalidate()
+    param_sets.reset_cache()
+    cursor = RecordingCursor({'param_sets': ['id', 'param_hash', 'stage', 'params', 'created_at']})
+    params = {'tolerance': 8, 'min_zone_quality': 0.5}
+    assert param_sets.get_param_set_id(cursor, params, 'triples', database='test_params') == 7
+    assert param_sets.get_param_set_id(cursor, dict(params), 'triples', database='test_params') == 7
+    print(f"Sentencias: {cursor.statements}")
+    assert cursor.statements == ['INSERT']
+    param_sets.reset_cache()
+    schema_registry.invalidate()
+
+def test_drop_legacy_columns_backfills_param_set_id():
+    schema_registry.invalidate()
+    param_sets.reset_cache()
+
+    class LegacyCursor(RecordingCursor):
+        def execute(self, query, params=None):
+            super().execute(query, params)
+            if query.startswith('SELECT id, detection_params'):
+                self.rows = [(1, '{"lookback_candles": 50}'), (2, '{"lookback_candles": 50}'),
+                             (3, '{"lookback_candles": 60}')]
+                self.statements[-1] = 'SELECT'
+            elif query.startswith('UPDATE'):
+                self.statements[-1] = ('UPDATE', params)
+
+    cursor = LegacyCursor({'param_sets': ['id', 'param_hash', 'stage', 'params', 'created_at'],
+                           'key_candles': ['id', 'candle_index', 'detection_params', 'param_set_id']})
+    assert param_sets.drop_legacy_columns(cursor, 'key_candles')
+    print(f"Sentencias: {cursor.statements}")
+    # Los dos conjuntos distintos se registran y cada fila recibe su id antes del DROP
+    assert cursor.statements == ['SELECT', 'INSERT', 'INSERT', ('UPDATE', (7, 1, 2, 3)), 'ALTER']
+    assert not param_sets.drop_legacy_columns(cursor, 'detect_accumulation_zone_results')
+    param_sets.reset_cache()
+    schema_registry.invalidate()
+
+if __name__ == "__main__":
+    test_hash_ignores_key_order_and_numpy_types()
+    test_param_set_inserted_once_per_process()
+    test_drop_legacy_columns_backfills_param_set_id()
@@ -0,0 +1,200 @@
+"""
+Prueba que pipeline.py, cargando el CSV una sola vez, produce lo mismo que cada detector con su propio CSV.
+Ubicación: aipha/programs/stable/tests/test_pipeline.py
+"""
+
+import sys
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from pipeline import (PipelineSink, CsvSink, DatabaseSink, StoreSink, run_pipeline, required_stages,
+                      find_triple_signals, PipelineData, _save_triple_signals, build_triple_signal, score_signals)
+from storage import SQLiteStore
+from save_triple_signals import TripleSignalSaver
+from detect_candles import Detector
+from mini_trend import MiniTrendDetector
+
+def write_sample_csv(path, rows=400, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.6, rows))
+    open_ = close + rng.normal(0, 0.3, rows)
+    high = np.maximum(open_, close) + rng.uniform(0.05, 0.5, rows)
+    low = np.minimum(open_, close) - rng.uniform(0.05, 0.5, rows)
+    volume = rng.uniform(10, 100, rows)
+    timestamps = 1744761600000000 + np.arange(rows) * 300000000
+    frame = pd.DataFrame({
+        'timestamp': timestamps, 'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume,
+        'close_time': timestamps + 299999999, 'quote_asset_volume': volume * close,
+        'number_of_trades': 100, 'taker_buy_base_asset_volume': volume / 2,
+        'taker_buy_quote_asset_volume': volume * close / 2, 'ignore': 0,
+    })
+    frame.to_csv(path, header=False, index=False)
+
+class RecordingSink(PipelineSink):
+    def __init__(self):
+        self.stages = []
+    def on_candles(self, data, output):
+        self.stages.append('candles')
+    def on_mini_trends(self, data, output):
+        self.stages.append('mini_trends')
+
+def test_pipeline_matches_standalone_detectors():
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = os.path.join(tmp, 'BTCUSDT-5m-2025-04-16.csv')
+        write_sample_csv(csv_file)
+
+        sink = RecordingSink()
+        data = run_pipeline(csv_file, params={'candles': {'volume_percentile': 60}},
+                            stages=['mini_trends'], sinks=[sink, CsvSink(tmp)])
+        assert sink.stages == ['candles', 'mini_trends']
+        assert (data.symbol, data.timeframe) == ('BTCUSDT', '5m')
+
+        # Mismas velas clave que Detector con su propia carga del CSV (y los parámetros indicados)
+        detector = Detector(csv_file)
+        detector.set_detection_params(60, 40, 30)
+        expected = detector.process_csv()
+        print(f"Velas clave: {len(expected)}")
+        assert [c['index'] for c in data.outputs['candles']] == [c['index'] for c in expected]
+
+        # Mismas mini-tendencias que MiniTrendDetector con su propia carga del CSV
+        trend_detector = MiniTrendDetector(csv_file)
+        trend_detector.set_params(zigzag_threshold=0.005, min_trend_bars=5)
+        expected_trends = trend_detector.process_csv()
+        assert len(expected_trends) > 0
+        pd.testing.assert_frame_equal(data.outputs['mini_trends'][expected_trends.columns], expected_trends)
+        assert 'comparison_results' in data.outputs['mini_trends']
+        assert os.path.exists(os.path.join(tmp, 'BTCUSDT-5m-2025-04-16_mini_trends.csv'))
+
+        # Con un pool de procesos las etapas dan la misma salida y los sinks se llaman en este proceso
+        sink = RecordingSink()
+        in_processes = run_pipeline(csv_file, params={'candles': {'volume_percentile': 60}},
+                                    stages=['mini_trends'], sinks=[sink], max_workers=2, executor='process')
+        assert sink.stages == ['candles', 'mini_trends']
+        assert in_processes.outputs['candles'] == data.outputs['candles']
+        pd.testing.assert_frame_equal(in_processes.outputs['mini_trends'], data.outputs['mini_trends'])
+
+        # Las señales triples se calculan sobre las salidas en memoria
+        trends = data.outputs['mini_trends']
+        first = trends.iloc[0]
+        zones = [{'start_idx': int(first['start_idx']), 'end_idx': int(first['end_idx']), 'quality_score': 0.9}]
+        candle = {'index': int(first['end_idx']), 'open': 1.0, 'high': 1.2, 'low': 0.9, 'close': 1.1,
+                  'volume': 50.0, 'body_percentage': 20.0}
+        signals, _ = find_triple_signals(PipelineData(csv_file, raw=data.raw), [candle], zones, trends,
+                                         {'tolerance': 8, 'min_zone_quality': 0.5, 'min_trend_r_squared': 0.0})
+        assert signals and all(s['zone_id'] == 0 for s in signals)
+        assert 0.0 <= signals[0]['combined_score']
+
+class ScopeCursor:
+    """Cursor de diccionarios que devuelve filas guardadas por tabla."""
+    def __init__(self, tables):
+        self.tables = tables
+        self.queries = []
+        self.rows = []
+    def execute(self, query, params=None):
+        self.queries.append((query, params))
+        self.rows = self.tables[query.split(' FROM ')[1].split()[0]]
+    def fetchall(self):
+        return self.rows
+
+class RecordingWriter:
+    def __init__(self):
+        self.jobs = []
+        self.kwargs = []
+    def submit(self, function, *args, description=None, **kwargs):
+        self.jobs.append((function, args))
+        self.kwargs.append(kwargs)
+    def close(self):
+        pass
+
+def test_database_sink_saves_in_memory_signals():
+    csv_file = 'BTCUSDT-5m-2025-04-16.csv'
+    data = PipelineData(csv_file, raw=pd.DataFrame())
+    data.stage_params['triples'] = {'tolerance': 8, 'min_zone_quality': 0.5, 'min_trend_r_squared': 0.0}
+    data.outputs['zones'] = [{'start_idx': 5, 'end_idx': 20}, {'start_idx': 30, 'end_idx': 40}]
+    data.outputs['mini_trends'] = pd.DataFrame({'start_idx': [0, 25], 'end_idx': [22, 45]})
+    signals = [{'candle_index': 35, 'zone_id': 1, 'trend_id': 1}]
+
+    # El sink entrega las señales recibidas, con las claves naturales de su zona y mini-tendencia
+    sink = DatabaseSink.__new__(DatabaseSink)
+    sink.writer = RecordingWriter()
+    sink.run_id = 'job-1'
+    sink.on_triples(data, signals)
+    function, args = sink.writer.jobs[0]
+    assert function is _save_triple_signals and args[3] == csv_file
+    # Las filas llevan el run_id del sink, no el del proceso
+    assert sink.writer.kwargs[0] == {'run_id': 'job-1'}
+    record = args[4][0]
+    assert (record['zone_start_idx'], record['zone_end_idx'], record['trend_start_idx'], record['trend_end_idx']) \
+        == (30, 40, 25, 45)
+
+    # Los ids de posición se sustituyen por los ids guardados del mismo archivo
+    saver = TripleSignalSaver()
+    saver.cursor = ScopeCursor({
+        'key_candles': [{'id': 11, 'candle_index': 35}],
+        'detect_accumulation_zone_results': [{'id': 3, 'start_idx': 30, 'end_idx': 40},
+                                             {'id': 4, 'start_idx': 30, 'end_idx': 40},
+                                             {'id': 5, 'start_idx': 5, 'end_idx': 20}],
+        'mini_trend_results': [{'id': 8, 'start_idx': 25, 'end_idx': 45}],
+    })
+    resolved = saver.attach_ids(args[4], 'BTCUSDT', '5m', csv_file)
+    assert (resolved[0]['key_candle_id'], resolved[0]['zone_id'], resolved[0]['trend_id']) == (11, 4, 8)
+    assert resolved[0]['csv_file'] == csv_file and record['zone_id'] == 1
+    assert all(params == ('BTCUSDT', '5m', csv_file) for _, params in saver.cursor.queries)
+
+def test_store_sink_writes_each_file_offline():
+    with tempfile.TemporaryDirectory() as tmp:
+        day_1 = os.path.join(tmp, 'BTCUSDT-5m-2025-04-16.csv')
+        day_2 = os.path.join(tmp, 'BTCUSDT-5m-2025-04-17.csv')
+        write_sample_csv(day_1)
+        write_sample_csv(day_2, rows=300, seed=11)
+        path = os.path.join(tmp, 'results.sqlite')
+        params = {'candles': {'volume_percentile': 60}}
+
+        with StoreSink(SQLiteStore(path), run_id='job-1') as sink:
+            data = run_pipeline(day_1, params=params, stages=['mini_trends'], sinks=[sink])
+            other = run_pipeline(day_2, params=params, stages=['mini_trends'], sinks=[sink])
+            # Repetir el primer día reemplaza solo sus filas, reutilizando las velas ya guardadas
+            again = run_pipeline(day_1, params=params, stages=['mini_trends'], sinks=[sink],
+                                 reuse={'candles': sink.load_candles})
+            assert [c['index'] for c in again.outputs['candles']] == [c['index'] for c in data.outputs['candles']]
+
+            # Zonas y señales (las zonas requieren pandas_ta: se entregan ya calculadas)
+            candle = data.outputs['candles'][0]
+            zones = [{'start_idx': candle['index'] - 3, 'end_idx': candle['index'] + 3, 'quality_score': 5.0}]
+            trend = data.outputs['mini_trends'].iloc[0].to_dict()
+            data.outputs['zones'] = zones
+            data.stage_params['zones'] = {'atr_period': 14}
+            data.stage_params['triples'] = {'tolerance': 8, 'min_zone_quality': 0.5, 'min_trend_r_squared': 0.0}
+            sink.write(data, 'zones', zones)
+            signal = build_triple_signal('BTCUSDT', '5m', candle, zones[0], 0, trend, 0)
+            sink.write(data, 'triples', score_signals([signal, dict(signal)]))
+
+        with SQLiteStore(path) as store:
+            assert store.count('key_candles', csv_file=day_1) == len(data.outputs['candles'])
+            assert store.count('key_candles', csv_file=day_2) == len(other.outputs['candles'])
+            assert store.count('mini_trend_results', csv_file=day_1) == len(data.outputs['mini_trends'])
+            candles = store.scan_records('key_candles', ['candle_index', 'in_accumulation_zone', 'run_id', 'datetime'],
+                                         csv_file=day_1, order_by='candle_index')
+            assert {row['run_id'] for row in candles} == {'job-1'}
+            assert candles[0]['in_accumulation_zone'] == 1 and candles[0]['datetime'] is not None
+            # La señal duplicada se descarta y los ids de posición pasan a ser los guardados
+            signals = store.scan_records('triple_signals', csv_file=day_1)
+            zone_id = store.scan_records('detect_accumulation_zone_results', ['id'], csv_file=day_1)[0]['id']
+            trend_id = store.scan_records('mini_trend_results', ['id'], csv_file=day_1, order_by='id')[0]['id']
+            assert len(signals) == 1
+            assert (signals[0]['zone_id'], signals[0]['mini_trend_id']) == (zone_id, trend_id)
+            assert signals[0]['final_score'] is not None and signals[0]['csv_file'] == os.path.basename(day_1)
+
+def test_required_stages_adds_dependencies():
+    assert required_stages(['triples']) == ['candles', 'segments', 'zones', 'mini_trends', 'triples']
+    assert required_stages(['zones']) == ['candles', 'zones']
+
+if __name__ == "__main__":
+    test_pipeline_matches_standalone_detectors()
+    test_database_sink_saves_in_memory_signals()
+    test_store_sink_writes_each_file_offline()
+    test_required_stages_adds_dependencies()
@@ -0,0 +1,53 @@
+"""
+Prueba que la reproducción acelerada de varios días y símbolos informa de latencias y coincide con el lote.
+Ubicación: aipha/programs/stable/tests/test_replay_harness.py
+"""
+
+import sys
+import os
+import tempfile
+import pandas as pd
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from replay_harness import find_replay_files, group_by_scope, run_replay, format_report
+from test_pipeline import write_sample_csv
+from test_live_engine import causal_zone_search
+
+def write_next_day(source, path):
+    """Copia de un CSV de un día (288 velas de 5m) desplazada un día, como el archivo del día siguiente."""
+    frame = pd.read_csv(source, header=None)
+    frame[0] += 86400 * 1000000
+    frame[6] += 86400 * 1000000
+    frame.to_csv(path, header=False, index=False)
+
+def test_replay_matches_batch_across_days_and_symbols():
+    with tempfile.TemporaryDirectory() as tmp:
+        first = os.path.join(tmp, 'BTCUSDT-5m-2025-04-16.csv')
+        write_sample_csv(first, rows=288, seed=3)
+        write_next_day(first, os.path.join(tmp, 'BTCUSDT-5m-2025-04-17.csv'))
+        os.makedirs(os.path.join(tmp, 'eth'))
+        write_sample_csv(os.path.join(tmp, 'eth', 'ETHUSDT-5m-2025-04-16.csv'), rows=300, seed=5)
+        open(os.path.join(tmp, 'notas.csv'), 'w').close()
+
+        files = find_replay_files([tmp])
+        assert len(files) == 3
+        assert [os.path.basename(f) for f in group_by_scope(files)[('BTCUSDT', '5m')]] == \
+            ['BTCUSDT-5m-2025-04-16.csv', 'BTCUSDT-5m-2025-04-17.csv']
+
+        params = {'candles': {'volume_percentile': 60},
+                  'triples': {'min_zone_quality': 0.3, 'min_trend_r_squared': 0.2}}
+        report = run_replay(files, params=params, zone_search=causal_zone_search)
+        print(format_report(report))
+
+        assert report['bars'] == 288 * 2 + 300
+        assert report['signals'] > 0
+        assert report['equivalence']['match'], report['equivalence']
+        assert report['max_throughput'] >= report['throughput'] > 0
+        latency = report['latency_ms']['signal']
+        assert latency['count'] == report['signals']
+        assert 0 <= latency['p50'] <= latency['p99'] <= latency['max']
+        assert report['signal_delay_bars']['p50'] >= 0
+
+if __name__ == "__main__":
+    test_replay_matches_batch_across_days_and_symbols()
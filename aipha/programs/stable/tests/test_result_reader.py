@@ -0,0 +1,64 @@
+"""
+Prueba que result_reader filtra en la consulta y convierte las filas raw en arrays NumPy.
+Ubicación: aipha/programs/stable/tests/test_result_reader.py
+"""
+
+import sys
+import os
+import numpy as np
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from result_reader import read_columns, read_frame
+
+class RawCursor:
+    """Cursor raw: devuelve los valores como bytes, como mysql-connector con raw=True."""
+    def __init__(self, rows, log):
+        self.rows = rows
+        self.log = log
+    def execute(self, query, params=None):
+        self.log.append((query, params))
+    def fetchall(self):
+        return self.rows
+    def close(self):
+        pass
+
+class RawConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+    def cursor(self, raw=False):
+        assert raw
+        return RawCursor(self.rows, self.queries)
+
+def test_filtered_columnar_read():
+    connection = RawConnection([
+        (b'1', b'120', b'101.5', b'2025-04-16 00:05:00', b'1'),
+        (b'2', b'135', None, None, b'0'),
+    ])
+    columns = read_columns(
+        connection, 'key_candles', ['id', 'candle_index', 'close', 'datetime', 'in_accumulation_zone'],
+        symbol='BTCUSDT', timeframe='5m', start='2025-04-16', filters={'param_set_id': [3, 4]},
+        order_by='candle_index'
+    )
+    query, params = connection.queries[0]
+    print(f"Query: {query}")
+    assert query == ("SELECT id, candle_index, close, datetime, in_accumulation_zone FROM key_candles "
+                     "WHERE symbol = %s AND timeframe = %s AND datetime >= %s AND param_set_id IN (%s, %s) "
+                     "ORDER BY candle_index")
+    assert params == ('BTCUSDT', '5m', '2025-04-16', 3, 4)
+    assert columns['candle_index'].dtype == np.int64
+    assert columns['candle_index'].tolist() == [120, 135]
+    assert columns['close'][0] == 101.5 and np.isnan(columns['close'][1])
+    assert columns['datetime'][0] == np.datetime64('2025-04-16T00:05:00')
+    assert np.isnat(columns['datetime'][1])
+    assert columns['in_accumulation_zone'].tolist() == [1, 0]
+
+def test_empty_frame_keeps_columns():
+    frame = read_frame(RawConnection([]), 'triple_signals', ['id', 'trend_direction', 'combined_score'])
+    assert list(frame.columns) == ['id', 'trend_direction', 'combined_score']
+    assert len(frame) == 0
+
+if __name__ == "__main__":
+    test_filtered_columnar_read()
+    test_empty_frame_keeps_columns()
@@ -0,0 +1,82 @@
+"""
+Prueba que RunLedger reutiliza una etapa sin cambios y la invalida al cambiar el CSV o el ámbito.
+Ubicación: aipha/programs/stable/tests/test_run_cache.py
+"""
+
+import sys
+import os
+import tempfile
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from run_cache import RunLedger, code_version, source_closure, ledger_scope
+from run_combined_detection import plan_stages
+from pipeline_stages import stage_params
+
+def test_ledger_skips_only_unchanged_stages():
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = os.path.join(tmp, 'BTCUSDT-5m-2025-04-16.csv')
+        with open(csv_file, 'w') as f:
+            f.write("1,100,101,99,100.5,10\n")
+        version = code_version('detect_candles.py')
+
+        with RunLedger(os.path.join(tmp, 'ledger.sqlite')) as ledger:
+            params_a = {'volume_percentile': 70, 'body_threshold': 40}
+            key_a = ledger.key(csv_file, 'candles', params_a, version)
+            assert ledger.lookup(key_a, 'BTCUSDT-5m') is None
+            ledger.record(key_a, 'BTCUSDT-5m', {'run_id': 'a'})
+            assert ledger.lookup(key_a, 'BTCUSDT-5m') == {'run_id': 'a'}
+
+            # Los mismos parámetros en otro orden son la misma clave
+            assert ledger.key(csv_file, 'candles', dict(reversed(list(params_a.items()))), version) == key_a
+
+            # Otra ejecución reemplaza el ámbito: la salida de A ya no es reutilizable
+            key_b = ledger.key(csv_file, 'candles', dict(params_a, lookback=20), version)
+            ledger.record(key_b, 'BTCUSDT-5m', {'run_id': 'b'})
+            assert ledger.lookup(key_a, 'BTCUSDT-5m') is None
+            assert ledger.lookup(key_b, 'BTCUSDT-5m') == {'run_id': 'b'}
+
+            # Un cambio en el contenido del CSV cambia la clave
+            with open(csv_file, 'a') as f:
+                f.write("2,100.5,102,100,101,12\n")
+            os.utime(csv_file, ns=(0, 1))
+            assert ledger.key(csv_file, 'candles', dict(params_a, lookback=20), version) != key_b
+
+def test_code_version_covers_imported_modules():
+    # Los módulos auxiliares que importa la etapa (también dentro de funciones) forman parte de su versión
+    sources = source_closure('save_triple_signals.py')
+    assert {'save_triple_signals.py', 'interval_join.py', 'batch_scoring.py', 'param_sets.py',
+            'sql_indexes.py', 'schema_registry.py'} <= set(sources)
+    assert 'pipeline.py' in source_closure('run_combined_detection.py')
+    assert source_closure('detect_candles.py') == ['detect_candles.py']
+    assert code_version('save_triple_signals.py') == code_version(*sources)
+
+def test_other_day_does_not_invalidate_a_file():
+    # Las tablas se reemplazan por archivo: A, B y de nuevo A reutiliza A
+    with tempfile.TemporaryDirectory() as tmp:
+        day_a = os.path.join(tmp, 'BTCUSDT-5m-2025-04-16.csv')
+        day_b = os.path.join(tmp, 'BTCUSDT-5m-2025-04-17.csv')
+        for path, price in ((day_a, 100), (day_b, 200)):
+            with open(path, 'w') as f:
+                f.write(f"1,{price},{price + 1},{price - 1},{price},10\n")
+        assert ledger_scope(day_a) == 'BTCUSDT-5m/BTCUSDT-5m-2025-04-16.csv'
+        params = stage_params(None)
+
+        with RunLedger(os.path.join(tmp, 'ledger.sqlite')) as ledger:
+            for csv_file in (day_a, day_b):
+                keys, reused = plan_stages(ledger, csv_file, ledger_scope(csv_file), ['candles'], params)
+                assert not reused
+                ledger.record(keys['candles'], ledger_scope(csv_file), {'run_id': csv_file})
+            _, reused = plan_stages(ledger, day_a, ledger_scope(day_a), ['candles'], params)
+            assert reused == {'candles': {'run_id': day_a}}
+
+            # Otra ejecución sobre el mismo archivo sí lo invalida
+            keys, _ = plan_stages(ledger, day_a, ledger_scope(day_a), ['candles'], stage_params({'candles': {'lookback': 20}}))
+            ledger.record(keys['candles'], ledger_scope(day_a), {'run_id': 'a2'})
+            _, reused = plan_stages(ledger, day_a, ledger_scope(day_a), ['candles'], params)
+            assert not reused
+
+if __name__ == "__main__":
+    test_ledger_skips_only_unchanged_stages()
+    test_code_version_covers_imported_modules()
+    test_other_day_does_not_invalidate_a_file()
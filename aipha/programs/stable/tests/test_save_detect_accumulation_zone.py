@@ -0,0 +1,69 @@
+"""
+Prueba que un fallo de las mini-tendencias dentro de save_results deshace toda la etapa.
+Ubicación: aipha/programs/stable/tests/test_save_detect_accumulation_zone.py
+"""
+
+import sys
+import os
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from save_detect_accumulation_zone import AccumulationZoneResultSaver
+
+class FailingCursor:
+    """Acepta las inserciones y falla al releer los ids de mini_trends."""
+    def __init__(self, log):
+        self.log = log
+    def execute(self, query, params=None):
+        self.log.append(query)
+        if query.startswith("SELECT id, start_idx, end_idx FROM mini_trends"):
+            raise RuntimeError("lost connection")
+    def executemany(self, query, rows):
+        self.log.append(query)
+    def fetchall(self):
+        return []
+    def close(self):
+        pass
+
+class FakeConnection:
+    def __init__(self):
+        self.log = []
+        self.commits = 0
+        self.rollbacks = 0
+    def is_connected(self):
+        return True
+    def cursor(self):
+        return FailingCursor(self.log)
+    def commit(self):
+        self.commits += 1
+    def rollback(self):
+        self.rollbacks += 1
+    def close(self):
+        pass
+
+class FakeMiniTrendDetector:
+    def __init__(self):
+        self.mini_trends = []
+    def segment_mini_trends(self):
+        self.mini_trends = [{'start_idx': 0, 'end_idx': 5, 'start_time': None, 'end_time': None,
+                             'direction': 'up', 'slope': 0.1, 'r_squared': 0.9, 'price_change_pct': 1.0,
+                             'duration_bars': 6, 'poc': 100.0, 'volume_total': 50.0}]
+
+def test_mini_trend_error_rolls_back_the_stage():
+    saver = AccumulationZoneResultSaver()
+    saver.csv_file = 'BTCUSDT-5m-2025-04-16.csv'
+    saver.connection = FakeConnection()
+    saver.cursor = saver.connection.cursor()
+    saver.ensure_tables = lambda: None
+    saver.mini_trend_detector = FakeMiniTrendDetector()
+
+    zones = [{'start_idx': 2, 'end_idx': 8, 'quality_score': 0.5}]
+    connection = saver.connection
+    assert saver.save_results(zones, {'atr_period': 14}) is False
+    # Una sola reversión (la de save_results), sin commit ni escrituras de zonas
+    assert connection.rollbacks == 1 and connection.commits == 0
+    assert not any('detect_accumulation_zone_results' in query for query in connection.log)
+    assert saver.saved_mini_trends is None
+
+if __name__ == "__main__":
+    test_mini_trend_error_rolls_back_the_stage()
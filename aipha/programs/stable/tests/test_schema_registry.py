@@ -0,0 +1,52 @@
+"""
+Prueba que schema_registry consulta information_schema una sola vez y se relee tras invalidate.
+Ubicación: aipha/programs/stable/tests/test_schema_registry.py
+"""
+
+import sys
+import os
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import schema_registry
+
+class SchemaCursor:
+    """Cursor de diccionarios que responde a las consultas de information_schema."""
+    def __init__(self, tables, indexes):
+        self.tables = tables
+        self.indexes = indexes
+        self.queries = 0
+        self.rows = []
+    def execute(self, query, params=None):
+        self.queries += 1
+        if 'information_schema.columns' in query:
+            self.rows = [{'tbl': t, 'col': c} for t, cols in self.tables.items() for c in cols]
+        else:
+            self.rows = [{'tbl': t, 'idx': i} for t, idxs in self.indexes.items() for i in idxs]
+    def fetchall(self):
+        return self.rows
+
+def test_cached_until_invalidated():
+    cursor = SchemaCursor(
+        {'key_candles': ['id', 'candle_index', 'symbol', 'created_at']},
+        {'key_candles': ['PRIMARY', 'idx_key_candles_scope']}
+    )
+    schema_registry.invalidate(database='test_db')
+    assert schema_registry.table_exists(cursor, 'key_candles', 'test_db')
+    assert not schema_registry.table_exists(cursor, 'triple_signals', 'test_db')
+    assert schema_registry.has_index(cursor, 'key_candles', 'idx_key_candles_scope', 'test_db')
+    columns, query = schema_registry.insert_statement(cursor, 'key_candles', database='test_db')
+    print(f"Query: {query}")
+    assert columns == ['candle_index', 'symbol']
+    assert query == "INSERT INTO key_candles (candle_index, symbol) VALUES (%s, %s)"
+    assert cursor.queries == 2
+
+    # Tras un DDL, la siguiente consulta relee el esquema
+    cursor.tables['key_candles'].append('mini_trend_id')
+    assert not schema_registry.has_column(cursor, 'key_candles', 'mini_trend_id', 'test_db')
+    schema_registry.invalidate('key_candles', database='test_db')
+    assert schema_registry.has_column(cursor, 'key_candles', 'mini_trend_id', 'test_db')
+    assert cursor.queries == 4
+
+if __name__ == "__main__":
+    test_cached_until_invalidated()
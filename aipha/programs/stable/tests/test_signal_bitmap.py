@@ -0,0 +1,56 @@
+"""
+Prueba el álgebra de bitmaps frente a la unión por intervalos.
+Ubicación: aipha/programs/stable/tests/test_signal_bitmap.py
+"""
+
+import numpy as np
+import sys
+import os
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from signal_bitmap import SignalBitmap, SignalAlgebra, key_candle_bitmap, zone_bitmap, trend_bitmap
+from interval_join import find_triple_coincidences
+
+def test_bitmap_operations():
+    bitmap = SignalBitmap.from_intervals([2, 10], [4, 10], 13)
+    print(f"Bitmap: {bitmap}, indices: {bitmap.indices().tolist()}")
+    assert bitmap.indices().tolist() == [2, 3, 4, 10]
+    assert bitmap.dilate(1).indices().tolist() == [1, 2, 3, 4, 5, 9, 10, 11]
+    assert (~bitmap).count() == 13 - 4
+    starts, ends = bitmap.runs()
+    assert starts.tolist() == [2, 10] and ends.tolist() == [4, 10]
+
+def test_coincidence_matches_interval_join():
+    rng = np.random.default_rng(7)
+    length = 2000
+    candles = [{'index': int(i)} for i in rng.choice(length, 150, replace=False)]
+    zones = [{'start_idx': int(s), 'end_idx': int(s + rng.integers(0, 30)), 'quality_score': float(q)}
+             for s, q in zip(rng.integers(0, length, 70), rng.uniform(0.3, 1.0, 70))]
+    trends = [{'start_idx': int(s), 'end_idx': int(s + rng.integers(0, 60)), 'r_squared': float(r)}
+              for s, r in zip(rng.integers(0, length, 90), rng.uniform(0.2, 1.0, 90))]
+
+    algebra = SignalAlgebra(length)
+    algebra.add('key_candle', key_candle_bitmap(candles, length))
+    algebra.add('in_zone', zone_bitmap(zones, length, tolerance=8, min_quality=0.5))
+    algebra.add('in_trend', trend_bitmap(trends, length, tolerance=8, min_r_squared=0.45))
+    bars = algebra.coincidence(['key_candle', 'in_zone', 'in_trend']).indices().tolist()
+
+    result = find_triple_coincidences(
+        [c['index'] for c in candles],
+        [z['start_idx'] for z in zones], [z['end_idx'] for z in zones],
+        [t['start_idx'] for t in trends], [t['end_idx'] for t in trends],
+        zone_quality=[z['quality_score'] for z in zones],
+        trend_r_squared=[t['r_squared'] for t in trends]
+    )
+    expected = sorted({candles[c]['index'] for c in result['candle'].tolist()})
+    print(f"Coincident bars: {len(bars)}, expected: {len(expected)}")
+    assert bars == expected
+
+    combos = algebra.evaluate_combinations(required=['key_candle'])
+    assert combos[-1][0] == ('key_candle', 'in_zone', 'in_trend')
+    assert combos[-1][1] == len(bars)
+
+if __name__ == "__main__":
+    test_bitmap_operations()
+    test_coincidence_matches_interval_join()
@@ -0,0 +1,126 @@
+"""
+Prueba el ámbito (símbolo, timeframe, archivo) a partir del CSV y la columna run_id de sql_indexes,
+y que el guardado de velas clave hace el DDL antes del borrado acotado al archivo.
+Ubicación: aipha/programs/stable/tests/test_sql_indexes.py
+"""
+
+import sys
+import os
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import schema_registry
+from sql_indexes import scope_from_csv, current_run_id, ensure_run_column, scope_file, scope_filter
+from save_detect_candles import DetectionResultSaver
+
+class RecordingSchemaCursor:
+    """Cursor que responde a information_schema y guarda los ALTER TABLE ejecutados."""
+    def __init__(self, tables):
+        self.tables = tables
+        self.ddl = []
+        self.rows = []
+    def execute(self, query, params=None):
+        if 'information_schema.columns' in query:
+            self.rows = [(t, c) for t, cols in self.tables.items() for c in cols]
+        elif 'information_schema.statistics' in query:
+            self.rows = []
+        else:
+            self.ddl.append(query)
+            self.tables['triple_signals'].append(query.split()[-2])
+    def fetchall(self):
+        return self.rows
+
+class SaverCursor:
+    """Cursor que simula information_schema, aplica ADD COLUMN y registra cada sentencia."""
+    def __init__(self, tables, log):
+        self.tables = tables
+        self.log = log
+        self.rows = []
+        self.lastrowid = 1
+    def execute(self, query, params=None):
+        if 'information_schema.columns' in query:
+            self.rows = [(t, c) for t, cols in self.tables.items() for c in cols]
+            return
+        if 'information_schema.statistics' in query:
+            self.rows = [('key_candles', 'idx_key_candles_scope')]
+            return
+        words = query.split()
+        self.log.append((' '.join(words[:2]), params))
+        if words[:2] == ['ALTER', 'TABLE'] and 'ADD COLUMN' in query:
+            self.tables[words[2]].append(words[5])
+    def executemany(self, query, rows):
+        self.log.append(('INSERT MANY', list(rows)))
+    def fetchall(self):
+        return self.rows
+    def close(self):
+        pass
+
+class SaverConnection:
+    def __init__(self, tables):
+        self.log = []
+        self.tables = tables
+    def cursor(self, *args, **kwargs):
+        return SaverCursor(self.tables, self.log)
+    def is_connected(self):
+        return True
+    def commit(self):
+        self.log.append(('COMMIT', None))
+    def rollback(self):
+        self.log.append(('ROLLBACK', None))
+
+def test_scope_from_csv():
+    assert scope_from_csv('aipha/data/BTCUSDT-5m-2025-04-16.csv') == ('BTCUSDT', '5m')
+    assert scope_from_csv('sample_data.csv') == (None, None)
+    assert scope_from_csv(None) == (None, None)
+    # Un identificador por proceso
+    assert current_run_id() == current_run_id()
+
+def test_ensure_run_column_once():
+    schema_registry.invalidate()
+    cursor = RecordingSchemaCursor({'triple_signals': ['id', 'symbol', 'timeframe']})
+    assert ensure_run_column(cursor, 'triple_signals')
+    assert not ensure_run_column(cursor, 'triple_signals')
+    print(f"DDL: {cursor.ddl}")
+    assert cursor.ddl == ["ALTER TABLE triple_signals ADD COLUMN run_id VARCHAR(32)"]
+    schema_registry.invalidate()
+
+def test_scope_filter():
+    assert scope_file('aipha/data/BTCUSDT-5m-2025-04-16.csv') == 'BTCUSDT-5m-2025-04-16.csv'
+    assert scope_file(None) is None
+    condition, params = scope_filter('BTCUSDT', '5m', 'aipha/data/BTCUSDT-5m-2025-04-16.csv')
+    # Solo el archivo (día) y las filas antiguas sin archivo; los demás días del par se conservan
+    assert condition == "symbol = %s AND timeframe = %s AND (csv_file = %s OR csv_file IS NULL)"
+    assert params == ('BTCUSDT', '5m', 'BTCUSDT-5m-2025-04-16.csv')
+    assert scope_filter(None, None, 'sample.csv') == ("csv_file = %s", ('sample.csv',))
+    assert scope_filter(None, None, None) == (None, ())
+
+def test_candle_saver_ddl_before_scoped_delete():
+    schema_registry.invalidate()
+    tables = {
+        'key_candles': ['id', 'candle_index', 'symbol', 'timeframe', 'run_id', 'param_set_id', 'created_at'],
+        'param_sets': ['id', 'param_hash', 'stage', 'params', 'created_at'],
+    }
+    connection = SaverConnection(tables)
+    saver = DetectionResultSaver()
+    saver.connection = connection
+    saver.cursor = connection.cursor()
+    saver.csv_file = 'BTCUSDT-5m-2025-04-16.csv'
+    assert saver.save_results([{'index': 3}], {'lookback_candles': 30}, ['key_candles'])
+    statements = [statement for statement, _ in connection.log]
+    print(f"Statements: {statements}")
+    # El DDL (con su commit implícito) termina antes del primer borrado o inserción
+    first_dml = statements.index('INSERT INTO')
+    assert statements[:first_dml] == ['ALTER TABLE', 'COMMIT']
+    assert statements[first_dml:] == ['INSERT INTO', 'DELETE FROM', 'INSERT MANY', 'COMMIT']
+    delete_params = connection.log[statements.index('DELETE FROM')][1]
+    assert delete_params == ('BTCUSDT', '5m', 'BTCUSDT-5m-2025-04-16.csv')
+    # La vela lleva el archivo del que sale
+    inserted = connection.log[statements.index('INSERT MANY')][1][0]
+    assert 'BTCUSDT-5m-2025-04-16.csv' in inserted
+    schema_registry.invalidate()
+
+if __name__ == "__main__":
+    test_scope_from_csv()
+    test_ensure_run_column_once()
+    test_scope_filter()
+    test_candle_saver_ddl_before_scoped_delete()
@@ -0,0 +1,61 @@
+"""
+Prueba que el benchmark de etapas mide tiempo y memoria, omite los tamaños fuera de presupuesto y detecta regresiones.
+Ubicación: aipha/programs/stable/tests/test_stage_benchmark.py
+"""
+
+import sys
+import os
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from stage_benchmark import STAGE_CASES, synthetic_bars, benchmark, compare, format_results
+
+def test_synthetic_bars_are_valid_ohlcv():
+    bars = synthetic_bars(2000, seed=3)
+    assert len(bars) == 2000
+    assert (bars['high'] >= bars[['open', 'close']].max(axis=1)).all()
+    assert (bars['low'] <= bars[['open', 'close']].min(axis=1)).all()
+    assert (bars['volume'] > 0).all()
+    assert bars['datetime'].diff().dropna().dt.total_seconds().eq(300).all()
+
+def test_benchmark_measures_and_skips_by_budget():
+    results = benchmark(['triple_matching', 'scoring', 'key_candles'], sizes=[1000, 20000, 2000000],
+                        budget=5, isolate=False)
+    print(format_results(results))
+    assert set(results) == {'triple_matching', 'scoring', 'key_candles'}
+    for stage in ('triple_matching', 'scoring'):
+        for rows in ('1000', '20000'):
+            r = results[stage][rows]
+            assert r['error'] is None and not r['skipped']
+            assert r['seconds'] > 0 and r['peak_mb'] >= 0
+    # El bucle por vela de Detector no cabe en el presupuesto con 2M velas
+    assert results['key_candles']['2000000']['skipped']
+    assert results['key_candles']['2000000']['estimate'] > 5
+
+def test_isolated_case_in_new_interpreter():
+    results = benchmark(['scoring'], sizes=[1000], budget=0)
+    assert results['scoring']['1000']['seconds'] > 0
+    assert set(STAGE_CASES) >= {'key_candles', 'segments', 'mini_trend_volume_profile', 'zone_volume_profile',
+                                'zones', 'triple_matching', 'scoring'}
+
+def test_compare_flags_regressions():
+    baseline = {'a': {'1000': {'seconds': 0.010, 'peak_mb': 5.0}, '100000': {'seconds': 1.0, 'peak_mb': 50.0}}}
+    results = {'a': {'1000': {'seconds': 0.015, 'peak_mb': 5.5}, '100000': {'seconds': 2.0, 'peak_mb': 80.0}},
+               'b': {'1000': {'seconds': 9.0}}}
+    # El caso pequeño crece por debajo de los mínimos absolutos; b no está en el baseline
+    assert compare(results, baseline) == [('a', '100000', 'seconds', 1.0, 2.0), ('a', '100000', 'peak_mb', 50.0, 80.0)]
+
+def test_compare_flags_unmeasured_cases():
+    baseline = {'a': {'1000': {'seconds': 0.010}, '100000': {'seconds': 1.0}, '1000000': {'seconds': 10.0}}}
+    results = {'a': {'1000': {'seconds': 0.010, 'error': None, 'skipped': False},
+                     '100000': {'seconds': None, 'error': None, 'skipped': True, 'estimate': 90.0}}}
+    # El tamaño omitido por presupuesto y el que falta cuentan como fallo
+    assert compare(results, baseline) == [('a', '100000', 'seconds', 1.0, None), ('a', '1000000', 'seconds', 10.0, None)]
+    assert format_results(results, baseline).splitlines()[-1] == '1 casos sin medir (omitidos o con error)'
+
+if __name__ == "__main__":
+    test_synthetic_bars_are_valid_ohlcv()
+    test_benchmark_measures_and_skips_by_budget()
+    test_isolated_case_in_new_interpreter()
+    test_compare_flags_regressions()
+    test_compare_flags_unmeasured_cases()
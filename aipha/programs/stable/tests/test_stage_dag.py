@@ -0,0 +1,96 @@
+"""
+Prueba que StageDAG ejecuta a la vez las etapas independientes, reutiliza la caché y calcula el camino crítico.
+Ubicación: aipha/programs/stable/tests/test_stage_dag.py
+"""
+
+import sys
+import os
+import time
+import threading
+import functools
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from stage_dag import StageDAG, StageCache, format_report
+
+def build_dag(calls, barrier):
+    def source(name):
+        def run():
+            calls.append(name)
+            # Las dos etapas independientes solo pasan la barrera si se ejecutan a la vez
+            barrier.wait(timeout=5)
+            time.sleep(0.05 if name == 'candles' else 0.01)
+            return name
+        return run
+
+    def combine(name):
+        def run(*inputs):
+            calls.append(name)
+            return (name,) + inputs
+        return run
+
+    dag = StageDAG()
+    dag.add('candles', source('candles'), params={'lookback': 30})
+    dag.add('segments', source('segments'), params={'zigzag_threshold': 0.005})
+    dag.add('zones', combine('zones'), inputs=('candles',))
+    dag.add('triples', combine('triples'), inputs=('zones', 'segments'))
+    return dag
+
+def test_independent_stages_run_concurrently_and_cache():
+    calls = []
+    cache = StageCache()
+    result = build_dag(calls, threading.Barrier(2)).run(max_workers=2, cache=cache, fingerprint='csv-a')
+    print(format_report(result))
+    assert result.outputs['triples'] == ('triples', ('zones', 'candles'), 'segments')
+    assert result.critical_path == ['candles', 'zones', 'triples']
+    assert result.critical_seconds <= result.wall_seconds + 1e-6
+    assert sorted(calls) == ['candles', 'segments', 'triples', 'zones']
+
+    # Misma huella y parámetros: todas las etapas salen de la caché
+    calls.clear()
+    again = build_dag(calls, threading.Barrier(2)).run(max_workers=2, cache=cache, fingerprint='csv-a')
+    assert calls == []
+    assert all(timing.cached for timing in again.timings.values())
+    assert again.outputs == result.outputs
+
+    # Otros datos: se vuelve a ejecutar
+    build_dag(calls, threading.Barrier(2)).run(max_workers=2, cache=cache, fingerprint='csv-b')
+    assert sorted(calls) == ['candles', 'segments', 'triples', 'zones']
+
+def square_sum(n):
+    # Etapa de CPU en Python puro (a nivel de módulo para que el pool de procesos la serialice)
+    return sum(i * i for i in range(n)), os.getpid()
+
+def add_outputs(*inputs):
+    return sum(value for value, _ in inputs), os.getpid()
+
+def test_process_executor():
+    dag = StageDAG()
+    dag.add('a', functools.partial(square_sum, 20000))
+    dag.add('b', functools.partial(square_sum, 30000))
+    dag.add('total', add_outputs, inputs=('a', 'b'))
+    result = dag.run(max_workers=2, executor='process')
+    expected = sum(i * i for i in range(20000)) + sum(i * i for i in range(30000))
+    assert result.outputs['total'][0] == expected
+    # Las etapas se ejecutan fuera de este proceso y sus tiempos siguen siendo coherentes
+    assert all(pid != os.getpid() for _, pid in result.outputs.values())
+    assert all(0.0 <= t.start <= t.end for t in result.timings.values())
+    assert result.critical_path[-1] == 'total'
+    try:
+        dag.run(executor='fiber')
+        assert False, "executor desconocido aceptado"
+    except ValueError:
+        pass
+
+def test_preset_skips_stage_and_its_inputs():
+    calls = []
+    dag = build_dag(calls, threading.Barrier(1))
+    result = dag.run(targets=['zones'], preset={'candles': 'stored'})
+    assert calls == ['zones']
+    assert result.outputs['zones'] == ('zones', 'stored')
+    assert dag.topological_order(['triples']) == ['candles', 'zones', 'segments', 'triples']
+
+if __name__ == "__main__":
+    test_independent_stages_run_concurrently_and_cache()
+    test_process_executor()
+    test_preset_skips_stage_and_its_inputs()
@@ -0,0 +1,124 @@
+"""
+Prueba el backend SQLite de storage: inserción masiva, reemplazo por archivo y lectura columnar.
+Ubicación: aipha/programs/stable/tests/test_storage.py
+"""
+
+import numpy as np
+import pandas as pd
+import tempfile
+import sys
+import os
+import pytest
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from storage import SQLiteStore, DuckDBStore, open_store
+
+def create_key_candles(symbol, timeframe, num_candles=50, offset=0, csv_file=None):
+    return [{
+        'candle_index': np.int64(i + offset),
+        'open': np.float64(100 + i), 'high': 101.0 + i, 'low': 99.0 + i, 'close': 100.5 + i,
+        'volume': float(i * 10), 'body_percentage': 25.0, 'is_key_candle': True,
+        'symbol': symbol, 'timeframe': timeframe, 'csv_file': csv_file,
+        'datetime': pd.Timestamp('2024-01-01') + pd.Timedelta(minutes=5 * i),
+    } for i in range(num_candles)]
+
+def test_sqlite_store():
+    with tempfile.TemporaryDirectory() as tmp:
+        with SQLiteStore(os.path.join(tmp, 'results.sqlite')) as store:
+            assert store.append('key_candles', create_key_candles('BTCUSDT', '5m')) == 50
+            store.append('key_candles', create_key_candles('ETHUSDT', '5m', 20))
+            assert store.count('key_candles') == 70
+
+            # Reemplazar solo el ámbito BTCUSDT-5m (las filas sin csv_file son del mismo archivo, como en los savers)
+            store.replace_scope('key_candles', 'BTCUSDT', '5m', 'BTCUSDT-5m-2024-01-01.csv',
+                                create_key_candles('BTCUSDT', '5m', 10, offset=100, csv_file='BTCUSDT-5m-2024-01-01.csv'))
+            assert store.count('key_candles', 'BTCUSDT', '5m') == 10
+            assert store.count('key_candles', 'ETHUSDT', '5m') == 20
+
+            columns = store.scan('key_candles', ['candle_index', 'volume', 'mini_trend_id', 'datetime'],
+                                 symbol='BTCUSDT', timeframe='5m', order_by='candle_index')
+            print(f"Scanned candle_index: {columns['candle_index'][:5]}")
+            # Los enteros vuelven como Int64 con nulos, no como float64
+            assert str(columns['candle_index'].dtype) == 'Int64'
+            assert columns['candle_index'].tolist() == list(range(100, 110))
+            assert str(columns['mini_trend_id'].dtype) == 'Int64' and columns['mini_trend_id'].isna().all()
+            assert columns['volume'].dtype == np.float64
+            assert columns['datetime'][1] == '2024-01-01 00:05:00'
+
+            records = store.scan_records('key_candles', symbol='ETHUSDT', timeframe='5m', order_by='id')
+            assert records[0]['symbol'] == 'ETHUSDT' and 'id' in records[0]
+
+def test_duckdb_store():
+    pytest.importorskip('duckdb')
+    with tempfile.TemporaryDirectory() as tmp:
+        with DuckDBStore(os.path.join(tmp, 'results.duckdb')) as store:
+            assert store.append('key_candles', create_key_candles('BTCUSDT', '5m')) == 50
+            store.append('key_candles', create_key_candles('ETHUSDT', '5m', 20))
+            store.replace_scope('key_candles', 'BTCUSDT', '5m', 'BTCUSDT-5m-2024-01-01.csv',
+                                create_key_candles('BTCUSDT', '5m', 10, offset=100))
+            assert store.count('key_candles', 'BTCUSDT', '5m') == 10
+            assert store.count('key_candles', 'ETHUSDT', '5m') == 20
+
+            columns = store.scan('key_candles', ['id', 'candle_index', 'mini_trend_id'],
+                                 symbol='BTCUSDT', timeframe='5m', order_by='candle_index')
+            assert str(columns['id'].dtype) == 'Int64'
+            assert columns['candle_index'].tolist() == list(range(100, 110))
+            assert columns['mini_trend_id'].isna().all()
+
+        # La tabla ya existe al reabrir el archivo (information_schema)
+        with DuckDBStore(os.path.join(tmp, 'results.duckdb')) as store:
+            assert store.count('key_candles') == 30
+
+def test_replace_scope_keeps_other_days():
+    day_1 = '/data/BTCUSDT-5m-2024-01-01.csv'
+    day_2 = '/data/BTCUSDT-5m-2024-01-02.csv'
+    with tempfile.TemporaryDirectory() as tmp:
+        with SQLiteStore(os.path.join(tmp, 'results.sqlite')) as store:
+            store.replace_scope('key_candles', 'BTCUSDT', '5m', day_1,
+                                create_key_candles('BTCUSDT', '5m', 30, csv_file=os.path.basename(day_1)))
+            store.replace_scope('key_candles', 'BTCUSDT', '5m', day_2,
+                                create_key_candles('BTCUSDT', '5m', 20, csv_file=os.path.basename(day_2)))
+            # Repetir el segundo día no toca el primero
+            store.replace_scope('key_candles', 'BTCUSDT', '5m', day_2,
+                                create_key_candles('BTCUSDT', '5m', 5, csv_file=os.path.basename(day_2)))
+            assert store.count('key_candles', 'BTCUSDT', '5m', csv_file=day_1) == 30
+            assert store.count('key_candles', 'BTCUSDT', '5m', csv_file=day_2) == 5
+            with pytest.raises(ValueError):
+                store.delete_scope('key_candles', None, None, None)
+
+def test_schema_matches_mysql_tables():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'results.sqlite')
+        with SQLiteStore(path) as store:
+            # Tabla creada con el esquema anterior, sin csv_file ni run_id
+            store.connection.execute("CREATE TABLE triple_signals (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                                     "symbol TEXT, timeframe TEXT, candle_index INTEGER)")
+            store.ensure_table('triple_signals')
+            columns = {row[1] for row in store.connection.execute("PRAGMA table_info(triple_signals)")}
+            assert {'csv_file', 'run_id', 'final_score'} <= columns
+            signal = {'symbol': 'BTCUSDT', 'timeframe': '5m', 'csv_file': 'BTCUSDT-5m-2024-01-01.csv', 'candle_index': 7}
+            store.append('triple_signals', [signal])
+            # Misma clave única que unique_signal_file en MySQL
+            with pytest.raises(Exception):
+                store.append('triple_signals', [signal])
+            store.rollback()
+
+            first = store.param_set_id({'a': 1, 'b': 2.0}, 'zones')
+            assert store.param_set_id({'b': 2.0, 'a': 1}, 'zones') == first
+            assert store.count('param_sets') == 1
+
+def test_unknown_backend():
+    try:
+        open_store('oracle')
+    except ValueError as e:
+        print(f"Error esperado: {e}")
+    else:
+        assert False, "open_store should reject unknown backends"
+
+if __name__ == "__main__":
+    test_sqlite_store()
+    test_duckdb_store()
+    test_replace_scope_keeps_other_days()
+    test_schema_matches_mysql_tables()
+    test_unknown_backend()
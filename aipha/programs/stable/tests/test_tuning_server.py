@@ -0,0 +1,169 @@
+"""
+Prueba que el servidor de ajuste da las mismas señales que pipeline.py y reutiliza los artefactos en caché.
+Ubicación: aipha/programs/stable/tests/test_tuning_server.py
+"""
+
+import sys
+import os
+import json
+import tempfile
+import threading
+import urllib.request
+
+import numpy as np
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from tuning_server import TuningEngine, TuningServer, rolling_volume_percentile
+from pipeline import PipelineData, detect_key_candles, segment_mini_trends, find_triple_signals, stage_params
+from test_pipeline import write_sample_csv
+from test_live_engine import causal_zone_search, signal_key
+
+def batch_signals(csv_file, params):
+    params = stage_params(params)
+    data = PipelineData(csv_file)
+    candles, _ = detect_key_candles(data, params['candles'])
+    segments, _ = segment_mini_trends(data, params['segments'])
+    zones = [zone for zone in (causal_zone_search(data.bars, c['index']) for c in candles) if zone]
+    signals, _ = find_triple_signals(data, candles, zones, segments, params['triples'])
+    return candles, signals
+
+def test_rolling_percentile_matches_detector():
+    volume = np.random.default_rng(5).lognormal(3, 1, 500)
+    result = rolling_volume_percentile(volume, 30, 70)
+    assert np.isnan(result[:30]).all()
+    for idx in (30, 31, 250, 499):
+        assert result[idx] == np.percentile(volume[idx - 30:idx], 70)
+
+def test_engine_matches_pipeline_and_reuses_artifacts():
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = os.path.join(tmp, 'BTCUSDT-5m-2025-04-16.csv')
+        write_sample_csv(csv_file, rows=600, seed=11)
+        engine = TuningEngine(zone_search=causal_zone_search)
+        engine.add_dataset(csv_file)
+        base = {'candles': {'volume_percentile': 60},
+                'triples': {'min_zone_quality': 0.3, 'min_trend_r_squared': 0.2}}
+
+        signals, info = engine.signals('BTCUSDT-5m-2025-04-16', base)
+        candles, expected = batch_signals(csv_file, base)
+        assert expected
+        assert sorted(map(signal_key, signals)) == sorted(map(signal_key, expected))
+        assert info['counts']['key_candles'] == len(candles)
+        assert 'signals' in info['computed'] and not info['reused']
+
+        # Solo cambia la tolerancia: velas, pivotes, segmentos y zonas salen de la caché
+        changed = dict(base, triples=dict(base['triples'], tolerance=3))
+        signals, info = engine.signals('BTCUSDT-5m-2025-04-16', changed)
+        assert sorted(map(signal_key, signals)) == sorted(map(signal_key, batch_signals(csv_file, changed)[1]))
+        assert {'volume_quantile', 'key_candles', 'zigzag_pivots', 'segments'} <= set(info['reused'])
+        assert info['artifacts']['zone'] == {'reused': info['counts']['key_candles'], 'computed': 0}
+        assert {'zone_join', 'trend_join', 'signals'} <= set(info['computed'])
+
+        # Más velas clave: cambia volume_percentile, así que el percentil se recalcula, pero solo se
+        # buscan las zonas de las velas nuevas
+        wider = dict(base, candles={'volume_percentile': 50})
+        signals, info = engine.signals('BTCUSDT-5m-2025-04-16', wider)
+        wider_candles, wider_expected = batch_signals(csv_file, wider)
+        assert sorted(map(signal_key, signals)) == sorted(map(signal_key, wider_expected))
+        assert 'segments' in info['reused'] and {'volume_quantile', 'key_candles'} <= set(info['computed'])
+        assert info['artifacts']['zone'] == {'reused': len(candles), 'computed': len(wider_candles) - len(candles)}
+
+        # Repetir una consulta no calcula nada
+        _, info = engine.signals('BTCUSDT-5m-2025-04-16', base)
+        assert not info['computed'] and 'signals' in info['reused']
+        print(f"Consulta repetida: {info['ms']:.2f}ms")
+
+def test_zones_do_not_evict_other_artifacts():
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = os.path.join(tmp, 'BTCUSDT-5m-2025-04-16.csv')
+        write_sample_csv(csv_file, rows=600, seed=11)
+        # Caché menor que el número de velas clave: las zonas ocupan una sola entrada
+        engine = TuningEngine(cache_entries=16, zone_search=causal_zone_search)
+        engine.add_dataset(csv_file)
+        params = {'candles': {'volume_percentile': 60}}
+        _, info = engine.signals('BTCUSDT-5m-2025-04-16', params)
+        assert info['counts']['key_candles'] > engine.cache.max_entries
+        assert info['artifacts']['zone'] == {'reused': 0, 'computed': info['counts']['key_candles']}
+
+        _, info = engine.signals('BTCUSDT-5m-2025-04-16', params)
+        assert not info['computed'] and 'signals' in info['reused']
+        assert info['artifacts']['zone'] == {'reused': info['counts']['key_candles'], 'computed': 0}
+        assert len(engine.cache) <= engine.cache.max_entries
+
+def test_atr_artifact_and_multi_file_fingerprint():
+    with tempfile.TemporaryDirectory() as tmp:
+        first = os.path.join(tmp, 'BTCUSDT-5m-2025-04-16.csv')
+        second = os.path.join(tmp, 'BTCUSDT-5m-2025-04-17.csv')
+        write_sample_csv(first, rows=300, seed=11)
+        write_sample_csv(second, rows=300, seed=12)
+
+        atr_calls = []
+        searched = []
+        def rolling_range(bars, atr_period):
+            atr_calls.append(atr_period)
+            return (bars['high'] - bars['low']).rolling(atr_period).mean()
+        def search(bars, index, atr=None):
+            searched.append(atr)
+            return causal_zone_search(bars, index)
+
+        engine = TuningEngine(zone_search=search, zone_atr=rolling_range)
+        single = engine.add_dataset(first)
+        both = engine.add_dataset([first, second], name='BTCUSDT-5m-2d')
+        # Dos archivos no comparten huella (ni artefactos) con el conjunto del primero
+        assert both.data.fingerprint != single.data.fingerprint
+        assert len(both.data.raw) == 600
+
+        base = {'candles': {'volume_percentile': 60}, 'zones': {'atr_period': 14, 'atr_multiplier': 1.0}}
+        _, info = engine.signals('BTCUSDT-5m-2d', base)
+        assert atr_calls == [14] and info['artifacts']['atr'] == 'computed'
+        assert searched and all(atr is searched[0] for atr in searched)
+
+        # Otro multiplicador: las zonas se vuelven a buscar con la misma serie ATR
+        _, info = engine.signals('BTCUSDT-5m-2d', dict(base, zones={'atr_period': 14, 'atr_multiplier': 2.0}))
+        assert atr_calls == [14] and info['artifacts']['atr'] == 'reused' and info['artifacts']['zone']['computed']
+        # Otro periodo: otra serie
+        engine.signals('BTCUSDT-5m-2d', dict(base, zones={'atr_period': 20, 'atr_multiplier': 2.0}))
+        assert atr_calls == [14, 20]
+
+def test_http_server():
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = os.path.join(tmp, 'ETHUSDT-5m-2025-04-16.csv')
+        write_sample_csv(csv_file, rows=400, seed=7)
+        server = TuningServer(('127.0.0.1', 0), TuningEngine(zone_search=causal_zone_search))
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        def post(path, body):
+            request = urllib.request.Request(url + path, data=json.dumps(body).encode('utf-8'), method='POST')
+            with urllib.request.urlopen(request) as response:
+                return json.loads(response.read())
+        try:
+            dataset = post('/datasets', {'csv': csv_file})
+            assert dataset['name'] == 'ETHUSDT-5m-2025-04-16' and dataset['rows'] == 400
+            params = {'candles': {'volume_percentile': 60}, 'triples': {'min_zone_quality': 0.3}}
+            response = post('/signals', {'dataset': dataset['name'], 'params': params, 'limit': 5})
+            assert len(response['signals']) == min(5, response['counts']['signals'])
+            scores = [signal['combined_score'] for signal in response['signals']]
+            assert scores == sorted(scores, reverse=True)
+            again = post('/signals', {'dataset': dataset['name'], 'params': params, 'limit': 5})
+            assert again['signals'] == response['signals'] and 'signals' in again['reused']
+
+            with urllib.request.urlopen(url + '/stats') as stats_response:
+                stats = json.loads(stats_response.read())
+            assert stats['queries'] == 2 and stats['cache']['hits'] > 0
+            try:
+                post('/signals', {'dataset': 'desconocido'})
+                assert False, "Se esperaba un 404"
+            except urllib.error.HTTPError as e:
+                assert e.code == 404
+        finally:
+            server.shutdown()
+            server.server_close()
+
+if __name__ == "__main__":
+    test_rolling_percentile_matches_detector()
+    test_engine_matches_pipeline_and_reuses_artifacts()
+    test_zones_do_not_evict_other_artifacts()
+    test_atr_artifact_and_multi_file_fingerprint()
+    test_http_server()
@@ -0,0 +1,82 @@
+"""
+Prueba el barrido de pesos frente a TripleSignalSaver.calculate_combined_score y la estabilidad del orden.
+Ubicación: aipha/programs/stable/tests/test_weight_sweep.py
+"""
+
+import numpy as np
+import sys
+import os
+import tempfile
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from weight_sweep import (COMPONENT_NAMES, build_component_cache, save_component_cache, load_component_cache,
+                          effective_weights, sweep, rankings, rank_stability, build_configs, parse_args)
+from batch_scoring import score_signals_batch, signals_to_columns
+from save_triple_signals import TripleSignalSaver
+from test_batch_scoring import create_sample_signals
+
+def test_build_component_cache():
+    signals = create_sample_signals(50)
+    for position, signal in enumerate(signals):
+        signal.update({'symbol': 'BTCUSDT', 'timeframe': '5m', 'candle_index': position, 'zone_id': position % 7,
+                       'trend_id': None})
+    cache = build_component_cache(signals)
+    assert cache['components'].shape == (50, len(COMPONENT_NAMES))
+    assert (cache['components'][:, COMPONENT_NAMES.index('provisional_base')] == 0.5).all()
+    assert cache['candle_index'].tolist() == list(range(50))
+    assert (cache['trend_id'] == -1).all() and (cache['symbol'] == 'BTCUSDT').all()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'components.npz')
+        save_component_cache(cache, path)
+        assert np.array_equal(load_component_cache(path)['components'], cache['components'])
+        # Cachés anteriores de 6 columnas se completan con la base provisional
+        legacy = dict(cache, components=cache['components'][:, :-1])
+        save_component_cache(legacy, path)
+        assert np.array_equal(load_component_cache(path)['components'], cache['components'])
+
+def test_sweep_matches_calculate_combined_score():
+    signals = create_sample_signals(300)
+    saver = TripleSignalSaver()
+    cache = build_component_cache(signals)
+    scores = sweep(cache, [effective_weights(), effective_weights(use_signal_strength=True)])
+    stored = score_signals_batch(signals_to_columns(signals))['combined_score']
+    for position, signal in enumerate(signals):
+        # save_signals: detalles ya calculados, base provisional 0.5
+        _, details = saver.calculate_signal_strength(signal)
+        provisional, _ = saver.calculate_combined_score(signal, details)
+        # Sin detalles: la base es la fuerza real
+        real, _ = saver.calculate_combined_score(signal)
+        assert abs(scores[position, 0] - provisional) <= 1e-4 + 1e-9
+        assert abs(scores[position, 0] - stored[position]) <= 1e-4 + 1e-9
+        assert abs(scores[position, 1] - real) <= 1e-4 + 1e-9
+
+def test_rank_stability():
+    scores = np.array([[0.9, 0.9, 0.1],
+                       [0.8, 0.7, 0.2],
+                       [0.7, 0.8, 0.3],
+                       [0.6, 0.6, 0.4]])
+    stability = rank_stability(scores, baseline=0, top_k=2)
+    assert np.allclose(stability['spearman'], [1.0, 0.8, -1.0])
+    assert np.allclose(stability['top_k_overlap'], [1.0, 0.5, 0.0])
+    assert stability['changed'].tolist() == [0, 2, 4]
+    assert np.allclose(stability['mean_shift'], [0.0, 0.5, 2.0])
+
+def test_strength_weights_change_rankings():
+    # Sin --use-signal-strength los pesos de fuerza no influirían: el flag queda implícito
+    assert parse_args(['--cache', 'c.npz', '--strength-weights', '0.8,0.1,0.1']).use_signal_strength
+    assert not parse_args(['--cache', 'c.npz']).use_signal_strength
+
+    cache = build_component_cache(create_sample_signals(300))
+    configs, weights = build_configs([(0.8, 0.1, 0.1)], [], use_signal_strength=True)
+    assert configs[2] == ((0.8, 0.1, 0.1), configs[0][1])
+    ranks = rankings(sweep(cache, weights))
+    # Frente a los pesos de fuerza actuales con la misma base, el orden cambia
+    assert (ranks[:, 2] != ranks[:, 1]).any()
+
+if __name__ == "__main__":
+    test_build_component_cache()
+    test_sweep_matches_calculate_combined_score()
+    test_rank_stability()
+    test_strength_weights_change_rankings()
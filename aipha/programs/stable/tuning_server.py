@@ -0,0 +1,382 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+tuning_server.py - Servidor JSON para ajustar parámetros con los datos en memoria
+
+Carga los conjuntos de datos una sola vez y responde "señales para estos parámetros" reutilizando
+los artefactos derivados ya calculados, guardados en una caché LRU (stage_dag.StageCache):
+- volume_quantile: percentil móvil del volumen (lookback, volume_percentile)
+- key_candles: velas clave (+ body_threshold)
+- zigzag_pivots: pivotes ZigZag (zigzag_threshold)
+- segments: mini-tendencias (+ min_trend_bars)
+- atr: serie ATR de la búsqueda de zonas (atr_period), así que al cambiar atr_multiplier u otros
+  umbrales de zona el ATR no se recalcula para cada vela clave
+- zone: zonas de acumulación por vela clave (un artefacto por juego de parámetros de zona), así que
+  al cambiar el percentil de volumen solo se buscan las zonas de las velas nuevas
+- zone_join / trend_join: índices de rangos vela-zona y vela-tendencia (tolerance y filtros de calidad)
+- signals: señales puntuadas
+Cada respuesta indica qué artefactos se reutilizaron y cuáles se calcularon.
+Las señales coinciden con las de pipeline.py para los mismos parámetros.
+
+    python tuning_server.py --csv data/BTCUSDT-5m-2025-04-16.csv --port 8765
+    curl -s localhost:8765/signals -d '{"dataset": "BTCUSDT-5m-2025-04-16",
+        "params": {"candles": {"volume_percentile": 80}, "triples": {"tolerance": 5}}}'
+
+Endpoints: GET /datasets, POST /datasets {"csv": ruta o lista, "name": ...}, POST /signals, GET /stats.
+Ubicación: aipha/programs/stable/tuning_server.py
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import threading
+import traceback
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+from pipeline import BINANCE_COLUMNS, PipelineData, stage_params, build_triple_signals
+from interval_join import join_points_to_intervals, compose_triples
+from mini_trend import MiniTrendDetector
+from param_sets import param_hash
+from run_cache import file_sha256
+from stage_dag import StageCache
+from detection_service import to_jsonable
+from log_config import configure_logging
+
+# Filas por bloque al calcular el percentil móvil (acota la memoria de las ventanas)
+QUANTILE_BLOCK_ROWS = 100000
+
+
+def rolling_volume_percentile(volume, lookback, percentile):
+    """
+    Percentil del volumen de las lookback velas anteriores a cada vela (NaN en las primeras),
+    con el mismo cálculo que Detector.process_csv.
+    """
+    volume = np.asarray(volume, dtype=float)
+    result = np.full(len(volume), np.nan)
+    if len(volume) <= lookback:
+        return result
+    # La ventana j cubre volume[j:j + lookback] y corresponde a la vela j + lookback
+    windows = sliding_window_view(volume[:-1], lookback)
+    for start in range(0, len(windows), QUANTILE_BLOCK_ROWS):
+        block = windows[start:start + QUANTILE_BLOCK_ROWS]
+        result[lookback + start:lookback + start + len(block)] = np.percentile(block, percentile, axis=1)
+    return result
+
+
+def body_percentage(columns):
+    """Cuerpo de cada vela en % de su rango (NaN si el rango es 0, velas que Detector descarta)."""
+    candle_range = columns['high'] - columns['low']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(candle_range != 0, 100 * np.abs(columns['close'] - columns['open']) / candle_range, np.nan)
+
+
+def select_key_candles(columns, body_pct, quantile, body_threshold):
+    """Velas clave, en el formato de Detector.process_csv, a partir de los arrays ya calculados."""
+    volume = columns['volume']
+    with np.errstate(invalid='ignore'):
+        selected = (volume >= quantile) & (body_pct <= body_threshold)
+    return [{
+        'index': int(idx),
+        'open': float(columns['open'][idx]),
+        'high': float(columns['high'][idx]),
+        'low': float(columns['low'][idx]),
+        'close': float(columns['close'][idx]),
+        'volume': float(volume[idx]),
+        'volume_percentile': float(quantile[idx]),
+        'body_percentage': float(body_pct[idx]),
+        'is_key_candle': True,
+        'timestamp': None
+    } for idx in np.flatnonzero(selected)]
+
+
+def fast_key_candles(frame, params):
+    """
+    Velas clave vectorizadas (mismo resultado que Detector.process_csv).
+    :param frame: Vista candle_frame con open, high, low, close y volume
+    :param params: Parámetros de la etapa 'candles'
+    """
+    columns = {col: frame[col].to_numpy(dtype=float) for col in ('open', 'high', 'low', 'close', 'volume')}
+    quantile = rolling_volume_percentile(columns['volume'], params['lookback'], params['volume_percentile'])
+    return select_key_candles(columns, body_percentage(columns), quantile, params['body_threshold'])
+
+
+class TuningDataset:
+    """Datos de un conjunto cargados una vez, con los arrays base de las velas."""
+    def __init__(self, name, data):
+        self.name = name
+        self.data = data
+        frame = data.candle_frame
+        self.columns = {col: frame[col].to_numpy(dtype=float) for col in ('open', 'high', 'low', 'close', 'volume')}
+        self.body_percentage = body_percentage(self.columns)
+        # Vista bars construida al cargar, no en la primera consulta
+        data.bars
+
+    @classmethod
+    def load(cls, csv_files, name=None):
+        csv_files = [csv_files] if isinstance(csv_files, str) else list(csv_files)
+        if len(csv_files) == 1:
+            data = PipelineData(csv_files[0])
+        else:
+            raw = pd.concat([pd.read_csv(f, names=BINANCE_COLUMNS, header=None) for f in csv_files], ignore_index=True)
+            data = PipelineData(csv_files[0], raw=raw)
+            # La huella del primer archivo coincidiría con la del conjunto de solo ese archivo: se usa la
+            # lista ordenada de hashes (el orden fija los índices de las velas)
+            digest = hashlib.sha256('|'.join(file_sha256(f) for f in csv_files).encode('ascii'))
+            data._fingerprint = digest.hexdigest()
+        return cls(name or os.path.splitext(os.path.basename(csv_files[0]))[0], data)
+
+    def describe(self):
+        return {'name': self.name, 'rows': len(self.data.raw), 'symbol': self.data.symbol,
+                'timeframe': self.data.timeframe, 'fingerprint': self.data.fingerprint}
+
+
+class TuningEngine:
+    """Conjuntos de datos cargados y caché de artefactos derivados compartida entre consultas."""
+    def __init__(self, cache_entries=1024, zone_search=None, zone_atr=None):
+        """
+        :param cache_entries: Artefactos que se conservan (LRU)
+        :param zone_search: Función(bars, index[, atr]) -> zona; por defecto live_engine.accumulation_zone_search
+        :param zone_atr: Función(bars, atr_period) -> serie ATR que se pasa a zone_search como atr.
+                         Por defecto live_engine.zone_atr con la búsqueda por defecto; con otra búsqueda
+                         y sin zone_atr no se pasa ATR
+        """
+        self.datasets = {}
+        self.cache = StageCache(max_entries=cache_entries)
+        self.zone_search = zone_search
+        self.zone_atr = zone_atr
+        self.queries = 0
+        self._lock = threading.Lock()
+
+    def add_dataset(self, csv_files, name=None):
+        dataset = TuningDataset.load(csv_files, name)
+        with self._lock:
+            self.datasets[dataset.name] = dataset
+        return dataset
+
+    def _artifact(self, dataset, name, params, compute, used):
+        """Artefacto desde la caché o calculado ahora; anota en used si se reutilizó."""
+        key = (dataset.data.fingerprint, name, param_hash(params))
+        found, value = self.cache.get(key)
+        if found:
+            used.setdefault(name, 'reused')
+            return value
+        value = compute()
+        self.cache.put(key, value)
+        used[name] = 'computed'
+        return value
+
+    def _key_candles(self, dataset, params, used):
+        quantile = self._artifact(
+            dataset, 'volume_quantile', {'lookback': params['lookback'], 'volume_percentile': params['volume_percentile']},
+            lambda: rolling_volume_percentile(dataset.columns['volume'], params['lookback'], params['volume_percentile']),
+            used)
+
+        def compute():
+            return select_key_candles(dataset.columns, dataset.body_percentage, quantile, params['body_threshold'])
+        return self._artifact(dataset, 'key_candles', params, compute, used)
+
+    def _segments(self, dataset, params, used):
+        detector = MiniTrendDetector()
+        detector.data = dataset.data.bars
+        detector.set_params(zigzag_threshold=params['zigzag_threshold'], min_trend_bars=params['min_trend_bars'])
+        pivots = self._artifact(dataset, 'zigzag_pivots', {'zigzag_threshold': params['zigzag_threshold']},
+                                detector.detect_zigzag_pivots, used)
+
+        def compute():
+            # Mismos segmentos que MiniTrendDetector.segment_mini_trends, a partir de los pivotes en caché
+            trends = [detector.describe_segment(detector.data.iloc[start:end + 1], start, end)
+                      for start, end in zip(pivots[:-1], pivots[1:]) if end - start + 1 >= params['min_trend_bars']]
+            return pd.DataFrame(trends)
+        return self._artifact(dataset, 'segments', params, compute, used)
+
+    def _zones(self, dataset, params, key_candles, used):
+        """
+        Zonas de las velas clave. Las zonas de cada juego de parámetros de zona son un único artefacto
+        (índice de vela -> zona) que se amplía con las velas nuevas, así que una entrada por vela no
+        desaloja del LRU al resto de artefactos.
+        """
+        key = (dataset.data.fingerprint, 'zone', param_hash(params))
+        found, by_index = self.cache.get(key)
+        if not found:
+            by_index = {}
+        search = self.zone_search
+        atr_function = self.zone_atr
+        atr = None
+        zones = []
+        counts = {'reused': 0, 'computed': 0}
+        for candle in key_candles:
+            index = candle['index']
+            if index in by_index:
+                counts['reused'] += 1
+            else:
+                if search is None:
+                    # Importación diferida: pandas_ta solo se carga si hay que buscar zonas
+                    from live_engine import accumulation_zone_search, zone_atr
+                    search = accumulation_zone_search(params)
+                    atr_function = atr_function or zone_atr
+                if atr_function is None:
+                    by_index[index] = search(dataset.data.bars, index)
+                else:
+                    if atr is None:
+                        # Una serie ATR por atr_period, compartida por todas las velas y umbrales de zona
+                        atr = self._artifact(dataset, 'atr', {'atr_period': params['atr_period']},
+                                             lambda: atr_function(dataset.data.bars, params['atr_period']), used)
+                    by_index[index] = search(dataset.data.bars, index, atr=atr)
+                counts['computed'] += 1
+            if by_index[index]:
+                zones.append(by_index[index])
+        self.cache.put(key, by_index)
+        used['zone'] = counts
+        return zones
+
+    def signals(self, dataset_name, params=None):
+        """
+        Señales de triple coincidencia para los parámetros indicados.
+        :return: (señales, diccionario con recuentos y artefactos reutilizados/calculados)
+        """
+        if dataset_name not in self.datasets:
+            raise KeyError(f"Conjunto de datos no cargado: {dataset_name}")
+        dataset = self.datasets[dataset_name]
+        params = stage_params(params)
+        used = {}
+        started = time.perf_counter()
+        with self._lock:
+            self.queries += 1
+            key_candles = self._key_candles(dataset, params['candles'], used)
+            segments = self._segments(dataset, params['segments'], used)
+            zones = self._zones(dataset, params['zones'], key_candles, used)
+            triples = params['triples']
+            candle_points = [c['index'] for c in key_candles]
+            zone_key = {'candles': params['candles'], 'zones': params['zones'], 'tolerance': triples['tolerance'],
+                        'min_zone_quality': triples['min_zone_quality']}
+            trend_key = {'candles': params['candles'], 'segments': params['segments'],
+                         'tolerance': triples['tolerance'], 'min_trend_r_squared': triples['min_trend_r_squared']}
+            signals_key = {'zone_join': zone_key, 'trend_join': trend_key}
+
+            def compute_signals():
+                if not key_candles or not zones or segments.empty:
+                    return []
+                zone_pairs = self._artifact(dataset, 'zone_join', zone_key, lambda: join_points_to_intervals(
+                    candle_points, [z['start_idx'] for z in zones], [z['end_idx'] for z in zones],
+                    triples['tolerance'],
+                    np.asarray([z['quality_score'] for z in zones], dtype=float) >= triples['min_zone_quality']), used)
+                trend_pairs = self._artifact(dataset, 'trend_join', trend_key, lambda: join_points_to_intervals(
+                    candle_points, segments['start_idx'], segments['end_idx'], triples['tolerance'],
+                    segments['r_squared'].to_numpy(dtype=float) >= triples['min_trend_r_squared']), used)
+                matches = compose_triples(*zone_pairs, *trend_pairs)
+                return build_triple_signals(dataset.data.symbol, dataset.data.timeframe, key_candles, zones,
+                                            segments.to_dict('records'), matches)
+            signals = self._artifact(dataset, 'signals', signals_key, compute_signals, used)
+
+        info = {
+            'counts': {'key_candles': len(key_candles), 'zones': len(zones), 'segments': len(segments),
+                       'signals': len(signals)},
+            'artifacts': used,
+            'reused': sorted(name for name, state in used.items() if state == 'reused'),
+            'computed': sorted(name for name, state in used.items() if state == 'computed'),
+            'ms': (time.perf_counter() - started) * 1000,
+        }
+        return signals, info
+
+    def stats(self):
+        return {'datasets': [dataset.describe() for dataset in self.datasets.values()], 'queries': self.queries,
+                'cache': {'entries': len(self.cache), 'max_entries': self.cache.max_entries,
+                          'hits': self.cache.hits, 'misses': self.cache.misses}}
+
+
+class _TuningHandler(BaseHTTPRequestHandler):
+    def _reply(self, status, body):
+        payload = json.dumps(to_jsonable(body)).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def do_GET(self):
+        engine = self.server.engine
+        if self.path == '/datasets':
+            self._reply(200, [dataset.describe() for dataset in engine.datasets.values()])
+        elif self.path == '/stats':
+            self._reply(200, engine.stats())
+        else:
+            self._reply(404, {'error': f"Ruta desconocida: {self.path}"})
+
+    def do_POST(self):
+        engine = self.server.engine
+        try:
+            request = self._body()
+            if self.path == '/datasets':
+                self._reply(200, engine.add_dataset(request['csv'], request.get('name')).describe())
+            elif self.path == '/signals':
+                signals, info = engine.signals(request['dataset'], request.get('params'))
+                limit = request.get('limit', 50)
+                best = sorted(signals, key=lambda s: -s['combined_score'])[:limit] if limit else []
+                self._reply(200, dict(info, signals=best))
+            else:
+                self._reply(404, {'error': f"Ruta desconocida: {self.path}"})
+        except KeyError as e:
+            self._reply(404, {'error': str(e)})
+        except Exception as e:
+            logging.error(f"Servidor de ajuste: error en {self.path}: {e}")
+            self._reply(400, {'error': f"{type(e).__name__}: {e}"})
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+
+class TuningServer(ThreadingHTTPServer):
+    """Servidor HTTP del motor de ajuste."""
+    daemon_threads = True
+
+    def __init__(self, address, engine):
+        self.engine = engine
+        super().__init__(address, _TuningHandler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor JSON de ajuste de parámetros con datos en memoria")
+    parser.add_argument('--csv', type=str, nargs='*', default=[], help='CSV a cargar al arrancar (un conjunto por archivo)')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Dirección de escucha')
+    parser.add_argument('--port', type=int, default=8765, help='Puerto')
+    parser.add_argument('--cache-entries', type=int, default=1024, help='Artefactos derivados en la caché LRU')
+    args = parser.parse_args()
+
+    configure_logging(level=logging.WARNING, fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    engine = TuningEngine(cache_entries=args.cache_entries)
+    for csv_file in args.csv:
+        dataset = engine.add_dataset(csv_file)
+        print(f"Cargado {dataset.name}: {len(dataset.data.raw)} velas")
+    server = TuningServer((args.host, args.port), engine)
+    print(f"Servidor de ajuste en http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return True
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(0 if main() else 1)
+    except Exception as e:
+        logging.error(f"Error inesperado: {str(e)}")
+        traceback.print_exc()
+        sys.exit(1)
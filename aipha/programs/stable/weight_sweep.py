@@ -0,0 +1,235 @@
+"""
+weight_sweep.py - Barrido de pesos de puntuación sobre componentes cacheados
+
+Guarda por señal las puntuaciones de componentes (zona, tendencia, vela, divergencia,
+contexto+fiabilidad y rentabilidad) y re-ordena todas las señales bajo muchos vectores de pesos
+a la vez con un producto de matrices. Informa de cambios en el orden y de la estabilidad del
+top-K, sin tocar la base de datos ni los detectores.
+La configuración base (0) se puntúa como save_signals, con la base provisional 0.5: es el orden
+guardado en triple_signals. Con --use-signal-strength las demás configuraciones usan la fuerza
+real de la señal como base, y la configuración 1 son los pesos actuales con esa base.
+--strength-weights implica --use-signal-strength: con la base 0.5 los pesos de fuerza no influyen.
+Ubicación: aipha/programs/stable/weight_sweep.py
+"""
+
+import os
+import sys
+import argparse
+import numpy as np
+
+# Ajuste de path para importar desde el módulo padre
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+from batch_scoring import (component_scores, context_factors, signals_to_columns,
+                           SIGNAL_STRENGTH_WEIGHTS, COMBINED_SCORE_WEIGHTS, PROVISIONAL_BASE_STRENGTH)
+
+# Columnas de la matriz de componentes ('provisional_base' es la constante 0.5 de save_signals)
+COMPONENT_NAMES = ('zone_score', 'trend_score', 'candle_score',
+                   'divergence_factor', 'context_factor', 'profit_potential', 'provisional_base')
+
+# Columnas que identifican cada señal en la caché
+KEY_COLUMNS = ('symbol', 'timeframe', 'candle_index', 'zone_id', 'trend_id')
+
+
+def build_component_cache(signals):
+    """
+    Calcula la matriz de componentes para una lista de señales de find_triple_signals.
+    :param signals: Lista de diccionarios de señales
+    :return: Diccionario con 'components' (n x 7, float64) y las columnas de KEY_COLUMNS
+    """
+    columns = signals_to_columns(signals)
+    components = component_scores(columns)
+    zone_score = np.round(components['zone_score'], 4)
+    trend_score = np.round(components['trend_score'], 4)
+    candle_score = np.round(components['candle_score'], 4)
+    factors = context_factors(columns, zone_score, trend_score, candle_score)
+
+    cache = {
+        'components': np.column_stack([
+            zone_score, trend_score, candle_score,
+            factors['divergence_factor'],
+            factors['market_factor'] + factors['reliability_bonus'],
+            factors['profit_potential'],
+            np.full(len(zone_score), PROVISIONAL_BASE_STRENGTH),
+        ]).astype(np.float64),
+    }
+    for key in KEY_COLUMNS:
+        values = [signal.get(key) for signal in signals]
+        if key in ('symbol', 'timeframe'):
+            cache[key] = np.array([str(v or '') for v in values], dtype=str)
+        else:
+            cache[key] = np.array([-1 if v is None else int(v) for v in values], dtype=np.int64)
+    return cache
+
+
+def save_component_cache(cache, path):
+    """Guarda la caché de componentes en un archivo .npz."""
+    np.savez(path, **cache)
+    return path
+
+
+def load_component_cache(path):
+    """Carga una caché de componentes guardada con save_component_cache."""
+    with np.load(path, allow_pickle=False) as data:
+        cache = {key: data[key] for key in data.files}
+    components = cache['components']
+    if components.shape[1] == len(COMPONENT_NAMES) - 1:
+        # Cachés anteriores sin la columna de base provisional
+        cache['components'] = np.column_stack([components, np.full(len(components), PROVISIONAL_BASE_STRENGTH)])
+    return cache
+
+
+def effective_weights(strength_weights=SIGNAL_STRENGTH_WEIGHTS, combined_weights=COMBINED_SCORE_WEIGHTS,
+                      use_signal_strength=False):
+    """
+    Convierte los pesos de fuerza y combinados en un vector lineal sobre COMPONENT_NAMES.
+    :param use_signal_strength: False (como save_signals): la base es la constante 0.5 y los pesos
+                                de fuerza no influyen. True: la base es la fuerza real de la señal,
+                                base * (pesos de fuerza · zona/tendencia/vela), como
+                                calculate_combined_score sin detalles previos
+    """
+    zone_w, trend_w, candle_w = strength_weights
+    base_w, divergence_w, context_w, profit_w = combined_weights
+    if use_signal_strength:
+        return np.array([base_w * zone_w, base_w * trend_w, base_w * candle_w,
+                         divergence_w, context_w, profit_w, 0.0], dtype=np.float64)
+    return np.array([0.0, 0.0, 0.0, divergence_w, context_w, profit_w, base_w], dtype=np.float64)
+
+
+def sweep(cache, weight_vectors):
+    """
+    Puntúa todas las señales bajo todos los vectores de pesos.
+    :param cache: Caché de build_component_cache / load_component_cache
+    :param weight_vectors: Matriz (m x 7) de pesos efectivos
+    :return: Matriz (n señales x m configuraciones) de puntuaciones combinadas (limitadas a 1.0)
+    """
+    weights = np.atleast_2d(np.asarray(weight_vectors, dtype=np.float64))
+    return np.minimum(cache['components'] @ weights.T, 1.0)
+
+
+def rankings(scores):
+    """
+    Posición (0 = mejor) de cada señal en cada configuración.
+    Los empates se resuelven por orden de la señal en la caché.
+    """
+    order = np.argsort(-scores, axis=0, kind='stable')
+    ranks = np.empty_like(order)
+    rows = np.arange(scores.shape[0])[:, None]
+    ranks[order, np.arange(scores.shape[1])] = rows
+    return ranks
+
+
+def rank_stability(scores, baseline=0, top_k=10):
+    """
+    Compara el orden de cada configuración con el de la configuración base.
+    :param scores: Resultado de sweep
+    :param baseline: Columna de referencia
+    :param top_k: Tamaño del top-K para medir estabilidad
+    :return: Diccionario de arrays (una entrada por configuración): spearman, top_k_overlap,
+             changed (señales que cambian de posición) y mean_shift (desplazamiento medio)
+    """
+    n_signals = scores.shape[0]
+    ranks = rankings(scores)
+    base_ranks = ranks[:, baseline][:, None]
+    shift = np.abs(ranks - base_ranks)
+
+    if n_signals > 1:
+        centered = ranks - (n_signals - 1) / 2
+        base_centered = centered[:, baseline][:, None]
+        spearman = (centered * base_centered).sum(axis=0) / (base_centered ** 2).sum()
+    else:
+        spearman = np.ones(scores.shape[1])
+
+    k = min(top_k, n_signals)
+    in_top = ranks < k
+    top_k_overlap = (in_top & in_top[:, baseline][:, None]).sum(axis=0) / k if k else np.ones(scores.shape[1])
+
+    return {
+        'spearman': spearman,
+        'top_k_overlap': top_k_overlap,
+        'changed': (shift > 0).sum(axis=0),
+        'mean_shift': shift.mean(axis=0) if n_signals else np.zeros(scores.shape[1]),
+    }
+
+
+def parse_weights(text, expected):
+    """Convierte '0.35,0.35,0.30' en una tupla de floats de longitud esperada."""
+    values = tuple(float(v) for v in text.split(','))
+    if len(values) != expected:
+        raise argparse.ArgumentTypeError(f"Expected {expected} weights, got {len(values)}: {text}")
+    return values
+
+
+def build_configs(strength_list, combined_list, random_count=0, seed=42, use_signal_strength=False):
+    """
+    Configuraciones del barrido y su matriz de pesos efectivos.
+    La configuración 0 es siempre la actual, puntuada como save_signals (el orden guardado).
+    :return: (lista de (pesos de fuerza, pesos combinados), matriz m x 7 de pesos efectivos)
+    """
+    configs = [(SIGNAL_STRENGTH_WEIGHTS, COMBINED_SCORE_WEIGHTS)]
+    if use_signal_strength:
+        configs.append((SIGNAL_STRENGTH_WEIGHTS, COMBINED_SCORE_WEIGHTS))
+    for strength in strength_list or [SIGNAL_STRENGTH_WEIGHTS]:
+        for combined in combined_list or [COMBINED_SCORE_WEIGHTS]:
+            if (strength, combined) not in configs:
+                configs.append((strength, combined))
+    rng = np.random.default_rng(seed)
+    for _ in range(random_count):
+        configs.append((tuple(np.round(rng.dirichlet(np.ones(3)), 3)),
+                        tuple(np.round(rng.dirichlet(np.ones(4)), 3))))
+
+    weights = np.vstack([effective_weights(*configs[0])] +
+                        [effective_weights(s, c, use_signal_strength) for s, c in configs[1:]])
+    return configs, weights
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Barrido de pesos sobre componentes de señales cacheados")
+    parser.add_argument('--cache', type=str, required=True, help='Archivo .npz generado por save_triple_signals.py --component-cache')
+    parser.add_argument('--strength-weights', type=str, action='append', default=[],
+                        help='Pesos zona,tendencia,vela (repetible; implica --use-signal-strength)')
+    parser.add_argument('--combined-weights', type=str, action='append', default=[],
+                        help='Pesos fuerza,divergencia,contexto,rentabilidad (repetible)')
+    parser.add_argument('--random', type=int, default=0, help='Añadir N configuraciones aleatorias (Dirichlet)')
+    parser.add_argument('--top-k', type=int, default=10, help='Tamaño del top-K para medir estabilidad')
+    parser.add_argument('--seed', type=int, default=42, help='Semilla para configuraciones aleatorias')
+    parser.add_argument('--use-signal-strength', action='store_true',
+                        help='Puntuar las configuraciones con la fuerza real como base (la base 0 sigue siendo la guardada)')
+    args = parser.parse_args(argv)
+    if args.strength_weights and not args.use_signal_strength:
+        # Con la base constante 0.5 los pesos de fuerza no influyen: todas las configuraciones
+        # puntuarían igual que la actual
+        print("--strength-weights implies --use-signal-strength")
+        args.use_signal_strength = True
+    return args
+
+
+def main():
+    args = parse_args()
+
+    cache = load_component_cache(args.cache)
+    print(f"Loaded {len(cache['components'])} signals from {args.cache}")
+
+    configs, weights = build_configs([parse_weights(w, 3) for w in args.strength_weights],
+                                     [parse_weights(w, 4) for w in args.combined_weights],
+                                     args.random, args.seed, args.use_signal_strength)
+    scores = sweep(cache, weights)
+    stability = rank_stability(scores, baseline=0, top_k=args.top_k)
+
+    header = "{:<4} {:<7} {:<22} {:<28} {:<9} {:<8} {:<8} {:<10}"
+    print(header.format("#", "Base", "Fuerza", "Combinada", "Spearman", f"Top-{args.top_k}", "Cambios", "Desp.medio"))
+    print("-" * 103)
+    for i, (strength, combined) in enumerate(configs):
+        print(header.format(
+            i,
+            'fuerza' if i and args.use_signal_strength else '0.5',
+            ",".join(f"{w:.3f}" for w in strength),
+            ",".join(f"{w:.3f}" for w in combined),
+            f"{stability['spearman'][i]:.4f}",
+            f"{stability['top_k_overlap'][i]:.2f}",
+            int(stability['changed'][i]),
+            f"{stability['mean_shift'][i]:.2f}"
+        ))
+
+
+if __name__ == "__main__":
+    main()
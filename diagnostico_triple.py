@@ -13,6 +13,10 @@ import json
 import sys
 from datetime import datetime
 
+# Módulos compartidos del pipeline
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'aipha', 'programs', 'stable'))
+import schema_registry
+
 # Cargar variables de entorno
 load_dotenv()
 
@@ -38,25 +42,22 @@ def analyze_components(symbol="BTCUSDT", timeframe="5m"):
     try:
         print(f"\n===== DIAGNÓSTICO PARA {symbol}-{timeframe} =====")
         
-        # Verificar estructura de las tablas
+        # Verificar estructura de las tablas (una sola lectura de information_schema)
         print("\nAnalizando estructura de las tablas...")
+        schema_registry.load_schema(cursor, db_config['database'])
         
         # Verificar key_candles
-        cursor.execute("SHOW COLUMNS FROM key_candles")
-        key_candles_columns = [col['Field'] for col in cursor.fetchall()]
+        key_candles_columns = list(schema_registry.table_columns(cursor, 'key_candles', db_config['database']))
         print(f"Columnas en key_candles: {key_candles_columns}")
         
         # Verificar detect_accumulation_zone_results
-        cursor.execute("SHOW COLUMNS FROM detect_accumulation_zone_results")
-        zone_columns = [col['Field'] for col in cursor.fetchall()]
+        zone_columns = list(schema_registry.table_columns(cursor, 'detect_accumulation_zone_results', db_config['database']))
         print(f"Columnas en detect_accumulation_zone_results: {zone_columns}")
         
         # Verificar mini_trend_results
         mini_trend_table = "mini_trend_results"
-        cursor.execute(f"SHOW TABLES LIKE '{mini_trend_table}'")
-        if cursor.fetchone():
-            cursor.execute(f"SHOW COLUMNS FROM {mini_trend_table}")
-            trend_columns = [col['Field'] for col in cursor.fetchall()]
+        trend_columns = list(schema_registry.table_columns(cursor, mini_trend_table, db_config['database']))
+        if trend_columns:
             print(f"Columnas en {mini_trend_table}: {trend_columns}")
         else:
             print(f"Tabla {mini_trend_table} no existe")
@@ -111,8 +112,7 @@ def analyze_components(symbol="BTCUSDT", timeframe="5m"):
         
         # 3. Verificar mini-tendencias
         mini_trend_table = "mini_trend_results"  # Table as in save_triple_signals.py
-        cursor.execute(f"SHOW TABLES LIKE '{mini_trend_table}'")
-        if cursor.fetchone():
+        if trend_columns:
             has_symbol_trend = 'symbol' in trend_columns
             has_timeframe_trend = 'timeframe' in trend_columns
             
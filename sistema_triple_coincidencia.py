@@ -12,19 +12,6 @@ Autor: AIPHA System
 Fecha: 2025-04-23
 """
 
-import os
-import sys
-import mysql.connector
-import pandas as pd
-from dotenv import load_dotenv
-import matplotlib.pyplot as plt
-from tabulate import tabulate
-import json
-from datetime import datetime
-
-# Cargar variables de entorno (opcional)
-load_dotenv()
-
 class SistemaTripleCoincidencia:
     """Clase que documenta y describe el sistema de triple coincidencia"""
     
@@ -6,14 +6,34 @@ view_triple_signals.py - Muestra las señales de triple coincidencia con su sist
 """
 
 import os
+import sys
 import mysql.connector
 import pandas as pd
 from dotenv import load_dotenv
-import json
+
+# Módulos de aipha/programs/stable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), 'aipha', 'programs', 'stable')))
+from result_reader import read_frame
+import schema_registry
 
 # Cargar variables de entorno
 load_dotenv()
 
+# Columnas que muestra el visor; base_strength y final_score solo existen en tablas recientes
+SIGNAL_COLUMNS = [
+    'id', 'symbol', 'timeframe', 'candle_index', 'datetime',
+    'open', 'high', 'low', 'close', 'volume', 'body_percentage',
+    'zone_id', 'zone_quality_score', 'zone_start_datetime', 'zone_end_datetime',
+    'mini_trend_id', 'trend_direction', 'trend_slope', 'trend_r_squared',
+    'trend_start_datetime', 'trend_end_datetime',
+    'signal_strength', 'combined_score',
+    'zone_score', 'trend_score', 'candle_score',
+    'direction_factor', 'slope_factor',
+    'divergence_factor', 'reliability_bonus', 'profit_potential',
+    'base_strength', 'final_score'
+]
+OPTIONAL_COLUMNS = ('base_strength', 'final_score')
+
 # Configuración de la base de datos
 db_config = {
     'host': os.getenv('MYSQL_HOST', 'localhost'),
@@ -34,28 +54,13 @@ def view_triple_signals(symbol="BTCUSDT", timeframe="5m"):
     conn, cursor = connect_db()
     
     try:
-        # Obtener señales
-        query = """
-        SELECT 
-            id, symbol, timeframe, candle_index, datetime, 
-            open, high, low, close, volume, body_percentage,
-            zone_id, zone_quality_score, zone_start_datetime, zone_end_datetime,
-            mini_trend_id, trend_direction, trend_slope, trend_r_squared,
-            trend_start_datetime, trend_end_datetime,
-            signal_strength, combined_score,
-            zone_score, trend_score, candle_score, 
-            direction_factor, slope_factor,
-            divergence_factor, reliability_bonus, profit_potential
-        FROM 
-            triple_signals
-        WHERE 
-            symbol = %s AND timeframe = %s
-        ORDER BY 
-            combined_score DESC, signal_strength DESC
-        """
-        
-        cursor.execute(query, (symbol, timeframe))
-        signals = cursor.fetchall()
+        # Obtener señales: una sola consulta filtrada por símbolo/timeframe, leída en bloque
+        columns = [c for c in SIGNAL_COLUMNS
+                   if c not in OPTIONAL_COLUMNS or schema_registry.has_column(cursor, 'triple_signals', c)]
+        signals = read_frame(
+            conn, 'triple_signals', columns, symbol=symbol, timeframe=timeframe,
+            order_by='combined_score DESC, signal_strength DESC'
+        ).to_dict('records')
         
         if not signals:
             print(f"No se encontraron señales de triple coincidencia para {symbol}-{timeframe}")
@@ -120,22 +125,13 @@ def view_triple_signals(symbol="BTCUSDT", timeframe="5m"):
             print("{:<25} {:<12} {:<6} {:<50}".format(
                 "PUNTUACIÓN FINAL", f"{signal['combined_score']:.4f}", "100%", ""))
             
-            # Intentar obtener y mostrar scoring_details si existe
-            query_details = "SELECT scoring_details FROM triple_signals WHERE id = %s"
-            cursor.execute(query_details, (signal['id'],))
-            details_row = cursor.fetchone()
-            
-            if details_row and details_row['scoring_details']:
-                try:
-                    details = json.loads(details_row['scoring_details'])
-                    print("\nDetalles adicionales de puntuación:")
-                    for key, value in details.items():
-                        if key not in ['zone_score', 'trend_score', 'candle_score', 'direction_factor', 
-                                     'slope_factor', 'divergence_factor', 'reliability_bonus', 
-                                     'profit_potential', 'base_strength', 'final_score']:
-                            print(f"  - {key}: {value}")
-                except:
-                    pass
+            # Puntuación base y final (columnas tipadas, ya leídas en la consulta principal)
+            extra = {key: signal[key] for key in OPTIONAL_COLUMNS
+                     if key in signal and not pd.isna(signal[key])}
+            if extra:
+                print("\nDetalles adicionales de puntuación:")
+                for key, value in extra.items():
+                    print(f"  - {key}: {value:.4f}")
     
     except Exception as e:
         print(f"Error consultando señales de triple coincidencia: {e}")